@@ -0,0 +1,46 @@
+"""
+NB10 Benchmark Suite
+
+Synthetic chest-CT DICOM phantoms and an end-to-end throughput benchmark
+that can be run on any machine (no GPU or real patient data required).
+
+Usage:
+    python -m benchmark generate --output bench_data --patients 10
+    python -m benchmark run --data bench_data --output bench_report.json
+    python -m benchmark golden check --report golden_diff.md
+    python -m benchmark schedule --workers 4
+"""
+
+from .phantom import (
+    PhantomSpec,
+    CalcifiedBlob,
+    generate_phantom_patient,
+    generate_phantom_cohort,
+    expected_agatston,
+    expected_lesion_count,
+    skewed_slice_counts,
+    load_manifest,
+)
+from .runner import run_benchmark, StageResult, STAGES
+from .scheduling import run_schedule_benchmark
+from .golden import Tolerances, GoldenCheck, build_golden, check_golden, risk_category
+
+__all__ = [
+    "PhantomSpec",
+    "CalcifiedBlob",
+    "generate_phantom_patient",
+    "generate_phantom_cohort",
+    "expected_agatston",
+    "expected_lesion_count",
+    "skewed_slice_counts",
+    "load_manifest",
+    "run_benchmark",
+    "run_schedule_benchmark",
+    "StageResult",
+    "STAGES",
+    "Tolerances",
+    "GoldenCheck",
+    "build_golden",
+    "check_golden",
+    "risk_category",
+]
@@ -0,0 +1,349 @@
+"""
+NB10 Benchmark CLI
+
+Examples:
+  # Generate 10 synthetic patients (64 x 5mm slices, RLE, 64KB private tags, plus a 1mm distractor series)
+  python -m benchmark generate --output bench_data --patients 10 \\
+      --transfer-syntax rle --private-tag-bytes 65536 --thin-series 1.0
+
+  # Run all stages with the threshold model (no GPU or model weights needed)
+  python -m benchmark run --data bench_data --output bench_report.json
+
+  # Measure model inference with the real SwinUNETR architecture
+  python -m benchmark run --data bench_data --stages full --model swin --checkpoint models/va_non_gated_ai_cac_model.pth
+
+  # Generate into a temporary directory and run in one step
+  python -m benchmark run --patients 5 --slices 48
+
+  # Golden-output regression gate (regenerates the phantom set stored in the golden file).
+  # Timings are compared against this machine's local baseline (logs/benchmark_timing_baselines.json),
+  # which is written by the first passing check; --no-timing checks accuracy only
+  python -m benchmark golden check --report golden_diff.md
+
+  # Re-record golden values (and the local timing baseline), or only the local timing baseline
+  python -m benchmark golden record
+  python -m benchmark golden record --timing-only
+
+  # FIFO vs longest-first scheduling on a skewed cohort (one 8x-slice study last in name order)
+  python -m benchmark schedule --patients 12 --slices 32 --workers 4 --large-factor 8
+"""
+
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+from dataclasses import asdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmark.phantom import PhantomSpec, TRANSFER_SYNTAXES, generate_phantom_cohort, skewed_slice_counts
+from benchmark.runner import STAGES, run_benchmark
+from benchmark.scheduling import run_schedule_benchmark
+from benchmark.golden import (DEFAULT_GOLDEN_PATH, DEFAULT_TIMING_PATH, Tolerances, build_golden,
+                              check_golden, format_markdown, load_golden, load_timing_baselines,
+                              machine_key, record_timing_baseline, save_golden, timing_baseline_for,
+                              write_report)
+
+
+def add_phantom_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group('phantom')
+    group.add_argument('--patients', type=int, default=5, help='Number of synthetic patients (default: 5)')
+    group.add_argument('--slices', type=int, default=64, help='Slices per series (default: 64)')
+    group.add_argument('--thickness', type=float, default=5.0, help='Slice thickness in mm (default: 5.0)')
+    group.add_argument('--transfer-syntax', choices=sorted(TRANSFER_SYNTAXES), default='explicit',
+                       help='Transfer syntax (default: explicit)')
+    group.add_argument('--private-tag-bytes', type=int, default=0,
+                       help='Vendor private tag bloat per file in bytes (default: 0)')
+    group.add_argument('--blobs', type=int, default=3, help='Calcified blobs per patient (default: 3)')
+    group.add_argument('--blob-hu', type=int, nargs=2, default=[150, 600], metavar=('MIN', 'MAX'),
+                       help='Blob HU range (default: 150 600)')
+    group.add_argument('--blob-radius', type=int, nargs=2, default=[2, 5], metavar=('MIN', 'MAX'),
+                       help='Blob radius range in pixels (default: 2 5)')
+    group.add_argument('--thin-series', type=float, default=None, metavar='MM',
+                       help='Add a thin-slice distractor series with this thickness')
+    group.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+
+
+def spec_from_args(args) -> PhantomSpec:
+    return PhantomSpec(
+        num_slices=args.slices,
+        slice_thickness=args.thickness,
+        transfer_syntax=args.transfer_syntax,
+        private_tag_bytes=args.private_tag_bytes,
+        num_blobs=args.blobs,
+        blob_hu_range=tuple(args.blob_hu),
+        blob_radius_range=tuple(args.blob_radius),
+        thin_series_thickness=args.thin_series,
+    )
+
+
+def cmd_generate(args) -> int:
+    manifest = generate_phantom_cohort(Path(args.output), args.patients, spec_from_args(args), seed=args.seed)
+    total_files = sum(p['num_files'] for p in manifest['patients'])
+    total_mb = sum(p['total_bytes'] for p in manifest['patients']) / 1024 ** 2
+    print(f"✓ Generated {len(manifest['patients'])} patients ({total_files} files, {total_mb:.1f} MB) in {args.output}")
+    return 0
+
+
+def cmd_run(args) -> int:
+    temp_dir = None
+    data_dir = args.data
+    if data_dir is None:
+        temp_dir = tempfile.mkdtemp(prefix='nb10_bench_')
+        data_dir = temp_dir
+        print(f"Generating {args.patients} phantom patients in {data_dir}...", flush=True)
+        generate_phantom_cohort(Path(data_dir), args.patients, spec_from_args(args), seed=args.seed)
+
+    try:
+        stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            print(f"✗ Unknown stage(s): {', '.join(sorted(unknown))} (choose from: {', '.join(STAGES)})")
+            return 2
+
+        report = run_benchmark(Path(data_dir), stages=stages, model_type=args.model,
+                               device=args.device, checkpoint_path=args.checkpoint,
+                               warmup=args.warmup, max_patients=args.max_patients)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(text, encoding='utf-8')
+        print(f"✓ Report saved to {args.output}")
+    else:
+        print(text)
+
+    for name, stage in report['stages'].items():
+        print(f"  {name:<6}: {stage['files_per_sec']:>8.1f} files/s  {stage['slices_per_sec']:>8.1f} slices/s  "
+              f"{stage['patients_per_hour']:>9.1f} patients/h  peak RSS {stage['peak_rss_gb']:.2f} GB")
+    if report['scores_match_expected'] is False:
+        print("✗ Agatston scores do not match the phantom ground truth")
+        return 1
+    return 0
+
+
+def _run_repeated(data_dir: Path, args) -> dict:
+    """运行 --repeat 次，计时取各阶段最小值（降低噪声），分数取第一次"""
+    reports = [run_benchmark(data_dir, stages=STAGES, model_type=args.model, device=args.device,
+                             checkpoint_path=args.checkpoint, warmup=args.warmup)
+               for _ in range(max(1, args.repeat))]
+    report = reports[0]
+    for other in reports[1:]:
+        for name, stage in report['stages'].items():
+            o = other['stages'][name]
+            stage['seconds'] = min(stage['seconds'], o['seconds'])
+            for key, sec in o['stage_seconds'].items():
+                stage['stage_seconds'][key] = min(stage['stage_seconds'].get(key, sec), sec)
+    return report
+
+
+def cmd_golden(args) -> int:
+    golden_path = Path(args.golden)
+    timing_path = Path(args.timing_baselines)
+    existing = load_golden(golden_path) if golden_path.exists() else None
+
+    if existing is None and (args.action == 'check' or args.timing_only):
+        print(f"✗ Golden file not found: {golden_path} (create it with 'golden record')")
+        return 2
+
+    # 数据来源：--data 指定目录；否则按金标准（或命令行）中的体模参数重新生成
+    temp_dir = None
+    if args.data:
+        data_dir = Path(args.data)
+        source = {'data_dir': str(data_dir)}
+    else:
+        stored = (existing or {}).get('source', {})
+        if args.action == 'record' and not args.timing_only:
+            spec, seed, patients = spec_from_args(args), args.seed, args.patients
+        elif 'phantom_spec' in stored:
+            spec_data = dict(stored['phantom_spec'])
+            for key in ('blob_hu_range', 'blob_radius_range', 'blob_slices_range'):
+                spec_data[key] = tuple(spec_data[key])
+            spec, seed, patients = PhantomSpec(**spec_data), stored['seed'], stored['patients']
+        else:
+            print(f"✗ Golden file was recorded from {stored.get('data_dir')}; pass --data")
+            return 2
+        source = {'phantom_spec': asdict(spec), 'seed': seed, 'patients': patients}
+        temp_dir = tempfile.mkdtemp(prefix='nb10_golden_')
+        data_dir = Path(temp_dir)
+        print(f"Generating {patients} phantom patients in {data_dir}...", flush=True)
+        generate_phantom_cohort(data_dir, patients, spec, seed=seed)
+
+    try:
+        report = _run_repeated(data_dir, args)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.action == 'record':
+        if not args.timing_only:
+            tolerances = Tolerances.from_dict((existing or {}).get('tolerances'))
+            if args.max_slowdown is not None:
+                tolerances.max_slowdown = args.max_slowdown
+            golden = build_golden(report, source, tolerances, existing=existing)
+            save_golden(golden, golden_path)
+            print(f"✓ Golden file saved to {golden_path} ({len(golden['patients'])} patients)")
+        record_timing_baseline(report, golden_path, timing_path)
+        print(f"✓ Timing baseline for '{machine_key(report)}' saved to {timing_path}")
+        return 0
+
+    tolerances = Tolerances.from_dict(existing.get('tolerances'))
+    if args.max_slowdown is not None:
+        tolerances.max_slowdown = args.max_slowdown
+    for metric in args.abs_tol or []:
+        tolerances.abs_tol[metric[0]] = float(metric[1])
+    for metric in args.rel_tol or []:
+        tolerances.rel_tol[metric[0]] = float(metric[1])
+
+    baseline = None
+    if not args.no_timing:
+        baseline = timing_baseline_for(load_timing_baselines(timing_path), golden_path, machine_key(report))
+    check = check_golden(report, existing, tolerances, baseline)
+    if args.no_timing:
+        check.timing_skipped = 'disabled (--no-timing)'
+    elif baseline is None and check.passed:
+        # 本机首次检查: 以本次耗时作为基线（准确性未通过时不写入）
+        record_timing_baseline(report, golden_path, timing_path)
+        check.timing_skipped = f"first run on this machine, baseline recorded to {timing_path}"
+    if args.report:
+        write_report(check, Path(args.report), golden_path)
+        print(f"Diff report saved to {args.report}")
+
+    if check.timing_skipped:
+        print(f"⚠ Timing not checked: {check.timing_skipped}")
+    if check.passed:
+        print(f"✓ Golden check passed ({check.patients_checked} patients, {check.stages_checked} timings)")
+        return 0
+
+    print(format_markdown(check, golden_path))
+    print("=" * 70)
+    print(f"✗ GOLDEN CHECK FAILED: {len(check.failures)} difference(s)")
+    for d in check.failures:
+        print(f"  ✗ [{d.kind}] {d.describe()}")
+    print("=" * 70)
+    return 1
+
+
+def cmd_schedule(args) -> int:
+    temp_dir = None
+    data_dir = args.data
+    if data_dir is None:
+        temp_dir = tempfile.mkdtemp(prefix='nb10_sched_')
+        data_dir = temp_dir
+        counts = skewed_slice_counts(args.patients, args.slices, args.large_factor, args.large_fraction)
+        print(f"Generating {args.patients} phantom patients ({min(counts)}-{max(counts)} slices) "
+              f"in {data_dir}...", flush=True)
+        generate_phantom_cohort(Path(data_dir), args.patients, spec_from_args(args), seed=args.seed,
+                                slice_counts=counts)
+
+    try:
+        report = run_schedule_benchmark(Path(data_dir), workers=args.workers, model_type=args.model,
+                                        device=args.device, checkpoint_path=args.checkpoint,
+                                        warmup=args.warmup, execute=not args.simulate_only)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding='utf-8')
+        print(f"✓ Report saved to {args.output}")
+
+    print(f"  {report['patients']} patients, {args.workers} workers, "
+          f"lower bound {report['lower_bound_sec']:.2f}s")
+    for name, entry in report['schedules'].items():
+        line = f"  {name:<5}: simulated makespan {entry['simulated_makespan_sec']:>8.2f}s"
+        if 'measured_makespan_sec' in entry:
+            line += (f"  measured {entry['measured_makespan_sec']:>8.2f}s"
+                     f"  (last: {entry['measured_last_patient']})")
+        print(line)
+    print(f"  lpt speedup (simulated): {report['lpt_simulated_speedup']}x")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmark',
+        description='NB10 synthetic DICOM phantom generator and throughput benchmark',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__.split('Examples:', 1)[1] if __doc__ else None,
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_gen = sub.add_parser('generate', help='Generate a synthetic phantom cohort')
+    p_gen.add_argument('--output', required=True, help='Output directory')
+    add_phantom_arguments(p_gen)
+    p_gen.set_defaults(func=cmd_generate)
+
+    p_run = sub.add_parser('run', help='Run the benchmark and report throughput as JSON')
+    p_run.add_argument('--data', help='Data directory (default: generate phantoms into a temp directory)')
+    p_run.add_argument('--stages', default=','.join(STAGES), help=f"Comma-separated stages (default: {','.join(STAGES)})")
+    p_run.add_argument('--model', choices=['threshold', 'swin'], default='threshold',
+                       help='threshold: no weights/GPU needed; swin: real architecture (default: threshold)')
+    p_run.add_argument('--checkpoint', help='SwinUNETR weights for --model swin (default: random weights)')
+    p_run.add_argument('--device', choices=['cpu', 'cuda'], default='cpu', help='Device (default: cpu)')
+    p_run.add_argument('--warmup', type=int, default=1, help='Untimed warm-up patients (default: 1)')
+    p_run.add_argument('--max-patients', type=int, help='Limit the number of patients')
+    p_run.add_argument('--output', help='Write the JSON report to this file (default: print)')
+    add_phantom_arguments(p_run)
+    p_run.set_defaults(func=cmd_run)
+
+    p_gold = sub.add_parser('golden', help='Record or check golden outputs and timing baselines')
+    p_gold.add_argument('action', choices=['record', 'check'])
+    p_gold.add_argument('--golden', default=str(DEFAULT_GOLDEN_PATH),
+                        help='Golden file (default: benchmark/golden/threshold_phantom.json)')
+    p_gold.add_argument('--timing-baselines', default=str(DEFAULT_TIMING_PATH),
+                        help='Local per-machine timing baselines (default: logs/benchmark_timing_baselines.json)')
+    p_gold.add_argument('--no-timing', action='store_true',
+                        help='check: compare accuracy only (no timing check, no baseline written)')
+    p_gold.add_argument('--data', help='Use a local data directory instead of the phantom set')
+    p_gold.add_argument('--model', choices=['threshold', 'swin'], default='threshold',
+                        help='Model (default: threshold)')
+    p_gold.add_argument('--checkpoint', help='SwinUNETR weights for --model swin')
+    p_gold.add_argument('--device', choices=['cpu', 'cuda'], default='cpu', help='Device (default: cpu)')
+    p_gold.add_argument('--warmup', type=int, default=1, help='Untimed warm-up patients (default: 1)')
+    p_gold.add_argument('--repeat', type=int, default=3,
+                        help='Timed repetitions; the fastest is compared (default: 3)')
+    p_gold.add_argument('--timing-only', action='store_true',
+                        help='record: only replace the local timing baseline for this machine')
+    p_gold.add_argument('--max-slowdown', type=float,
+                        help='Allowed slowdown per stage, e.g. 0.2 = 20%% (default: from golden file)')
+    p_gold.add_argument('--abs-tol', nargs=2, action='append', metavar=('METRIC', 'VALUE'),
+                        help='check: override the absolute tolerance for a metric')
+    p_gold.add_argument('--rel-tol', nargs=2, action='append', metavar=('METRIC', 'VALUE'),
+                        help='check: override the relative tolerance for a metric')
+    p_gold.add_argument('--report', help='check: write a diff report (.md or .json)')
+    add_phantom_arguments(p_gold)
+    p_gold.set_defaults(func=cmd_golden)
+
+    p_sched = sub.add_parser('schedule', help='Compare FIFO vs longest-first makespan on a skewed cohort')
+    p_sched.add_argument('--data', help='Data directory (default: generate a skewed phantom cohort)')
+    p_sched.add_argument('--workers', type=int, default=4, help='Parallel workers (default: 4)')
+    p_sched.add_argument('--large-factor', type=int, default=8,
+                         help='Slice multiplier of the large studies (default: 8)')
+    p_sched.add_argument('--large-fraction', type=float, default=0.1,
+                         help='Fraction of large studies, at least one (default: 0.1)')
+    p_sched.add_argument('--model', choices=['threshold', 'swin'], default='threshold',
+                         help='Model (default: threshold)')
+    p_sched.add_argument('--checkpoint', help='SwinUNETR weights for --model swin')
+    p_sched.add_argument('--device', choices=['cpu', 'cuda'], default='cpu', help='Device (default: cpu)')
+    p_sched.add_argument('--warmup', type=int, default=1, help='Untimed warm-up patients (default: 1)')
+    p_sched.add_argument('--simulate-only', action='store_true',
+                         help='Only time patients serially and simulate both orders')
+    p_sched.add_argument('--output', help='Write the JSON report to this file')
+    add_phantom_arguments(p_sched)
+    p_sched.set_defaults(func=cmd_schedule, patients=12, slices=32)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
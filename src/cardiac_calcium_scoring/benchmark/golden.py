@@ -0,0 +1,318 @@
+"""
+金标准输出回归检查
+Golden-output Regression Gate
+
+优化评分、DICOM加载或模型后端之后，用固定的数据集（体模或本地数据）
+证明结果没有变化、速度没有变慢:
+
+- 准确性: 逐例比较 Agatston、钙化体积、钙化质量、病灶数和风险分级，
+  数值指标按 |当前 - 金标准| <= abs_tol + rel_tol × |金标准| 判定，
+  病灶数和风险分级必须完全一致
+- 性能: 各阶段耗时与本机基线比较，任一阶段变慢超过阈值（默认20%）即失败，
+  耗时过短（低于 min_stage_seconds）的阶段不参与比较，避免计时噪声误报
+
+金标准文件为JSON（纳入版本库），只记录数据来源（体模参数+随机种子，或数据目录）、
+容差和逐例数值。计时基线与机器相关，保存在本地（默认 logs/benchmark_timing_baselines.json，
+不纳入版本库），按金标准文件名和机器键区分；本机首次 check 通过时自动写入。
+
+取代 scripts/compare_colab_vs_windows.py 的手工对比流程。
+"""
+
+import json
+import logging
+import platform
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 与 config.yaml 中 clinical.risk_thresholds 的默认值一致
+DEFAULT_RISK_THRESHOLDS = {'very_low': 0, 'low': 1, 'moderate': 101, 'high': 401}
+
+NUMERIC_METRICS = ('agatston_score', 'calcium_volume_mm3', 'calcium_mass_mg')
+EXACT_METRICS = ('lesion_count', 'risk_category')
+
+DEFAULT_GOLDEN_PATH = Path(__file__).parent / 'golden' / 'threshold_phantom.json'
+
+# 本地计时基线（与 paths.log_dir 默认值一致，不纳入版本库）
+DEFAULT_TIMING_PATH = Path(__file__).parent.parent / 'logs' / 'benchmark_timing_baselines.json'
+
+
+def risk_category(score: float, thresholds: Optional[Dict[str, float]] = None) -> str:
+    """按Agatston积分分级: very_low / low / moderate / high"""
+    t = thresholds or DEFAULT_RISK_THRESHOLDS
+    if score >= t['high']:
+        return 'high'
+    if score >= t['moderate']:
+        return 'moderate'
+    if score >= t['low']:
+        return 'low'
+    return 'very_low'
+
+
+def machine_key(report: dict) -> str:
+    """计时基线的机器键（同一机器、同一设备的计时才可比）"""
+    m = report['machine']
+    return f"{platform.system().lower()}-{platform.machine()}-{m['cpu_count']}cpu-{m['device']}"
+
+
+@dataclass
+class Tolerances:
+    """金标准比较容差"""
+    abs_tol: Dict[str, float] = field(default_factory=lambda: {
+        'agatston_score': 0.0, 'calcium_volume_mm3': 0.01, 'calcium_mass_mg': 0.01})
+    rel_tol: Dict[str, float] = field(default_factory=lambda: {
+        'agatston_score': 0.0, 'calcium_volume_mm3': 1e-3, 'calcium_mass_mg': 1e-3})
+    max_slowdown: float = 0.20
+    min_stage_seconds: float = 0.05
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> 'Tolerances':
+        tol = cls()
+        if data:
+            tol.abs_tol.update(data.get('abs_tol', {}))
+            tol.rel_tol.update(data.get('rel_tol', {}))
+            tol.max_slowdown = data.get('max_slowdown', tol.max_slowdown)
+            tol.min_stage_seconds = data.get('min_stage_seconds', tol.min_stage_seconds)
+        return tol
+
+    def allowed(self, metric: str, golden_value: float) -> float:
+        return self.abs_tol.get(metric, 0.0) + self.rel_tol.get(metric, 0.0) * abs(golden_value)
+
+
+@dataclass
+class Difference:
+    """一条比较结果"""
+    kind: str           # accuracy / timing / missing
+    subject: str        # 患者ID 或 阶段名
+    metric: str
+    golden: object
+    current: object
+    allowed: Optional[float] = None
+    failed: bool = True
+
+    def describe(self) -> str:
+        if self.kind == 'timing':
+            change = (self.current - self.golden) / self.golden if self.golden else 0.0
+            return (f"{self.subject}: {self.metric} {self.golden:.3f}s -> {self.current:.3f}s "
+                    f"({change:+.1%}, allowed +{self.allowed:.0%})")
+        if self.kind == 'missing':
+            return f"{self.subject}: {self.metric} (golden={self.golden}, current={self.current})"
+        allowed = f" (allowed ±{self.allowed:g})" if self.allowed is not None else ""
+        return f"{self.subject}: {self.metric} {self.golden} -> {self.current}{allowed}"
+
+
+@dataclass
+class GoldenCheck:
+    """金标准检查结果"""
+    machine: str
+    differences: List[Difference] = field(default_factory=list)
+    patients_checked: int = 0
+    stages_checked: int = 0
+    timing_skipped: Optional[str] = None
+
+    @property
+    def failures(self) -> List[Difference]:
+        return [d for d in self.differences if d.failed]
+
+    @property
+    def passed(self) -> bool:
+        return not self.failures
+
+
+def _score_entry(score: dict, thresholds: Optional[Dict[str, float]]) -> dict:
+    return {
+        'agatston_score': score['agatston_score'],
+        'calcium_volume_mm3': round(float(score['calcium_volume_mm3']), 4),
+        'calcium_mass_mg': round(float(score['calcium_mass_mg']), 4),
+        'lesion_count': int(score['lesion_count']),
+        'risk_category': risk_category(score['agatston_score'], thresholds),
+    }
+
+
+def _timing_baseline(report: dict) -> dict:
+    stages = {}
+    for name, stage in report['stages'].items():
+        stages[name] = {'seconds': stage['seconds'], 'stage_seconds': dict(stage['stage_seconds'])}
+    return {'recorded': report['timestamp'], 'machine': report['machine'], 'stages': stages}
+
+
+def build_golden(report: dict, source: dict, tolerances: Optional[Tolerances] = None,
+                 thresholds: Optional[Dict[str, float]] = None,
+                 existing: Optional[dict] = None) -> dict:
+    """
+    由基准测试报告生成（或更新）金标准（只含准确性数值；计时基线见 record_timing_baseline）
+
+    Args:
+        report: run_benchmark() 的报告（需包含full阶段）
+        source: 数据来源描述（phantom_spec+seed+patients 或 data_dir）
+        tolerances: 容差（默认沿用existing中的，否则使用默认值）
+        thresholds: 风险分级阈值
+        existing: 已有金标准
+    """
+    if not report['scores']:
+        raise ValueError("Benchmark report has no scores (run the 'full' stage)")
+    golden = dict(existing) if existing else {}
+    golden.pop('timing_baselines', None)  # 旧版金标准文件中的计时基线不再使用
+    if tolerances is None:
+        tolerances = Tolerances.from_dict(golden.get('tolerances'))
+    golden.update({
+        'created': report['timestamp'],
+        'model': report['config']['model'],
+        'source': source,
+        'risk_thresholds': thresholds or DEFAULT_RISK_THRESHOLDS,
+        'tolerances': asdict(tolerances),
+        'patients': {s['patient_id']: _score_entry(s, thresholds) for s in report['scores']},
+    })
+    return golden
+
+
+def load_timing_baselines(path: Path = DEFAULT_TIMING_PATH) -> dict:
+    """读取本地计时基线 {金标准文件名: {机器键: 基线}}；文件不存在时为空"""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def timing_baseline_for(baselines: dict, golden_path: Path, machine: str) -> Optional[dict]:
+    """某金标准文件在某机器上的计时基线"""
+    return baselines.get(Path(golden_path).name, {}).get(machine)
+
+
+def record_timing_baseline(report: dict, golden_path: Path, path: Path = DEFAULT_TIMING_PATH) -> Path:
+    """把本次报告的各阶段耗时写为本机基线（替换同一金标准、同一机器的旧基线）"""
+    baselines = load_timing_baselines(path)
+    baselines.setdefault(Path(golden_path).name, {})[machine_key(report)] = _timing_baseline(report)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(baselines, indent=2) + "\n", encoding='utf-8')
+    return path
+
+
+def check_golden(report: dict, golden: dict, tolerances: Optional[Tolerances] = None,
+                 timing_baseline: Optional[dict] = None) -> GoldenCheck:
+    """
+    将基准测试报告与金标准比较
+
+    Args:
+        report: run_benchmark() 的报告
+        golden: 金标准字典
+        tolerances: 覆盖金标准中记录的容差
+        timing_baseline: 本机计时基线（timing_baseline_for()）；None 时不检查耗时
+
+    Returns:
+        GoldenCheck（passed 为 False 表示存在准确性漂移或性能退化）
+    """
+    tol = tolerances or Tolerances.from_dict(golden.get('tolerances'))
+    thresholds = golden.get('risk_thresholds')
+    result = GoldenCheck(machine=machine_key(report))
+
+    # 准确性
+    current = {s['patient_id']: _score_entry(s, thresholds) for s in report['scores']}
+    for patient_id, gold in sorted(golden['patients'].items()):
+        cur = current.get(patient_id)
+        if cur is None:
+            result.differences.append(Difference('missing', patient_id, 'result', 'present', 'missing'))
+            continue
+        result.patients_checked += 1
+        for metric in NUMERIC_METRICS:
+            allowed = tol.allowed(metric, gold[metric])
+            delta = abs(cur[metric] - gold[metric])
+            if delta > 0:
+                result.differences.append(Difference('accuracy', patient_id, metric, gold[metric],
+                                                     cur[metric], allowed, failed=delta > allowed))
+        for metric in EXACT_METRICS:
+            if cur[metric] != gold[metric]:
+                result.differences.append(Difference('accuracy', patient_id, metric,
+                                                     gold[metric], cur[metric]))
+    for patient_id in sorted(set(current) - set(golden['patients'])):
+        result.differences.append(Difference('missing', patient_id, 'golden value', 'missing', 'present',
+                                             failed=False))
+
+    # 性能
+    baseline = timing_baseline
+    if baseline is None:
+        result.timing_skipped = f"no timing baseline for machine '{result.machine}'"
+        return result
+
+    for stage_name, base in baseline['stages'].items():
+        stage = report['stages'].get(stage_name)
+        if stage is None:
+            continue
+        pairs = [(stage_name, 'total', base['seconds'], stage['seconds'])]
+        pairs += [(stage_name, key, sec, stage['stage_seconds'].get(key, 0.0))
+                  for key, sec in base['stage_seconds'].items()]
+        for subject, metric, gold_sec, cur_sec in pairs:
+            if gold_sec < tol.min_stage_seconds:
+                continue
+            result.stages_checked += 1
+            if cur_sec > gold_sec:
+                slow = cur_sec > gold_sec * (1 + tol.max_slowdown)
+                result.differences.append(Difference('timing', subject, metric, gold_sec, cur_sec,
+                                                     tol.max_slowdown, failed=slow))
+    return result
+
+
+def format_markdown(check: GoldenCheck, golden_path: Optional[Path] = None) -> str:
+    """生成Markdown差异报告"""
+    status = 'PASS' if check.passed else 'FAIL'
+    lines = [
+        f"# Golden-output check: {status}",
+        "",
+        f"- Generated: {datetime.now().isoformat(timespec='seconds')}",
+        f"- Golden file: {golden_path or '-'}",
+        f"- Machine: {check.machine}",
+        f"- Patients checked: {check.patients_checked}",
+        f"- Timings checked: {check.stages_checked}" + (f" ({check.timing_skipped})" if check.timing_skipped else ""),
+        f"- Failures: {len(check.failures)}",
+        "",
+    ]
+    if not check.differences:
+        lines.append("No differences.")
+        return "\n".join(lines) + "\n"
+
+    lines += ["| Status | Kind | Subject | Metric | Golden | Current | Allowed |",
+              "|---|---|---|---|---|---|---|"]
+    for d in sorted(check.differences, key=lambda d: (not d.failed, d.kind, d.subject, d.metric)):
+        allowed = '' if d.allowed is None else (f"+{d.allowed:.0%}" if d.kind == 'timing' else f"±{d.allowed:g}")
+        golden, current = ((f"{d.golden:.3f}s", f"{d.current:.3f}s") if d.kind == 'timing'
+                           else (d.golden, d.current))
+        lines.append(f"| {'FAIL' if d.failed else 'ok'} | {d.kind} | {d.subject} | {d.metric} | "
+                     f"{golden} | {current} | {allowed} |")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(check: GoldenCheck, output_path: Path, golden_path: Optional[Path] = None) -> Path:
+    """写出差异报告（.json 为JSON，其余为Markdown）"""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if output_path.suffix.lower() == '.json':
+        data = {
+            'passed': check.passed,
+            'machine': check.machine,
+            'golden_file': str(golden_path) if golden_path else None,
+            'patients_checked': check.patients_checked,
+            'stages_checked': check.stages_checked,
+            'timing_skipped': check.timing_skipped,
+            'differences': [asdict(d) for d in check.differences],
+        }
+        output_path.write_text(json.dumps(data, indent=2, default=str), encoding='utf-8')
+    else:
+        output_path.write_text(format_markdown(check, golden_path), encoding='utf-8')
+    return output_path
+
+
+def load_golden(path: Path) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_golden(golden: dict, path: Path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(golden, indent=2) + "\n", encoding='utf-8')
+    return path
@@ -0,0 +1,368 @@
+"""
+合成胸部CT DICOM体模
+Synthetic Chest-CT DICOM Phantom
+
+生成可在各站点之间共享的合成数据（不含任何真实患者信息）:
+- 体部椭圆（软组织）、双肺（-850 HU）、心脏区域、体外空气
+- 在心脏区域内插入已知HU值和尺寸的钙化块（圆柱体）
+- 可配置层数、层厚、传输语法（explicit / implicit / RLE）
+- 可选厂商私有标签膨胀（模拟CSA头等大私有块）
+- 可选同一检查中的薄层干扰序列（用于测试序列选择）
+
+期望Agatston积分和病灶数按 processing.compute_agatston_for_vol() 的
+同一规则计算，写入 phantom_manifest.json。
+"""
+
+import json
+import math
+from dataclasses import dataclass, asdict, replace
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pydicom
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.uid import (ExplicitVRLittleEndian, ImplicitVRLittleEndian,
+                         RLELossless, generate_uid)
+
+CT_IMAGE_STORAGE = '1.2.840.10008.5.1.4.1.1.2'
+
+TRANSFER_SYNTAXES = {
+    'explicit': ExplicitVRLittleEndian,
+    'implicit': ImplicitVRLittleEndian,
+    'rle': RLELossless,
+}
+
+# 体模组织HU值
+AIR_HU = -1000
+LUNG_HU = -850
+TISSUE_HU = 40
+NOISE_SIGMA_HU = 8.0
+NOISE_CLIP_HU = 25.0  # 保证软组织噪声不会超过130 HU钙化阈值
+
+RESCALE_INTERCEPT = -1024
+
+
+@dataclass
+class CalcifiedBlob:
+    """钙化块（圆柱体：层内圆盘 × 连续若干层）"""
+    row: int
+    col: int
+    first_slice: int
+    num_slices: int
+    radius_px: int
+    hu: int
+
+    def disk_mask(self, rows: int, cols: int) -> np.ndarray:
+        rr, cc = np.ogrid[:rows, :cols]
+        return (rr - self.row) ** 2 + (cc - self.col) ** 2 <= self.radius_px ** 2
+
+
+@dataclass
+class PhantomSpec:
+    """体模参数"""
+    num_slices: int = 64
+    slice_thickness: float = 5.0
+    pixel_spacing: float = 0.7
+    rows: int = 512
+    cols: int = 512
+    transfer_syntax: str = 'explicit'       # explicit / implicit / rle
+    private_tag_bytes: int = 0               # 每个文件的私有标签膨胀字节数
+    num_blobs: int = 3
+    blob_hu_range: Tuple[int, int] = (150, 600)
+    blob_radius_range: Tuple[int, int] = (2, 5)
+    blob_slices_range: Tuple[int, int] = (1, 3)
+    thin_series_thickness: Optional[float] = None  # 额外的薄层干扰序列
+    patient_age: str = '060Y'
+    patient_sex: str = 'M'
+
+    def __post_init__(self):
+        if self.transfer_syntax not in TRANSFER_SYNTAXES:
+            raise ValueError(f"Unknown transfer syntax '{self.transfer_syntax}' "
+                             f"(choose from: {', '.join(TRANSFER_SYNTAXES)})")
+
+
+def agatston_weight(max_hu: float) -> int:
+    """与 processing.get_object_agatston() 相同的密度权重"""
+    if max_hu >= 400:
+        return 4
+    if max_hu >= 300:
+        return 3
+    if max_hu >= 200:
+        return 2
+    if max_hu >= 130:
+        return 1
+    return 0
+
+
+def expected_agatston(blobs: List[CalcifiedBlob], spec: PhantomSpec) -> int:
+    """
+    计算钙化块的期望Agatston积分
+
+    与 compute_agatston_for_vol() 一致：体素体积按3mm层厚归一化，
+    每个连通域按最大HU加权后取整。
+    """
+    voxel_vol = spec.pixel_spacing * spec.pixel_spacing * spec.slice_thickness / 3
+    total = 0
+    for blob in blobs:
+        pixels = int(blob.disk_mask(spec.rows, spec.cols).sum())
+        voxel_count = pixels * blob.num_slices
+        if voxel_count <= 1:
+            continue
+        total += round(agatston_weight(blob.hu) * voxel_count * voxel_vol)
+    return int(total)
+
+
+def expected_lesion_count(blobs: List[CalcifiedBlob], spec: PhantomSpec) -> int:
+    """计入积分的钙化块数（与 compute_agatston_for_vol 的病灶计数一致）"""
+    return sum(1 for b in blobs
+               if int(b.disk_mask(spec.rows, spec.cols).sum()) * b.num_slices > 1
+               and agatston_weight(b.hu) > 0)
+
+
+def _anatomy_slice(spec: PhantomSpec) -> Tuple[np.ndarray, np.ndarray]:
+    """生成单层基础解剖（HU）及心脏区域掩码"""
+    rr, cc = np.ogrid[:spec.rows, :spec.cols]
+    cy, cx = spec.rows / 2, spec.cols / 2
+    sy, sx = spec.rows / 512, spec.cols / 512
+
+    image = np.full((spec.rows, spec.cols), AIR_HU, dtype=np.float32)
+
+    body = ((rr - cy) / (150 * sy)) ** 2 + ((cc - cx) / (200 * sx)) ** 2 <= 1
+    image[body] = TISSUE_HU
+
+    for side in (-1, 1):
+        lung = ((rr - (cy - 15 * sy)) / (110 * sy)) ** 2 + ((cc - (cx + side * 95 * sx)) / (65 * sx)) ** 2 <= 1
+        image[lung] = LUNG_HU
+
+    heart = ((rr - (cy + 15 * sy)) / (70 * sy)) ** 2 + ((cc - (cx + 20 * sx)) / (75 * sx)) ** 2 <= 1
+    image[heart] = TISSUE_HU
+
+    return image, heart
+
+
+def _place_blobs(spec: PhantomSpec, heart: np.ndarray, rng: np.random.Generator) -> List[CalcifiedBlob]:
+    """在心脏区域内随机放置互不接触的钙化块"""
+    heart_rows, heart_cols = np.nonzero(heart)
+    blobs: List[CalcifiedBlob] = []
+
+    attempts = 0
+    while len(blobs) < spec.num_blobs and attempts < 1000:
+        attempts += 1
+        radius = int(rng.integers(spec.blob_radius_range[0], spec.blob_radius_range[1] + 1))
+        n_slices = int(rng.integers(spec.blob_slices_range[0], spec.blob_slices_range[1] + 1))
+        n_slices = min(n_slices, spec.num_slices)
+        idx = int(rng.integers(len(heart_rows)))
+        candidate = CalcifiedBlob(
+            row=int(heart_rows[idx]),
+            col=int(heart_cols[idx]),
+            first_slice=int(rng.integers(0, spec.num_slices - n_slices + 1)),
+            num_slices=n_slices,
+            radius_px=radius,
+            hu=int(rng.integers(spec.blob_hu_range[0], spec.blob_hu_range[1] + 1)),
+        )
+
+        # 整个圆盘必须在心脏区域内
+        if not heart[candidate.disk_mask(spec.rows, spec.cols)].all():
+            continue
+
+        # 与已有钙化块保持间隔，避免连通域合并
+        clear = True
+        for other in blobs:
+            in_plane = math.hypot(candidate.row - other.row, candidate.col - other.col)
+            overlap_z = (candidate.first_slice <= other.first_slice + other.num_slices and
+                         other.first_slice <= candidate.first_slice + candidate.num_slices)
+            if overlap_z and in_plane <= candidate.radius_px + other.radius_px + 2:
+                clear = False
+                break
+        if clear:
+            blobs.append(candidate)
+
+    return blobs
+
+
+def _write_series(folder: Path, spec: PhantomSpec, slices_hu: List[np.ndarray], thickness: float,
+                  patient_id: str, study_uid: str, series_uid: str, series_number: int,
+                  description: str, rng: np.random.Generator, uid_seed: str) -> int:
+    """写出一个序列，返回写入的总字节数"""
+    transfer_syntax = TRANSFER_SYNTAXES[spec.transfer_syntax]
+    bytes_written = 0
+
+    for i, hu in enumerate(slices_hu):
+        sop_uid = generate_uid(entropy_srcs=[uid_seed, series_uid, str(i)])
+
+        meta = FileMetaDataset()
+        meta.MediaStorageSOPClassUID = CT_IMAGE_STORAGE
+        meta.MediaStorageSOPInstanceUID = sop_uid
+        meta.TransferSyntaxUID = ExplicitVRLittleEndian if transfer_syntax == RLELossless else transfer_syntax
+
+        path = folder / f"S{series_number:02d}_IM{i + 1:04d}.dcm"
+        ds = FileDataset(str(path), {}, file_meta=meta, preamble=b"\0" * 128)
+
+        ds.SOPClassUID = CT_IMAGE_STORAGE
+        ds.SOPInstanceUID = sop_uid
+        ds.Modality = 'CT'
+        ds.Manufacturer = 'NB10 PHANTOM'
+        ds.PatientID = patient_id
+        ds.PatientName = patient_id
+        ds.PatientAge = spec.patient_age
+        ds.PatientSex = spec.patient_sex
+        ds.StudyDate = '20250101'
+        ds.StudyInstanceUID = study_uid
+        ds.SeriesInstanceUID = series_uid
+        ds.SeriesNumber = series_number
+        ds.SeriesDescription = description
+        ds.InstanceNumber = i + 1
+        ds.SliceThickness = thickness
+        ds.ImagePositionPatient = [0.0, 0.0, float(i * thickness)]
+        ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        ds.PixelSpacing = [spec.pixel_spacing, spec.pixel_spacing]
+        ds.Rows = spec.rows
+        ds.Columns = spec.cols
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = 'MONOCHROME2'
+        ds.BitsAllocated = 16
+        ds.BitsStored = 16
+        ds.HighBit = 15
+        ds.PixelRepresentation = 1
+        ds.RescaleIntercept = RESCALE_INTERCEPT
+        ds.RescaleSlope = 1
+
+        if spec.private_tag_bytes > 0:
+            block = ds.private_block(0x0029, 'NB10 PHANTOM BLOAT', create=True)
+            block.add_new(0x10, 'OB', rng.bytes(spec.private_tag_bytes))
+
+        stored = np.round(hu - RESCALE_INTERCEPT).astype(np.int16)
+        ds.PixelData = stored.tobytes()
+        ds.is_little_endian = True
+        ds.is_implicit_VR = transfer_syntax == ImplicitVRLittleEndian
+
+        if transfer_syntax == RLELossless:
+            ds.compress(RLELossless, stored)
+
+        ds.save_as(str(path), write_like_original=False)
+        bytes_written += path.stat().st_size
+
+    return bytes_written
+
+
+def generate_phantom_patient(folder: Path, spec: PhantomSpec, seed: int = 0,
+                             patient_id: Optional[str] = None) -> dict:
+    """
+    生成一个合成患者
+
+    Args:
+        folder: 输出目录（患者文件夹）
+        spec: 体模参数
+        seed: 随机种子（同一种子生成完全相同的数据和UID）
+        patient_id: 患者ID（默认使用文件夹名）
+
+    Returns:
+        患者清单条目（钙化块、期望积分、文件数等）
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    patient_id = patient_id or folder.name
+    rng = np.random.default_rng(seed)
+    uid_seed = f"nb10-phantom-{seed}-{patient_id}"
+
+    base, heart = _anatomy_slice(spec)
+    blobs = _place_blobs(spec, heart, rng)
+    blob_masks = [b.disk_mask(spec.rows, spec.cols) for b in blobs]
+
+    # 主序列（目标层厚）
+    slices_hu = []
+    for z in range(spec.num_slices):
+        noise = np.clip(rng.normal(0, NOISE_SIGMA_HU, base.shape), -NOISE_CLIP_HU, NOISE_CLIP_HU)
+        hu = base + np.where(base > LUNG_HU, noise, 0)
+        for blob, mask in zip(blobs, blob_masks):
+            if blob.first_slice <= z < blob.first_slice + blob.num_slices:
+                hu[mask] = blob.hu
+        slices_hu.append(hu)
+
+    study_uid = generate_uid(entropy_srcs=[uid_seed, 'study'])
+    main_uid = generate_uid(entropy_srcs=[uid_seed, 'series', '1'])
+    total_bytes = _write_series(folder, spec, slices_hu, spec.slice_thickness, patient_id,
+                                study_uid, main_uid, 1, 'PHANTOM CALCIUM SCORE', rng, uid_seed)
+    num_files = len(slices_hu)
+
+    # 薄层干扰序列（与主序列同一解剖，不含钙化块）
+    if spec.thin_series_thickness:
+        n_thin = int(round(spec.num_slices * spec.slice_thickness / spec.thin_series_thickness))
+        thin = [base + np.clip(rng.normal(0, NOISE_SIGMA_HU, base.shape), -NOISE_CLIP_HU, NOISE_CLIP_HU)
+                * (base > LUNG_HU) for _ in range(n_thin)]
+        thin_uid = generate_uid(entropy_srcs=[uid_seed, 'series', '2'])
+        total_bytes += _write_series(folder, spec, thin, spec.thin_series_thickness, patient_id,
+                                     study_uid, thin_uid, 2, 'PHANTOM THIN', rng, uid_seed)
+        num_files += n_thin
+
+    return {
+        'patient_id': patient_id,
+        'folder': str(folder),
+        'seed': seed,
+        'num_files': num_files,
+        'num_slices': spec.num_slices,
+        'total_bytes': total_bytes,
+        'blobs': [asdict(b) for b in blobs],
+        'expected_agatston': expected_agatston(blobs, spec),
+        'expected_lesion_count': expected_lesion_count(blobs, spec),
+    }
+
+
+def skewed_slice_counts(num_patients: int, base_slices: int, large_factor: int = 8,
+                        large_fraction: float = 0.1) -> List[int]:
+    """
+    偏斜队列的逐患者层数：大部分为 base_slices，约 large_fraction 比例（至少1例）
+    为 base_slices × large_factor（如薄层重建），且排在文件夹名顺序的最后
+    （按名称顺序处理时的最坏情况）
+    """
+    num_large = min(num_patients, max(1, int(round(num_patients * large_fraction))))
+    return [base_slices] * (num_patients - num_large) + [base_slices * large_factor] * num_large
+
+
+def generate_phantom_cohort(output_dir: Path, num_patients: int, spec: PhantomSpec,
+                            seed: int = 0, slice_counts: Optional[List[int]] = None) -> dict:
+    """
+    生成合成队列，并写出 phantom_manifest.json
+
+    Args:
+        output_dir: 输出目录（每个患者一个子文件夹）
+        num_patients: 患者数
+        spec: 体模参数
+        seed: 基础随机种子（第i个患者使用 seed + i）
+        slice_counts: 可选的逐患者层数（覆盖 spec.num_slices，见 skewed_slice_counts）
+
+    Returns:
+        清单字典
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    patients = [
+        generate_phantom_patient(
+            output_dir / f"PHANTOM{i + 1:04d}",
+            replace(spec, num_slices=slice_counts[i]) if slice_counts else spec,
+            seed=seed + i)
+        for i in range(num_patients)
+    ]
+
+    manifest = {
+        'generator': 'nb10-phantom',
+        'pydicom_version': pydicom.__version__,
+        'seed': seed,
+        'spec': asdict(spec),
+        'patients': patients,
+    }
+    with open(output_dir / 'phantom_manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def load_manifest(data_dir: Path) -> Optional[dict]:
+    """读取体模清单（非体模数据目录返回None）"""
+    path = Path(data_dir) / 'phantom_manifest.json'
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,229 @@
+"""
+端到端基准测试
+End-to-end Benchmark Runner
+
+对一个DICOM数据目录（通常是体模队列）按阶段运行处理流程并计时:
+- series: 文件扫描 + 头信息解析 + 序列选择 (prepare_dicom_for_aicac)
+- load:   series + 像素读取/解码 + HU转换 + 重采样 (load_dicom_study)
+- full:   load + 模型推理 + Agatston评分 (run_inference_on_loaded_study)
+
+报告 files/sec、slices/sec、patients/hour、峰值RSS，以及full阶段的
+分阶段耗时（来自Tracer），输出为JSON。
+
+模型:
+- threshold: HU>=130 的阈值"模型"，无需权重和GPU，用于测量I/O和评分，
+             且在体模上可与期望Agatston积分逐例核对
+- swin:      真实SwinUNETR结构（不提供checkpoint时为随机权重），用于测量推理
+"""
+
+import os
+import sys
+import time
+import platform
+import logging
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 模块根目录（cardiac_calcium_scoring/），使 core.* 可导入
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import torch
+
+from core.resource_sampler import ResourceSampler
+from core.tracing import Tracer
+
+try:
+    from .phantom import load_manifest
+except ImportError:
+    from phantom import load_manifest
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('series', 'load', 'full')
+
+
+class ThresholdModel(torch.nn.Module):
+    """HU>=130 阈值分割（输出logit: 钙化为+1，其余为-1）"""
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return (x >= 130).float() * 2 - 1
+
+
+@dataclass
+class StageResult:
+    """单阶段基准结果"""
+    stage: str
+    patients: int = 0
+    failed: int = 0
+    files: int = 0
+    slices: int = 0
+    seconds: float = 0.0
+    files_per_sec: float = 0.0
+    slices_per_sec: float = 0.0
+    patients_per_hour: float = 0.0
+    peak_rss_gb: float = 0.0
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+
+    def finalize(self):
+        if self.seconds > 0:
+            self.files_per_sec = round(self.files / self.seconds, 2)
+            self.slices_per_sec = round(self.slices / self.seconds, 2)
+            self.patients_per_hour = round(self.patients * 3600 / self.seconds, 1)
+        self.seconds = round(self.seconds, 3)
+        self.stage_seconds = {k: round(v, 3) for k, v in sorted(self.stage_seconds.items(),
+                                                                 key=lambda kv: -kv[1])}
+
+
+def find_patient_folders(data_dir: Path) -> List[Path]:
+    """数据目录下每个包含 .dcm 文件的子文件夹视为一个患者"""
+    return sorted(p for p in Path(data_dir).iterdir()
+                  if p.is_dir() and any(p.glob('*.dcm')))
+
+
+def build_model(model_type: str, device: str, checkpoint_path: Optional[str] = None):
+    """创建基准测试模型"""
+    if model_type == 'threshold':
+        return ThresholdModel().to(device).eval()
+    if model_type == 'swin':
+        from core.ai_cac_inference_lib import create_model
+        return create_model(device=device, checkpoint_path=checkpoint_path)
+    raise ValueError(f"Unknown model type: {model_type}")
+
+
+def _run_stage(stage: str, folders: List[Path], model, device: str,
+               expected: Dict[str, dict], scores: List[dict],
+               sampler: Optional[ResourceSampler] = None) -> StageResult:
+    from core.ai_cac_inference_lib import load_dicom_study, run_inference_on_loaded_study
+    from core.dicom_series_selector import prepare_dicom_for_aicac
+
+    result = StageResult(stage=stage)
+    tracer = Tracer()
+
+    start_wall = time.time()
+    start = time.perf_counter()
+    for folder in folders:
+        try:
+            if stage == 'series':
+                with tracer.patient(folder.name):
+                    series = prepare_dicom_for_aicac(folder, tracer=tracer)
+                if series is None:
+                    raise ValueError("No suitable series found")
+                result.files += len(list(folder.glob('*.dcm')))
+                result.slices += series['num_files']
+            else:
+                loaded = load_dicom_study(str(folder), tracer=tracer)
+                for batch in loaded['batches']:
+                    result.slices += int(batch[1].shape[-1])
+                result.files += len(list(folder.glob('*.dcm')))
+
+                if stage == 'full':
+                    out = run_inference_on_loaded_study(loaded, model, device, tracer=tracer)
+                    truth = expected.get(folder.name, {})
+                    scores.append({
+                        'patient_id': folder.name,
+                        'agatston_score': out['agatston_score'],
+                        'calcium_volume_mm3': out['calcium_volume_mm3'],
+                        'calcium_mass_mg': out['calcium_mass_mg'],
+                        'lesion_count': out['lesion_count'],
+                        'expected_agatston': truth.get('expected_agatston'),
+                        'expected_lesion_count': truth.get('expected_lesion_count'),
+                    })
+                del loaded
+            result.patients += 1
+        except Exception as e:
+            logger.warning(f"[{stage}] {folder.name} failed: {e}")
+            result.failed += 1
+    result.seconds = time.perf_counter() - start
+
+    if sampler is not None:
+        rss = [s.process_rss_gb for s in sampler.snapshot() if s.timestamp >= start_wall]
+        rss.append(sampler.sample_now().process_rss_gb)
+        result.peak_rss_gb = round(max(rss), 3)
+
+    for folder in folders:
+        for name, sec in tracer.stage_durations(folder.name).items():
+            key = name[2:-4]  # t_<stage>_sec -> <stage>
+            result.stage_seconds[key] = result.stage_seconds.get(key, 0.0) + sec
+
+    result.finalize()
+    return result
+
+
+def run_benchmark(data_dir: Path, stages=STAGES, model_type: str = 'threshold',
+                  device: str = 'cpu', checkpoint_path: Optional[str] = None,
+                  warmup: int = 1, max_patients: Optional[int] = None) -> dict:
+    """
+    运行基准测试
+
+    Args:
+        data_dir: 数据目录（每个患者一个子文件夹）
+        stages: 要运行的阶段（series / load / full）
+        model_type: 'threshold' 或 'swin'
+        device: 'cpu' 或 'cuda'
+        checkpoint_path: swin模型权重（可选）
+        warmup: 计时前先完整处理的患者数（不计入结果）
+        max_patients: 最多处理的患者数
+
+    Returns:
+        报告字典（可直接写为JSON）
+    """
+    data_dir = Path(data_dir)
+    folders = find_patient_folders(data_dir)
+    if max_patients:
+        folders = folders[:max_patients]
+    if not folders:
+        raise ValueError(f"No DICOM patient folders found in {data_dir}")
+
+    manifest = load_manifest(data_dir)
+    expected = {p['patient_id']: p for p in manifest['patients']} if manifest else {}
+
+    model = build_model(model_type, device, checkpoint_path) if 'full' in stages else None
+
+    sampler = ResourceSampler(interval_sec=0.1, buffer_size=100000,
+                              cuda_available=(device == 'cuda'))
+    sampler.start()
+
+    stage_results = []
+    scores: List[dict] = []
+    try:
+        if warmup > 0:
+            # 预热：导入模块、初始化线程池/内核，避免首例拖慢计时
+            _run_stage('full' if model is not None else 'load', folders[:warmup], model, device, {}, [])
+
+        for stage in STAGES:
+            if stage in stages:
+                logger.info(f"Benchmark stage '{stage}' on {len(folders)} patients...")
+                stage_results.append(_run_stage(stage, folders, model, device, expected,
+                                                    scores, sampler))
+    finally:
+        sampler.stop()
+
+    checked = [s for s in scores if s['expected_agatston'] is not None]
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'torch': torch.__version__,
+            'torch_threads': torch.get_num_threads(),
+            'device': device,
+        },
+        'config': {
+            'data_dir': str(data_dir),
+            'patients': len(folders),
+            'stages': list(stages),
+            'model': model_type,
+            'warmup': warmup,
+            'phantom_spec': manifest['spec'] if manifest else None,
+        },
+        'stages': {r.stage: asdict(r) for r in stage_results},
+        'peak_rss_gb': round(sampler.peak('process_rss_gb') or 0.0, 3),
+        'peak_vram_reserved_gb': round(sampler.peak('vram_reserved_gb') or 0.0, 3),
+        'scores': scores,
+        'scores_match_expected': (all(s['agatston_score'] == s['expected_agatston'] and
+                                      s['lesion_count'] == s['expected_lesion_count'] for s in checked)
+                                  if checked and model_type == 'threshold' else None),
+    }
@@ -0,0 +1,129 @@
+"""
+调度基准测试
+Scheduling Benchmark (FIFO vs LPT)
+
+在偏斜队列（大部分常规层数，少数为数倍层数的薄层检查）上比较两种处理顺序的makespan:
+- fifo: 文件夹名顺序
+- lpt:  按头信息索引中的切片数从大到小（core.scheduler.order_by_cost）
+
+两种结果:
+- simulated: 每个患者先串行计时一次，再用 list_schedule() 按各顺序模拟
+             N个worker的共享队列；不受本机核数限制，结果稳定
+- measured:  真实运行（N个线程从同一队列取患者，load + 推理 + 评分）；
+             单核或GIL受限时各顺序差异会被压缩
+"""
+
+import sys
+import time
+import platform
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 模块根目录（cardiac_calcium_scoring/），使 core.* 可导入
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.header_index import HeaderIndex
+from core.scheduler import SCHEDULES, list_schedule, makespan_lower_bound, order_by_cost
+
+try:
+    from .runner import build_model, find_patient_folders
+except ImportError:
+    from runner import build_model, find_patient_folders
+
+logger = logging.getLogger(__name__)
+
+
+def _process(folder: Path, model, device: str):
+    from core.ai_cac_inference_lib import load_dicom_study, run_inference_on_loaded_study
+    loaded = load_dicom_study(str(folder))
+    run_inference_on_loaded_study(loaded, model, device)
+
+
+def _timed(folder: Path, model, device: str) -> float:
+    start = time.perf_counter()
+    _process(folder, model, device)
+    return time.perf_counter() - start
+
+
+def _run_pool(folders: List[Path], model, device: str, workers: int) -> Dict:
+    """N个线程共享一个队列（ThreadPoolExecutor按提交顺序分发给空闲线程）"""
+    finished: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    def task(folder: Path):
+        _process(folder, model, device)
+        finished[folder.name] = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='Schedule') as pool:
+        for future in [pool.submit(task, f) for f in folders]:
+            future.result()
+    makespan = time.perf_counter() - start
+    return {'makespan_sec': round(makespan, 3),
+            'last_patient': max(finished, key=finished.get) if finished else None}
+
+
+def run_schedule_benchmark(data_dir: Path, workers: int = 4, model_type: str = 'threshold',
+                           device: str = 'cpu', checkpoint_path: Optional[str] = None,
+                           warmup: int = 1, execute: bool = True) -> dict:
+    """
+    比较 fifo / lpt 顺序的makespan
+
+    Args:
+        data_dir: 数据目录（通常由 skewed_slice_counts 生成的体模队列）
+        workers: 并行worker数
+        model_type: 'threshold' / 'swin'
+        device: 'cpu' / 'cuda'
+        checkpoint_path: swin权重
+        warmup: 不计时的预热患者数
+        execute: False时只做串行计时 + 模拟，不运行线程池
+
+    Returns:
+        报告字典（JSON可序列化）
+    """
+    folders = find_patient_folders(Path(data_dir))
+    if not folders:
+        raise ValueError(f"No patient folders with .dcm files in {data_dir}")
+
+    summaries = HeaderIndex().build(folders)
+    slices = {f.name: summaries[str(f)].slice_count if str(f) in summaries else 0 for f in folders}
+
+    model = build_model(model_type, device, checkpoint_path)
+    for folder in folders[:max(0, warmup)]:
+        _process(folder, model, device)
+
+    # 串行计时：每个患者的真实成本（模拟和下界的输入）
+    seconds = {f.name: _timed(f, model, device) for f in folders}
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'node': platform.node(), 'python': platform.python_version(),
+                    'processor': platform.processor() or platform.machine()},
+        'data_dir': str(data_dir),
+        'model': model_type,
+        'device': device,
+        'workers': workers,
+        'patients': len(folders),
+        'slice_counts': slices,
+        'patient_seconds': {k: round(v, 3) for k, v in seconds.items()},
+        'lower_bound_sec': round(makespan_lower_bound(list(seconds.values()), workers), 3),
+        'schedules': {},
+    }
+
+    for strategy in SCHEDULES:
+        ordered = order_by_cost(folders, lambda f: slices[f.name], strategy)
+        simulated, _ = list_schedule([seconds[f.name] for f in ordered], workers)
+        entry = {'order': [f.name for f in ordered], 'simulated_makespan_sec': round(simulated, 3)}
+        if execute:
+            entry.update({f"measured_{k}": v for k, v in _run_pool(ordered, model, device, workers).items()})
+        report['schedules'][strategy] = entry
+
+    fifo, lpt = report['schedules']['fifo'], report['schedules']['lpt']
+    report['lpt_simulated_speedup'] = round(fifo['simulated_makespan_sec'] / lpt['simulated_makespan_sec'], 3) \
+        if lpt['simulated_makespan_sec'] > 0 else None
+    if execute:
+        report['lpt_measured_speedup'] = round(fifo['measured_makespan_sec'] / lpt['measured_makespan_sec'], 3) \
+            if lpt['measured_makespan_sec'] > 0 else None
+    return report
@@ -15,8 +15,9 @@ import os
 from pathlib import Path
 import argparse
 import logging
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 import warnings
 
 # Suppress warnings
@@ -36,7 +37,7 @@ AI_CAC_PATH = Path(__file__).parent.parent / "external" / "AI-CAC"
 if AI_CAC_PATH.exists():
     sys.path.insert(0, str(AI_CAC_PATH))
 
-from core import ConfigManager, create_model, run_inference_on_dicom_folder
+from core import ConfigManager, create_model, load_dicom_study, predict_loaded_study, score_prediction
 
 
 __version__ = "2.0.0-alpha"  # Week 4: Integrated CPU optimizer
@@ -57,6 +58,7 @@ def load_processed_cache(cache_file: Path, logger: logging.Logger) -> set:
         return set()
 
     try:
+        repair_cache_tail(cache_file, logger)
         df = pd.read_csv(cache_file)
         # Only return successfully processed cases
         if 'status' in df.columns and 'patient_id' in df.columns:
@@ -101,16 +103,46 @@ def append_to_cache(cache_file: Path, result: dict, logger: logging.Logger):
 
         df_new = pd.DataFrame([cache_record])
 
-        # Append or create new file
-        if cache_file.exists():
-            df_new.to_csv(cache_file, mode='a', header=False, index=False)
-        else:
-            df_new.to_csv(cache_file, mode='w', header=True, index=False)
+        # Append or create new file; one write per record, fsynced before the next patient
+        # is committed, so after a crash every recorded patient is on disk
+        new_file = not cache_file.exists() or cache_file.stat().st_size == 0
+        record = df_new.to_csv(header=new_file, index=False).encode('utf-8')
+        with open(cache_file, 'ab') as f:
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        if new_file:
             logger.debug(f"Resume: Created cache file: {cache_file}")
     except Exception as e:
         logger.warning(f"Resume: Failed to append to cache: {e}")
 
 
+def repair_cache_tail(cache_file: Path, logger: logging.Logger):
+    """
+    Drop a partial last record left in the cache file by a crash during append_to_cache()
+
+    A torn line can end inside a quoted error message, which would make the rest of the
+    file unreadable; the patient it belonged to is simply processed again.
+    """
+    with open(cache_file, 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        tail = min(size, 1 << 16)
+        f.seek(size - tail)
+        cut = f.read(tail).rfind(b'\n')
+        if cut < 0 and tail < size:
+            return
+        keep = size - tail + cut + 1
+        f.truncate(keep)
+        f.flush()
+        os.fsync(f.fileno())
+    logger.warning(f"Resume: Dropped a partial record ({size - keep} bytes) left by an interrupted run")
+
+
 def clear_resume_cache(cache_file: Path, logger: logging.Logger) -> bool:
     """
     Clear resume cache file
@@ -188,7 +220,8 @@ def setup_logging(config: ConfigManager) -> logging.Logger:
     return logger
 
 
-def scan_dicom_folders(data_dir: Path, logger: logging.Logger, max_depth: int = 2) -> List[Path]:
+def scan_dicom_folders(data_dir: Path, logger: logging.Logger, max_depth: int = 2,
+                       max_workers: int = 8, detection: str = 'auto') -> List[Path]:
     """
     Scan for DICOM folders in data directory (supports nested group directories)
 
@@ -196,6 +229,9 @@ def scan_dicom_folders(data_dir: Path, logger: logging.Logger, max_depth: int =
         data_dir: Data directory path
         logger: Logger instance
         max_depth: Maximum depth to scan (default: 2, supports data/group/patient structure)
+        max_workers: Directories listed in parallel (helps most on network shares)
+        detection: How DICOM files are recognised: 'extension' (.dcm only), 'auto'
+                   (sniff the DICM preamble in folders without .dcm files) or 'sniff'
 
     Returns:
         List of DICOM folder paths
@@ -218,35 +254,87 @@ def scan_dicom_folders(data_dir: Path, logger: logging.Logger, max_depth: int =
         logger.error("")
         return []
 
-    # Recursively find all subdirectories containing DICOM files
-    dicom_folders = []
+    # Parallel os.scandir walk; stops listing a folder at its first DICOM file
+    from core.dicom_scanner import DicomScanner
+    scan_start = datetime.now()
+    scanner = DicomScanner(max_depth=max_depth, max_workers=max_workers, detection=detection)
+    dicom_folders = [folder.path for folder in scanner.scan(data_dir)]
 
-    def scan_recursive(directory: Path, current_depth: int = 0):
-        """Recursively scan for directories containing DICOM files"""
-        if current_depth > max_depth:
-            return
+    elapsed = (datetime.now() - scan_start).total_seconds()
+    logger.info(f"Found {len(dicom_folders)} DICOM folders "
+                f"({scanner.directories_visited} directories listed in {elapsed:.1f}s)")
+    return dicom_folders
 
-        for item in directory.iterdir():
-            if not item.is_dir():
-                continue
 
-            # Check if this directory contains .dcm files
-            dcm_files = list(item.glob("*.dcm"))
-            if dcm_files:
-                dicom_folders.append(item)
-                logger.debug(f"Found DICOM folder: {item.relative_to(data_dir)} ({len(dcm_files)} files)")
-            else:
-                # No .dcm files here, scan subdirectories
-                scan_recursive(item, current_depth + 1)
+def create_staging_cache(dicom_folders: List[Path], config: ConfigManager, logger: logging.Logger):
+    """
+    Create the local staging cache when data lives on a slow mount
+
+    staging.enabled: "auto" (only for SMB/NFS/FUSE/Google Drive paths), true or false
+
+    Returns:
+        StagingCache or None
+    """
+    from core.staging_cache import StagingCache, is_remote_path
 
-    scan_recursive(data_dir)
+    enabled = config.get('staging.enabled', 'auto')
+    if not dicom_folders or enabled is False or str(enabled).lower() in ('false', 'off', 'no'):
+        return None
+    if str(enabled).lower() == 'auto' and not is_remote_path(dicom_folders[0]):
+        return None
 
-    logger.info(f"Found {len(dicom_folders)} DICOM folders")
-    return sorted(dicom_folders)
+    try:
+        staging = StagingCache(
+            stage_dir=config.get('staging.dir') or None,
+            max_bytes=int(float(config.get('staging.max_gb', 20)) * 2**30),
+            lookahead=config.get('staging.lookahead', 4),
+            copy_workers=config.get('staging.copy_workers', 8),
+        )
+    except OSError as e:
+        logger.warning(f"Local staging disabled, cannot create staging directory: {e}")
+        return None
+    logger.info(f"Staging: selected series of the next {staging.lookahead} patients are copied to "
+                f"{staging.run_dir} (budget {staging.max_bytes / 2**30:.1f} GB)")
+    return staging
+
+
+def create_results_writer(output_dir: Path, run_id: str, config: ConfigManager,
+                          performance_profile, logger: logging.Logger):
+    """
+    Parquet results writer with this run's metadata (output.results_parquet)
+
+    Returns:
+        ResultsWriter, or None when disabled or pyarrow is not installed
+    """
+    if not config.get('output.results_parquet', True):
+        return None
+    from core.results_store import PYARROW_AVAILABLE, RESULTS_DIR, ResultsWriter, file_checksum
+    if not PYARROW_AVAILABLE:
+        logger.info("Parquet results disabled: pyarrow not installed (pip install pyarrow)")
+        return None
+
+    from core.ai_cac_inference_lib import __version__ as inference_lib_version
+    from core.eta_model import machine_key
+    model_path = getattr(config, 'model_path', None)
+    metadata = {
+        'tool_version': __version__,
+        'inference_lib_version': inference_lib_version,
+        'model_file': Path(model_path).name if model_path else None,
+        'model_sha256': file_checksum(model_path) if model_path else None,
+        'device': config.device,
+        'machine': machine_key(config.device),
+        'performance_profile': performance_profile.tier_name if performance_profile else None,
+        'mode': getattr(config, 'mode', None),
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    return ResultsWriter(output_dir / RESULTS_DIR, run_id, metadata,
+                         row_group_rows=config.get('output.results_row_group_rows', 10000))
 
 
 def run_inference_batch(dicom_folders: List[Path], model, config: ConfigManager,
-                       logger: logging.Logger, performance_profile=None, safety_monitor=None) -> pd.DataFrame:
+                       logger: logging.Logger, performance_profile=None, safety_monitor=None,
+                       tracer=None, profiler=None, metrics=None, planner=None,
+                       qc_failures: Optional[Dict[str, str]] = None) -> pd.DataFrame:
     """
     Run inference on batch of DICOM folders with resume support
 
@@ -257,10 +345,18 @@ def run_inference_batch(dicom_folders: List[Path], model, config: ConfigManager,
         logger: Logger instance
         performance_profile: Optional performance profile for optimization
         safety_monitor: Optional safety monitor for OOM protection
+        tracer: Optional Tracer for per-stage timing (--trace)
+        profiler: Optional PatientProfiler for selected patients (--profile)
+        metrics: Optional RunMetrics for the metrics exporter
+        planner: Optional RunPlanner (learned per-patient ETA, timing history)
+        qc_failures: Optional {folder_str: reason} from series QC; these studies are
+            recorded as failed without being loaded
 
     Returns:
         DataFrame with results
     """
+    from core.tracing import NULL_TRACER
+    tracer = tracer or NULL_TRACER
     device = config.device
     results = []
 
@@ -293,7 +389,38 @@ def run_inference_batch(dicom_folders: List[Path], model, config: ConfigManager,
             print("="*70)
             print()
 
+    # Typed columnar copy of the results (fixed schema, run metadata), appended in row groups
+    run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    results_writer = create_results_writer(output_dir, run_id, config, performance_profile, logger)
+
+    # Studies rejected by series QC (header index) cost no decode or inference time
+    total_cases = len(dicom_folders)  # Cases in this run, including QC rejections (summary denominator)
+    rejected = [f for f in dicom_folders if str(f) in (qc_failures or {})]
+    if rejected:
+        dicom_folders = [f for f in dicom_folders if str(f) not in qc_failures]
+        for folder_path in rejected:
+            failed_result = {
+                'patient_id': folder_path.name,
+                'status': 'failed',
+                'error': f"Series QC: {qc_failures[str(folder_path)]}",
+                'agatston_score': None,
+                'calcium_volume_mm3': None,
+                'calcium_mass_mg': None,
+                'num_slices': None,
+                'has_calcification': None
+            }
+            results.append(failed_result)
+            if results_writer is not None:
+                results_writer.add(failed_result)
+            if enable_resume:
+                append_to_cache(cache_file, failed_result, logger)
+        print(f"Series QC: {len(rejected)} case(s) recorded as failed without loading")
+
     if not dicom_folders:
+        if results_writer is not None:
+            results_writer.close()
+        if rejected:
+            return pd.DataFrame(results)
         logger.info("Resume: All cases already processed!")
         print()
         print("✓ All cases already processed!")
@@ -324,104 +451,319 @@ def run_inference_batch(dicom_folders: List[Path], model, config: ConfigManager,
         clear_cache_interval = config.get('performance.clear_cache_interval', 5)
         logger.info("Using default configuration (no optimization)")
 
+    # OOM-adaptive slice batching (shared across patients so adjustments carry over)
+    # The batch may grow above the profile value while resources stay SAFE; OOM halving finds the real limit
+    from core.adaptive_batching import AdaptiveSliceBatcher, default_slice_batch_size, MAX_BATCH_HEADROOM
+    initial_slice_batch = default_slice_batch_size(device, performance_profile)
+    slice_batcher = AdaptiveSliceBatcher(
+        initial_slice_batch,
+        max_batch_size=config.get('performance.max_slice_batch_size', initial_slice_batch * MAX_BATCH_HEADROOM)
+    )
+    logger.info(f"  - slice_batch_size: {slice_batcher.batch_size} (max {slice_batcher.max_batch_size})")
+
+    # Closed-loop concurrency: patient prefetching and slice batch ceiling follow live resource levels
+    from core.concurrency_controller import ConcurrencyController, ConcurrencySettings
+    from core.patient_prefetcher import PatientPrefetcher
+    adaptive_concurrency = config.get('performance.concurrency.enabled', True) and safety_monitor is not None
+    controller = ConcurrencyController(
+        initial=ConcurrencySettings(1, 1, slice_batcher.max_batch_size),
+        maximum=ConcurrencySettings(
+            parallel_patients=config.get('performance.concurrency.max_parallel_patients', 2),
+            prefetch_depth=config.get('performance.concurrency.max_prefetch_depth', 2),
+            slice_batch_size=slice_batcher.max_batch_size,
+        ),
+        scale_up_after=config.get('performance.concurrency.scale_up_after', 3),
+        up_cooldown_sec=config.get('performance.concurrency.up_cooldown_sec', 30.0),
+    )
+    logger.info(f"  - concurrency: {controller.settings.describe()} "
+                f"({'adaptive' if adaptive_concurrency else 'static'})")
+
+    pin_memory = performance_profile.pin_memory if performance_profile else False
+
+    # DICOM files identified by preamble sniffing are cached in the header index
+    from core.dicom_scanner import list_dicom_files
+    detection = config.get('processing.dicom_detection', 'auto')
+
+    def known_files(folder: Path):
+        summary = planner.summaries.get(str(folder)) if planner else None
+        files = summary.dicom_files() if summary is not None else None
+        if files is None and detection != 'auto':
+            files = list_dicom_files(folder, detection)
+        return files
+
+    # Slow mounts (SMB, Google Drive): selected series are copied to local disk ahead of the pipeline
+    staging = create_staging_cache(dicom_folders, config, logger)
+    if staging:
+        staging.schedule(dicom_folders, known_files)
+
+    def load_study(folder: Path):
+        if staging is None:
+            return load_dicom_study(str(folder), pin_memory=pin_memory, tracer=tracer, files=known_files(folder))
+        with tracer.patient(folder.name), tracer.span('staging_wait'):
+            staged = staging.fetch(folder)
+        try:
+            files = staged if staged is not None else known_files(folder)
+            return load_dicom_study(str(folder), pin_memory=pin_memory, tracer=tracer, files=files)
+        finally:
+            # Pixels are decoded into memory, the local copy is no longer needed
+            staging.release(folder)
+
+    # Per-lesion table from the scoring pass, written as a Parquet dataset partitioned by run
+    lesion_writer = None
+    if config.get('output.lesion_table', True):
+        from core.lesion_store import LESION_DIR, LesionTableWriter
+        lesion_writer = LesionTableWriter(
+            output_dir / LESION_DIR, run_id,
+            rows_per_file=config.get('output.lesion_rows_per_file', 500000),
+            flush_interval_sec=60.0 * (config.get('output.lesion_flush_interval_min', 0) or 0))
+
+    # Profiled patients are loaded on the main thread inside the profiler (cProfile is per-thread)
+    profiled_ids = set()
+    if profiler:
+        profiled_ids = {f.name for idx, f in enumerate(dicom_folders, 1)
+                        if profiler.should_profile(idx, f.name)}
+        logger.info(f"Profiling ({', '.join(profiler.modes)}): {len(profiled_ids)} patient(s) -> "
+                    f"{profiler.output_dir}")
+
     import time as time_module
     start_time = time_module.time()
+    if metrics:
+        metrics.start_run(len(dicom_folders))
 
-    for i, folder_path in enumerate(dicom_folders, 1):
+    def commit_success(i: int, folder_path: Path, case_start: float, result: dict):
         patient_id = folder_path.name
-        case_start = time_module.time()
+        lesions = result.pop('lesions', None)
+        if lesion_writer is not None and lesions is not None:
+            with tracer.patient(patient_id), tracer.span('lesion_table'):
+                lesion_writer.add(patient_id, lesions)
 
-        # Show progress to console with percentage
-        percent = int(100 * i / len(dicom_folders))
-        print(f"[{i}/{len(dicom_folders)} - {percent}%] Processing: {patient_id}")
-        print(f"  - Loading DICOM files...", flush=True)
+        # Add metadata
+        result['patient_id'] = patient_id
+        result['status'] = 'success'
+        result['error'] = ''
 
-        logger.info(f"[{i}/{len(dicom_folders)}] Processing: {patient_id}")
+        if results_writer is not None:
+            results_writer.add(result)
 
-        try:
-            # Monitor resources periodically (every 10 patients)
-            if safety_monitor and i % 10 == 1:
-                from core.safety_monitor import SafetyLevel
-                status = safety_monitor.check_status()
-                logger.info(f"  Resource check: RAM {status.ram_available_gb:.1f}GB, " +
-                          f"VRAM {status.vram_free_gb:.1f}GB - {status.overall_level.value}")
-
-                if status.overall_level == SafetyLevel.CRITICAL:
-                    logger.warning(f"  {status.details}")
-                    safety_monitor.clear_gpu_cache()
-
-            # Show AI processing status with estimated time
-            if device == 'cpu':
-                est_time_msg = "~3-5 minutes"
-            else:
-                est_time_msg = "~10-20 seconds"
-            print(f"  - Running AI analysis (estimated: {est_time_msg})...", flush=True)
-
-            # Run inference with performance profile and safety monitor
-            result = run_inference_on_dicom_folder(
-                str(folder_path),
-                model,
-                device=device,
-                performance_profile=performance_profile,
-                safety_monitor=safety_monitor
-            )
+        # Save to cache immediately (incremental save)
+        if enable_resume:
+            with tracer.patient(patient_id), tracer.span('csv_append'):
+                append_to_cache(cache_file, result, logger)
 
-            # Add metadata
-            result['patient_id'] = patient_id
-            result['status'] = 'success'
-            result['error'] = ''
+        # Only after the writes succeed: a write error is committed as a failure instead
+        results.append(result)
+
+        # Per-stage timings (--trace); not part of the resume cache columns
+        stage_times = tracer.stage_durations(patient_id)
+        result.update(stage_times)
+
+        # Log and show result with time (forward pass start to commit)
+        agatston = result['agatston_score']
+        case_time = time_module.time() - case_start
+        if metrics:
+            metrics.observe_patient(True, case_time, result.get('slices_scored'), stage_times)
+        if planner:
+            planner.record(folder_path, 'success', case_time, stage_times)
+
+        # Calculate remaining time estimate (per-patient predictions from headers when available)
+        remaining_cases = len(dicom_folders) - i
+        if planner:
+            est_remaining_sec = planner.remaining_seconds(dicom_folders[i:], time_module.time() - start_time)
+        else:
+            avg_time = (time_module.time() - start_time) / i
+            est_remaining_sec = avg_time * remaining_cases
 
-            results.append(result)
+        if est_remaining_sec < 60:
+            time_str = f"{int(est_remaining_sec)}s"
+        else:
+            time_str = f"{int(est_remaining_sec/60)}m {int(est_remaining_sec%60)}s"
 
-            # Save to cache immediately (incremental save)
-            if enable_resume:
-                append_to_cache(cache_file, result, logger)
+        print(f"  ✓ {patient_id} complete - Agatston Score: {agatston:.1f} (took {int(case_time)}s)")
+        if remaining_cases > 0:
+            print(f"  Estimated remaining time: {time_str}")
+        print()
+        logger.info(f"  ✓ Success {patient_id} - Agatston Score: {agatston:.2f} (time: {case_time:.1f}s)")
+        logger.info(f"  Slice batch: effective {result['slice_batch_size']:.1f}, "
+                    f"min {result['slice_batch_min']}, OOM retries {result['oom_retries']}")
+        if stage_times:
+            logger.info("  Stages: " + ", ".join(
+                f"{k[2:-4]} {v:.2f}s" for k, v in sorted(stage_times.items(), key=lambda kv: -kv[1])))
+
+    def commit_failure(folder_path: Path, case_start: float, error: BaseException):
+        patient_id = folder_path.name
+        error_msg = str(error)
+        print(f"  ✗ {patient_id} failed - {error_msg}")
+        print()
+        logger.error(f"  ✗ Failed {patient_id} - {error_msg}")
+        failed_result = {
+            'patient_id': patient_id,
+            'status': 'failed',
+            'error': error_msg,
+            'agatston_score': None,
+            'calcium_volume_mm3': None,
+            'calcium_mass_mg': None,
+            'num_slices': None,
+            'has_calcification': None
+        }
+        stage_times = tracer.stage_durations(patient_id)
+        failed_result.update(stage_times)
+        results.append(failed_result)
+        if results_writer is not None:
+            try:
+                results_writer.add(failed_result)
+            except Exception as e:
+                logger.error(f"  Could not write {patient_id} to the Parquet results: {e}")
+        if metrics:
+            metrics.observe_patient(False, time_module.time() - case_start, stage_times=stage_times)
+        if planner:
+            planner.record(folder_path, 'failed', time_module.time() - case_start, stage_times)
 
-            # Log and show result with time
-            agatston = result['agatston_score']
-            case_time = time_module.time() - case_start
+        # Save failed case to cache (will not be skipped on resume)
+        if enable_resume:
+            append_to_cache(cache_file, failed_result, logger)
 
-            # Calculate remaining time estimate
-            avg_time = (time_module.time() - start_time) / i
-            remaining_cases = len(dicom_folders) - i
-            est_remaining_sec = avg_time * remaining_cases
+    def commit_patient(context, result, error):
+        """Called by the scoring stage in patient order, one patient at a time"""
+        i, folder_path, case_start = context
+        if error is None:
+            try:
+                commit_success(i, folder_path, case_start, result)
+                return
+            except Exception as e:
+                error = e
+        commit_failure(folder_path, case_start, error)
+
+    # Scoring, lesion table and result writes run in their own stage: the model starts on the
+    # next patient right after a forward pass, results are still committed in patient order
+    from core.scoring_stage import ScoringStage
+    lesion_table = lesion_writer is not None
+    scoring = ScoringStage(
+        lambda prediction: score_prediction(prediction, tracer=tracer, lesion_table=lesion_table),
+        commit_patient,
+        workers=config.get('performance.scoring_workers', 1),
+        queue_size=config.get('performance.scoring_queue', 2),
+    )
+    logger.info(f"  - scoring stage: {scoring.workers} worker(s), queue {scoring.queue_size}")
 
-            if est_remaining_sec < 60:
-                time_str = f"{int(est_remaining_sec)}s"
-            else:
-                time_str = f"{int(est_remaining_sec/60)}m {int(est_remaining_sec%60)}s"
+    prefetcher = PatientPrefetcher(
+        dicom_folders,
+        lambda folder: None if folder.name in profiled_ids else load_study(folder),
+        controller=controller,
+    )
 
-            print(f"  ✓ Complete - Agatston Score: {agatston:.1f} (took {int(case_time)}s)")
-            if remaining_cases > 0:
-                print(f"  Estimated remaining time: {time_str}")
-            print()
-            logger.info(f"  ✓ Success - Agatston Score: {agatston:.2f} (time: {case_time:.1f}s)")
+    try:
+        for i, (folder_path, get_loaded_study) in enumerate(prefetcher, 1):
+            patient_id = folder_path.name
+            case_start = time_module.time()
+
+            # Show progress to console with percentage
+            percent = int(100 * i / len(dicom_folders))
+            print(f"[{i}/{len(dicom_folders)} - {percent}%] Processing: {patient_id}")
+            print(f"  - Loading DICOM files...", flush=True)
+
+            logger.info(f"[{i}/{len(dicom_folders)}] Processing: {patient_id}")
+            if planner:
+                summary = planner.summaries.get(str(folder_path))
+                if summary:
+                    logger.info(f"  Predicted: {planner.estimate(folder_path):.0f}s "
+                                f"({summary.slice_count} slices, {summary.file_count} files)")
+
+            try:
+                # Monitor resources periodically (every 10 patients)
+                if safety_monitor and i % 10 == 1:
+                    from core.safety_monitor import SafetyLevel
+                    status = safety_monitor.latest_status()
+                    logger.info(f"  Resource check: RAM {status.ram_available_gb:.1f}GB, " +
+                              f"VRAM {status.vram_free_gb:.1f}GB - {status.overall_level.value}")
+
+                    if status.overall_level == SafetyLevel.CRITICAL:
+                        logger.warning(f"  {status.details}")
+                        safety_monitor.clear_gpu_cache()
+
+                # Adjust concurrency from the latest resource snapshot
+                if adaptive_concurrency and controller.update(safety_monitor.latest_status()):
+                    slice_batcher.set_max_batch_size(controller.settings.slice_batch_size)
+                    logger.info(f"  Concurrency adjusted: {controller.settings.describe()}")
+
+                if metrics:
+                    metrics.set_queue(remaining=len(dicom_folders) - i, prefetched=prefetcher.pending)
+                    metrics.set_concurrency(**asdict(controller.settings))
+
+                # Show AI processing status with estimated time
+                if device == 'cpu':
+                    est_time_msg = "~3-5 minutes"
+                else:
+                    est_time_msg = "~10-20 seconds"
+
+                def process_patient():
+                    loaded = load_study(folder_path) if patient_id in profiled_ids else get_loaded_study()
+                    print(f"  - Running AI analysis (estimated: {est_time_msg})...", flush=True)
+
+                    # Forward pass with performance profile and safety monitor; scoring follows
+                    # in the scoring stage
+                    return predict_loaded_study(
+                        loaded,
+                        model,
+                        device=device,
+                        performance_profile=performance_profile,
+                        safety_monitor=safety_monitor,
+                        slice_batcher=slice_batcher,
+                        tracer=tracer
+                    )
+
+                if patient_id in profiled_ids:
+                    # Scored inline so the profile covers the whole patient
+                    profile_report = None
+                    try:
+                        with profiler.profile(patient_id) as profile_report:
+                            result = score_prediction(process_patient(), tracer=tracer,
+                                                      lesion_table=lesion_table)
+                    finally:
+                        if profile_report is not None:
+                            logger.info(f"  Profile ({profile_report.seconds:.1f}s, "
+                                        f"{len(profile_report.files)} files in {profiler.output_dir}):")
+                            for line in profile_report.summary:
+                                logger.info(f"    {line}")
+                    submit, payload = scoring.submit_result, result
+                else:
+                    submit, payload = scoring.submit, process_patient()
+
+            except Exception as e:
+                submit, payload = scoring.submit_error, e
+
+            # Blocks while the scoring queue is full
+            submit(payload, (i, folder_path, case_start))
+            del payload
 
             # Clear GPU cache periodically
             if device == 'cuda' and i % clear_cache_interval == 0:
                 torch.cuda.empty_cache()
                 logger.debug(f"  Cleared GPU cache (interval: {clear_cache_interval})")
-
-        except Exception as e:
-            error_msg = str(e)
-            print(f"  ✗ Failed - {error_msg}")
-            print()
-            logger.error(f"  ✗ Failed - {error_msg}")
-            failed_result = {
-                'patient_id': patient_id,
-                'status': 'failed',
-                'error': error_msg,
-                'agatston_score': None,
-                'calcium_volume_mm3': None,
-                'calcium_mass_mg': None,
-                'num_slices': None,
-                'has_calcification': None
-            }
-            results.append(failed_result)
-
-            # Save failed case to cache (will not be skipped on resume)
-            if enable_resume:
-                append_to_cache(cache_file, failed_result, logger)
+    finally:
+        # Runs on Ctrl+C and on scoring/commit failures too: no prefetch threads, loaded
+        # volumes or staged copies outlive the run
+        try:
+            # Patients already through the model are scored and committed
+            scoring.close()
+            logger.info(f"Scoring stage: {scoring.describe()}")
+        finally:
+            # In-flight loads may still be waiting on staged files: prefetcher first, then staging
+            prefetcher.close()
+            if staging:
+                staging.close()
+                logger.info(f"Staging: {staging.stats.describe()}")
+            if lesion_writer is not None:
+                lesion_writer.close()
+                logger.info(f"Lesion table: {lesion_writer.describe()}")
+            if results_writer is not None:
+                results_writer.close()
+                logger.info(f"Results (Parquet): {results_writer.describe()}")
+
+    if metrics:
+        metrics.set_queue(remaining=0, prefetched=0)
+    if adaptive_concurrency:
+        logger.info(f"Concurrency: {controller.settings.describe()} "
+                    f"({controller.num_downgrades} scale-downs, {controller.num_upgrades} scale-ups)")
 
     # Convert to DataFrame
     df = pd.DataFrame(results)
@@ -430,8 +772,10 @@ def run_inference_batch(dicom_folders: List[Path], model, config: ConfigManager,
     success_count = (df['status'] == 'success').sum()
     failed_count = (df['status'] == 'failed').sum()
     logger.info(f"\nInference Complete:")
-    logger.info(f"  Success: {success_count}/{len(dicom_folders)}")
-    logger.info(f"  Failed:  {failed_count}/{len(dicom_folders)}")
+    logger.info(f"  Success: {success_count}/{total_cases}")
+    logger.info(f"  Failed:  {failed_count}/{total_cases}")
+    if rejected:
+        logger.info(f"  (of which rejected by series QC: {len(rejected)})")
 
     if success_count > 0:
         success_df = df[df['status'] == 'success']
@@ -445,6 +789,234 @@ def run_inference_batch(dicom_folders: List[Path], model, config: ConfigManager,
     return df
 
 
+def series_qc_thresholds(config: ConfigManager):
+    """
+    QCThresholds from the qc: config section
+
+    Returns:
+        QCThresholds, or None when series QC is disabled
+    """
+    if not config.get('qc.enabled', True):
+        return None
+    from dataclasses import fields
+    from core.series_qc import QCThresholds
+    defaults = QCThresholds()
+    return QCThresholds(**{f.name: config.get(f'qc.{f.name}', getattr(defaults, f.name))
+                           for f in fields(QCThresholds)})
+
+
+def build_header_index(dicom_folders: List[Path], config: ConfigManager, logger: logging.Logger):
+    """
+    Read DICOM headers (no pixels) for run planning and series QC
+
+    Returns:
+        {folder_str: HeaderSummary}, or None when planning and QC are both disabled or reading fails
+    """
+    qc = series_qc_thresholds(config)
+    if not config.get('planning.enabled', True) and qc is None:
+        return None
+
+    from core.header_index import HeaderIndex
+
+    output_dir = Path(config.get('paths.output_dir', './output'))
+    try:
+        print("  - Reading DICOM headers for planning and QC...", flush=True)
+        index = HeaderIndex(output_dir / ".nb10_header_index.json",
+                            detection=config.get('processing.dicom_detection', 'auto'), qc=qc)
+        summaries = index.build(dicom_folders, max_workers=config.get('planning.header_workers', 8))
+        index.save()
+    except Exception as e:
+        logger.warning(f"Header index unavailable (no planning or series QC): {e}")
+        return None
+    return summaries
+
+
+def plan_run(dicom_folders: List[Path], summaries, config: ConfigManager, profile_name: str,
+             fallback_sec: float, logger: logging.Logger):
+    """
+    Build a RunPlanner from the header index and the timing history (no pixels decoded)
+
+    Returns:
+        RunPlanner, or None when planning is disabled, the index is unavailable or fitting fails
+    """
+    if not config.get('planning.enabled', True) or summaries is None:
+        return None
+
+    from core.eta_model import EtaModel, RunPlanner, TimingHistory, machine_key
+
+    output_dir = Path(config.get('paths.output_dir', './output'))
+    device = config.device
+    try:
+        history = TimingHistory(output_dir / ".nb10_timing_history.csv")
+        machine = machine_key(device)
+        model = EtaModel.fit(history.load(), machine, device, profile_name,
+                             min_samples=config.get('planning.min_history_samples', 8))
+    except Exception as e:
+        logger.warning(f"Run planning unavailable: {e}")
+        return None
+
+    planner = RunPlanner(model, summaries, history, fallback_sec, machine, device, profile_name)
+    logger.info(f"Planner: {len(summaries)}/{len(dicom_folders)} folders indexed; {planner.describe()}")
+    return planner
+
+
+@dataclass
+class CohortJob:
+    """One data_dir/output_dir pair processed by this run"""
+    name: Optional[str]
+    data_dir: Path
+    output_dir: Path
+    dicom_folders: List[Path] = field(default_factory=list)
+    planner: object = None
+    qc_failures: Dict[str, str] = field(default_factory=dict)  # folder -> series QC failure reason
+
+
+def resolve_cohorts(config: ConfigManager, names: List[str]) -> List[CohortJob]:
+    """
+    Cohorts selected with --cohort from the config's `cohorts:` section
+
+        cohorts:
+          chd:
+            data_dir: "D:/cardiac_data/chd"
+            output_dir: "output/chd"      # default: <paths.output_dir>/<name>
+
+    Args:
+        config: ConfigManager instance
+        names: Cohort names; 'all' selects every cohort in config order
+
+    Raises:
+        ValueError: No cohorts section, unknown name or missing data_dir
+    """
+    defined = config.get('cohorts') or {}
+    if not defined:
+        raise ValueError("--cohort requires a 'cohorts:' section in the configuration file")
+    selected = list(defined) if 'all' in names else names
+    unknown = [name for name in selected if name not in defined]
+    if unknown:
+        raise ValueError(f"Unknown cohort(s): {', '.join(unknown)} (defined: {', '.join(defined)})")
+
+    base_output = Path(config.get('paths.output_dir', './output'))
+    jobs = []
+    for name in dict.fromkeys(selected):
+        spec = defined[name] or {}
+        if not spec.get('data_dir'):
+            raise ValueError(f"Cohort '{name}' has no data_dir")
+        # Relative cohort paths resolve like paths.* (against the tool directory, not the cwd)
+        output_dir = config.normalize_path(spec['output_dir']) if spec.get('output_dir') else base_output / name
+        jobs.append(CohortJob(name, config.normalize_path(spec['data_dir']), output_dir))
+    return jobs
+
+
+def use_cohort(config: ConfigManager, job: CohortJob):
+    """Point paths.data_dir/output_dir at a cohort (planning, resume cache and results read these keys)"""
+    config.set('paths.data_dir', str(job.data_dir))
+    config.set('paths.output_dir', str(job.output_dir))
+    job.output_dir.mkdir(parents=True, exist_ok=True)
+
+
+def prepare_cohort(job: CohortJob, config: ConfigManager, profile_name: str,
+                   fallback_sec: float, logger: logging.Logger) -> CohortJob:
+    """
+    Scan, limit (pilot mode), plan and order one cohort's patient folders
+
+    Sets job.dicom_folders (empty when no DICOM folders were found), job.planner and
+    job.qc_failures (studies that run_inference_batch() records as failed without loading).
+    """
+    print("Scanning DICOM data...")
+    dicom_folders = scan_dicom_folders(job.data_dir, logger,
+                                       max_workers=config.get('processing.scan_workers', 8),
+                                       detection=config.get('processing.dicom_detection', 'auto'))
+
+    if not dicom_folders:
+        print(f"✗ No DICOM folders found in: {job.data_dir}")
+        print("\nPlease check:")
+        print("  - Data directory path is correct")
+        print("  - Directory contains patient subdirectories")
+        print("  - Each subdirectory contains .dcm files")
+        return job
+
+    print(f"✓ Found {len(dicom_folders)} patient folders")
+    print()
+
+    # Apply pilot mode limit
+    original_count = len(dicom_folders)
+    if config.mode == 'pilot':
+        pilot_limit = config.get('processing.pilot_limit', 10)
+        dicom_folders = dicom_folders[:pilot_limit]
+        if original_count > pilot_limit:
+            print(f"Pilot Mode Limit:")
+            print(f"  Will process: {len(dicom_folders)} cases (first {pilot_limit})")
+            print(f"  Remaining: {original_count - pilot_limit} cases")
+            print(f"  (Use '--mode full' to process all cases)")
+            print()
+
+    # Per-patient cost model fitted from past runs, fed by header-only slice/file counts
+    summaries = build_header_index(dicom_folders, config, logger)
+    planner = plan_run(dicom_folders, summaries, config, profile_name, fallback_sec, logger)
+
+    # Series QC on the header index: unusable studies fail here instead of decoding to zeros
+    qc_failures = {folder: summary.qc_failure for folder, summary in (summaries or {}).items()
+                   if summary.qc_failure}
+    if qc_failures:
+        print(f"Series QC: {len(qc_failures)} stud{'y' if len(qc_failures) == 1 else 'ies'} "
+              f"rejected before inference (reasons in the results 'error' column)")
+        print()
+        for folder, reason in qc_failures.items():
+            logger.warning(f"Series QC rejected {Path(folder).name}: {reason}")
+
+    # Longest-first ordering so one huge study does not run alone at the tail
+    schedule = config.get('processing.schedule', 'lpt')
+    if planner and schedule != 'fifo':
+        from core.scheduler import order_by_cost
+        dicom_folders = order_by_cost(dicom_folders, planner.estimate, schedule)
+        # Inference is serial, so the order changes which studies load in parallel, not the run time
+        if dicom_folders:
+            logger.info(f"Schedule: {schedule}; largest predicted study first "
+                        f"({dicom_folders[0].name}, {planner.estimate(dicom_folders[0]):.0f}s)")
+
+    job.dicom_folders = dicom_folders
+    job.planner = planner
+    job.qc_failures = qc_failures
+    return job
+
+
+def write_run_results(results_df: pd.DataFrame, config: ConfigManager, logger: logging.Logger) -> Path:
+    """
+    Write this run's results (timestamped CSV) and, with resume enabled, the complete results
+
+    Returns:
+        Path of the timestamped results CSV
+    """
+    output_dir = Path(config.get('paths.output_dir', './output'))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    # Save current run results (with timestamp)
+    output_file = output_dir / f"nb10_results_{timestamp}.csv"
+    results_df.to_csv(output_file, index=False, encoding='utf-8-sig')
+
+    # v1.1.3-rc2: If resume is enabled, also save/update complete results
+    enable_resume = config.get('processing.enable_resume', True)
+    if enable_resume:
+        cache_file = output_dir / ".nb10_resume_cache.csv"
+        complete_csv = output_dir / "nb10_results_complete.csv"
+
+        # Build complete results from cache (single source of truth)
+        if cache_file.exists():
+            try:
+                cache_df = pd.read_csv(cache_file)
+                # Only include successful cases
+                complete_df = cache_df[cache_df['status'] == 'success'].copy()
+
+                # Save complete results
+                complete_df.to_csv(complete_csv, index=False, encoding='utf-8-sig')
+
+                logger.info(f"Complete results saved: {complete_csv} ({len(complete_df)} cases)")
+            except Exception as e:
+                logger.warning(f"Failed to generate complete results: {e}")
+    return output_file
+
+
 def save_results(df: pd.DataFrame, config: ConfigManager, logger: logging.Logger):
     """
     Save results to CSV file
@@ -474,6 +1046,55 @@ def save_results(df: pd.DataFrame, config: ConfigManager, logger: logging.Logger
     logger.info(f"Latest copy: {latest_file}")
 
 
+def run_autotune_command(hw_info, device: str, logger: logging.Logger) -> int:
+    """
+    Run the autotune micro-benchmark and persist the per-machine profile
+
+    Args:
+        hw_info: HardwareInfo from hardware_profiler
+        device: 'cuda' or 'cpu'
+        logger: Logger instance
+
+    Returns:
+        Exit code
+    """
+    from core.autotuner import run_autotune, save_tuned_config, machine_fingerprint
+
+    print()
+    print("=" * 70)
+    print("AUTOTUNE")
+    print("=" * 70)
+    print(f"  Machine ID: {machine_fingerprint(hw_info)}")
+    print(f"  Device: {device}")
+    print("  Benchmarking synthetic 512x512 slices (this may take a few minutes)...", flush=True)
+
+    def on_progress(done, total, trials):
+        best = max((t.slices_per_sec or 0.0 for t in trials), default=0.0)
+        print(f"  [{done}/{total}] threads={trials[0].torch_threads}, "
+              f"interop={trials[0].interop_threads}: best {best:.2f} slices/s", flush=True)
+
+    try:
+        tuned = run_autotune(hw_info, device, progress_callback=on_progress)
+    except RuntimeError as e:
+        print(f"✗ Autotune failed: {e}")
+        logger.error(f"Autotune failed: {e}")
+        return 1
+
+    profile_path = save_tuned_config(hw_info, tuned)
+    logger.info(f"Autotune profile saved: {profile_path}")
+
+    print()
+    print("✓ Best configuration:")
+    print(f"    slice_batch_size: {tuned.slice_batch_size}")
+    print(f"    torch_threads:    {tuned.torch_threads}")
+    print(f"    interop_threads:  {tuned.interop_threads}")
+    print(f"    throughput:       {tuned.slices_per_sec:.2f} slices/s")
+    print(f"  Saved to: {profile_path}")
+    print("  (Used automatically on the next run)")
+    print("=" * 70)
+    return 0
+
+
 def main():
     """Main entry point"""
     parser = argparse.ArgumentParser(
@@ -501,6 +1122,24 @@ Examples:
 
   # Disable resume feature
   python cli/run_nb10.py --config config/config.yaml --mode full --no-resume
+
+  # Benchmark this machine and save the best batch/thread settings
+  python cli/run_nb10.py --config config/config.yaml --autotune
+
+  # Record per-stage timings (result columns + logs/nb10_<timestamp>_trace.json)
+  python cli/run_nb10.py --config config/config.yaml --mode pilot --trace
+
+  # Profile every 20th patient with cProfile and tracemalloc (logs/profiles/<run>/)
+  python cli/run_nb10.py --config config/config.yaml --mode full --profile cpu memory --profile-every 20
+
+  # Profile one patient's PyTorch operators
+  python cli/run_nb10.py --config config/config.yaml --profile torch --profile-patient P0042
+
+  # Export live metrics to a Prometheus text file and http://127.0.0.1:9410/metrics
+  python cli/run_nb10.py --config config/config.yaml --mode full --metrics-file logs/nb10_metrics.prom --metrics-port 9410
+
+  # Score every cohort of the config's cohorts: section in one process (model loaded once)
+  python cli/run_nb10.py --config config/config.yaml --mode full --cohort all
         """
     )
 
@@ -561,6 +1200,73 @@ Examples:
         help='Disable resume feature (do not save/load cache)'
     )
 
+    parser.add_argument(
+        '--autotune',
+        action='store_true',
+        help='Benchmark slice batch size and thread settings on this machine, '
+             'save the best configuration to config/machine_profiles/ and exit'
+    )
+
+    parser.add_argument(
+        '--trace',
+        action='store_true',
+        help='Record per-stage timings: adds t_<stage>_sec columns to the results '
+             'and writes a Chrome/Perfetto trace JSON next to the log file'
+    )
+
+    parser.add_argument(
+        '--profile',
+        nargs='+',
+        choices=['cpu', 'torch', 'memory'],
+        help='Profile selected patients: cpu (cProfile), torch (torch.profiler operator table), '
+             'memory (tracemalloc peak allocations). Output goes to <log_dir>/profiles/'
+    )
+
+    parser.add_argument(
+        '--profile-every',
+        type=int,
+        default=10,
+        metavar='N',
+        help='With --profile: profile every Nth patient, starting with the first (default: 10)'
+    )
+
+    parser.add_argument(
+        '--profile-patient',
+        action='append',
+        metavar='ID',
+        help='With --profile: profile only this patient ID (repeatable; overrides --profile-every)'
+    )
+
+    parser.add_argument(
+        '--metrics-file',
+        type=str,
+        metavar='PATH',
+        help='Write live metrics in Prometheus text format to this file (rewritten atomically)'
+    )
+
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        metavar='PORT',
+        help='Serve live metrics on http://127.0.0.1:PORT/metrics (localhost only)'
+    )
+
+    parser.add_argument(
+        '--lesion-flush-minutes',
+        type=float,
+        metavar='MIN',
+        help='Also write buffered lesion table rows at least every MIN minutes, so a crash loses '
+             'at most that much (default: only when output.lesion_rows_per_file rows are buffered)'
+    )
+
+    parser.add_argument(
+        '--cohort',
+        action='append',
+        metavar='NAME',
+        help="Process a cohort from the config's cohorts: section (repeatable; 'all' for every cohort). "
+             "Cohorts run one after another in this process, sharing the model and workers"
+    )
+
     parser.add_argument(
         '--version',
         action='version',
@@ -568,6 +1274,9 @@ Examples:
     )
 
     args = parser.parse_args()
+    if args.cohort and (args.data_dir or args.output_dir):
+        parser.error("--cohort cannot be combined with --data-dir/--output-dir "
+                     "(cohort paths come from the cohorts: section)")
 
     # Don't print title - already shown by start_nb10.bat
     # Just show initialization
@@ -617,19 +1326,33 @@ Examples:
             config.set('processing.pilot_limit', args.pilot_limit)
         if args.no_resume:
             config.set('processing.enable_resume', False)
+        if args.lesion_flush_minutes is not None:
+            config.set('output.lesion_flush_interval_min', args.lesion_flush_minutes)
+
+        # Multi-cohort run: several data_dir/output_dir pairs, one process
+        cohort_jobs = []
+        if args.cohort:
+            try:
+                cohort_jobs = resolve_cohorts(config, args.cohort)
+            except ValueError as e:
+                print(f"\n✗ Error: {e}")
+                return 1
+            logger.info(f"Cohorts: {', '.join(job.name for job in cohort_jobs)}")
 
         # Handle cache clearing
         if args.clear_cache:
-            output_dir = Path(config.get('paths.output_dir', './output'))
-            cache_file = output_dir / ".nb10_resume_cache.csv"
-            if cache_file.exists():
-                print("Clearing resume cache...")
-                clear_resume_cache(cache_file, logger)
-                print("✓ Cache cleared - will process all cases")
-                print()
-            else:
-                print("No cache file found - nothing to clear")
-                print()
+            output_dirs = ([job.output_dir for job in cohort_jobs] if cohort_jobs
+                           else [Path(config.get('paths.output_dir', './output'))])
+            for output_dir in output_dirs:
+                cache_file = output_dir / ".nb10_resume_cache.csv"
+                if cache_file.exists():
+                    print("Clearing resume cache...")
+                    clear_resume_cache(cache_file, logger)
+                    print(f"✓ Cache cleared - will process all cases ({output_dir})")
+                    print()
+                else:
+                    print(f"No cache file found - nothing to clear ({output_dir})")
+                    print()
 
         # Validate configuration quietly
         config.validate()
@@ -658,7 +1381,11 @@ Examples:
             get_hospital_cpu_preset = None
 
         hw_info = detect_hardware()
-        performance_profile = select_profile_by_hardware(hw_info)
+
+        if args.autotune:
+            return run_autotune_command(hw_info, config.device, logger)
+
+        performance_profile = select_profile_by_hardware(hw_info, device=config.device)
 
         # Week 4: Initialize CPU optimizer if available
         cpu_optimizer = None
@@ -670,6 +1397,10 @@ Examples:
                 cpu_optimizer = CPUOptimizer()
                 cpu_config = cpu_optimizer.get_optimal_config()
 
+                # Autotuned threads take precedence over the tier table
+                if performance_profile.torch_threads:
+                    cpu_config.torch_threads = performance_profile.torch_threads
+
                 # Get hospital preset for additional info
                 if get_hospital_cpu_preset:
                     hospital_preset = get_hospital_cpu_preset()
@@ -737,92 +1468,76 @@ Examples:
         print("=" * 70)
         print()
 
-        # Check data directory with interactive prompt
-        data_dir = Path(config.data_dir)
-        if not data_dir.exists():
-            print("="*70)
-            print("⚠️  DATA DIRECTORY NOT FOUND")
-            print("="*70)
-            print()
-            print(f"Current setting: {data_dir}")
-            print()
-            print("Options:")
-            print("  1. Edit config/config.yaml and restart")
-            print("  2. Enter path now (temporary)")
-            print("  3. Exit")
-            print()
-
-            choice = input("Your choice (1-3): ").strip()
-
-            if choice == '2':
-                new_path = input("\nEnter DICOM data directory path: ").strip().strip('"')
-                data_dir = Path(new_path)
-                if not data_dir.exists():
-                    print(f"\n✗ Error: Directory does not exist: {data_dir}")
-                    return 1
-                config.set('paths.data_dir', str(data_dir))
-                print(f"✓ Using: {data_dir}")
+        if cohort_jobs:
+            missing = [job for job in cohort_jobs if not job.data_dir.exists()]
+            for job in missing:
+                print(f"✗ Error: Data directory of cohort '{job.name}' does not exist: {job.data_dir}")
+            if missing:
+                return 1
+        else:
+            # Check data directory with interactive prompt
+            data_dir = Path(config.data_dir)
+            if not data_dir.exists():
+                print("="*70)
+                print("⚠️  DATA DIRECTORY NOT FOUND")
+                print("="*70)
+                print()
+                print(f"Current setting: {data_dir}")
+                print()
+                print("Options:")
+                print("  1. Edit config/config.yaml and restart")
+                print("  2. Enter path now (temporary)")
+                print("  3. Exit")
                 print()
-            elif choice == '3' or choice == '':
-                print("\nExiting...")
-                return 0
-            else:
-                print("\nPlease edit config/config.yaml and restart.")
-                print(f"Update: data_dir: \"{data_dir}\"")
-                return 0
-
-        # Scan DICOM folders (supports nested group directories)
-        print("Scanning DICOM data...")
-        dicom_folders = []
-
-        def scan_for_dicom(directory: Path, max_depth: int = 2, current_depth: int = 0):
-            """Recursively scan for directories containing DICOM files"""
-            if current_depth > max_depth:
-                return
-
-            for item in directory.iterdir():
-                if not item.is_dir():
-                    continue
 
-                # Check if this directory contains .dcm files
-                dcm_files = list(item.glob("*.dcm"))
-                if dcm_files:
-                    dicom_folders.append(item)
-                    logger.debug(f"Found DICOM folder: {item.relative_to(data_dir)} ({len(dcm_files)} files)")
+                choice = input("Your choice (1-3): ").strip()
+
+                if choice == '2':
+                    new_path = input("\nEnter DICOM data directory path: ").strip().strip('"')
+                    data_dir = Path(new_path)
+                    if not data_dir.exists():
+                        print(f"\n✗ Error: Directory does not exist: {data_dir}")
+                        return 1
+                    config.set('paths.data_dir', str(data_dir))
+                    print(f"✓ Using: {data_dir}")
+                    print()
+                elif choice == '3' or choice == '':
+                    print("\nExiting...")
+                    return 0
                 else:
-                    # No .dcm files, scan subdirectories
-                    scan_for_dicom(item, max_depth, current_depth + 1)
-
-        scan_for_dicom(data_dir)
-        logger.info(f"Found {len(dicom_folders)} DICOM folders")
-
-        if not dicom_folders:
-            print(f"✗ No DICOM folders found in: {data_dir}")
-            print("\nPlease check:")
-            print("  - Data directory path is correct")
-            print("  - Directory contains patient subdirectories")
-            print("  - Each subdirectory contains .dcm files")
-            return 1
-
-        print(f"✓ Found {len(dicom_folders)} patient folders")
-        print()
+                    print("\nPlease edit config/config.yaml and restart.")
+                    print(f"Update: data_dir: \"{data_dir}\"")
+                    return 0
+            cohort_jobs = [CohortJob(None, data_dir, Path(config.get('paths.output_dir', './output')))]
 
-        # Apply pilot mode limit
-        original_count = len(dicom_folders)
-        if config.mode == 'pilot':
-            pilot_limit = config.get('processing.pilot_limit', 10)
-            dicom_folders = dicom_folders[:pilot_limit]
-            if original_count > pilot_limit:
-                print(f"Pilot Mode Limit:")
-                print(f"  Will process: {len(dicom_folders)} cases (first {pilot_limit})")
-                print(f"  Remaining: {original_count - pilot_limit} cases")
-                print(f"  (Use '--mode full' to process all cases)")
-                print()
+        # Per-patient time used until the timing history can fit a cost model
+        if config.device == 'cpu' and cpu_optimizer_available and cpu_config:
+            fallback_sec = sum(cpu_config.expected_time_per_patient_sec) / 2
+        else:
+            fallback_sec = 240.0 if config.device == 'cpu' else 15.0
+
+        # Scan DICOM folders (supports nested group directories), plan and order each cohort
+        for job in cohort_jobs:
+            if job.name:
+                print(f"Cohort '{job.name}': {job.data_dir}")
+            use_cohort(config, job)
+            prepare_cohort(job, config, performance_profile.tier_name, fallback_sec, logger)
+        cohort_jobs = [job for job in cohort_jobs if job.dicom_folders]
+        if not cohort_jobs:
+            return 1
 
         # Estimate processing time (Week 4: Use CPU optimizer estimates)
-        cases_to_process = len(dicom_folders)
+        cases_to_process = sum(len(job.dicom_folders) for job in cohort_jobs)
+        planners = [job.planner for job in cohort_jobs]
 
-        if config.device == 'cpu' and cpu_optimizer_available and cpu_config:
+        if all(planner and planner.model.fitted for planner in planners):
+            from core.eta_model import format_duration
+            total_sec = sum(job.planner.total_seconds(job.dicom_folders) for job in cohort_jobs)
+            print(f"Ready to Process:")
+            print(f"  Cases: {cases_to_process}")
+            print(f"  Estimated time: {format_duration(total_sec)}")
+            print(f"    ({planners[0].describe()})")
+        elif config.device == 'cpu' and cpu_optimizer_available and cpu_config:
             # Use CPU optimizer's performance estimates
             time_est = cpu_optimizer.estimate_processing_time(cases_to_process, cpu_config)
             est_time_str = time_est['avg_time_str']
@@ -850,6 +1565,15 @@ Examples:
             print(f"  Cases: {cases_to_process}")
             print(f"  Estimated time: {est_time_str}")
 
+        slice_counts = [summary.slice_count for planner in planners if planner
+                        for summary in planner.summaries.values()]
+        if slice_counts:
+            print(f"  Slices per patient: {min(slice_counts)}-{max(slice_counts)} "
+                  f"(total {sum(slice_counts)})")
+        if any(job.name for job in cohort_jobs):
+            for job in cohort_jobs:
+                print(f"  Cohort {job.name}: {len(job.dicom_folders)} cases -> {job.output_dir}")
+
         print()
 
         # Interactive confirmation
@@ -867,8 +1591,17 @@ Examples:
         print("  - Loading libraries (this may take ~30 seconds)...", flush=True)
 
         from core.safety_monitor import get_monitor
+        from core.resource_sampler import ResourceSampler
         safety_monitor = get_monitor(enable_auto_downgrade=True)
 
+        # Background resource sampling: the inference loop only reads the latest snapshot
+        resource_sampler = ResourceSampler(
+            interval_sec=config.get('performance.resource_sample_interval_sec', 1.0),
+            buffer_size=config.get('performance.resource_buffer_size', 3600),
+            cuda_available=(config.device == 'cuda'),
+        )
+        safety_monitor.attach_sampler(resource_sampler)
+
         logger.info(f"Hardware: {hw_info.gpu.device_name if hw_info.gpu.available else 'CPU only'}")
         logger.info(f"Profile: {performance_profile.tier_name}")
 
@@ -876,7 +1609,9 @@ Examples:
         print("  - Initializing model architecture...", flush=True)
         model = create_model(
             device=config.device,
-            checkpoint_path=str(config.model_path)
+            checkpoint_path=str(config.model_path),
+            torch_threads=performance_profile.torch_threads,
+            interop_threads=performance_profile.interop_threads
         )
         print("  - Loading weights...", flush=True)
 
@@ -898,54 +1633,103 @@ Examples:
         # Run inference with performance profile and safety monitor
         # Note: run_inference_batch will show resume info if applicable
         print("="*70)
-        results_df = run_inference_batch(dicom_folders, model, config, logger,
-                                        performance_profile, safety_monitor)
-
-        # Save results
-        output_dir = Path(config.get('paths.output_dir', './output'))
-        output_dir.mkdir(parents=True, exist_ok=True)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-
-        # Save current run results (with timestamp)
-        output_file = output_dir / f"nb10_results_{timestamp}.csv"
-        results_df.to_csv(output_file, index=False, encoding='utf-8-sig')
+        # Metrics exporter (Prometheus text file and/or localhost HTTP endpoint)
+        metrics_file = args.metrics_file or config.get('metrics.textfile') or None
+        metrics_port = args.metrics_port if args.metrics_port is not None else config.get('metrics.http_port', 0)
+        metrics_enabled = bool(args.metrics_file or args.metrics_port or config.get('metrics.enabled', False))
+        metrics, metrics_exporter = None, None
+        if metrics_enabled:
+            from core.metrics_exporter import RunMetrics, MetricsExporter
+            metrics = RunMetrics(window=config.get('metrics.window', 20))
+            metrics_exporter = MetricsExporter(
+                metrics,
+                textfile=Path(metrics_file) if metrics_file else log_dir / 'nb10_metrics.prom',
+                http_port=metrics_port,
+                sampler=resource_sampler,
+                interval_sec=config.get('metrics.interval_sec', 15.0),
+            )
 
-        # v1.1.3-rc2: If resume is enabled, also save/update complete results
-        enable_resume = config.get('processing.enable_resume', True)
-        if enable_resume:
-            cache_file = output_dir / ".nb10_resume_cache.csv"
-            complete_csv = output_dir / "nb10_results_complete.csv"
+        # Stage latencies feed the metrics and timing history even without --trace
+        # (span events are only kept for --trace)
+        from core.tracing import Tracer, NULL_TRACER
+        if args.trace:
+            tracer = Tracer()
+        elif metrics_enabled or any(planners):
+            tracer = Tracer(record_events=False)
+        else:
+            tracer = NULL_TRACER
+
+        profiler = None
+        if args.profile:
+            from core.profiling import PatientProfiler
+            profiler = PatientProfiler(
+                args.profile,
+                output_dir=log_dir / 'profiles' / log_file.stem,
+                every=args.profile_every,
+                patient_ids=args.profile_patient,
+                use_cuda=(config.device == 'cuda'),
+            )
 
-            # Build complete results from cache (single source of truth)
-            if cache_file.exists():
+        resource_sampler.start()
+        if metrics_exporter:
+            metrics_exporter.start()
+        cohort_results = []
+        try:
+            for job in cohort_jobs:
+                use_cohort(config, job)
+                if job.name:
+                    print(f"COHORT: {job.name} ({len(job.dicom_folders)} cases)")
+                    print("=" * 70)
+                    logger.info(f"Cohort {job.name}: {job.data_dir} -> {job.output_dir}")
+                results_df = run_inference_batch(job.dicom_folders, model, config, logger,
+                                                 performance_profile, safety_monitor, tracer, profiler,
+                                                 metrics, job.planner, job.qc_failures)
+                # Each cohort's results are written as soon as it finishes
+                output_file = write_run_results(results_df, config, logger)
+                cohort_results.append((job, results_df, output_file))
+        finally:
+            if metrics_exporter:
+                metrics_exporter.stop()
+            resource_sampler.stop()
+            resources_file = log_file.with_name(f"{log_file.stem}_resources.csv")
+            try:
+                resource_sampler.export_csv(resources_file)
+                peak_rss = resource_sampler.peak('process_rss_gb')
+                logger.info(f"Resource samples saved: {resources_file} (peak RSS: {peak_rss:.2f}GB)")
+            except Exception as e:
+                logger.warning(f"Failed to export resource samples: {e}")
+            if args.trace:
+                trace_file = log_file.with_name(f"{log_file.stem}_trace.json")
                 try:
-                    cache_df = pd.read_csv(cache_file)
-                    # Only include successful cases
-                    complete_df = cache_df[cache_df['status'] == 'success'].copy()
-
-                    # Save complete results
-                    complete_df.to_csv(complete_csv, index=False, encoding='utf-8-sig')
-
-                    logger.info(f"Complete results saved: {complete_csv} ({len(complete_df)} cases)")
+                    tracer.export_chrome_trace(trace_file)
+                    logger.info(f"Trace saved: {trace_file} (open in chrome://tracing or ui.perfetto.dev)")
                 except Exception as e:
-                    logger.warning(f"Failed to generate complete results: {e}")
+                    logger.warning(f"Failed to export trace: {e}")
 
         # Show summary
         print()
         print("="*70)
         print("✓ PROCESSING COMPLETE")
         print("="*70)
-        success_count = (results_df['status'] == 'success').sum()
-        failed_count = (results_df['status'] == 'failed').sum()
-        print(f"  Success: {success_count}/{len(dicom_folders)}")
-        if failed_count > 0:
-            print(f"  Failed:  {failed_count}/{len(dicom_folders)}")
-        if success_count > 0:
-            mean_score = results_df[results_df['status'] == 'success']['agatston_score'].mean()
-            print(f"  Mean Agatston Score: {mean_score:.1f}")
-        print()
+        for job, results_df, output_file in cohort_results:
+            if job.name:
+                print(f"  Cohort {job.name}:")
+            success_count = (results_df['status'] == 'success').sum() if not results_df.empty else 0
+            failed_count = (results_df['status'] == 'failed').sum() if not results_df.empty else 0
+            print(f"  Success: {success_count}/{len(job.dicom_folders)}")
+            if failed_count > 0:
+                print(f"  Failed:  {failed_count}/{len(job.dicom_folders)}")
+            qc_rejected = (results_df['error'].astype(str).str.startswith('Series QC:').sum()
+                           if 'error' in results_df else 0)
+            if qc_rejected > 0:
+                print(f"    (of which rejected by series QC: {qc_rejected})")
+            if success_count > 0:
+                mean_score = results_df[results_df['status'] == 'success']['agatston_score'].mean()
+                print(f"  Mean Agatston Score: {mean_score:.1f}")
+            print()
         print(f"  Results saved to:")
-        print(f"    {output_file}")
+        for _, _, output_file in cohort_results:
+            print(f"    {output_file}")
         print("="*70)
         print()
         print("Next steps:")
@@ -89,9 +89,15 @@ from .config_manager import ConfigManager, create_default_config
 try:
     from .ai_cac_inference_lib import create_model as create_model_local
     from .ai_cac_inference_lib import run_inference_on_dicom_folder
+    from .ai_cac_inference_lib import load_dicom_study, run_inference_on_loaded_study
+    from .ai_cac_inference_lib import predict_loaded_study, score_prediction
 except ImportError as e:
     create_model_local = None
     run_inference_on_dicom_folder = None
+    load_dicom_study = None
+    run_inference_on_loaded_study = None
+    predict_loaded_study = None
+    score_prediction = None
     import warnings
     warnings.warn(f"Local AI-CAC inference library not available: {e}")
 
@@ -124,7 +130,12 @@ def create_model(device='cuda', checkpoint_path=None, **kwargs):
         # Fallback to local implementation
         if create_model_local is None:
             raise RuntimeError("Neither shared nor local AI-CAC model available")
-        return create_model_local(device=device, checkpoint_path=checkpoint_path)
+        return create_model_local(
+            device=device,
+            checkpoint_path=checkpoint_path,
+            torch_threads=kwargs.get('torch_threads'),
+            interop_threads=kwargs.get('interop_threads'),
+        )
 
 
 # ========================================
@@ -143,6 +154,10 @@ __all__ = [
     # Model interface (unified)
     "create_model",
     "run_inference_on_dicom_folder",
+    "load_dicom_study",
+    "run_inference_on_loaded_study",
+    "predict_loaded_study",
+    "score_prediction",
 
     # Hardware detection (shared, Week 3)
     "detect_hardware",
@@ -0,0 +1,181 @@
+"""
+自适应切片批处理模块
+Adaptive Slice Batching
+
+推理时如果 model(batch) 发生内存分配失败（CUDA OOM 或 CPU 分配失败），
+不再让整个患者失败，而是把切片批大小减半后重试；连续成功若干批次且
+资源压力下降后，再逐步（每次+1）恢复批大小。
+
+策略（乘性减少、加性增加）:
+- OOM: 当前批大小减半，并把上限降到失败值-1，避免立即再次OOM
+- 连续成功 grow_after 批: 批大小+1（不超过当前上限）
+- 已达上限且OOM后SafetyMonitor报告过SAFE: 上限+1，逐步探测回到 max_batch_size
+  （未接入SafetyMonitor时，以OOM后连续 probe_after 批无OOM代替SAFE读数）
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# 未配置 performance.max_slice_batch_size 时，批大小最多增长到初始值的倍数；
+# 超出显存/内存时由OOM减半找回实际上限
+MAX_BATCH_HEADROOM = 2
+
+
+def is_oom_error(e: BaseException) -> bool:
+    """
+    判断异常是否为内存分配失败
+
+    torch.cuda.OutOfMemoryError 是 RuntimeError 的子类；CPU 分配失败只能
+    通过错误信息识别（"DefaultCPUAllocator: can't allocate memory"）。
+    """
+    if isinstance(e, MemoryError):
+        return True
+    msg = str(e).lower()
+    return 'out of memory' in msg or "can't allocate memory" in msg
+
+
+def default_slice_batch_size(device: str, performance_profile=None) -> int:
+    """
+    获取默认切片批大小
+
+    Args:
+        device: 'cuda' 或 'cpu'
+        performance_profile: 可选 PerformanceProfile
+
+    Returns:
+        切片批大小
+    """
+    if performance_profile:
+        return performance_profile.slice_batch_size
+    # v1.1.3: CPU可以使用更大的batch（没有VRAM限制）；GPU模式保守配置
+    return 8 if device == 'cpu' else 4
+
+
+@dataclass
+class BatchStats:
+    """单个患者的批处理统计"""
+    slices: int = 0
+    forward_calls: int = 0
+    oom_retries: int = 0
+    min_batch_size: int = 0
+    max_batch_size: int = 0
+
+    @property
+    def effective_batch_size(self) -> float:
+        """平均有效批大小（切片数 / 前向调用次数）"""
+        if self.forward_calls == 0:
+            return 0.0
+        return self.slices / self.forward_calls
+
+
+class AdaptiveSliceBatcher:
+    """
+    OOM自适应切片批大小控制器
+
+    同一个实例可跨患者复用，使得一次OOM后的批大小调整延续到后续患者。
+    """
+
+    def __init__(self, initial_batch_size: int, max_batch_size: Optional[int] = None,
+                 min_batch_size: int = 1, grow_after: int = 4, probe_after: int = 32):
+        """
+        Args:
+            initial_batch_size: 初始批大小（通常来自性能档位）
+            max_batch_size: 允许增长到的最大批大小（默认等于初始值）
+            min_batch_size: 最小批大小（到达后仍OOM则放弃重试）
+            grow_after: 连续成功多少批后尝试增大
+            probe_after: 未接入SafetyMonitor（从未调用 note_pressure）时，
+                         OOM后连续成功多少批才允许放宽上限
+        """
+        self.min_batch_size = max(1, min_batch_size)
+        self.max_batch_size = max(initial_batch_size, max_batch_size or initial_batch_size)
+        self.grow_after = max(1, grow_after)
+        self.probe_after = max(1, probe_after)
+
+        self.batch_size = max(self.min_batch_size, initial_batch_size)
+        self.ceiling = self.max_batch_size
+        self.total_oom_retries = 0
+
+        self._success_streak = 0
+        self._pressure_ok = True
+        self._probe_allowed = True  # OOM后需观察到SAFE状态才放宽上限
+        self._monitored = False     # 是否收到过SafetyMonitor的压力读数
+        self._clean_batches = 0     # 上次OOM后的成功批次数
+        self.stats = BatchStats(min_batch_size=self.batch_size, max_batch_size=self.batch_size)
+
+    def begin_patient(self):
+        """开始新患者，重置单患者统计"""
+        self.stats = BatchStats(min_batch_size=self.batch_size, max_batch_size=self.batch_size)
+
+    def set_max_batch_size(self, max_batch_size: int):
+        """
+        调整最大批大小（由并发控制器在运行时调用）
+
+        降低时立即生效；提高时不直接跳升，而是由 on_success() 逐步探测回去。
+        """
+        self.max_batch_size = max(self.min_batch_size, max_batch_size)
+        self.ceiling = min(self.ceiling, self.max_batch_size)
+        self.batch_size = min(self.batch_size, self.ceiling)
+
+    def note_pressure(self, safe: bool):
+        """
+        记录资源压力（来自SafetyMonitor）
+
+        Args:
+            safe: True 表示资源状态SAFE，可以继续增长
+        """
+        self._monitored = True
+        self._pressure_ok = safe
+        if safe:
+            self._probe_allowed = True
+
+    def on_success(self, num_slices: int):
+        """记录一次成功的前向计算，必要时增大批大小"""
+        self.stats.slices += num_slices
+        self.stats.forward_calls += 1
+        self._success_streak += 1
+        self._clean_batches += 1
+        if not self._monitored and self._clean_batches >= self.probe_after:
+            self._probe_allowed = True
+
+        if self._success_streak < self.grow_after or not self._pressure_ok:
+            return
+
+        self._success_streak = 0
+        if self.batch_size < self.ceiling:
+            self.batch_size += 1
+        elif self.ceiling < self.max_batch_size and self._probe_allowed:
+            # 压力已下降：逐步放宽上限
+            self.ceiling += 1
+            self.batch_size = self.ceiling
+        else:
+            return
+
+        self.stats.max_batch_size = max(self.stats.max_batch_size, self.batch_size)
+        logger.debug(f"Slice batch size increased to {self.batch_size}")
+
+    def on_oom(self) -> bool:
+        """
+        记录一次OOM并减半批大小
+
+        Returns:
+            True 表示可以用更小的批重试；False 表示已是最小批大小
+        """
+        if self.batch_size <= self.min_batch_size:
+            return False
+
+        failed = self.batch_size
+        self.ceiling = max(self.min_batch_size, failed - 1)
+        self.batch_size = max(self.min_batch_size, failed // 2)
+        self._success_streak = 0
+        self._clean_batches = 0
+        self._probe_allowed = False
+
+        self.stats.oom_retries += 1
+        self.total_oom_retries += 1
+        self.stats.min_batch_size = min(self.stats.min_batch_size, self.batch_size)
+
+        logger.warning(f"Out of memory at slice batch {failed}, retrying with {self.batch_size}")
+        return True
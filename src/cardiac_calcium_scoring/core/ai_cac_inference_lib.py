@@ -8,25 +8,34 @@ Original: https://github.com/Raffi-Hagopian/AI-CAC
 License: MIT
 """
 
-__version__ = "2.1.1"  # v1.1.4: Fix DataLoader hanging on last patient
+__version__ = "2.4.0"  # Split forward pass and scoring into separate stages
 
 import os
 import sys
 import torch
 import pandas as pd
-from torch.utils.data import DataLoader
 from monai.networks.nets import SwinUNETR
 
+try:
+    from .tracing import NULL_TRACER
+except ImportError:
+    from tracing import NULL_TRACER
+
 # Add AI-CAC to path (will be done by caller)
 # sys.path.insert(0, '/content/AI-CAC')
 
 
-def extract_patient_demographics(dicom_folder_path):
+def extract_patient_demographics(dicom_folder_path, files=None):
     """
     Extract patient age and sex from DICOM metadata
 
+    load_dicom_study() takes demographics from the metadata collected during series
+    selection; this standalone helper reads the DICOMDIR records or one file header
+    (see dicom_series_selector.read_study_metadata).
+
     Args:
         dicom_folder_path: Path to folder containing DICOM files
+        files: Optional DICOM file paths already listed by the caller (skips the directory listing)
 
     Returns:
         dict: {
@@ -35,87 +44,43 @@ def extract_patient_demographics(dicom_folder_path):
             'is_premature_cad': bool or None  # Male <55, Female <65
         }
     """
-    import pydicom
     from pathlib import Path
-
-    result = {
-        'patient_age': None,
-        'patient_sex': None,
-        'is_premature_cad': None
-    }
+    from dicom_series_selector import read_study_metadata
+    from study_metadata import StudyMetadata
 
     try:
-        # Find first DICOM file
-        folder = Path(dicom_folder_path)
-        dcm_files = list(folder.rglob("*.dcm"))
-        if not dcm_files:
-            return result
-
-        # Read first DICOM file (all files should have same patient info)
-        dcm = pydicom.dcmread(dcm_files[0], stop_before_pixels=True)
-
-        # Extract age
-        if hasattr(dcm, 'PatientAge'):
-            age_str = str(dcm.PatientAge)
-            if age_str.endswith('Y'):
-                try:
-                    result['patient_age'] = int(age_str[:-1])
-                except:
-                    pass
-
-        # If no direct age, calculate from birth date and study date
-        if result['patient_age'] is None:
-            if hasattr(dcm, 'PatientBirthDate') and hasattr(dcm, 'StudyDate'):
-                try:
-                    birth_year = int(str(dcm.PatientBirthDate)[:4])
-                    study_year = int(str(dcm.StudyDate)[:4])
-                    result['patient_age'] = study_year - birth_year
-                except:
-                    pass
-
-        # Extract sex
-        if hasattr(dcm, 'PatientSex'):
-            sex = str(dcm.PatientSex).upper()
-            if sex in ['M', 'F']:
-                result['patient_sex'] = sex
-
-        # Check premature CAD criteria
-        if result['patient_age'] is not None and result['patient_sex'] is not None:
-            if result['patient_sex'] == 'M' and result['patient_age'] < 55:
-                result['is_premature_cad'] = True
-            elif result['patient_sex'] == 'F' and result['patient_age'] < 65:
-                result['is_premature_cad'] = True
-            else:
-                result['is_premature_cad'] = False
-
+        return read_study_metadata(Path(dicom_folder_path), files=files).demographics()
     except Exception:
         # Silently fail - demographics are optional
-        pass
-
-    return result
+        return StudyMetadata().demographics()
 
 
-def create_model(device='cuda', checkpoint_path=None):
+def create_model(device='cuda', checkpoint_path=None, torch_threads=None, interop_threads=None):
     """
     Create and load AI-CAC SwinUNETR model
 
     Args:
         device: 'cuda' or 'cpu'
         checkpoint_path: Path to model weights (.pth file)
+        torch_threads: CPU intra-op threads (default: cores-1, max 8; autotune may override)
+        interop_threads: CPU inter-op threads (default: 2; autotune may override)
 
     Returns:
         Loaded model in eval mode
     """
     # v1.1.3: CPU线程优化 - 必须在第一次并行操作前设置（仅设置一次）
     if device == 'cpu':
-        import multiprocessing
-        cpu_count = multiprocessing.cpu_count()
-        torch_threads = min(cpu_count - 1, 8)  # 保留1核给系统，最多8线程
+        if torch_threads is None:
+            import multiprocessing
+            cpu_count = multiprocessing.cpu_count()
+            torch_threads = min(cpu_count - 1, 8)  # 保留1核给系统，最多8线程
+        if interop_threads is None:
+            interop_threads = 2
 
         # 仅在未设置时设置（避免重复调用create_model时报错）
         try:
             torch.set_num_threads(torch_threads)
-            torch.set_num_interop_threads(2)  # 操作间并行
+            torch.set_num_interop_threads(interop_threads)  # 操作间并行
         except RuntimeError:
             # 已经设置过，忽略错误
             pass
@@ -150,124 +115,195 @@ def create_model(device='cuda', checkpoint_path=None):
     return model
 
 
-def run_inference_on_dicom_folder(dicom_folder_path, model, device='cuda',
-                                   batch_size=1, num_workers=0, performance_profile=None,
-                                   safety_monitor=None, extract_demographics=True):
+def load_dicom_study(dicom_folder_path, extract_demographics=True, pin_memory=False,
+                     tracer=NULL_TRACER, files=None):
     """
-    Run AI-CAC inference on a single patient's DICOM folder
+    Load a patient's DICOM study into model-ready tensors (CPU only, no model needed)
+
+    This is the I/O and decode stage of run_inference_on_dicom_folder(). It can run
+    in a background thread while the model processes another patient.
 
     Args:
         dicom_folder_path: Path to folder containing DICOM files
-        model: Loaded SwinUNETR model
-        device: 'cuda' or 'cpu'
-        batch_size: DataLoader batch size (default 1, process one patient at a time)
-        num_workers: Number of DataLoader workers (default 0, auto-detect if profile provided)
-        performance_profile: Optional PerformanceProfile for hardware-optimized settings
-        safety_monitor: Optional SafetyMonitor for resource monitoring and OOM protection
         extract_demographics: Extract age and gender from DICOM metadata (default True)
+        pin_memory: Pin loaded tensors for faster host-to-GPU transfer
+        tracer: Optional Tracer for per-stage timing (see tracing.py)
+        files: Optional DICOM file paths already identified by the caller (e.g. the
+               header index); by default the folder is listed once, sniffing the
+               DICM preamble when there are no .dcm files
 
     Returns:
         dict: {
-            'agatston_score': float,
-            'calcium_volume_mm3': float,
-            'calcium_mass_mg': float,
-            'num_slices': int,
-            'has_calcification': bool,
-            'patient_age': int or None,
-            'patient_sex': str or None,
-            'is_premature_cad': bool or None  # Male <55, Female <65
+            'study_name': str,
+            'batches': list of (study_id, inputs, targets, hu_vols, vox_dims) tuples,
+            'demographics': dict,
+            'metadata': StudyMetadata (patient/study tags from series selection),
+            'axial_positions': list of float (z of each slice of the scored volume, mm),
+            'num_studies': int
         }
     """
     # Import AI-CAC modules from core directory
     from pathlib import Path
+    from torch.utils.data.dataloader import default_collate
     import_path = Path(__file__).parent
     if str(import_path) not in sys.path:
         sys.path.insert(0, str(import_path))
 
     from dataset_generator_inference import CTChestDataset_nongated
-    from processing import compute_agatston_for_batch
     from dicom_series_selector import prepare_dicom_for_aicac
+    from dicom_scanner import list_dicom_files
+    from dicomdir import find_dicomdir
+    from study_metadata import StudyMetadata
 
-    # Step 0: Extract patient demographics if requested
-    demographics = {
-        'patient_age': None,
-        'patient_sex': None,
-        'is_premature_cad': None
-    }
-    if extract_demographics:
-        demographics = extract_patient_demographics(dicom_folder_path)
-
-    # Step 1 & 2: Use Colab-compatible DICOM series selection
-    # This is more flexible than AI-CAC's filter_series.py:
-    # - Works with empty Series Description
-    # - Primary: Select 4-6mm thickness
-    # - Fallback: Select series with fewest files
     study_name = os.path.basename(dicom_folder_path)
 
-    series_result = prepare_dicom_for_aicac(Path(dicom_folder_path))
-
-    if series_result is None:
-        raise ValueError(f"No suitable series found in {dicom_folder_path}")
-
-    # Step 3: Build study_files structure
-    study_files = {
-        study_name: {
-            'file_paths': series_result['file_paths'],
-            'axial_positions': series_result['axial_positions']
+    with tracer.patient(study_name):
+        # List the folder once for series selection
+        dcm_files = files
+        if dcm_files is None:
+            with tracer.span('file_scan'):
+                dcm_files = list_dicom_files(Path(dicom_folder_path))
+                if not dcm_files:
+                    # CD/DVD-style export: images live in subfolders listed by a DICOMDIR
+                    dicomdir = find_dicomdir(Path(dicom_folder_path))
+                    if dicomdir is not None:
+                        dcm_files = dicomdir.files_under(Path(dicom_folder_path))
+
+        # Step 1 & 2: Use Colab-compatible DICOM series selection
+        # This is more flexible than AI-CAC's filter_series.py:
+        # - Works with empty Series Description
+        # - Primary: Select 4-6mm thickness
+        # - Fallback: Select series with fewest files
+        series_result = prepare_dicom_for_aicac(Path(dicom_folder_path), tracer=tracer, files=dcm_files)
+
+        if series_result is None:
+            raise ValueError(f"No suitable series found in {dicom_folder_path}")
+
+        # Demographics come from the headers series selection already read (no extra I/O)
+        metadata = series_result['metadata']
+        demographics = (metadata.demographics() if extract_demographics
+                        else StudyMetadata().demographics())
+
+        # Step 3: Build study_files structure
+        study_files = {
+            study_name: {
+                'file_paths': series_result['file_paths'],
+                'axial_positions': series_result['axial_positions']
+            }
         }
+
+        # Step 4: Create dataset (using official API structure)
+        study_ids = list(study_files.keys())
+
+        # ✅ Official structure: list of tuples [(file_path, axial_position), ...]
+        study_paths = []
+        for study_id in study_ids:
+            file_paths = study_files[study_id]['file_paths']
+            axial_positions = study_files[study_id]['axial_positions']
+
+            # Create list of tuples for this study
+            study_tuple_list = [(fp, ap) for fp, ap in zip(file_paths, axial_positions)]
+            study_paths.append(study_tuple_list)
+
+        study_labels = [-1] * len(study_ids)  # Placeholder for inference (no ground truth)
+
+        # ✅ Official API: positional arguments
+        dataset = CTChestDataset_nongated(study_ids, study_paths, study_labels, tracer=tracer)
+
+        # v1.1.3-rc3: DataLoader with num_workers>0 hangs after the last patient, and one
+        # patient never benefits from worker processes. Load in the calling thread and
+        # collate exactly as DataLoader(batch_size=1) would.
+        pin_memory = pin_memory and torch.cuda.is_available()
+        batches = []
+        for idx in range(len(dataset)):
+            sample = dataset[idx]
+            if str(sample[0]).endswith('_corrupt'):
+                # The dataset substitutes an all-zero volume for undecodable studies; fail the
+                # patient instead of scoring zeros
+                raise ValueError(f"Pixel data of {study_name} could not be decoded (see console output)")
+            with tracer.span('collate'):
+                batch = default_collate([sample])
+                if pin_memory:
+                    batch = tuple(t.pin_memory() if torch.is_tensor(t) else t for t in batch)
+            batches.append(batch)
+
+    return {
+        'study_name': study_name,
+        'batches': batches,
+        'demographics': demographics,
+        'metadata': metadata,
+        'axial_positions': series_result['axial_positions'],
+        'num_studies': len(dataset)
     }
 
-    # Step 4: Create dataset (using official API structure)
-    study_ids = list(study_files.keys())
-
-    # ✅ Official structure: list of tuples [(file_path, axial_position), ...]
-    study_paths = []
-    for study_id in study_ids:
-        file_paths = study_files[study_id]['file_paths']
-        axial_positions = study_files[study_id]['axial_positions']
-
-        # Create list of tuples for this study
-        study_tuple_list = [(fp, ap) for fp, ap in zip(file_paths, axial_positions)]
-        study_paths.append(study_tuple_list)
-
-    study_labels = [-1] * len(study_ids)  # Placeholder for inference (no ground truth)
-
-    # ✅ Official API: positional arguments
-    dataset = CTChestDataset_nongated(study_ids, study_paths, study_labels)
-
-    # Apply hardware-optimized DataLoader settings
-    if performance_profile:
-        dl_num_workers = performance_profile.num_workers
-        dl_pin_memory = performance_profile.pin_memory
-        dl_prefetch = performance_profile.prefetch_factor
-    else:
-        # Fallback to passed parameters or defaults
-        dl_num_workers = num_workers
-        dl_pin_memory = False
-        dl_prefetch = None
-
-    # v1.1.3-rc3: CRITICAL FIX - Force num_workers=0 for single-patient inference
-    # Issue: DataLoader with num_workers>0 hangs after last patient due to
-    # worker process cleanup issues. Since we process one patient at a time,
-    # multiprocessing overhead provides no benefit and causes hangs.
-    # Solution: Always use num_workers=0 for single patient (main process loading)
-    dl_num_workers = 0
-    dl_prefetch = None  # Not applicable when num_workers=0
-
-    # Always use batch_size=1 for single patient inference to avoid OOM
-    dataloader = DataLoader(
-        dataset,
-        batch_size=1,
-        shuffle=False,
-        num_workers=dl_num_workers,
-        pin_memory=dl_pin_memory,
-        prefetch_factor=dl_prefetch
-    )
+
+def lesion_table_columns(tables, axial_positions=None):
+    """
+    Combine lesion_table_for_vol() results of one patient and add physical coordinates
+
+    Args:
+        tables: list of (lesion table dict, voxel_dims) per scored volume
+        axial_positions: z (mm) of each slice, from load_dicom_study()
+
+    Returns:
+        dict of equal-length numpy arrays; adds centroid_x_mm / centroid_y_mm (in-plane, from
+        the image corner), z_extent_mm and centroid_z_mm / z_min_mm / z_max_mm (patient z,
+        NaN without axial_positions)
+    """
+    import numpy as np
+    from processing import LESION_COLUMNS
+
+    columns = {name: [] for name in LESION_COLUMNS + ['centroid_x_mm', 'centroid_y_mm', 'z_extent_mm',
+                                                      'centroid_z_mm', 'z_min_mm', 'z_max_mm']}
+    positions = np.asarray(axial_positions, dtype=float) if axial_positions else None
+    for table, voxel_dims in tables:
+        for name in LESION_COLUMNS:
+            columns[name].append(np.asarray(table[name]))
+        slices = np.asarray(table['slice_last']) - np.asarray(table['slice_first']) + 1
+        columns['centroid_y_mm'].append(np.asarray(table['centroid_row']) * float(voxel_dims[0]))
+        columns['centroid_x_mm'].append(np.asarray(table['centroid_col']) * float(voxel_dims[1]))
+        columns['z_extent_mm'].append(slices * float(voxel_dims[2]))
+        if positions is not None and len(table['lesion_id']):
+            index = np.arange(len(positions))
+            columns['centroid_z_mm'].append(np.interp(table['centroid_slice'], index, positions))
+            columns['z_min_mm'].append(positions[np.asarray(table['slice_first'], dtype=int)])
+            columns['z_max_mm'].append(positions[np.asarray(table['slice_last'], dtype=int)])
+        else:
+            for name in ('centroid_z_mm', 'z_min_mm', 'z_max_mm'):
+                columns[name].append(np.full(len(table['lesion_id']), np.nan))
+    return {name: np.concatenate(parts) if parts else np.array([]) for name, parts in columns.items()}
+
+
+def predict_loaded_study(loaded_study, model, device='cuda', performance_profile=None,
+                         safety_monitor=None, slice_batcher=None, tracer=NULL_TRACER):
+    """
+    Model stage of run_inference_on_loaded_study(): forward pass only, no scoring
+
+    The Agatston score depends on the prediction only through (logits > 0), so the volume
+    handed to the scoring stage is a boolean mask (1/4 of the float32 prediction). On GPU
+    it is copied into pinned host memory without blocking; score_prediction() waits for
+    the copy. The model can start on the next patient while this one is scored.
+
+    Args:
+        loaded_study: dict from load_dicom_study()
+        model: Loaded SwinUNETR model
+        device: 'cuda' or 'cpu'
+        performance_profile: Optional PerformanceProfile (default slice batch size)
+        safety_monitor: Optional SafetyMonitor for resource monitoring and OOM protection
+        slice_batcher: Optional AdaptiveSliceBatcher shared across patients
+            (default: a new one sized from performance_profile)
+        tracer: Optional Tracer for per-stage timing (see tracing.py)
+
+    Returns:
+        dict: prediction for score_prediction() ('volumes': list of
+        (study_id, host inputs, host mask, voxel dims), 'ready': CUDA event or None, ...)
+    """
+    from adaptive_batching import AdaptiveSliceBatcher, default_slice_batch_size, is_oom_error
 
     # Safety check: Verify resources before starting
     if safety_monitor:
         from core.safety_monitor import SafetyLevel
-        initial_status = safety_monitor.check_status()
+        initial_status = safety_monitor.latest_status()
         if initial_status.overall_level == SafetyLevel.EMERGENCY:
             raise RuntimeError(f"资源严重不足，无法启动推理: {initial_status.details}")
         elif initial_status.overall_level == SafetyLevel.CRITICAL:
@@ -278,110 +314,192 @@ def run_inference_on_dicom_folder(dicom_folder_path, model, device='cuda',
     # CTChestDataset_nongated returns tuple: (study_id, inputs, targets, hu_vols, vox_dims)
 
     # v1.1.3: CPU优化 - 根据device动态调整batch size
-    if device == 'cpu':
-        # CPU可以使用更大的batch（没有VRAM限制）
-        SLICE_BATCH_SIZE = performance_profile.slice_batch_size if performance_profile else 8
-    else:
-        # GPU模式：保守配置（考虑VRAM限制）
-        SLICE_BATCH_SIZE = performance_profile.slice_batch_size if performance_profile else 4
-
-    score_data = []
+    # OOM时自动减半重试，压力下降后逐步恢复（见 adaptive_batching.py）
+    if slice_batcher is None:
+        slice_batcher = AdaptiveSliceBatcher(default_slice_batch_size(device, performance_profile))
+    slice_batcher.begin_patient()
+
+    volumes = []
+    slices_scored = 0
+
+    with torch.no_grad(), tracer.patient(loaded_study['study_name']):
+        for study_id, inputs, targets, hu_vols, vox_dims in loaded_study['batches']:
+            study_id = study_id[0]  # Extract study ID from batch
+
+            # Convert to torch tensors and move to device
+            # Dataset returns numpy arrays, need to convert
+            if not torch.is_tensor(inputs):
+                inputs = torch.from_numpy(inputs)
+            if not torch.is_tensor(hu_vols):
+                hu_vols = torch.from_numpy(hu_vols)
+
+            # inputs shape should be [batch=1, 1, 512, 512, 64]
+            # But DataLoader might return [1, 512, 512, 64] if batch_size=1
+            if inputs.dim() == 4:
+                # Add batch dimension if missing
+                inputs = inputs.unsqueeze(0)
+            # Scoring reads the host copy; no device-to-host transfer of the inputs
+            host_inputs = inputs
+
+            with tracer.span('to_device'):
+                inputs = inputs.to(device)
+                hu_vols = hu_vols.to(device)
 
-    # v1.1.3-rc3: Wrap DataLoader iteration in try-finally to ensure cleanup
-    try:
-        with torch.no_grad():
-            for study_id, inputs, targets, hu_vols, vox_dims in dataloader:
-                study_id = study_id[0]  # Extract study ID from batch
+            # Initialize prediction volume with same shape as inputs
+            pred_vol = torch.zeros(inputs.shape, dtype=torch.float, device=device)
+            num_slices = inputs.shape[-1]  # Last dimension is depth
+            slices_scored += num_slices
+
+            # Process slice by slice in batches (matching AI-CAC implementation)
+            start_idx = 0
+            next_check_idx = 20
+            while start_idx < num_slices:
+                # Safety check: Monitor resources every 20 slices
+                if safety_monitor and start_idx >= next_check_idx:
+                    from core.safety_monitor import SafetyLevel
+                    next_check_idx = start_idx + 20
+                    status = safety_monitor.latest_status()
+                    slice_batcher.note_pressure(status.overall_level == SafetyLevel.SAFE)
+                    if status.overall_level == SafetyLevel.CRITICAL:
+                        # Clear GPU cache to free memory
+                        safety_monitor.clear_gpu_cache()
 
-                # Convert to torch tensors and move to device
-                # Dataset returns numpy arrays, need to convert
-                if not torch.is_tensor(inputs):
-                    inputs = torch.from_numpy(inputs)
-                if not torch.is_tensor(hu_vols):
-                    hu_vols = torch.from_numpy(hu_vols)
+                end_idx = min(start_idx + slice_batcher.batch_size, num_slices)
 
-                inputs = inputs.to(device)
-                hu_vols = hu_vols.to(device)
+                # Extract slice batch: [1, 1, 512, 512, N]
+                batch = inputs[..., start_idx:end_idx]
+                # Remove batch dim and permute: [N, 1, 512, 512]
+                batch = batch.squeeze(0).permute(3, 0, 1, 2)
 
-                # inputs shape should be [batch=1, 1, 512, 512, 64]
-                # But DataLoader might return [1, 512, 512, 64] if batch_size=1
-                if inputs.dim() == 4:
-                    # Add batch dimension if missing
-                    inputs = inputs.unsqueeze(0)
-
-                # Initialize prediction volume with same shape as inputs
-                pred_vol = torch.zeros(inputs.shape, dtype=torch.float, device=device)
-                num_slices = inputs.shape[-1]  # Last dimension is depth
-
-                # Process slice by slice in batches (matching AI-CAC implementation)
-                for start_idx in range(0, num_slices, SLICE_BATCH_SIZE):
-                    # Safety check: Monitor resources every 20 slices
-                    if safety_monitor and start_idx % 20 == 0 and start_idx > 0:
-                        from core.safety_monitor import SafetyLevel
-                        status = safety_monitor.check_status()
-                        if status.overall_level == SafetyLevel.CRITICAL:
-                            # Clear GPU cache to free memory
+                # Model inference - on allocation failure halve the batch and retry
+                try:
+                    with tracer.span('model_forward', slices=end_idx - start_idx):
+                        batch_out = model(batch.float())  # [N, 1, 512, 512]
+                        if tracer.enabled and device == 'cuda':
+                            # CUDA kernels are asynchronous; wait so the span measures compute
+                            torch.cuda.synchronize()
+                except (RuntimeError, MemoryError) as e:
+                    if not is_oom_error(e) or not slice_batcher.on_oom():
+                        raise
+                    del batch
+                    if device == 'cuda':
+                        if safety_monitor:
                             safety_monitor.clear_gpu_cache()
+                        else:
+                            torch.cuda.empty_cache()
+                    continue
 
-                    end_idx = min(start_idx + SLICE_BATCH_SIZE, num_slices)
+                # Reshape back to volume format: [1, 1, 512, 512, N]
+                batch_out = batch_out.unsqueeze(0).permute(0, 2, 3, 4, 1)
 
-                    # Extract slice batch: [1, 1, 512, 512, N]
-                    batch = inputs[..., start_idx:end_idx]
-                    # Remove batch dim and permute: [N, 1, 512, 512]
-                    batch = batch.squeeze(0).permute(3, 0, 1, 2)
+                # Store predictions in volume
+                pred_vol[..., start_idx:end_idx] = batch_out
 
-                    # Model inference
-                    batch_out = model(batch.float())  # [N, 1, 512, 512]
+                # Clear intermediate tensors to free GPU memory
+                del batch, batch_out
 
-                    # Reshape back to volume format: [1, 1, 512, 512, N]
-                    batch_out = batch_out.unsqueeze(0).permute(0, 2, 3, 4, 1)
+                slice_batcher.on_success(end_idx - start_idx)
+                start_idx = end_idx
+
+            mask = pred_vol > 0
+            if device == 'cuda':
+                host_mask = torch.empty(mask.shape, dtype=torch.bool, pin_memory=True)
+                host_mask.copy_(mask, non_blocking=True)
+                volumes.append((study_id, host_inputs, host_mask, vox_dims))
+            else:
+                volumes.append((study_id, host_inputs, mask, vox_dims))
+
+            # Clear GPU cache after each patient to avoid OOM
+            if device == 'cuda':
+                del inputs, hu_vols, pred_vol, mask
+                if safety_monitor:
+                    safety_monitor.clear_gpu_cache()
+                else:
+                    torch.cuda.empty_cache()
+
+    ready = None
+    if device == 'cuda' and volumes:
+        ready = torch.cuda.Event()
+        ready.record()
+
+    return {
+        'study_name': loaded_study['study_name'],
+        'volumes': volumes,
+        'ready': ready,
+        'slices_scored': slices_scored,
+        'num_studies': loaded_study['num_studies'],
+        'demographics': loaded_study['demographics'],
+        'axial_positions': loaded_study.get('axial_positions'),
+        'batch_stats': {
+            'slice_batch_size': round(slice_batcher.stats.effective_batch_size, 2),
+            'slice_batch_min': slice_batcher.stats.min_batch_size,
+            'oom_retries': slice_batcher.stats.oom_retries
+        },
+    }
 
-                    # Store predictions in volume
-                    pred_vol[..., start_idx:end_idx] = batch_out
 
-                    # Clear intermediate tensors to free GPU memory
-                    del batch, batch_out
+def score_prediction(prediction, tracer=NULL_TRACER, lesion_table=False):
+    """
+    Scoring stage of run_inference_on_loaded_study(): Agatston score and lesion table (CPU only)
 
-                # Compute Agatston score - must move tensors to CPU first
-                scores = compute_agatston_for_batch(
-                    inputs.cpu(),
-                    pred_vol.cpu(),
-                    vox_dims
-                )
+    Safe to call from a worker thread while the model runs the next patient.
 
-                score_data.append({
-                    'study_id': study_id,
-                    'agatston_score': scores[0] if isinstance(scores, list) else scores
-                })
+    Args:
+        prediction: dict from predict_loaded_study()
+        tracer: Optional Tracer for per-stage timing (see tracing.py)
+        lesion_table: Also return the per-lesion table (result['lesions'], columnar dict of
+            numpy arrays, see lesion_table_columns) from the same labeling pass as the score
 
-                # Clear GPU cache after each patient to avoid OOM
-                if device == 'cuda':
-                    del inputs, hu_vols, pred_vol
-                    if safety_monitor:
-                        safety_monitor.clear_gpu_cache()
-                    else:
-                        torch.cuda.empty_cache()
-    finally:
-        # v1.1.3-rc3: Explicitly cleanup DataLoader to prevent hanging
-        # This ensures worker processes are terminated even if exception occurs
-        if hasattr(dataloader, '_iterator') and dataloader._iterator is not None:
-            try:
-                dataloader._iterator._shutdown_workers()
-            except:
-                pass
-        del dataloader
+    Returns:
+        dict: same as run_inference_on_dicom_folder() (plus 'lesions' with lesion_table)
+    """
+    from processing import compute_agatston_for_batch
+
+    score_data = []
+    lesion_tables = []
+
+    with tracer.patient(prediction['study_name']):
+        if prediction['ready'] is not None:
+            with tracer.span('mask_transfer'):
+                prediction['ready'].synchronize()
+
+        for study_id, inputs, mask, vox_dims in prediction['volumes']:
+            # Compute Agatston score
+            scores, lesion_counts, tables = compute_agatston_for_batch(
+                inputs,
+                mask,
+                vox_dims,
+                tracer=tracer,
+                return_lesion_tables=True
+            )
+            if lesion_table:
+                lesion_tables.append((tables[0], vox_dims[0].numpy()))
+
+            score_data.append({
+                'study_id': study_id,
+                'agatston_score': scores[0] if isinstance(scores, list) else scores,
+                'lesion_count': lesion_counts[0]
+            })
 
     # Step 6: Aggregate results
+    demographics = prediction['demographics']
+    batch_stats = prediction['batch_stats']
+
     if len(score_data) == 0:
         result = {
             'agatston_score': 0.0,
             'calcium_volume_mm3': 0.0,
             'calcium_mass_mg': 0.0,
             'num_slices': 0,
-            'has_calcification': False
+            'has_calcification': False,
+            'lesion_count': 0,
+            'slices_scored': 0
         }
         # Add demographics
         result.update(demographics)
+        result.update(batch_stats)
+        if lesion_table:
+            result['lesions'] = lesion_table_columns([])
         return result
 
     # Sum scores across all batches for this patient
@@ -396,13 +514,103 @@ def run_inference_on_dicom_folder(dicom_folder_path, model, device='cuda',
         'agatston_score': float(total_score),
         'calcium_volume_mm3': float(calcium_volume_mm3),
         'calcium_mass_mg': float(calcium_mass_mg),
-        'num_slices': len(dataset),
-        'has_calcification': total_score > 0
+        'num_slices': prediction['num_studies'],
+        'has_calcification': total_score > 0,
+        'lesion_count': int(sum(item['lesion_count'] for item in score_data)),
+        'slices_scored': int(prediction['slices_scored'])
     }
 
     # Add demographics
     result.update(demographics)
+    result.update(batch_stats)
+    if lesion_table:
+        result['lesions'] = lesion_table_columns(lesion_tables, prediction['axial_positions'])
+
+    return result
+
+
+def run_inference_on_loaded_study(loaded_study, model, device='cuda', performance_profile=None,
+                                  safety_monitor=None, slice_batcher=None, tracer=NULL_TRACER,
+                                  lesion_table=False):
+    """
+    Run AI-CAC inference on a study returned by load_dicom_study()
+
+    predict_loaded_study() followed by score_prediction(); the batch CLI runs the two
+    stages concurrently across patients (see scoring_stage.py).
 
+    Args:
+        loaded_study: dict from load_dicom_study()
+        model: Loaded SwinUNETR model
+        device: 'cuda' or 'cpu'
+        performance_profile: Optional PerformanceProfile (default slice batch size)
+        safety_monitor: Optional SafetyMonitor for resource monitoring and OOM protection
+        slice_batcher: Optional AdaptiveSliceBatcher shared across patients
+            (default: a new one sized from performance_profile)
+        tracer: Optional Tracer for per-stage timing (see tracing.py)
+        lesion_table: Also return the per-lesion table (result['lesions'], columnar dict of
+            numpy arrays, see lesion_table_columns) from the same labeling pass as the score
+
+    Returns:
+        dict: same as run_inference_on_dicom_folder() (plus 'lesions' with lesion_table)
+    """
+    prediction = predict_loaded_study(loaded_study, model, device=device,
+                                      performance_profile=performance_profile,
+                                      safety_monitor=safety_monitor, slice_batcher=slice_batcher,
+                                      tracer=tracer)
+    return score_prediction(prediction, tracer=tracer, lesion_table=lesion_table)
+
+
+def run_inference_on_dicom_folder(dicom_folder_path, model, device='cuda',
+                                   batch_size=1, num_workers=0, performance_profile=None,
+                                   safety_monitor=None, extract_demographics=True,
+                                   slice_batcher=None, tracer=NULL_TRACER):
+    """
+    Run AI-CAC inference on a single patient's DICOM folder
+
+    Args:
+        dicom_folder_path: Path to folder containing DICOM files
+        model: Loaded SwinUNETR model
+        device: 'cuda' or 'cpu'
+        batch_size: Kept for API compatibility (one patient is processed at a time)
+        num_workers: Kept for API compatibility (loading always runs in the calling thread)
+        performance_profile: Optional PerformanceProfile for hardware-optimized settings
+        safety_monitor: Optional SafetyMonitor for resource monitoring and OOM protection
+        extract_demographics: Extract age and gender from DICOM metadata (default True)
+        slice_batcher: Optional AdaptiveSliceBatcher shared across patients
+            (default: a new one sized from performance_profile)
+        tracer: Optional Tracer; when enabled, per-stage durations are added
+            to the result as 't_<stage>_sec' keys
+
+    Returns:
+        dict: {
+            'agatston_score': float,
+            'calcium_volume_mm3': float,
+            'calcium_mass_mg': float,
+            'num_slices': int,
+            'has_calcification': bool,
+            'lesion_count': int,        # Calcified objects contributing to the score
+            'slices_scored': int,       # Axial slices run through the model
+            'patient_age': int or None,
+            'patient_sex': str or None,
+            'is_premature_cad': bool or None,  # Male <55, Female <65
+            'slice_batch_size': float,  # Effective (mean) slice batch size
+            'slice_batch_min': int,     # Smallest batch used after OOM retries
+            'oom_retries': int
+        }
+    """
+    pin_memory = performance_profile.pin_memory if performance_profile else False
+
+    loaded_study = load_dicom_study(dicom_folder_path, extract_demographics, pin_memory,
+                                    tracer=tracer)
+
+    result = run_inference_on_loaded_study(
+        loaded_study, model, device,
+        performance_profile=performance_profile,
+        safety_monitor=safety_monitor,
+        slice_batcher=slice_batcher,
+        tracer=tracer
+    )
+    result.update(tracer.stage_durations(loaded_study['study_name']))
     return result
 
 
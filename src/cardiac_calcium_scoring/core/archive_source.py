@@ -0,0 +1,277 @@
+"""
+压缩包数据源模块
+ZIP/TAR Archive Input Backend
+
+站点常以数百GB的zip包提交队列，过去需要先解压到磁盘才能扫描（占用双倍存储、耗时数小时）。
+本模块把压缩包当作只读目录使用，不向磁盘写入任何内容:
+
+    D:/cohort.zip/P001/IM0001   ->  压缩包 D:/cohort.zip 中的成员 P001/IM0001
+
+- 扫描: 枚举成员（zip读取中央目录；tar顺序读取成员头），含DICOM成员的成员目录即患者目录，
+        返回上述"虚拟路径"，其余流程（患者ID = 目录名、缓存、索引）不变
+- 序列选择: read_dicom(stop_before_pixels=True) 流式读取成员头部，不解压像素
+- 像素: 只读取选中序列的成员，直接交给 pydicom 解码
+
+支持 .zip（任意压缩方式）和未压缩 .tar（按成员偏移随机读取）。.tar.gz 等压缩tar
+无法随机访问成员（每次读取都要从头解压），会给出明确错误，需改用zip或未压缩tar。
+
+压缩包句柄按线程打开（zipfile/文件偏移读取不能跨线程共享），成员列表按进程缓存。
+"""
+
+import io
+import os
+import posixpath
+import re
+import logging
+import tarfile
+import threading
+import zipfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pydicom
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar')
+
+_ARCHIVE_COMPONENT = re.compile(r'\.(zip|tar)([\\/]|$)', re.IGNORECASE)
+
+PREAMBLE_BYTES = 132
+DICM_MAGIC = b'DICM'
+
+
+def has_archive_suffix(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+@lru_cache(maxsize=4096)
+def _is_archive_file(path: str) -> bool:
+    return has_archive_suffix(path) and os.path.isfile(path)
+
+
+def split_archive_path(path) -> Optional[Tuple[str, str]]:
+    """
+    拆分虚拟路径
+
+    Returns:
+        (压缩包路径, 成员路径('/'分隔，压缩包本身为'')); 普通路径返回None
+    """
+    path = os.path.normpath(str(path))
+    if not _ARCHIVE_COMPONENT.search(path):
+        return None
+    parts = path.split(os.sep)
+    for i in range(1, len(parts) + 1):
+        prefix = os.sep.join(parts[:i]) or os.sep
+        if has_archive_suffix(prefix) and _is_archive_file(prefix):
+            return prefix, '/'.join(parts[i:])
+    return None
+
+
+class _MemberWindow(io.RawIOBase):
+    """tar成员：原始文件中 [offset, offset+size) 的只读窗口"""
+
+    def __init__(self, path: str, offset: int, size: int, name: str = ''):
+        self.name = name  # pydicom 读取文件对象的 name 属性
+        self._file = open(path, 'rb')
+        self._start = offset
+        self._size = size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self._size
+        self._pos = max(0, min(pos, self._size))
+        return self._pos
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self._size - self._pos)
+        if n <= 0:
+            return 0
+        self._file.seek(self._start + self._pos)
+        data = self._file.read(n)
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class Archive:
+    """
+    只读压缩包（zip / 未压缩tar）
+
+    成员表: {成员名: (大小, tar数据偏移或-1)}
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.normpath(str(path))
+        self.mtime_ns = os.stat(self.path).st_mtime_ns
+        self.kind = 'zip' if zipfile.is_zipfile(self.path) else 'tar'
+        self.members: Dict[str, Tuple[int, int]] = {}
+        self._names: Dict[str, str] = {}
+        self._local = threading.local()
+        self._read_members()
+        self._children = self._index_directories()
+
+    def _read_members(self):
+        # 成员名按 '/' 规范化（去掉 tar -cf x.tar . 产生的 './' 前缀），原名用于打开
+        if self.kind == 'zip':
+            with zipfile.ZipFile(self.path) as zf:
+                for info in zf.infolist():
+                    if not info.is_dir():
+                        self._add_member(info.filename, info.file_size, -1)
+            return
+        try:
+            with tarfile.open(self.path, 'r:') as tf:
+                for info in tf:
+                    if info.isfile() and not info.issparse():
+                        self._add_member(info.name, info.size, info.offset_data)
+        except tarfile.ReadError as e:
+            raise ValueError(f"{self.path}: only .zip and uncompressed .tar archives can be read in place "
+                             f"(compressed tar members cannot be accessed randomly): {e}") from e
+
+    def _add_member(self, name: str, size: int, offset: int):
+        clean = posixpath.normpath(name.replace('\\', '/')).lstrip('/')
+        self.members[clean] = (size, offset)
+        if clean != name:
+            self._names[clean] = name
+
+    def _index_directories(self) -> Dict[str, List[str]]:
+        children: Dict[str, List[str]] = {}
+        for name in self.members:
+            directory, _, _ = name.rpartition('/')
+            children.setdefault(directory, []).append(name)
+        for names in children.values():
+            names.sort()
+        return children
+
+    def directories(self) -> List[str]:
+        """含文件的成员目录（''为压缩包根）"""
+        return sorted(self._children)
+
+    def files_in(self, directory: str) -> List[str]:
+        """成员目录下的直接成员"""
+        return self._children.get(directory.strip('/'), [])
+
+    def open(self, member: str):
+        """以只读文件对象打开成员（zip流式解压；tar按偏移读取）"""
+        size, offset = self.members[member]
+        if self.kind == 'zip':
+            zf = getattr(self._local, 'zip', None)
+            if zf is None:
+                zf = self._local.zip = zipfile.ZipFile(self.path)
+            return zf.open(self._names.get(member, member))
+        return io.BufferedReader(_MemberWindow(self.path, offset, size, _virtual(self.path, member)))
+
+    def read_head(self, member: str, size: int = PREAMBLE_BYTES) -> bytes:
+        with self.open(member) as f:
+            return f.read(size)
+
+
+_archives: Dict[str, Tuple[int, Archive]] = {}
+_lock = threading.Lock()
+
+
+def get_archive(path) -> Archive:
+    """打开压缩包（成员表按路径+mtime缓存）"""
+    key = os.path.normpath(str(path))
+    mtime = os.stat(key).st_mtime_ns
+    with _lock:
+        cached = _archives.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    archive = Archive(key)
+    with _lock:
+        _archives[key] = (mtime, archive)
+    logger.info(f"Archive {key}: {len(archive.members)} members ({archive.kind})")
+    return archive
+
+
+def _virtual(archive_path: str, member: str) -> str:
+    return os.path.join(archive_path, *member.split('/')) if member else archive_path
+
+
+def _is_dicom_member(archive: Archive, member: str, detection: str) -> bool:
+    name = member.rpartition('/')[2]
+    if name.lower().endswith('.dcm'):
+        return True
+    if detection == 'extension' or name.startswith('.') or name.upper() == 'DICOMDIR':
+        return False
+    try:
+        head = archive.read_head(member)
+    except Exception:
+        return False
+    return len(head) == PREAMBLE_BYTES and head[128:] == DICM_MAGIC
+
+
+def list_archive_dicom_files(folder, detection: str = 'auto') -> List[str]:
+    """
+    虚拟目录下的DICOM成员（虚拟路径，排序）
+
+    识别规则与 dicom_scanner.list_dicom_files 相同（auto: 无 .dcm 时嗅探DICM前导区）
+    """
+    archive_path, directory = split_archive_path(folder)
+    archive = get_archive(archive_path)
+    members = archive.files_in(directory)
+    dcm = [m for m in members if m.lower().endswith('.dcm')]
+    if detection == 'sniff' or (detection == 'auto' and not dcm):
+        dcm += [m for m in members if not m.lower().endswith('.dcm')
+                and _is_dicom_member(archive, m, detection)]
+    return sorted(_virtual(archive_path, m) for m in dcm)
+
+
+def archive_dicom_folders(path, detection: str = 'auto') -> List[Path]:
+    """压缩包中的患者目录（含DICOM成员的成员目录，虚拟路径）"""
+    archive = get_archive(path)
+    folders = []
+    for directory in archive.directories():
+        members = archive.files_in(directory)
+        if any(m.lower().endswith('.dcm') for m in members) or (
+                detection != 'extension' and any(_is_dicom_member(archive, m, detection) for m in members)):
+            folders.append(Path(_virtual(archive.path, directory)))
+    return folders
+
+
+def archive_signature(folder) -> Tuple[int, int]:
+    """(目录下成员数, 压缩包mtime_ns)，与 header_index.folder_signature 同形"""
+    archive_path, directory = split_archive_path(folder)
+    archive = get_archive(archive_path)
+    return len(archive.files_in(directory)), archive.mtime_ns
+
+
+def read_dicom(path, **kwargs):
+    """
+    pydicom.dcmread 的替代：普通文件直接读取，虚拟路径从压缩包成员读取
+
+    stop_before_pixels=True 时只流式读取成员头部
+    """
+    split = split_archive_path(path)
+    if split is None:
+        return pydicom.dcmread(str(path), **kwargs)
+    archive_path, member = split
+    with get_archive(archive_path).open(member) as f:
+        return pydicom.dcmread(f, **kwargs)
+
+
+def file_size(path) -> int:
+    """文件大小（虚拟路径为成员解压后大小）"""
+    split = split_archive_path(path)
+    if split is None:
+        return os.path.getsize(path)
+    archive_path, member = split
+    return get_archive(archive_path).members[member][0]
@@ -0,0 +1,371 @@
+"""
+性能自动调优模块
+Performance Autotuner
+
+在本机上用合成的512x512切片做短时微基准测试，遍历slice_batch_size、
+PyTorch线程数和interop线程数的组合，并把最优配置保存为本机专属的
+配置文件。select_profile_by_hardware() 会优先使用该文件，而不是静态档位表。
+
+说明:
+- torch.set_num_interop_threads() 每个进程只能设置一次，因此每组线程配置
+  都在独立的spawn子进程中测试。
+- 模型权重不影响计算耗时，基准测试使用随机初始化的SwinUNETR。
+"""
+
+import os
+import json
+import time
+import socket
+import hashlib
+import platform
+import logging
+import multiprocessing
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+try:
+    from .adaptive_batching import is_oom_error
+except ImportError:
+    from adaptive_batching import is_oom_error
+
+logger = logging.getLogger(__name__)
+
+# 本机配置文件目录 (config/machine_profiles/<machine_id>.json)
+DEFAULT_PROFILE_DIR = Path(__file__).parent.parent / "config" / "machine_profiles"
+
+# 合成切片尺寸（与模型输入一致）
+SLICE_SHAPE = (512, 512)
+
+# 默认网格
+DEFAULT_CPU_BATCH_SIZES = [1, 2, 4, 8, 12, 16]
+DEFAULT_GPU_BATCH_SIZES = [2, 4, 6, 8, 12, 16]
+DEFAULT_INTEROP_THREADS = [1, 2, 4]
+
+
+@dataclass
+class TrialResult:
+    """单次基准测试结果"""
+    slice_batch_size: int
+    torch_threads: int
+    interop_threads: int
+    slices_per_sec: Optional[float]  # None表示失败（如OOM）
+    error: str = ''
+
+
+@dataclass
+class TunedConfig:
+    """调优后的本机配置"""
+    machine_id: str
+    device: str
+    slice_batch_size: int
+    torch_threads: int
+    interop_threads: int
+    slices_per_sec: float
+    tuned_at: str
+    trials: List[TrialResult] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TunedConfig':
+        trials = [TrialResult(**t) for t in data.get('trials', [])]
+        return cls(
+            machine_id=data['machine_id'],
+            device=data['device'],
+            slice_batch_size=int(data['slice_batch_size']),
+            torch_threads=int(data['torch_threads']),
+            interop_threads=int(data['interop_threads']),
+            slices_per_sec=float(data['slices_per_sec']),
+            tuned_at=data.get('tuned_at', ''),
+            trials=trials,
+        )
+
+
+def machine_fingerprint(hw_info) -> str:
+    """
+    计算本机标识
+
+    相同档位标签的机器实际性能差异很大，因此按主机名+CPU型号+GPU型号区分。
+
+    Args:
+        hw_info: HardwareInfo对象 (来自hardware_profiler)
+
+    Returns:
+        12位十六进制字符串
+    """
+    parts = [
+        socket.gethostname(),
+        platform.system(),
+        hw_info.cpu.cpu_model or '',
+        str(hw_info.cpu.physical_cores),
+        str(hw_info.cpu.logical_cores),
+        hw_info.gpu.device_name if hw_info.gpu.available else 'CPU',
+        f"{hw_info.gpu.vram_total_gb:.0f}",
+    ]
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+
+def get_profile_path(hw_info, profile_dir: Optional[Path] = None) -> Path:
+    """返回本机配置文件路径"""
+    profile_dir = Path(profile_dir) if profile_dir else DEFAULT_PROFILE_DIR
+    return profile_dir / f"{machine_fingerprint(hw_info)}.json"
+
+
+def load_tuned_config(hw_info, device: str,
+                      profile_dir: Optional[Path] = None) -> Optional[TunedConfig]:
+    """
+    读取本机调优配置
+
+    Args:
+        hw_info: HardwareInfo对象
+        device: 'cuda' 或 'cpu'
+        profile_dir: 配置目录 (默认 config/machine_profiles)
+
+    Returns:
+        TunedConfig，若无调优结果则返回None
+    """
+    profile_path = get_profile_path(hw_info, profile_dir)
+    if not profile_path.exists():
+        return None
+
+    try:
+        with open(profile_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        entry = data.get('devices', {}).get(device)
+        if not entry:
+            return None
+        return TunedConfig.from_dict(entry)
+    except Exception as e:
+        logger.warning(f"读取本机调优配置失败 ({profile_path}): {e}")
+        return None
+
+
+def save_tuned_config(hw_info, tuned: TunedConfig,
+                      profile_dir: Optional[Path] = None) -> Path:
+    """
+    保存本机调优配置（同一文件内按device分别保存）
+
+    Returns:
+        配置文件路径
+    """
+    profile_path = get_profile_path(hw_info, profile_dir)
+    profile_path.parent.mkdir(parents=True, exist_ok=True)
+
+    data = {'machine_id': tuned.machine_id, 'hostname': socket.gethostname(), 'devices': {}}
+    if profile_path.exists():
+        try:
+            with open(profile_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            pass
+
+    data.setdefault('devices', {})[tuned.device] = asdict(tuned)
+
+    tmp_path = profile_path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, profile_path)
+
+    return profile_path
+
+
+def default_thread_grid(physical_cores: int) -> List[int]:
+    """根据物理核心数生成torch线程候选值"""
+    cores = max(1, physical_cores)
+    candidates = {max(1, cores // 2), max(1, cores - 1), cores, min(cores, 8)}
+    return sorted(candidates)
+
+
+def _benchmark_worker(device: str, torch_threads: int, interop_threads: int,
+                      batch_sizes: List[int], iterations: int, result_queue):
+    """
+    子进程: 设置线程数后测试各batch size的吞吐量
+
+    必须是模块级函数，以便spawn子进程导入。
+    """
+    trials = []
+    try:
+        import torch
+        from monai.networks.nets import SwinUNETR
+
+        torch.set_num_threads(torch_threads)
+        torch.set_num_interop_threads(interop_threads)
+
+        # 与create_model()相同的网络结构
+        model = SwinUNETR(
+            spatial_dims=2,
+            img_size=SLICE_SHAPE,
+            in_channels=1,
+            out_channels=1,
+            feature_size=96,
+            use_checkpoint=True,
+            drop_rate=0.2,
+        ).to(device)
+        model.eval()
+
+        with torch.no_grad():
+            for bs in batch_sizes:
+                try:
+                    batch = torch.randn(bs, 1, *SLICE_SHAPE, device=device)
+
+                    # 预热
+                    model(batch)
+                    if device == 'cuda':
+                        torch.cuda.synchronize()
+
+                    start = time.perf_counter()
+                    for _ in range(iterations):
+                        model(batch)
+                    if device == 'cuda':
+                        torch.cuda.synchronize()
+                    elapsed = time.perf_counter() - start
+
+                    trials.append(TrialResult(bs, torch_threads, interop_threads,
+                                              bs * iterations / elapsed))
+                    del batch
+                except RuntimeError as e:
+                    if not is_oom_error(e):
+                        raise
+                    trials.append(TrialResult(bs, torch_threads, interop_threads, None, 'OOM'))
+                    if device == 'cuda':
+                        torch.cuda.empty_cache()
+                    # 更大的batch同样会OOM
+                    break
+    except Exception as e:
+        trials.append(TrialResult(0, torch_threads, interop_threads, None, str(e)))
+
+    result_queue.put([asdict(t) for t in trials])
+
+
+def _collect_trials(proc, queue, timeout_sec: float) -> Optional[List[TrialResult]]:
+    """等待子进程结果；子进程异常退出或超时时返回None"""
+    import queue as queue_module
+
+    deadline = time.time() + timeout_sec
+    trials = None
+    try:
+        while time.time() < deadline:
+            try:
+                trials = [TrialResult(**t) for t in queue.get(timeout=1.0)]
+                break
+            except queue_module.Empty:
+                if not proc.is_alive():
+                    break
+    finally:
+        proc.join(timeout=10)
+        if proc.is_alive():
+            proc.terminate()
+            proc.join()
+    return trials
+
+
+def run_autotune(hw_info, device: str,
+                 batch_sizes: Optional[List[int]] = None,
+                 thread_grid: Optional[List[int]] = None,
+                 interop_grid: Optional[List[int]] = None,
+                 iterations: int = 3,
+                 timeout_sec: float = 600.0,
+                 progress_callback=None) -> TunedConfig:
+    """
+    运行自动调优
+
+    Args:
+        hw_info: HardwareInfo对象
+        device: 'cuda' 或 'cpu'
+        batch_sizes: slice_batch_size候选值
+        thread_grid: torch线程数候选值
+        interop_grid: interop线程数候选值
+        iterations: 每个batch size的计时迭代次数
+        timeout_sec: 每个子进程的超时时间
+        progress_callback: 可选回调 callback(done, total, trials)
+
+    Returns:
+        TunedConfig（吞吐量最高的组合）
+
+    Raises:
+        RuntimeError: 所有组合均失败
+    """
+    if batch_sizes is None:
+        batch_sizes = DEFAULT_GPU_BATCH_SIZES if device == 'cuda' else DEFAULT_CPU_BATCH_SIZES
+    if thread_grid is None:
+        if device == 'cuda':
+            # GPU模式下CPU线程影响较小，只测试少量候选
+            thread_grid = [min(max(1, hw_info.cpu.physical_cores), 8)]
+        else:
+            thread_grid = default_thread_grid(hw_info.cpu.physical_cores)
+    if interop_grid is None:
+        interop_grid = DEFAULT_INTEROP_THREADS
+
+    batch_sizes = sorted(set(batch_sizes))
+    combos = [(t, i) for t in thread_grid for i in interop_grid]
+
+    logger.info(f"Autotune: device={device}, batch_sizes={batch_sizes}, "
+                f"threads={thread_grid}, interop={interop_grid}")
+
+    ctx = multiprocessing.get_context('spawn')
+    all_trials: List[TrialResult] = []
+
+    for n, (threads, interop) in enumerate(combos, 1):
+        queue = ctx.Queue()
+        proc = ctx.Process(
+            target=_benchmark_worker,
+            args=(device, threads, interop, batch_sizes, iterations, queue),
+        )
+        proc.start()
+        trials = _collect_trials(proc, queue, timeout_sec)
+        if trials is None:
+            trials = [TrialResult(0, threads, interop, None,
+                                  f"benchmark process exited (code {proc.exitcode})")]
+
+        for t in trials:
+            if t.slices_per_sec is not None:
+                logger.info(f"  threads={threads}, interop={interop}, "
+                            f"batch={t.slice_batch_size}: {t.slices_per_sec:.2f} slices/s")
+            else:
+                logger.info(f"  threads={threads}, interop={interop}, "
+                            f"batch={t.slice_batch_size}: failed ({t.error})")
+
+        all_trials.extend(trials)
+        if progress_callback:
+            progress_callback(n, len(combos), trials)
+
+    successful = [t for t in all_trials if t.slices_per_sec is not None]
+    if not successful:
+        errors = {t.error for t in all_trials if t.error}
+        raise RuntimeError(f"Autotune failed for all configurations: {'; '.join(sorted(errors))}")
+
+    best = max(successful, key=lambda t: t.slices_per_sec)
+
+    tuned = TunedConfig(
+        machine_id=machine_fingerprint(hw_info),
+        device=device,
+        slice_batch_size=best.slice_batch_size,
+        torch_threads=best.torch_threads,
+        interop_threads=best.interop_threads,
+        slices_per_sec=best.slices_per_sec,
+        tuned_at=datetime.now().isoformat(timespec='seconds'),
+        trials=all_trials,
+    )
+
+    logger.info(f"Autotune best: batch={tuned.slice_batch_size}, threads={tuned.torch_threads}, "
+                f"interop={tuned.interop_threads} ({tuned.slices_per_sec:.2f} slices/s)")
+
+    return tuned
+
+
+if __name__ == "__main__":
+    # 测试代码
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    from hardware_profiler import detect_hardware
+
+    hw = detect_hardware()
+    dev = 'cuda' if hw.gpu.available else 'cpu'
+    print(f"本机标识: {machine_fingerprint(hw)}")
+    print(f"配置文件: {get_profile_path(hw)}")
+
+    result = run_autotune(hw, dev, iterations=2)
+    path = save_tuned_config(hw, result)
+    print(f"\n✅ 最优配置: batch={result.slice_batch_size}, threads={result.torch_threads}, "
+          f"interop={result.interop_threads} ({result.slices_per_sec:.2f} slices/s)")
+    print(f"已保存: {path}")
@@ -0,0 +1,202 @@
+"""
+闭环并发控制模块
+Closed-loop Concurrency Controller
+
+根据SafetyMonitor的实时资源状态，在运行时调整三个并发参数:
+- parallel_patients: 同时解码/加载的患者数
+- prefetch_depth: 领先于推理的已加载（或加载中）患者数
+- slice_batch_size: 切片批大小上限（通过AdaptiveSliceBatcher生效）
+
+策略（带迟滞，避免来回振荡）:
+- EMERGENCY: 所有参数立即降到最小值
+- CRITICAL: 每次降一档（RAM压力先降预取深度，再降并行患者数；
+  VRAM压力把切片批上限减半），两次降档之间至少间隔 down_interval_sec
+- WARNING: 保持不变（迟滞区间），并清零SAFE计数
+- SAFE: 连续 scale_up_after 次SAFE，且距上次降档超过 up_cooldown_sec，
+  才升一档（每次只调整一个参数，+1）
+"""
+
+import time
+import logging
+from dataclasses import dataclass, replace
+from typing import Optional
+
+try:
+    from .safety_monitor import SafetyLevel
+except ImportError:
+    from safety_monitor import SafetyLevel
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ConcurrencySettings:
+    """并发参数"""
+    parallel_patients: int
+    prefetch_depth: int
+    slice_batch_size: int
+
+    def describe(self) -> str:
+        return (f"parallel_patients={self.parallel_patients}, "
+                f"prefetch_depth={self.prefetch_depth}, "
+                f"slice_batch_size={self.slice_batch_size}")
+
+
+class ConcurrencyController:
+    """
+    并发控制器
+
+    用法:
+        controller = ConcurrencyController(initial, maximum)
+        for patient in ...:
+            controller.update(safety_monitor.latest_status())
+            settings = controller.settings
+    """
+
+    def __init__(self, initial: ConcurrencySettings, maximum: ConcurrencySettings,
+                 minimum: Optional[ConcurrencySettings] = None,
+                 scale_up_after: int = 3,
+                 down_interval_sec: float = 5.0,
+                 up_cooldown_sec: float = 30.0):
+        """
+        Args:
+            initial: 初始参数
+            maximum: 各参数上限
+            minimum: 各参数下限（默认 1/0/1）
+            scale_up_after: 连续多少次SAFE后升一档
+            down_interval_sec: 两次CRITICAL降档之间的最小间隔（秒）
+            up_cooldown_sec: 降档后多久才允许升档（秒）
+        """
+        self.minimum = minimum or ConcurrencySettings(1, 0, 1)
+        self.maximum = ConcurrencySettings(
+            parallel_patients=max(self.minimum.parallel_patients, maximum.parallel_patients),
+            prefetch_depth=max(self.minimum.prefetch_depth, maximum.prefetch_depth),
+            slice_batch_size=max(self.minimum.slice_batch_size, maximum.slice_batch_size),
+        )
+        self.settings = self._clamp(initial)
+
+        self.scale_up_after = max(1, scale_up_after)
+        self.down_interval_sec = down_interval_sec
+        self.up_cooldown_sec = up_cooldown_sec
+
+        self._safe_streak = 0
+        self._last_downgrade = float('-inf')
+        self.num_downgrades = 0
+        self.num_upgrades = 0
+
+    def _clamp(self, s: ConcurrencySettings) -> ConcurrencySettings:
+        lo, hi = self.minimum, self.maximum
+        return ConcurrencySettings(
+            parallel_patients=min(max(s.parallel_patients, lo.parallel_patients), hi.parallel_patients),
+            prefetch_depth=min(max(s.prefetch_depth, lo.prefetch_depth), hi.prefetch_depth),
+            slice_batch_size=min(max(s.slice_batch_size, lo.slice_batch_size), hi.slice_batch_size),
+        )
+
+    def update(self, status, now: Optional[float] = None) -> bool:
+        """
+        根据资源状态调整参数
+
+        Args:
+            status: SafetyMonitor返回的ResourceStatus
+            now: 当前时间（测试用，默认time.monotonic()）
+
+        Returns:
+            True 表示参数发生了变化
+        """
+        now = time.monotonic() if now is None else now
+        level = status.overall_level
+
+        if level == SafetyLevel.EMERGENCY:
+            self._safe_streak = 0
+            return self._apply(self.minimum, now, downgrade=True, reason="EMERGENCY")
+
+        if level == SafetyLevel.CRITICAL:
+            self._safe_streak = 0
+            if now - self._last_downgrade < self.down_interval_sec:
+                return False
+            return self._apply(self._step_down(status), now, downgrade=True, reason="CRITICAL")
+
+        if level == SafetyLevel.WARNING:
+            self._safe_streak = 0
+            return False
+
+        self._safe_streak += 1
+        if self._safe_streak < self.scale_up_after:
+            return False
+        if now - self._last_downgrade < self.up_cooldown_sec:
+            return False
+
+        self._safe_streak = 0
+        return self._apply(self._step_up(), now, downgrade=False, reason="SAFE")
+
+    def _step_down(self, status) -> ConcurrencySettings:
+        s = self.settings
+        if status.vram_level in (SafetyLevel.CRITICAL, SafetyLevel.EMERGENCY):
+            s = replace(s, slice_batch_size=s.slice_batch_size // 2)
+        if status.ram_level in (SafetyLevel.CRITICAL, SafetyLevel.EMERGENCY):
+            # 预取的患者体数据最占内存，先减少预取，其次减少并行加载
+            if s.prefetch_depth > self.minimum.prefetch_depth:
+                s = replace(s, prefetch_depth=s.prefetch_depth - 1)
+            elif s.parallel_patients > self.minimum.parallel_patients:
+                s = replace(s, parallel_patients=s.parallel_patients - 1)
+            else:
+                s = replace(s, slice_batch_size=s.slice_batch_size // 2)
+        return self._clamp(s)
+
+    def _step_up(self) -> ConcurrencySettings:
+        # 与降档顺序相反：先恢复切片批，再并行患者数，最后预取深度
+        s, hi = self.settings, self.maximum
+        if s.slice_batch_size < hi.slice_batch_size:
+            return replace(s, slice_batch_size=s.slice_batch_size + 1)
+        if s.parallel_patients < hi.parallel_patients:
+            return replace(s, parallel_patients=s.parallel_patients + 1)
+        if s.prefetch_depth < hi.prefetch_depth:
+            return replace(s, prefetch_depth=s.prefetch_depth + 1)
+        return s
+
+    def _apply(self, new: ConcurrencySettings, now: float, downgrade: bool, reason: str) -> bool:
+        new = self._clamp(new)
+        if new == self.settings:
+            return False
+
+        old, self.settings = self.settings, new
+        if downgrade:
+            self._last_downgrade = now
+            self.num_downgrades += 1
+            logger.warning(f"Concurrency scaled down ({reason}): {new.describe()}")
+        else:
+            self.num_upgrades += 1
+            logger.info(f"Concurrency scaled up: {new.describe()}")
+        logger.debug(f"Concurrency was: {old.describe()}")
+        return True
+
+
+if __name__ == "__main__":
+    # 测试代码
+    from types import SimpleNamespace
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    def fake_status(level, ram=None, vram=SafetyLevel.SAFE):
+        return SimpleNamespace(overall_level=level, ram_level=ram or level, vram_level=vram)
+
+    controller = ConcurrencyController(
+        initial=ConcurrencySettings(2, 2, 8),
+        maximum=ConcurrencySettings(2, 2, 8),
+        scale_up_after=2, down_interval_sec=1.0, up_cooldown_sec=5.0,
+    )
+    timeline = [
+        (0, fake_status(SafetyLevel.CRITICAL)),
+        (0.5, fake_status(SafetyLevel.CRITICAL)),   # 间隔不足，不再降档
+        (2, fake_status(SafetyLevel.CRITICAL)),
+        (3, fake_status(SafetyLevel.WARNING)),      # 迟滞区间
+        (4, fake_status(SafetyLevel.SAFE)),
+        (5, fake_status(SafetyLevel.SAFE)),         # 冷却中
+        (8, fake_status(SafetyLevel.SAFE)),
+        (9, fake_status(SafetyLevel.SAFE)),
+        (10, fake_status(SafetyLevel.SAFE)),
+        (11, fake_status(SafetyLevel.SAFE)),
+    ]
+    for t, st in timeline:
+        controller.update(st, now=t)
+        print(f"t={t:>4}: {st.overall_level.value:<9} -> {controller.settings.describe()}")
@@ -0,0 +1,341 @@
+"""
+DICOM目录扫描模块
+Parallel DICOM Directory Scanner
+
+原扫描方式对每个目录调用 Path.iterdir() + list(glob('*.dcm'))，仅为判断"是否含DICOM"
+就物化完整文件列表；之后序列选择和人口学信息提取又各自再遍历一次同一目录。
+在SMB挂载的归档上（每次目录枚举都是网络往返），1万例患者的扫描需要数分钟。
+
+本模块:
+- 基于 os.scandir（目录项自带文件类型，无需逐个stat）
+- 按层级把子目录分发到线程池并行枚举（网络共享上延迟可重叠）
+- 只需判断时（collect_files=False）在第一个 .dcm 处停止枚举
+- 需要文件列表时一次枚举即返回排序后的路径，
+  可直接传给 identify_dicom_series(files=...)，避免重复遍历
+
+DICOM识别（detection）:
+- extension: 只认 .dcm 扩展名（原行为）
+- auto:      有 .dcm 文件时同 extension；目录中没有 .dcm 时读取其他文件的
+             前132字节，按 Part 10 前导区 "DICM" 标记识别（无扩展名、.IMA 等导出）
+- sniff:     .dcm 之外的文件一律嗅探
+嗅探只读132字节，不做完整解析；DICOMDIR 和常见非DICOM扩展名直接跳过。
+没有前导区的旧格式文件（ACR-NEMA）与 pydicom 默认行为一致，不被识别。
+
+目录约定与原实现一致：含DICOM文件的目录即患者目录（不再向下递归），
+否则向下最多 max_depth 层（data/组/患者）。遇到含DICOMDIR的目录时，
+患者目录直接取自DICOMDIR中的检查记录（见 dicomdir.py），不再向下枚举。
+.zip / .tar 压缩包（包括 data_dir 本身）按只读目录处理，患者目录为
+压缩包内的虚拟路径（见 archive_source.py）。
+"""
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    from .dicomdir import load_dicomdir
+    from .archive_source import (archive_dicom_folders, has_archive_suffix,
+                                 list_archive_dicom_files, split_archive_path)
+except ImportError:
+    from dicomdir import load_dicomdir
+    from archive_source import (archive_dicom_folders, has_archive_suffix,
+                                list_archive_dicom_files, split_archive_path)
+
+logger = logging.getLogger(__name__)
+
+DICOM_SUFFIX = '.dcm'
+DETECTION_MODES = ('extension', 'auto', 'sniff')
+
+PREAMBLE_BYTES = 132
+DICM_MAGIC = b'DICM'
+
+# 导出目录中常见的非DICOM文件，不打开
+NON_DICOM_SUFFIXES = frozenset({
+    '.txt', '.xml', '.json', '.csv', '.htm', '.html', '.pdf', '.ini', '.log',
+    '.jpg', '.jpeg', '.png', '.bmp', '.gif', '.zip', '.exe', '.dll', '.db', '.md5',
+})
+
+
+@dataclass
+class DicomFolder:
+    """扫描结果：一个患者目录"""
+    path: Path
+    files: Optional[List[str]] = None   # collect_files=True 时为排序后的DICOM文件路径
+
+
+def _check_detection(detection: str):
+    if detection not in DETECTION_MODES:
+        raise ValueError(f"Unknown DICOM detection '{detection}' (choose from: {', '.join(DETECTION_MODES)})")
+
+
+def _has_dicom_suffix(name: str) -> bool:
+    return name.lower().endswith(DICOM_SUFFIX)
+
+
+def _is_sniff_candidate(name: str) -> bool:
+    if name.startswith('.') or name.upper() == 'DICOMDIR':
+        return False
+    return os.path.splitext(name)[1].lower() not in NON_DICOM_SUFFIXES
+
+
+def has_dicom_preamble(path: str) -> bool:
+    """读取前132字节，检查偏移128处的 "DICM" 标记"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(PREAMBLE_BYTES)
+    except OSError:
+        return False
+    return len(head) == PREAMBLE_BYTES and head[128:] == DICM_MAGIC
+
+
+def sniff_dicom_files(paths: Sequence[str], max_workers: int = 8) -> List[str]:
+    """
+    批量嗅探：返回带DICM前导区的文件（保持输入顺序）
+
+    文件打开延迟在网络共享上占主导，因此用线程池并发读取
+    """
+    if not paths:
+        return []
+    if max_workers <= 1 or len(paths) < 2:
+        return [p for p in paths if has_dicom_preamble(p)]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paths)),
+                            thread_name_prefix='DicomSniff') as pool:
+        return [p for p, ok in zip(paths, pool.map(has_dicom_preamble, paths)) if ok]
+
+
+def _is_dicomdir(name: str) -> bool:
+    return name.upper() == 'DICOMDIR'
+
+
+class _Listing(NamedTuple):
+    """一个目录的枚举结果"""
+    has_dicom: bool
+    files: List[str]              # DICOM文件（仅collect_files）
+    subdirs: List[str]            # 子目录（仅不含DICOM时）
+    dicomdir: Optional[str] = None
+    archives: Tuple[str, ...] = ()
+
+
+def _split_entries(directory) -> Tuple[List[str], List[str], List[str], Optional[str], List[str]]:
+    """一次 scandir：(.dcm文件, 其他可嗅探文件, 子目录, DICOMDIR路径, 压缩包)"""
+    dcm: List[str] = []
+    others: List[str] = []
+    subdirs: List[str] = []
+    archives: List[str] = []
+    dicomdir: Optional[str] = None
+    with os.scandir(directory) as it:
+        for entry in it:
+            if _is_dicomdir(entry.name) and entry.is_file():
+                dicomdir = entry.path
+            elif has_archive_suffix(entry.name) and entry.is_file():
+                archives.append(entry.path)
+            elif entry.is_dir():
+                subdirs.append(entry.path)
+            elif _has_dicom_suffix(entry.name):
+                if entry.is_file():
+                    dcm.append(entry.path)
+            elif _is_sniff_candidate(entry.name) and entry.is_file():
+                others.append(entry.path)
+    return dcm, others, subdirs, dicomdir, archives
+
+
+def list_dicom_files(folder: Path, detection: str = 'auto', max_workers: int = 8) -> List[str]:
+    """
+    列出目录下的DICOM文件（不递归，排序后的完整路径）
+
+    Args:
+        folder: 目录
+        detection: extension / auto / sniff（见模块说明）
+        max_workers: 嗅探线程数
+    """
+    _check_detection(detection)
+    if split_archive_path(folder) is not None:
+        return list_archive_dicom_files(folder, detection)
+    dcm, others, _, _, _ = _split_entries(folder)
+    if detection == 'sniff' or (detection == 'auto' and not dcm):
+        dcm += sniff_dicom_files(others, max_workers)
+    return sorted(dcm)
+
+
+def has_dicom_files(folder: Path, detection: str = 'auto') -> bool:
+    """目录下是否有DICOM文件（在第一个匹配处停止）"""
+    if split_archive_path(folder) is not None:
+        return bool(list_archive_dicom_files(folder, detection))
+    return _visit(str(folder), False, detection).has_dicom
+
+
+def _visit(directory: str, collect_files: bool, detection: str = 'auto') -> _Listing:
+    """枚举一个目录"""
+    if not collect_files and detection != 'sniff':
+        # 只判断：在第一个 .dcm 处停止枚举
+        others: List[str] = []
+        subdirs: List[str] = []
+        archives: List[str] = []
+        dicomdir: Optional[str] = None
+        with os.scandir(directory) as it:
+            for entry in it:
+                if _has_dicom_suffix(entry.name) and entry.is_file():
+                    return _Listing(True, [], [])
+                if _is_dicomdir(entry.name) and entry.is_file():
+                    dicomdir = entry.path
+                elif has_archive_suffix(entry.name) and entry.is_file():
+                    archives.append(entry.path)
+                elif entry.is_dir():
+                    subdirs.append(entry.path)
+                elif detection == 'auto' and _is_sniff_candidate(entry.name) and entry.is_file():
+                    others.append(entry.path)
+        # 没有 .dcm：逐个嗅探，找到一个即停止（本函数已在扫描线程池中运行）
+        if any(has_dicom_preamble(p) for p in others):
+            return _Listing(True, [], [], dicomdir, tuple(archives))
+        return _Listing(False, [], subdirs, dicomdir, tuple(archives))
+
+    dcm, others, subdirs, dicomdir, archives = _split_entries(directory)
+    if detection == 'sniff' or (detection == 'auto' and not dcm):
+        dcm += [p for p in others if has_dicom_preamble(p)]
+    if dcm:
+        return _Listing(True, sorted(dcm) if collect_files else [], [], dicomdir, tuple(archives))
+    return _Listing(False, [], subdirs, dicomdir, tuple(archives))
+
+
+class DicomScanner:
+    """
+    并行DICOM目录扫描器
+
+    用法:
+        folders = DicomScanner(max_depth=2, max_workers=8).scan(data_dir)
+        paths = [f.path for f in folders]
+    """
+
+    def __init__(self, max_depth: int = 2, max_workers: int = 8, collect_files: bool = False,
+                 detection: str = 'auto'):
+        """
+        Args:
+            max_depth: 向下扫描的最大层数（2 = data/组/子组/患者）
+            max_workers: 枚举线程数（本地磁盘1-2即可，网络共享可设8-32）
+            collect_files: 是否同时返回每个患者目录的DICOM文件列表
+            detection: DICOM识别方式 extension / auto / sniff
+        """
+        _check_detection(detection)
+        self.detection = detection
+        self.max_depth = max_depth
+        self.max_workers = max(1, max_workers)
+        self.collect_files = collect_files
+        self.directories_visited = 0
+        self.errors: List[Tuple[str, str]] = []
+
+    def scan(self, root: Path) -> List[DicomFolder]:
+        """
+        扫描root下的患者目录（root本身不作为患者目录）
+
+        Returns:
+            按路径排序的 DicomFolder 列表
+        """
+        root = Path(root)
+        found: List[DicomFolder] = []
+        if has_archive_suffix(root.name) and root.is_file():
+            # data_dir 本身就是压缩包
+            self._add_archive(str(root), found)
+            return sorted(found, key=lambda f: f.path)
+        try:
+            frontier, root_dicomdir, root_archives = self._subdirs(str(root))
+        except OSError as e:
+            self.errors.append((str(root), str(e)))
+            logger.error(f"Cannot list {root}: {e}")
+            return found
+        if root_dicomdir and self._add_dicomdir(root_dicomdir, found):
+            return sorted(found, key=lambda f: f.path)
+        for archive in root_archives:
+            self._add_archive(archive, found)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='DicomScan') as pool:
+            depth = 0
+            while frontier and depth <= self.max_depth:
+                next_frontier: List[str] = []
+                for directory, outcome in zip(frontier, pool.map(self._visit_safe, frontier)):
+                    self.directories_visited += 1
+                    if outcome is None:
+                        continue
+                    has_dicom, files, subdirs, dicomdir, archives = outcome
+                    for archive in archives:
+                        self._add_archive(archive, found)
+                    if dicomdir and self._add_dicomdir(dicomdir, found):
+                        continue
+                    if has_dicom:
+                        found.append(DicomFolder(Path(directory), files if self.collect_files else None))
+                        logger.debug(f"Found DICOM folder: {Path(directory).relative_to(root)}"
+                                     + (f" ({len(files)} files)" if self.collect_files else ""))
+                    else:
+                        next_frontier.extend(subdirs)
+                frontier = next_frontier
+                depth += 1
+
+        if self.errors:
+            logger.warning(f"{len(self.errors)} director{'y' if len(self.errors) == 1 else 'ies'} "
+                           f"could not be read (first: {self.errors[0][0]}: {self.errors[0][1]})")
+        return sorted(found, key=lambda f: f.path)
+
+    @staticmethod
+    def _subdirs(directory: str) -> Tuple[List[str], Optional[str], List[str]]:
+        subdirs: List[str] = []
+        archives: List[str] = []
+        dicomdir: Optional[str] = None
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir():
+                    subdirs.append(entry.path)
+                elif _is_dicomdir(entry.name) and entry.is_file():
+                    dicomdir = entry.path
+                elif has_archive_suffix(entry.name) and entry.is_file():
+                    archives.append(entry.path)
+        return subdirs, dicomdir, archives
+
+    def _add_archive(self, path: str, found: List[DicomFolder]):
+        """添加压缩包中的患者目录（虚拟路径）"""
+        try:
+            folders = archive_dicom_folders(path, self.detection)
+        except Exception as e:
+            self.errors.append((path, str(e)))
+            return
+        for folder in folders:
+            files = list_archive_dicom_files(folder, self.detection) if self.collect_files else None
+            found.append(DicomFolder(folder, files))
+        logger.debug(f"Archive {path}: {len(folders)} patient folder(s)")
+
+    def _add_dicomdir(self, path: str, found: List[DicomFolder]) -> bool:
+        """
+        按DICOMDIR中的检查记录添加患者目录（该目录不再向下枚举）
+
+        Returns:
+            False表示DICOMDIR不可用（不可读或无法按目录区分患者），按普通目录处理
+        """
+        try:
+            dicomdir = load_dicomdir(Path(path))
+        except Exception as e:
+            self.errors.append((path, str(e)))
+            return False
+        folders = dicomdir.study_folders()
+        if not folders:
+            return False
+        for folder, series_uids in folders.items():
+            files = (sorted(f for uid in series_uids for f in dicomdir.series[uid].files)
+                     if self.collect_files else None)
+            found.append(DicomFolder(Path(folder), files))
+        logger.debug(f"DICOMDIR {path}: {len(folders)} patient folder(s)")
+        return True
+
+    def _visit_safe(self, directory: str):
+        try:
+            return _visit(directory, self.collect_files, self.detection)
+        except OSError as e:
+            # 权限不足/网络中断的目录跳过，不中断整个扫描
+            self.errors.append((directory, str(e)))
+            return None
+
+
+def scan_dicom_tree(root: Path, max_depth: int = 2, max_workers: int = 8,
+                    detection: str = 'auto') -> List[Path]:
+    """便捷函数：返回排序后的患者目录路径"""
+    return [f.path for f in DicomScanner(max_depth, max_workers, detection=detection).scan(root)]
@@ -10,25 +10,44 @@ Key Features:
 - Primary: Select series with 4-6mm slice thickness
 - Fallback: If no 4-6mm series, select the series with fewest files (likely thick slice)
 - No dependency on Series Description keywords (works with empty descriptions)
+- Patient/study metadata (age, sex, dates) is collected from the headers read for
+  series identification, so demographics need no extra directory walk or file read
 
 Author: NB10 Windows Tool
 Version: 1.0.0
 Date: 2025-10-14
 """
 
-import pydicom
+import os
 from pathlib import Path
 from collections import defaultdict
 from typing import Dict, List, Tuple, Optional
 
-
-def identify_dicom_series(dicom_dir: Path, sample_size: int = 20) -> Dict:
+try:
+    from .tracing import NULL_TRACER
+    from .dicom_scanner import list_dicom_files
+    from .dicomdir import find_dicomdir, series_info_for
+    from .archive_source import read_dicom
+    from .study_metadata import METADATA_TAGS, StudyMetadata
+except ImportError:
+    from tracing import NULL_TRACER
+    from dicom_scanner import list_dicom_files
+    from dicomdir import find_dicomdir, series_info_for
+    from archive_source import read_dicom
+    from study_metadata import METADATA_TAGS, StudyMetadata
+
+
+def identify_dicom_series(dicom_dir: Path, sample_size: int = 20, tracer=NULL_TRACER,
+                          files: Optional[List[str]] = None) -> Dict:
     """
     Identify all DICOM series in a directory and extract metadata.
 
     Args:
         dicom_dir: Directory containing DICOM files
         sample_size: Number of files to sample for metadata extraction
+        tracer: Optional Tracer for per-stage timing (see tracing.py)
+        files: DICOM paths already listed by the caller (see dicom_scanner.py);
+               the directory is not enumerated again
 
     Returns:
         Dictionary mapping SeriesInstanceUID to series info:
@@ -37,46 +56,67 @@ def identify_dicom_series(dicom_dir: Path, sample_size: int = 20) -> Dict:
                 'files': [list of file paths],
                 'thickness': float,
                 'description': str,
-                'positions': [list of Z positions]
+                'positions': [list of Z positions],
+                'metadata': StudyMetadata (patient/study tags of the first file)
             }
         }
     """
-    dcm_files = list(Path(dicom_dir).glob("*.dcm"))
-
-    if len(dcm_files) == 0:
-        return {}
-
     series_info = defaultdict(lambda: {
         'files': [],
         'thickness': None,
         'description': None,
-        'positions': []
+        'positions': [],
+        'metadata': None
     })
 
+    # A DICOMDIR (in this folder or up to 3 levels above) already lists the series,
+    # files and often slice positions; only files it does not cover are opened below
+    covered = set()
+    dicomdir = find_dicomdir(Path(dicom_dir))
+    if dicomdir is not None:
+        with tracer.span('dicomdir'):
+            series_info.update(series_info_for(dicomdir, Path(dicom_dir)))
+            covered = set(dicomdir.files_under(Path(dicom_dir)))
+
+    if files is not None:
+        dcm_files = files
+    else:
+        with tracer.span('file_scan'):
+            dcm_files = list_dicom_files(Path(dicom_dir))
+    if covered:
+        dcm_files = [f for f in dcm_files if os.path.normpath(str(f)) not in covered]
+
+    if len(dcm_files) == 0:
+        return dict(series_info)
+
     # PERFORMANCE FIX: Single-pass reading - collect files and metadata in one loop
     # Previously: Read sample for metadata, then read ALL files again for positions
     # This was causing severe performance degradation on repeated runs
-    for dcm_file in dcm_files:
-        try:
-            ds = pydicom.dcmread(str(dcm_file), stop_before_pixels=True)
-            series_uid = getattr(ds, 'SeriesInstanceUID', 'Unknown')
+    with tracer.span('header_parse', files=len(dcm_files)):
+        for dcm_file in dcm_files:
+            try:
+                ds = read_dicom(dcm_file, stop_before_pixels=True)
+                series_uid = getattr(ds, 'SeriesInstanceUID', 'Unknown')
 
-            # Extract metadata from first file of each series
-            if series_info[series_uid]['thickness'] is None:
-                thickness = getattr(ds, 'SliceThickness', None)
-                if thickness is not None:
-                    series_info[series_uid]['thickness'] = float(thickness)
+                # Extract metadata from first file of each series
+                if series_info[series_uid]['thickness'] is None:
+                    thickness = getattr(ds, 'SliceThickness', None)
+                    if thickness is not None:
+                        series_info[series_uid]['thickness'] = float(thickness)
 
-                series_info[series_uid]['description'] = getattr(ds, 'SeriesDescription', '')
+                    series_info[series_uid]['description'] = getattr(ds, 'SeriesDescription', '')
 
-            # Get Z position from ImagePositionPatient
-            ipp = getattr(ds, 'ImagePositionPatient', None)
-            if ipp:
-                series_info[series_uid]['positions'].append(float(ipp[2]))
+                if series_info[series_uid]['metadata'] is None:
+                    series_info[series_uid]['metadata'] = StudyMetadata.from_dataset(ds)
 
-            series_info[series_uid]['files'].append(str(dcm_file))
-        except Exception:
-            continue
+                # Get Z position from ImagePositionPatient
+                ipp = getattr(ds, 'ImagePositionPatient', None)
+                if ipp:
+                    series_info[series_uid]['positions'].append(float(ipp[2]))
+
+                series_info[series_uid]['files'].append(str(dcm_file))
+            except Exception:
+                continue
 
     return dict(series_info)
 
@@ -141,7 +181,65 @@ def select_best_series(series_info: Dict) -> Tuple[List[str], List[float], str]:
     return selected['files'], selected['positions'], message
 
 
-def prepare_dicom_for_aicac(dicom_folder: Path) -> Optional[Dict]:
+def study_metadata(series_info: Dict, selected_files: Optional[List[str]] = None) -> StudyMetadata:
+    """
+    Patient/study metadata from identify_dicom_series() results (no file access).
+
+    The selected series is preferred; fields it lacks are filled in from the other
+    series of the folder.
+
+    Args:
+        series_info: Dictionary from identify_dicom_series()
+        selected_files: File list returned by select_best_series(), if any
+
+    Returns:
+        StudyMetadata (empty if no header carried patient/study tags)
+    """
+    ordered = sorted(series_info.values(), key=lambda info: info['files'] is not selected_files)
+    metadata = StudyMetadata()
+    for info in ordered:
+        metadata = metadata.merge(info.get('metadata'))
+    return metadata
+
+
+def read_study_metadata(dicom_folder: Path, files: Optional[List[str]] = None) -> StudyMetadata:
+    """
+    Patient/study metadata for callers that do not run series selection.
+
+    Reads the DICOMDIR records when the folder has one, otherwise the header of the
+    first readable DICOM file (metadata tags only). The folder is listed
+    non-recursively (see dicom_scanner.py) unless files are given.
+
+    Args:
+        dicom_folder: Path to patient's DICOM folder
+        files: Optional pre-listed DICOM paths
+
+    Returns:
+        StudyMetadata (empty if no header could be read)
+    """
+    metadata = StudyMetadata()
+    dicomdir = find_dicomdir(Path(dicom_folder))
+    if dicomdir is not None:
+        for series in dicomdir.series_under(Path(dicom_folder)):
+            metadata = metadata.merge(series.metadata)
+        if metadata.has_demographics:
+            return metadata
+        if files is None:
+            files = dicomdir.files_under(Path(dicom_folder))
+
+    if files is None:
+        files = list_dicom_files(Path(dicom_folder))
+    for dcm_file in files:
+        try:
+            ds = read_dicom(dcm_file, stop_before_pixels=True, specific_tags=METADATA_TAGS)
+        except Exception:
+            continue
+        return metadata.merge(StudyMetadata.from_dataset(ds))
+    return metadata
+
+
+def prepare_dicom_for_aicac(dicom_folder: Path, tracer=NULL_TRACER,
+                            files: Optional[List[str]] = None) -> Optional[Dict]:
     """
     Prepare DICOM data for AI-CAC inference.
 
@@ -150,26 +248,33 @@ def prepare_dicom_for_aicac(dicom_folder: Path) -> Optional[Dict]:
 
     Args:
         dicom_folder: Path to patient's DICOM folder
+        tracer: Optional Tracer for per-stage timing (see tracing.py)
+        files: Optional pre-listed DICOM paths (passed to identify_dicom_series)
 
     Returns:
         Dictionary with:
         {
             'file_paths': [sorted list of DICOM file paths],
             'axial_positions': [corresponding Z positions],
-            'selection_info': str (description of selection)
+            'selection_info': str (description of selection),
+            'num_files': int,
+            'metadata': StudyMetadata (patient/study tags, see study_metadata())
         }
         Or None if no suitable series found.
     """
-    series_info = identify_dicom_series(dicom_folder)
+    series_info = identify_dicom_series(dicom_folder, tracer=tracer, files=files)
 
     if not series_info:
         return None
 
-    files, positions, message = select_best_series(series_info)
+    with tracer.span('series_select'):
+        files, positions, message = select_best_series(series_info)
 
     if not files:
         return None
 
+    metadata = study_metadata(series_info, files)
+
     # Sort by axial position
     sorted_pairs = sorted(zip(files, positions), key=lambda x: x[1])
     sorted_files = [fp for fp, _ in sorted_pairs]
@@ -179,7 +284,8 @@ def prepare_dicom_for_aicac(dicom_folder: Path) -> Optional[Dict]:
         'file_paths': sorted_files,
         'axial_positions': sorted_positions,
         'selection_info': message,
-        'num_files': len(sorted_files)
+        'num_files': len(sorted_files),
+        'metadata': metadata
     }
 
 
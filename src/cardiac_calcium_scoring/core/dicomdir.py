@@ -0,0 +1,286 @@
+"""
+DICOMDIR读取模块
+DICOMDIR-driven Series Identification
+
+CD/DVD式导出（PT000000/ST000000/SE000000/IM000000 + 根目录DICOMDIR）中，
+DICOMDIR 已列出每个患者、检查、序列和图像（文件ID、传输语法，常含层位置）。
+有DICOMDIR时:
+
+- 扫描: 每个检查（STUDY记录）的文件所在的公共目录即一个患者目录，
+        整个导出只读一个文件即可列出全部患者（不逐目录枚举、不嗅探）
+- 序列识别: identify_dicom_series() 直接使用记录中的序列/文件/位置；
+        只有记录未覆盖的信息（缺层厚的序列读取1个文件头，缺位置的图像读取其文件头）
+        以及目录中未被DICOMDIR引用的文件才回退到逐文件读取头信息
+- 规划: 头信息索引用记录中的切片数和传输语法，每个序列最多读取1个文件头
+
+解析结果按 (路径, mtime) 缓存在进程内，多个患者共享同一次解析。
+"""
+
+import os
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pydicom
+from pydicom.fileset import FileSet
+
+try:
+    from .study_metadata import METADATA_TAGS, StudyMetadata
+except ImportError:
+    from study_metadata import METADATA_TAGS, StudyMetadata
+
+logger = logging.getLogger(__name__)
+
+DICOMDIR_NAMES = ('DICOMDIR', 'dicomdir')
+
+# 在患者目录及其上几级目录中查找DICOMDIR（根/PT/ST/SE）
+SEARCH_PARENTS = 3
+
+_HEADER_TAGS = ['SliceThickness', 'SeriesDescription', 'ImagePositionPatient']
+
+
+@dataclass
+class DicomdirSeries:
+    """DICOMDIR中的一个序列"""
+    series_uid: str
+    study_uid: str
+    patient_id: str
+    description: str = ''
+    thickness: Optional[float] = None
+    transfer_syntax: str = ''
+    files: List[str] = field(default_factory=list)
+    positions: List[Optional[float]] = field(default_factory=list)
+    metadata: StudyMetadata = field(default_factory=StudyMetadata)  # 来自PATIENT/STUDY记录
+
+    @property
+    def folder(self) -> str:
+        return os.path.commonpath([os.path.dirname(f) for f in self.files]) if self.files else ''
+
+
+def _position(instance) -> Optional[float]:
+    if 'ImagePositionPatient' in instance:
+        ipp = instance.ImagePositionPatient
+        if ipp and len(ipp) == 3:
+            return float(ipp[2])
+    if 'SliceLocation' in instance and instance.SliceLocation not in (None, ''):
+        return float(instance.SliceLocation)
+    return None
+
+
+def _is_under(path: str, folder: str) -> bool:
+    return path == folder or path.startswith(folder.rstrip(os.sep) + os.sep)
+
+
+class Dicomdir:
+    """已解析的DICOMDIR"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.root = str(self.path.parent)
+        self.mtime_ns = os.stat(self.path).st_mtime_ns
+        self.series: Dict[str, DicomdirSeries] = {}
+        self.studies: Dict[str, List[str]] = {}
+        self._parse()
+        self._series_folders = {uid: s.folder for uid, s in self.series.items()}
+        self._folders = self._map_study_folders()
+
+    def _parse(self):
+        file_set = FileSet(pydicom.dcmread(str(self.path)))
+        for instance in file_set:
+            if 'SeriesInstanceUID' not in instance:
+                continue
+            series_uid = str(instance.SeriesInstanceUID)
+            series = self.series.get(series_uid)
+            if series is None:
+                study_uid = str(getattr(instance, 'StudyInstanceUID', '') or series_uid)
+                series = DicomdirSeries(
+                    series_uid=series_uid,
+                    study_uid=study_uid,
+                    patient_id=str(getattr(instance, 'PatientID', '') or ''),
+                    description=str(getattr(instance, 'SeriesDescription', '') or ''),
+                    transfer_syntax=str(getattr(instance, 'ReferencedTransferSyntaxUIDInFile', '') or ''),
+                    metadata=StudyMetadata.from_dataset(instance),
+                )
+                self.series[series_uid] = series
+                self.studies.setdefault(study_uid, []).append(series_uid)
+            if series.thickness is None and 'SliceThickness' in instance and instance.SliceThickness:
+                series.thickness = float(instance.SliceThickness)
+            series.files.append(os.path.normpath(instance.path))
+            series.positions.append(_position(instance))
+
+    def _map_study_folders(self) -> Dict[str, List[str]]:
+        """
+        检查 -> 患者目录；多个检查落在同一目录时合并
+
+        从检查文件的公共目录（常为 SE000000）向上取到只含该患者图像的最高一级
+        （如 PT000000），使患者目录名可区分患者。导出把多个患者的图像平铺在
+        同一目录时无法按目录区分患者，这些检查不映射。
+        """
+        study_dirs: Dict[str, str] = {}
+        owners: Dict[str, set] = {}
+        for study_uid, series_uids in self.studies.items():
+            files = [f for uid in series_uids for f in self.series[uid].files]
+            folder = os.path.commonpath([os.path.dirname(f) for f in files])
+            study_dirs[study_uid] = folder
+            patient_id = self.series[series_uids[0]].patient_id
+            current = folder
+            while True:
+                owners.setdefault(current, set()).add(patient_id)
+                if not _is_under(current, self.root) or current == self.root:
+                    break
+                current = os.path.dirname(current)
+
+        folders: Dict[str, List[str]] = {}
+        shared = 0
+        for study_uid, folder in study_dirs.items():
+            if len(owners[folder]) > 1:
+                shared += 1
+                continue
+            parent = os.path.dirname(folder)
+            while folder != self.root and _is_under(parent, self.root) and len(owners.get(parent, ())) == 1:
+                folder, parent = parent, os.path.dirname(parent)
+            folders.setdefault(folder, []).extend(self.studies[study_uid])
+
+        if shared:
+            logger.warning(f"DICOMDIR {self.path}: {shared} stud{'y' if shared == 1 else 'ies'} share a folder "
+                           f"with other patients and cannot be split per patient")
+        return folders
+
+    def study_folders(self) -> Dict[str, List[str]]:
+        """{患者目录: 序列UID列表}"""
+        return self._folders
+
+    def series_under(self, folder: Path) -> List[DicomdirSeries]:
+        folder = os.path.normpath(str(folder))
+        uids = self._folders.get(folder)
+        if uids is not None:
+            return [self.series[uid] for uid in uids]
+        return [self.series[uid] for uid, series_folder in self._series_folders.items()
+                if series_folder and _is_under(series_folder, folder)]
+
+    def files_under(self, folder: Path) -> List[str]:
+        return sorted(f for s in self.series_under(folder) for f in s.files)
+
+    def signature(self, folder: Path) -> Tuple[int, int]:
+        """(引用的文件数, DICOMDIR mtime_ns)，与 header_index.folder_signature 同形"""
+        return sum(len(s.files) for s in self.series_under(folder)), self.mtime_ns
+
+
+_cache: Dict[str, Tuple[int, Dicomdir]] = {}
+_lookup: Dict[str, Optional[str]] = {}
+_lock = threading.Lock()
+
+
+def load_dicomdir(path: Path) -> Dicomdir:
+    """解析DICOMDIR（按路径+mtime缓存）"""
+    key = os.path.normpath(str(path))
+    mtime = os.stat(key).st_mtime_ns
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        dicomdir = Dicomdir(Path(key))
+        _cache[key] = (mtime, dicomdir)
+        logger.info(f"DICOMDIR {key}: {len(dicomdir.studies)} studies, {len(dicomdir.series)} series, "
+                    f"{sum(len(s.files) for s in dicomdir.series.values())} images")
+        return dicomdir
+
+
+def dicomdir_in(directory: Path) -> Optional[Path]:
+    """目录中的DICOMDIR文件（不向上查找；结果按目录缓存，上级目录在多个患者间只检查一次）"""
+    directory = os.path.normpath(str(directory))
+    with _lock:
+        if directory in _lookup:
+            known = _lookup[directory]
+            return Path(known) if known else None
+    known = None
+    for name in DICOMDIR_NAMES:
+        candidate = os.path.join(directory, name)
+        if os.path.isfile(candidate):
+            known = candidate
+            break
+    with _lock:
+        _lookup[directory] = known
+    return Path(known) if known else None
+
+
+def find_dicomdir(folder: Path, max_parents: int = SEARCH_PARENTS) -> Optional[Dicomdir]:
+    """
+    查找覆盖folder的DICOMDIR（folder本身及向上max_parents级）
+
+    Returns:
+        已解析的 Dicomdir，未找到、解析失败或其中没有folder下的图像时返回None
+    """
+    folder = os.path.normpath(str(folder))
+    current = folder
+    path = None
+    for _ in range(max_parents + 1):
+        path = dicomdir_in(Path(current))
+        if path is not None:
+            break
+        parent = os.path.dirname(current)
+        if parent == current:
+            break
+        current = parent
+    if path is None:
+        return None
+
+    try:
+        dicomdir = load_dicomdir(path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable DICOMDIR {path}: {e}")
+        with _lock:
+            _lookup[os.path.normpath(str(path.parent))] = None
+        return None
+    return dicomdir if dicomdir.series_under(Path(folder)) else None
+
+
+def series_info_for(dicomdir: Dicomdir, folder: Path, complete_positions: bool = True) -> Dict[str, dict]:
+    """
+    folder下的序列信息（identify_dicom_series() 的返回格式）
+
+    记录未给出层厚或年龄/性别（PATIENT记录常只有PatientID）的序列读取其第1个文件头；
+    complete_positions时缺位置的图像逐个读取文件头，
+    读取失败或仍无位置的图像不计入（与逐文件扫描时跳过不可读文件一致）。
+    """
+    info: Dict[str, dict] = {}
+    for series in dicomdir.series_under(folder):
+        thickness, description, metadata = series.thickness, series.description, series.metadata
+        if (thickness is None or not metadata.has_demographics) and series.files:
+            try:
+                ds = pydicom.dcmread(series.files[0], stop_before_pixels=True,
+                                     specific_tags=_HEADER_TAGS + METADATA_TAGS)
+                if thickness is None and getattr(ds, 'SliceThickness', None) is not None:
+                    thickness = float(ds.SliceThickness)
+                description = description or str(getattr(ds, 'SeriesDescription', '') or '')
+                metadata = metadata.merge(StudyMetadata.from_dataset(ds))
+            except Exception:
+                pass
+
+        files: List[str] = []
+        positions: List[float] = []
+        for path, position in zip(series.files, series.positions):
+            if position is None and complete_positions:
+                try:
+                    ds = pydicom.dcmread(path, stop_before_pixels=True, specific_tags=_HEADER_TAGS)
+                    ipp = getattr(ds, 'ImagePositionPatient', None)
+                    position = float(ipp[2]) if ipp else None
+                except Exception:
+                    continue
+                if position is None:
+                    continue  # 无法按层位置排序
+            files.append(path)
+            if position is not None:
+                positions.append(position)
+
+        info[series.series_uid] = {
+            'files': files,
+            'thickness': thickness,
+            'description': description,
+            'positions': positions,
+            'transfer_syntax': series.transfer_syntax,
+            'metadata': metadata,
+        }
+    return info
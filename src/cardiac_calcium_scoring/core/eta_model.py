@@ -0,0 +1,247 @@
+"""
+耗时预测模块
+Learned ETA Model
+
+用历史运行的逐患者、分阶段耗时拟合成本模型，替代按患者数乘以固定
+expected_time_per_patient_sec 的静态估计:
+
+    耗时 ≈ a + b × 切片数 + c × 文件数 + d × 切片数 × [压缩传输语法]
+
+每个阶段（header_parse、pixel_decode、model_forward...）和总耗时分别用
+最小二乘拟合，按机器（主机名+设备）区分；本机样本不足时使用同设备、同性能档位
+其他机器的历史；仍不足时退回静态估计（按切片数缩放）。
+
+输入特征来自 header_index.HeaderSummary，因此在解码任何像素之前即可预测
+每个患者和整个运行的耗时。历史记录保存在输出目录的 .nb10_timing_history.csv。
+"""
+
+import csv
+import json
+import platform
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HISTORY_COLUMNS = [
+    'timestamp', 'machine', 'device', 'profile', 'patient_id', 'status',
+    'file_count', 'slice_count', 'transfer_syntax', 'compressed', 'series_bytes',
+    'total_sec', 'stage_seconds',
+]
+
+# 静态估计按切片数缩放时的参考切片数（典型5mm胸部CT）
+REFERENCE_SLICES = 64
+
+
+def machine_key(device: str) -> str:
+    return f"{platform.node() or 'unknown'}-{device}"
+
+
+def _features(slice_count: float, file_count: float, compressed: bool) -> List[float]:
+    return [1.0, float(slice_count), float(file_count), float(slice_count) * float(bool(compressed))]
+
+
+class TimingHistory:
+    """逐患者耗时历史（CSV，追加写入）"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def append(self, row: Dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not self.path.exists()
+        with open(self.path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=HISTORY_COLUMNS, extrasaction='ignore')
+            if is_new:
+                writer.writeheader()
+            writer.writerow(row)
+
+    def load(self) -> List[Dict]:
+        if not self.path.exists():
+            return []
+        rows = []
+        try:
+            with open(self.path, 'r', newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    try:
+                        row['file_count'] = int(row['file_count'])
+                        row['slice_count'] = int(row['slice_count'])
+                        row['compressed'] = row['compressed'] in ('True', 'true', '1')
+                        row['total_sec'] = float(row['total_sec'])
+                        row['stage_seconds'] = json.loads(row['stage_seconds'] or '{}')
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    rows.append(row)
+        except OSError as e:
+            logger.warning(f"Failed to read timing history {self.path}: {e}")
+        return rows
+
+
+@dataclass
+class LinearCost:
+    """单个目标（总耗时或某阶段）的线性成本模型"""
+    coef: np.ndarray
+    rmse: float
+    samples: int
+
+    def predict(self, slice_count: float, file_count: float, compressed: bool) -> float:
+        return max(0.0, float(np.dot(self.coef, _features(slice_count, file_count, compressed))))
+
+
+def _fit(X: np.ndarray, y: np.ndarray, ridge: float = 1e-3) -> LinearCost:
+    # 轻微岭回归：历史中切片数/压缩方式单一时系数不可辨识，避免出现极端系数
+    scale = np.maximum(np.abs(X).max(axis=0), 1.0)
+    Xs = X / scale
+    A = Xs.T @ Xs + ridge * np.eye(X.shape[1])
+    coef = np.linalg.solve(A, Xs.T @ y) / scale
+    rmse = float(np.sqrt(np.mean((X @ coef - y) ** 2)))
+    return LinearCost(coef=coef, rmse=rmse, samples=len(y))
+
+
+@dataclass
+class EtaModel:
+    """总耗时 + 分阶段成本模型"""
+    total: Optional[LinearCost] = None
+    stages: Dict[str, LinearCost] = field(default_factory=dict)
+    source: str = 'none'          # machine / profile / none
+    samples: int = 0
+
+    @property
+    def fitted(self) -> bool:
+        return self.total is not None
+
+    @classmethod
+    def fit(cls, rows: List[Dict], machine: str, device: str, profile: Optional[str] = None,
+            min_samples: int = 8) -> 'EtaModel':
+        """
+        从历史拟合模型
+
+        Args:
+            rows: TimingHistory.load() 的结果
+            machine: 本机键（machine_key()）
+            device: 'cpu' / 'cuda'
+            profile: 性能档位名（用于借用同档位其他机器的历史）
+            min_samples: 最少成功样本数
+        """
+        ok = [r for r in rows if r.get('status') == 'success' and r['total_sec'] > 0]
+        candidates = [('machine', [r for r in ok if r['machine'] == machine])]
+        if profile:
+            candidates.append(('profile', [r for r in ok if r['device'] == device
+                                           and r.get('profile') == profile]))
+
+        for source, subset in candidates:
+            if len(subset) < min_samples:
+                continue
+            X = np.array([_features(r['slice_count'], r['file_count'], r['compressed']) for r in subset])
+            model = cls(total=_fit(X, np.array([r['total_sec'] for r in subset])),
+                        source=source, samples=len(subset))
+            stage_names = sorted({k for r in subset for k in r['stage_seconds']})
+            for stage in stage_names:
+                y = np.array([r['stage_seconds'].get(stage, 0.0) for r in subset])
+                model.stages[stage] = _fit(X, y)
+            return model
+        return cls()
+
+    def predict(self, summary) -> Optional[float]:
+        if not self.fitted:
+            return None
+        return self.total.predict(summary.slice_count, summary.file_count, summary.compressed)
+
+    def predict_stages(self, summary) -> Dict[str, float]:
+        return {stage: cost.predict(summary.slice_count, summary.file_count, summary.compressed)
+                for stage, cost in self.stages.items()}
+
+
+class RunPlanner:
+    """
+    运行规划：逐患者预测、总耗时、校准后的剩余时间，以及历史记录
+
+    用法:
+        planner = RunPlanner(model, summaries, history, fallback_sec=240, ...)
+        planner.total_seconds(folders)
+        planner.remaining_seconds(remaining_folders, elapsed_sec)
+        planner.record(folder, 'success', case_sec, stage_times)
+    """
+
+    def __init__(self, model: EtaModel, summaries: Dict[str, object],
+                 history: Optional[TimingHistory], fallback_sec: float,
+                 machine: str, device: str, profile: Optional[str] = None):
+        self.model = model
+        self.summaries = summaries
+        self.history = history
+        self.fallback_sec = fallback_sec
+        self.machine = machine
+        self.device = device
+        self.profile = profile
+        self._predicted_done = 0.0
+
+    def estimate(self, folder: Path) -> float:
+        """单个患者的预测耗时（秒）"""
+        summary = self.summaries.get(str(folder))
+        if getattr(summary, 'qc_failure', None):
+            return 0.0  # 质控未通过：不解码、不推理
+        if summary is not None:
+            predicted = self.model.predict(summary)
+            if predicted is not None:
+                return predicted
+            # 无历史：静态估计按切片数缩放（切片数在不同检查间可相差10倍）
+            return self.fallback_sec * max(summary.slice_count, 1) / REFERENCE_SLICES
+        return self.fallback_sec
+
+    def total_seconds(self, folders: Iterable[Path]) -> float:
+        return sum(self.estimate(f) for f in folders)
+
+    def remaining_seconds(self, remaining: Iterable[Path], elapsed_sec: float) -> float:
+        """
+        剩余时间 = 剩余患者预测之和 × 校准系数（本次运行实际/预测，限制在0.25-4倍）
+        """
+        predicted = self.total_seconds(remaining)
+        if self._predicted_done > 0 and elapsed_sec > 0:
+            predicted *= min(4.0, max(0.25, elapsed_sec / self._predicted_done))
+        return predicted
+
+    def record(self, folder: Path, status: str, total_sec: float, stage_times: Dict[str, float]):
+        """患者完成后调用：更新校准，并把耗时写入历史"""
+        self._predicted_done += self.estimate(folder)
+        summary = self.summaries.get(str(folder))
+        if self.history is None or summary is None:
+            return
+        try:
+            self.history.append({
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'machine': self.machine,
+                'device': self.device,
+                'profile': self.profile or '',
+                'patient_id': Path(folder).name,
+                'status': status,
+                'file_count': summary.file_count,
+                'slice_count': summary.slice_count,
+                'transfer_syntax': summary.transfer_syntax,
+                'compressed': summary.compressed,
+                'series_bytes': summary.series_bytes,
+                'total_sec': round(total_sec, 3),
+                'stage_seconds': json.dumps({k[2:-4]: v for k, v in stage_times.items()}),
+            })
+        except OSError as e:
+            logger.warning(f"Failed to append timing history: {e}")
+
+    def describe(self) -> str:
+        if self.model.fitted:
+            where = 'this machine' if self.model.source == 'machine' else f"'{self.profile}' profile"
+            return (f"learned from {self.model.samples} patients on {where}, "
+                    f"±{self.model.total.rmse:.0f}s per patient")
+        return "static estimate scaled by slice count (no timing history yet)"
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60}s"
+    return f"{seconds // 3600}h {(seconds % 3600) // 60}m"
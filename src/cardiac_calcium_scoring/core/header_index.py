@@ -0,0 +1,270 @@
+"""
+DICOM头信息索引模块
+DICOM Header Index
+
+在解码任何像素之前，只读取头信息（SeriesInstanceUID、SliceThickness、传输语法），
+按与 dicom_series_selector.select_best_series() 相同的规则确定每个患者将被处理的序列，
+并记录其切片数、文件数、传输语法和字节数。用于运行前的耗时预测和规划。
+
+索引缓存为JSON（默认在输出目录下 .nb10_header_index.json），以
+(文件数, 文件夹mtime) 作为签名，文件夹未变化时再次运行无需重新读取。
+DICOM文件靠前导区嗅探识别（无扩展名、.IMA）时，识别结果（文件名列表）也保存在
+索引中，后续运行和加载阶段不必再次嗅探。
+有DICOMDIR覆盖的文件夹直接使用其中的序列记录（见 dicomdir.py），签名取
+(引用的文件数, DICOMDIR mtime)。
+同时读取逐切片几何信息，对选中序列做解码前质控（见 series_qc.py），失败原因记录在
+HeaderSummary.qc_failure；质控阈值变化时缓存失效。
+"""
+
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pydicom.uid import UID
+
+try:
+    from .dicom_series_selector import select_best_series
+    from .dicom_scanner import list_dicom_files, DICOM_SUFFIX
+    from .dicomdir import find_dicomdir, series_info_for
+    from .archive_source import archive_signature, file_size, read_dicom, split_archive_path
+    from .series_qc import GEOMETRY_COLUMNS, GEOMETRY_TAGS, QCThresholds, check_series, slice_geometry
+except ImportError:
+    from dicom_series_selector import select_best_series
+    from dicom_scanner import list_dicom_files, DICOM_SUFFIX
+    from dicomdir import find_dicomdir, series_info_for
+    from archive_source import archive_signature, file_size, read_dicom, split_archive_path
+    from series_qc import GEOMETRY_COLUMNS, GEOMETRY_TAGS, QCThresholds, check_series, slice_geometry
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 3
+
+_HEADER_TAGS = ['SeriesInstanceUID', 'SliceThickness'] + GEOMETRY_TAGS
+
+
+@dataclass
+class HeaderSummary:
+    """单个患者文件夹的头信息摘要"""
+    folder: str
+    file_count: int              # 文件夹内全部DICOM文件
+    series_count: int
+    slice_count: int             # 选中序列的切片数
+    slice_thickness: Optional[float]
+    transfer_syntax: str         # 选中序列的传输语法UID
+    compressed: bool
+    series_bytes: int            # 选中序列的文件总字节数
+    signature: Tuple[int, int] = (0, 0)
+    dicom_names: Optional[List[str]] = None  # 嗅探识别时的DICOM文件名（全为 .dcm 时为None）
+    qc_failure: Optional[str] = None          # 选中序列的质控失败原因（未做质控或通过时为None）
+
+    @property
+    def patient_id(self) -> str:
+        return Path(self.folder).name
+
+    def dicom_files(self) -> Optional[List[str]]:
+        """缓存的嗅探结果（完整路径）；None表示按扩展名即可列出"""
+        if self.dicom_names is None:
+            return None
+        return [os.path.join(self.folder, name) for name in self.dicom_names]
+
+
+def folder_signature(folder: Path, dicomdir=None) -> Tuple[int, int]:
+    """(文件数, 文件夹mtime_ns)；增删文件都会改变签名"""
+    if split_archive_path(folder) is not None:
+        return archive_signature(folder)
+    if dicomdir is None:
+        dicomdir = find_dicomdir(folder)
+    if dicomdir is not None:
+        return dicomdir.signature(folder)
+    with os.scandir(folder) as it:
+        count = sum(1 for entry in it if entry.is_file())
+    return count, os.stat(folder).st_mtime_ns
+
+
+def _series_geometry(files: List[str], positions: List[float],
+                     geometry: Dict[str, List[float]]) -> np.ndarray:
+    """选中序列的逐切片几何；DICOMDIR记录的序列只有（完整时的）层位置"""
+    rows = np.full((len(files), GEOMETRY_COLUMNS), np.nan)
+    for i, path in enumerate(files):
+        if path in geometry:
+            rows[i] = geometry[path]
+    if np.isnan(rows[:, 2]).all() and len(positions) == len(files):
+        rows[:, 2] = positions
+    return rows
+
+
+def summarize_folder(folder: Path, files: Optional[List[str]] = None,
+                     detection: str = 'auto', qc: Optional[QCThresholds] = None) -> Optional[HeaderSummary]:
+    """
+    只读头信息，汇总一个患者文件夹
+
+    Args:
+        folder: 患者文件夹
+        files: 可选，已列出的DICOM路径（DicomScanner(collect_files=True)）
+        detection: 未提供files时的DICOM识别方式（见 dicom_scanner）
+        qc: 质控阈值；None时不做质控
+
+    Returns:
+        HeaderSummary，没有可读DICOM时返回None
+    """
+    folder = Path(folder)
+    dicomdir = find_dicomdir(folder)
+    signature = folder_signature(folder, dicomdir)
+    series_info: Dict[str, dict] = {}
+    file_meta: Dict[str, Tuple[str, int]] = {}
+    geometry: Dict[str, List[float]] = {}
+
+    if dicomdir is not None:
+        # 序列、文件和传输语法来自DICOMDIR记录，不逐个读取（也不stat，字节数记为0）
+        for series_uid, info in series_info_for(dicomdir, folder, complete_positions=False).items():
+            series_info[series_uid] = info
+            for path in info['files']:
+                file_meta[path] = (info['transfer_syntax'], 0)
+
+    if files is None:
+        files = list_dicom_files(folder, detection)
+    files = [f for f in files if os.path.normpath(f) not in file_meta]
+    file_count = len(file_meta) + len(files)
+
+    for path in map(Path, files):
+        try:
+            ds = read_dicom(path, stop_before_pixels=True, specific_tags=_HEADER_TAGS)
+        except Exception:
+            continue
+        series_uid = str(getattr(ds, 'SeriesInstanceUID', 'Unknown'))
+        info = series_info.setdefault(series_uid, {'files': [], 'thickness': None,
+                                                   'description': '', 'positions': []})
+        if info['thickness'] is None and getattr(ds, 'SliceThickness', None) is not None:
+            info['thickness'] = float(ds.SliceThickness)
+        info['files'].append(str(path))
+        geometry[str(path)] = slice_geometry(ds)
+
+        syntax = str(getattr(getattr(ds, 'file_meta', None), 'TransferSyntaxUID', '') or '')
+        file_meta[str(path)] = (syntax, file_size(path))
+
+    if not series_info:
+        return None
+
+    selected_files, _, _ = select_best_series(series_info)
+    selected = next(info for info in series_info.values() if info['files'] is selected_files)
+    syntax = file_meta[selected_files[0]][0] if selected_files else ''
+    qc_failure = None
+    if qc is not None:
+        qc_failure = check_series(_series_geometry(selected_files, selected['positions'], geometry), qc)
+
+    return HeaderSummary(
+        folder=str(folder),
+        file_count=file_count,
+        series_count=len(series_info),
+        slice_count=len(selected_files),
+        slice_thickness=selected['thickness'],
+        transfer_syntax=syntax,
+        compressed=bool(syntax) and UID(syntax).is_compressed,
+        series_bytes=sum(file_meta[f][1] for f in selected_files),
+        signature=signature,
+        dicom_names=(None if dicomdir is not None or all(f.lower().endswith(DICOM_SUFFIX) for f in files)
+                     else [os.path.relpath(f, folder) for f in files]),
+        qc_failure=qc_failure,
+    )
+
+
+class HeaderIndex:
+    """
+    头信息索引（带JSON缓存）
+
+    用法:
+        index = HeaderIndex(output_dir / '.nb10_header_index.json', qc=QCThresholds())
+        summaries = index.build(dicom_folders)   # {folder_str: HeaderSummary}
+        index.save()
+    """
+
+    def __init__(self, cache_file: Optional[Path] = None, detection: str = 'auto',
+                 qc: Optional[QCThresholds] = None):
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.detection = detection
+        self.qc = qc
+        self.entries: Dict[str, HeaderSummary] = {}
+        self._load()
+
+    def _load(self):
+        if not self.cache_file or not self.cache_file.exists():
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != INDEX_VERSION or data.get('qc') != self._qc_key():
+                return
+            for folder, entry in data.get('entries', {}).items():
+                entry['signature'] = tuple(entry['signature'])
+                self.entries[folder] = HeaderSummary(**entry)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable header index {self.cache_file}: {e}")
+            self.entries = {}
+
+    def save(self):
+        if not self.cache_file:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_file.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION,
+                       'qc': self._qc_key(),
+                       'entries': {k: asdict(v) for k, v in self.entries.items()}}, f)
+        os.replace(tmp, self.cache_file)
+
+    def _qc_key(self) -> Optional[dict]:
+        return asdict(self.qc) if self.qc is not None else None
+
+    def get(self, folder: Path) -> Optional[HeaderSummary]:
+        return self.entries.get(str(folder))
+
+    def build(self, folders: Iterable[Path], max_workers: int = 8,
+              progress=None) -> Dict[str, HeaderSummary]:
+        """
+        为文件夹建立索引（签名未变的缓存条目直接复用）
+
+        Args:
+            folders: 患者文件夹
+            max_workers: 读取头信息的线程数（I/O密集）
+            progress: 可选回调 progress(done, total)
+
+        Returns:
+            {folder_str: HeaderSummary}（无可读DICOM的文件夹不包含在内）
+        """
+        folders = [Path(f) for f in folders]
+        stale: List[Path] = []
+        for folder in folders:
+            cached = self.entries.get(str(folder))
+            try:
+                if cached is None or tuple(cached.signature) != folder_signature(folder):
+                    stale.append(folder)
+            except OSError:
+                stale.append(folder)
+
+        if stale:
+            logger.info(f"Header index: reading headers for {len(stale)}/{len(folders)} folders "
+                        f"({len(folders) - len(stale)} cached)")
+            with ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                    thread_name_prefix='HeaderIndex') as pool:
+                for done, (folder, summary) in enumerate(
+                        zip(stale, pool.map(self._summarize_safe, stale)), 1):
+                    if summary is not None:
+                        self.entries[str(folder)] = summary
+                    else:
+                        self.entries.pop(str(folder), None)
+                    if progress:
+                        progress(done, len(stale))
+
+        return {str(f): self.entries[str(f)] for f in folders if str(f) in self.entries}
+
+    def _summarize_safe(self, folder: Path) -> Optional[HeaderSummary]:
+        try:
+            return summarize_folder(folder, detection=self.detection, qc=self.qc)
+        except Exception as e:
+            logger.debug(f"Header index: {folder} failed: {e}")
+            return None
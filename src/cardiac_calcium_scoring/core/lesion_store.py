@@ -0,0 +1,150 @@
+"""
+病灶表输出模块
+Lesion Table Store (Parquet dataset partitioned by run)
+
+评分阶段对每个患者做一次连通域标记，同一次标记同时给出逐病灶统计（质心、z范围、体素数、
+峰值HU、Agatston贡献、体积；见 processing.lesion_table_for_vol）。本模块把这些列式数据
+按运行分区写成 Parquet 数据集，供研究/质控直接查询，无需重新推理:
+
+    <output_dir>/lesions/run=<run_id>/part-00000.parquet
+                                     part-00001.parquet ...
+
+    pd.read_parquet('output/lesions')        # run 列来自分区目录名
+    duckdb.sql("SELECT run, patient_id, sum(agatston) FROM "
+               "read_parquet('output/lesions/*/*.parquet', hive_partitioning = true) GROUP BY ALL")
+
+缓冲的行达到 rows_per_file 时写出一个分片，其余在 close() 时写出（先写临时文件再改名，
+读取方不会看到写了一半的文件），因此分片数只取决于病灶行数，而不是患者数或运行时长。
+进程异常退出时，最后一次写出之后的病灶会丢失，而这些患者在续跑缓存中已记为成功，需要时可
+删除缓存重跑；长时间运行如需限制丢失量，可设置 flush_interval_sec（建议15-30分钟）。
+未安装 pyarrow 时退化为同样分区的 CSV 分片（part-*.csv）。
+"""
+
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+LESION_DIR = 'lesions'
+
+# 整数列（其余数值列为float64）
+_INT_COLUMNS = ('lesion_id', 'voxel_count', 'slice_first', 'slice_last')
+
+
+class LesionTableWriter:
+    """
+    逐患者追加病灶表，按运行分区写出 Parquet 分片
+
+    用法:
+        with LesionTableWriter(output_dir / 'lesions', run_id) as writer:
+            writer.add(patient_id, result.pop('lesions'))
+    """
+
+    def __init__(self, root: Path, run_id: str, rows_per_file: int = 500_000,
+                 flush_interval_sec: Optional[float] = None, compression: str = 'zstd'):
+        """
+        Args:
+            root: 数据集根目录（其下为 run=<run_id> 分区）
+            run_id: 运行标识（分区目录名）
+            rows_per_file: 每个分片的最大行数
+            flush_interval_sec: 有缓冲数据时的最长写出间隔（None/0 = 仅按行数写出）
+            compression: Parquet压缩算法
+        """
+        self.run_dir = Path(root) / f"run={run_id}"
+        self.rows_per_file = max(1, rows_per_file)
+        self.flush_interval_sec = flush_interval_sec or None
+        self.compression = compression
+        self.format = 'parquet' if PYARROW_AVAILABLE else 'csv'
+        self.patients = 0
+        self.lesions_written = 0
+        self.files: List[Path] = []
+        self._columns: Dict[str, List[np.ndarray]] = {}
+        self._rows = 0
+        self._last_flush = time.monotonic()
+        if not PYARROW_AVAILABLE:
+            logger.warning("pyarrow not installed: lesion table written as CSV parts (pip install pyarrow)")
+
+    def add(self, patient_id: str, lesions: Dict[str, np.ndarray]):
+        """追加一个患者的病灶（lesion_table_columns() 的列式结果；无病灶时只计数）"""
+        self.patients += 1
+        count = len(lesions['lesion_id'])
+        if count:
+            self._columns.setdefault('patient_id', []).append(np.full(count, str(patient_id), dtype=object))
+            for name, values in lesions.items():
+                self._columns.setdefault(name, []).append(np.asarray(values))
+            self._rows += count
+        if self._rows >= self.rows_per_file or (
+                self._rows and self.flush_interval_sec
+                and time.monotonic() - self._last_flush >= self.flush_interval_sec):
+            self.flush()
+
+    def flush(self):
+        """写出缓冲的行为一个新分片"""
+        self._last_flush = time.monotonic()
+        if not self._rows:
+            return
+        columns = {}
+        for name, parts in self._columns.items():
+            values = np.concatenate(parts)
+            if name in _INT_COLUMNS:
+                values = values.astype(np.int64)
+            elif name != 'patient_id':
+                values = values.astype(np.float64)
+            columns[name] = values
+
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        path = self.run_dir / f"part-{len(self.files):05d}.{self.format}"
+        tmp = path.with_name(f".{path.name}.tmp")
+        if PYARROW_AVAILABLE:
+            pq.write_table(pa.table(columns), tmp, compression=self.compression)
+        else:
+            pd.DataFrame(columns).to_csv(tmp, index=False)
+        os.replace(tmp, path)
+
+        self.files.append(path)
+        self.lesions_written += self._rows
+        self._columns = {}
+        self._rows = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self) -> 'LesionTableWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def describe(self) -> str:
+        return (f"{self.lesions_written} lesions from {self.patients} patients in "
+                f"{len(self.files)} {self.format} file(s) under {self.run_dir}")
+
+
+def read_lesion_table(root: Path, run_id: Optional[str] = None) -> pd.DataFrame:
+    """
+    读取病灶数据集（全部运行或单次运行），run 列取自分区目录名
+
+    大数据集建议用 DuckDB / pyarrow.dataset 直接按列和分区过滤查询。
+    """
+    root = Path(root)
+    runs = [root / f"run={run_id}"] if run_id else sorted(root.glob('run=*'))
+    frames = []
+    for run_dir in runs:
+        for path in sorted(run_dir.glob('part-*.*')):
+            frame = pd.read_parquet(path) if path.suffix == '.parquet' else pd.read_csv(path)
+            frame.insert(0, 'run', run_dir.name.split('=', 1)[1])
+            frames.append(frame)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
@@ -0,0 +1,345 @@
+"""
+运行指标导出模块
+Metrics Exporter for Long-running Batch Jobs
+
+多日队列运行时，不依赖解析 nb10_*.log 文本即可查看实时吞吐和健康状态。
+指标使用Prometheus文本格式，两种完全离线的输出方式:
+
+- textfile: 定期原子写入 .prom 文件（node_exporter textfile collector
+  可直接采集，也可以直接 cat / 脚本读取）
+- http:     仅监听本机的 /metrics 端点（可选）
+
+导出的指标:
+- nb10_patients_total / processed / failed，待处理队列长度、预取中的患者数
+- nb10_slices_processed_total、nb10_slices_per_second（最近N例）
+- nb10_stage_duration_seconds{stage=...}  各阶段耗时直方图（来自Tracer）
+- nb10_patient_duration_seconds           单例总耗时直方图
+- nb10_process_rss_gb / nb10_vram_reserved_gb / nb10_ram_available_gb（来自ResourceSampler）
+- nb10_eta_seconds / nb10_estimated_completion_timestamp_seconds
+"""
+
+import os
+import time
+import bisect
+import logging
+import tempfile
+import threading
+from collections import deque, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 阶段耗时（秒）直方图桶：覆盖从毫秒级的表头解析到分钟级的CPU推理
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+PATIENT_BUCKETS = (1.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 180.0, 300.0, 600.0, 1200.0)
+
+
+class Histogram:
+    """累积直方图（Prometheus语义：le桶计数为累积值）"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        idx = bisect.bisect_left(self.buckets, value)
+        if idx < len(self.counts):
+            self.counts[idx] += 1
+        self.count += 1
+        self.sum += value
+
+    def render(self, name: str, labels: str = '') -> List[str]:
+        sep = ',' if labels else ''
+        lines = []
+        cumulative = 0
+        for le, c in zip(self.buckets, self.counts):
+            cumulative += c
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{le:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {self.sum:.6f}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
+
+
+class RunMetrics:
+    """
+    单次运行的指标（线程安全）
+
+    用法:
+        metrics = RunMetrics(window=20)
+        metrics.start_run(total_patients=500)
+        metrics.observe_patient(success=True, seconds=42.0, num_slices=60,
+                                stage_times={'t_model_forward_sec': 30.1, ...})
+        text = metrics.render()
+    """
+
+    def __init__(self, window: int = 20):
+        """
+        Args:
+            window: 计算slices/sec和ETA时使用的最近患者数
+        """
+        self._lock = threading.Lock()
+        self.window = max(1, window)
+
+        self.run_start = time.time()
+        self.patients_total = 0
+        self.patients_processed = 0
+        self.patients_failed = 0
+        self.slices_processed = 0
+        self.queue_depth = 0
+        self.prefetched = 0
+        self.concurrency: Dict[str, int] = {}
+        self.resources: Dict[str, float] = {}
+
+        self._recent = deque(maxlen=self.window + 1)   # (完成时间, 切片数)
+        self._stage_hist: Dict[str, Histogram] = defaultdict(lambda: Histogram(STAGE_BUCKETS))
+        self._patient_hist = Histogram(PATIENT_BUCKETS)
+        self.last_update = self.run_start
+
+    def start_run(self, total_patients: int):
+        with self._lock:
+            self.run_start = time.time()
+            self.patients_total = total_patients
+            self.queue_depth = total_patients
+            self.last_update = self.run_start
+
+    def set_queue(self, remaining: int, prefetched: int = 0):
+        with self._lock:
+            self.queue_depth = remaining
+            self.prefetched = prefetched
+
+    def set_concurrency(self, **settings: int):
+        with self._lock:
+            self.concurrency.update(settings)
+
+    def update_resources(self, sample):
+        """sample: ResourceSample（或具有相同字段的对象）"""
+        if sample is None:
+            return
+        with self._lock:
+            self.resources = {
+                'process_rss_gb': sample.process_rss_gb,
+                'ram_available_gb': sample.ram_available_gb,
+                'vram_reserved_gb': sample.vram_reserved_gb,
+                'vram_allocated_gb': sample.vram_allocated_gb,
+                'cpu_percent': sample.cpu_percent,
+            }
+
+    def observe_patient(self, success: bool, seconds: float, num_slices: Optional[int] = None,
+                        stage_times: Optional[Dict[str, float]] = None):
+        """
+        记录一个完成（或失败）的患者
+
+        Args:
+            success: 是否成功
+            seconds: 该患者的总耗时
+            num_slices: 切片数（失败时可为None）
+            stage_times: Tracer.stage_durations() 的结果 {'t_<stage>_sec': s}
+        """
+        with self._lock:
+            slices = int(num_slices or 0) if success else 0
+            if success:
+                self.patients_processed += 1
+                self.slices_processed += slices
+            else:
+                self.patients_failed += 1
+            self._patient_hist.observe(seconds)
+            for key, sec in (stage_times or {}).items():
+                self._stage_hist[key[2:-4]].observe(sec)   # t_<stage>_sec -> <stage>
+            self.last_update = time.time()
+            self._recent.append((self.last_update, slices))
+
+    # 吞吐和ETA按墙钟完成节奏计算（预取使加载与推理重叠，单例耗时之和会高估）
+
+    def slices_per_second(self) -> float:
+        with self._lock:
+            return self._slices_per_second()
+
+    def _slices_per_second(self) -> float:
+        if len(self._recent) >= 2:
+            span = self._recent[-1][0] - self._recent[0][0]
+            slices = sum(n for _, n in list(self._recent)[1:])
+        else:
+            span = self.last_update - self.run_start
+            slices = self.slices_processed
+        return slices / span if span > 0 else 0.0
+
+    def eta_seconds(self) -> Optional[float]:
+        with self._lock:
+            return self._eta_seconds()
+
+    def _eta_seconds(self) -> Optional[float]:
+        done = self.patients_processed + self.patients_failed
+        remaining = max(0, self.patients_total - done)
+        if remaining == 0:
+            return 0.0
+        if done == 0:
+            return None
+        if len(self._recent) >= 2:
+            pace = (self._recent[-1][0] - self._recent[0][0]) / (len(self._recent) - 1)
+        else:
+            pace = (self.last_update - self.run_start) / done
+        return remaining * pace
+
+    def render(self) -> str:
+        """渲染为Prometheus文本格式"""
+        with self._lock:
+            now = time.time()
+            eta = self._eta_seconds()
+            out: List[str] = []
+
+            def metric(name: str, kind: str, help_text: str, value, labels: str = ''):
+                out.append(f"# HELP {name} {help_text}")
+                out.append(f"# TYPE {name} {kind}")
+                out.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+            metric('nb10_run_start_timestamp_seconds', 'gauge', 'Unix time the run started.',
+                   f"{self.run_start:.3f}")
+            metric('nb10_last_update_timestamp_seconds', 'gauge', 'Unix time the last patient finished.',
+                   f"{self.last_update:.3f}")
+            metric('nb10_patients_total', 'gauge', 'Patients scheduled in this run.', self.patients_total)
+            metric('nb10_patients_processed_total', 'counter', 'Patients scored successfully.',
+                   self.patients_processed)
+            metric('nb10_patients_failed_total', 'counter', 'Patients that failed.', self.patients_failed)
+            metric('nb10_queue_depth', 'gauge', 'Patients not yet started.', self.queue_depth)
+            metric('nb10_prefetched_patients', 'gauge', 'Patients loaded or loading ahead of inference.',
+                   self.prefetched)
+            metric('nb10_slices_processed_total', 'counter', 'Slices scored.', self.slices_processed)
+            metric('nb10_slices_per_second', 'gauge',
+                   f'Slice throughput over the last {self.window} patients.', f"{self._slices_per_second():.4f}")
+
+            for key, value in sorted(self.concurrency.items()):
+                metric(f'nb10_concurrency_{key}', 'gauge', f'Current {key.replace("_", " ")} setting.', value)
+            for key, value in sorted(self.resources.items()):
+                metric(f'nb10_{key}', 'gauge', f'Latest sampled {key.replace("_", " ")}.', f"{value:.4f}")
+
+            if eta is not None:
+                metric('nb10_eta_seconds', 'gauge', 'Estimated seconds until the run completes.', f"{eta:.1f}")
+                metric('nb10_estimated_completion_timestamp_seconds', 'gauge',
+                       'Estimated Unix time the run completes.', f"{now + eta:.0f}")
+
+            out.append("# HELP nb10_patient_duration_seconds Wall time per patient.")
+            out.append("# TYPE nb10_patient_duration_seconds histogram")
+            out += self._patient_hist.render('nb10_patient_duration_seconds')
+
+            if self._stage_hist:
+                out.append("# HELP nb10_stage_duration_seconds Time per patient spent in each pipeline stage.")
+                out.append("# TYPE nb10_stage_duration_seconds histogram")
+                for stage, hist in sorted(self._stage_hist.items()):
+                    out += hist.render('nb10_stage_duration_seconds', f'stage="{stage}"')
+
+        return "\n".join(out) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    metrics: RunMetrics = None
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics http: " + format % args)
+
+
+class MetricsExporter:
+    """
+    指标导出器（textfile 和/或 本机HTTP）
+
+    用法:
+        exporter = MetricsExporter(metrics, textfile=Path('logs/nb10_metrics.prom'),
+                                   sampler=resource_sampler, interval_sec=15)
+        exporter.start()
+        ...
+        exporter.stop()   # 停止前写出最终状态
+    """
+
+    def __init__(self, metrics: RunMetrics, textfile: Optional[Path] = None,
+                 http_port: Optional[int] = None, http_host: str = '127.0.0.1',
+                 sampler=None, interval_sec: float = 15.0):
+        """
+        Args:
+            metrics: RunMetrics实例
+            textfile: .prom 输出文件（None表示不写文件）
+            http_port: 本机HTTP端口（None或0表示不启用）
+            http_host: HTTP监听地址（默认仅本机）
+            sampler: 可选ResourceSampler，每次写出前读取最新资源快照
+            interval_sec: textfile写出间隔（秒）
+        """
+        self.metrics = metrics
+        self.textfile = Path(textfile) if textfile else None
+        self.http_port = http_port or None
+        self.http_host = http_host
+        self.sampler = sampler
+        self.interval_sec = max(1.0, interval_sec)
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self):
+        if self.textfile:
+            self.textfile.parent.mkdir(parents=True, exist_ok=True)
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='MetricsExporter', daemon=True)
+            self._thread.start()
+            logger.info(f"Metrics textfile: {self.textfile} (every {self.interval_sec:.0f}s)")
+
+        if self.http_port:
+            handler = type('MetricsHandler', (_MetricsHandler,), {'metrics': self.metrics})
+            self._server = ThreadingHTTPServer((self.http_host, self.http_port), handler)
+            threading.Thread(target=self._server.serve_forever, name='MetricsHTTP', daemon=True).start()
+            logger.info(f"Metrics endpoint: http://{self.http_host}:{self._server.server_address[1]}/metrics")
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_sec + 5)
+            self._thread = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.flush()
+
+    def flush(self):
+        """立即写出textfile（原子替换，采集方不会读到半个文件）"""
+        if self.sampler is not None:
+            self.metrics.update_resources(self.sampler.latest())
+        if not self.textfile:
+            return
+        text = self.metrics.render()
+        fd, tmp = tempfile.mkstemp(prefix='.nb10_metrics_', suffix='.tmp', dir=str(self.textfile.parent))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp, self.textfile)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics file: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval_sec):
+            self.flush()
+
+    def __enter__(self) -> 'MetricsExporter':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
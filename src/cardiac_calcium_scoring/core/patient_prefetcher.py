@@ -0,0 +1,99 @@
+"""
+患者预取模块
+Patient Prefetcher
+
+在后台线程中提前加载（DICOM读取、解码、重采样）后续患者，
+使模型推理与I/O重叠。并发数和预取深度每次取下一个患者时
+从ConcurrencyController读取，因此可以在运行时调整。
+
+结果按输入顺序返回；加载失败的异常在取到该患者时再抛出。
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, Any
+
+logger = logging.getLogger(__name__)
+
+
+class PatientPrefetcher:
+    """
+    按顺序预取患者数据
+
+    用法:
+        prefetcher = PatientPrefetcher(folders, load_fn, controller=controller)
+        with prefetcher:
+            for folder, get_loaded in prefetcher:
+                loaded = get_loaded()   # 加载失败时在这里抛出异常
+    """
+
+    def __init__(self, items: Iterable, load_fn: Callable[[Any], Any],
+                 controller=None, max_workers: Optional[int] = None):
+        """
+        Args:
+            items: 待加载的条目（如患者文件夹路径）
+            load_fn: 加载函数 load_fn(item) -> loaded
+            controller: 可选ConcurrencyController（提供parallel_patients/prefetch_depth）
+            max_workers: 线程池大小（默认取controller上限，无controller时为1）
+        """
+        self.items = list(items)
+        self.load_fn = load_fn
+        self.controller = controller
+
+        if max_workers is None:
+            max_workers = controller.maximum.parallel_patients if controller else 1
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                            thread_name_prefix='PatientLoader')
+        self._futures: Dict[int, Future] = {}
+        self._next_submit = 0
+
+    @property
+    def pending(self) -> int:
+        """已提交但尚未被取走的患者数（加载中或已加载）"""
+        return len(self._futures)
+
+    def _limits(self) -> Tuple[int, int]:
+        if self.controller is None:
+            return 1, 1
+        s = self.controller.settings
+        return s.parallel_patients, s.prefetch_depth
+
+    def _top_up(self, current: int):
+        """提交后续患者，直到达到预取深度或并行上限"""
+        parallel, depth = self._limits()
+        while self._next_submit < len(self.items):
+            ahead = self._next_submit - current - 1  # 已提交的后续患者数
+            running = sum(1 for f in self._futures.values() if not f.done())
+            if ahead >= depth or running >= parallel:
+                break
+            self._submit(self._next_submit)
+
+    def _submit(self, idx: int):
+        self._futures[idx] = self._executor.submit(self.load_fn, self.items[idx])
+        self._next_submit = idx + 1
+
+    def __iter__(self) -> Iterator[Tuple[Any, Callable[[], Any]]]:
+        for idx, item in enumerate(self.items):
+            if idx not in self._futures:
+                self._submit(idx)
+            # 当前患者之后的预取在等待当前患者期间就开始
+            self._top_up(idx)
+            future = self._futures[idx]
+            wait([future])
+            del self._futures[idx]
+            # 当前患者加载完成后空出的并行名额，在推理期间用于预取
+            self._top_up(idx)
+            yield item, future.result
+
+    def close(self):
+        """取消尚未开始的加载并关闭线程池"""
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'PatientPrefetcher':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -6,7 +6,8 @@ Performance Profile System
 """
 
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from pathlib import Path
 from typing import Optional
 import logging
 
@@ -46,6 +47,10 @@ class PerformanceProfile:
     expected_speedup: str     # 预期性能提升
     expected_time_per_patient: float  # 预期处理时间(秒/患者)
 
+    # 线程参数（None表示沿用CPU优化器/模型默认值，由autotune实测写入）
+    torch_threads: Optional[int] = None
+    interop_threads: Optional[int] = None
+
     def __str__(self):
         return (f"档位: {self.tier_name}\n"
                 f"  - num_workers: {self.num_workers}\n"
@@ -128,12 +133,18 @@ PROFILES = {
 }
 
 
-def select_profile_by_hardware(hw_info) -> PerformanceProfile:
+def select_profile_by_hardware(hw_info, device: Optional[str] = None,
+                               profile_dir: Optional[Path] = None) -> PerformanceProfile:
     """
     根据硬件信息自动选择最优配置档位
 
+    如果本机已运行过autotune（config/machine_profiles/<machine_id>.json），
+    优先使用实测的slice_batch_size和线程数，而不是静态档位表。
+
     Args:
         hw_info: HardwareInfo对象 (来自hardware_profiler)
+        device: 推理设备 'cuda'/'cpu'（默认: 有GPU则cuda）
+        profile_dir: 本机调优配置目录（默认 config/machine_profiles）
 
     Returns:
         PerformanceProfile: 最优配置档位
@@ -145,6 +156,34 @@ def select_profile_by_hardware(hw_info) -> PerformanceProfile:
     - PROFESSIONAL: 13-24GB VRAM (RTX 4080, A5000)
     - ENTERPRISE: 多GPU 或 >24GB VRAM
     """
+    profile = _select_static_profile(hw_info)
+
+    if device is None:
+        device = 'cuda' if hw_info.gpu.available else 'cpu'
+
+    try:
+        from .autotuner import load_tuned_config
+    except ImportError:
+        from autotuner import load_tuned_config
+
+    tuned = load_tuned_config(hw_info, device, profile_dir)
+    if tuned is not None:
+        logger.info(f"使用本机调优配置 ({tuned.tuned_at}): slice_batch_size={tuned.slice_batch_size}, "
+                    f"threads={tuned.torch_threads}, interop={tuned.interop_threads}")
+        profile = replace(
+            profile,
+            tier_name=f"{profile.tier_name} (Autotuned)",
+            slice_batch_size=tuned.slice_batch_size,
+            torch_threads=tuned.torch_threads,
+            interop_threads=tuned.interop_threads,
+            expected_speedup=f"实测 {tuned.slices_per_sec:.1f} slices/s",
+        )
+
+    return profile
+
+
+def _select_static_profile(hw_info) -> PerformanceProfile:
+    """根据静态档位表选择配置（select_profile_by_hardware的基础）"""
     gpu = hw_info.gpu
     cpu = hw_info.cpu
     ram = hw_info.ram
@@ -181,16 +220,10 @@ def select_profile_by_hardware(hw_info) -> PerformanceProfile:
     if not ram.is_sufficient:  # <8GB可用
         logger.warning(f"可用内存不足({ram.available_gb:.1f}GB)，禁用pin_memory和降低num_workers")
         # 创建修改后的profile副本
-        profile = PerformanceProfile(
-            tier=profile.tier,
-            tier_name=profile.tier_name,
-            description=profile.description,
+        profile = replace(
+            profile,
             num_workers=max(0, profile.num_workers - 2),  # 降级
             pin_memory=False,  # ← 禁用pin_memory（低RAM下会导致性能下降）
-            prefetch_factor=profile.prefetch_factor,
-            slice_batch_size=profile.slice_batch_size,
-            clear_cache_interval=profile.clear_cache_interval,
-            enable_auto_cache=profile.enable_auto_cache,
             expected_speedup="基线 (内存不足，已禁用优化)",
             expected_time_per_patient=15.0  # 回退到基线性能
         )
@@ -223,6 +256,8 @@ def print_profile_summary(profile: PerformanceProfile):
     print("推理参数:")
     print(f"  - slice_batch_size: {profile.slice_batch_size}")
     print(f"  - clear_cache_interval: {profile.clear_cache_interval}")
+    if profile.torch_threads:
+        print(f"  - torch_threads: {profile.torch_threads} (interop: {profile.interop_threads})")
     print()
     print("预期性能:")
     print(f"  - 性能提升: {profile.expected_speedup}")
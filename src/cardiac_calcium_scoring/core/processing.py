@@ -4,32 +4,37 @@
 
 import pandas as pd
 import numpy as np
-import pydicom
 import os
 import re 
 import torch
 from scipy import ndimage
+from tracing import NULL_TRACER
+from archive_source import read_dicom
 
-def load_pydicom_slices_by_axial_cord(tuples): # tuples consist of list of tuples (dicom slice file path, dicom slice axial position) for a given study
+def load_pydicom_slices_by_axial_cord(tuples, tracer=NULL_TRACER): # tuples consist of list of tuples (dicom slice file path, dicom slice axial position) for a given study
     tuples.sort(key=lambda x: x[1], reverse = False)   #sort list of tuples inplace, by axial coordinate, true axial cord order is similar to reverse file order
     # v1.1.4: Use dcmread instead of deprecated read_file
-    slices = [pydicom.dcmread(tup[0]) for tup in tuples]
+    with tracer.span('dicom_read', files=len(tuples)):
+        slices = [read_dicom(tup[0]) for tup in tuples]  # plain files or members of a zip/tar
     return slices
 
 # Make sure CT voxel values are in HU -- could have different intercepts/slopes
-def get_pixels_hu(slices):
+def get_pixels_hu(slices, tracer=NULL_TRACER):
     #print('Number of slices: %s' % len(slices))
-    image = np.stack([s.pixel_array for s in slices], axis=2)    
-    # Convert to int16 (from sometimes int16)
-    image = image.astype(np.int16)
-    # Convert to Hounsfield units (HU)
-    intercept = slices[0].RescaleIntercept
-    slope = slices[0].RescaleSlope
-    if slope != 1:
-        image = slope * image.astype(np.float64)
+    with tracer.span('pixel_decode'):
+        image = np.stack([s.pixel_array for s in slices], axis=2)    
+    with tracer.span('hu_convert'):
+        # Convert to int16 (from sometimes int16)
         image = image.astype(np.int16)
-    image += np.int16(intercept)
-    return np.array(image, dtype=np.int16), list(slices[0].PixelSpacing) + [slices[0].SliceThickness]
+        # Convert to Hounsfield units (HU)
+        intercept = slices[0].RescaleIntercept
+        slope = slices[0].RescaleSlope
+        if slope != 1:
+            image = slope * image.astype(np.float64)
+            image = image.astype(np.int16)
+        image += np.int16(intercept)
+        image = np.array(image, dtype=np.int16)
+    return image, list(slices[0].PixelSpacing) + [slices[0].SliceThickness]
 
 def get_object_agatston(calc_object, calc_pixel_count):
     object_max = np.max(calc_object)
@@ -44,34 +49,97 @@ def get_object_agatston(calc_object, calc_pixel_count):
         object_agatston = calc_pixel_count * 4
     return object_agatston
 
+# Density weights of get_object_agatston(), vectorized over lesions
+AGATSTON_HU_THRESHOLDS = np.array([130, 200, 300, 400])
+
+# Columns of lesion_table_for_vol(); row/col/slice are voxel indices of the scored volume
+LESION_COLUMNS = ['lesion_id', 'voxel_count', 'volume_mm3', 'peak_hu', 'mean_hu', 'agatston',
+                  'centroid_row', 'centroid_col', 'centroid_slice', 'slice_first', 'slice_last']
+
+def lesion_table_for_vol(input_vol_hu, mask, voxel_dims, min_calc_object_pixels=3):
+    """Per-lesion statistics from a single connected-component labeling (columnar dict of arrays).
+    Objects and Agatston contributions are exactly those of compute_agatston_for_vol()."""
+    labeled_mask, num_labels = ndimage.label(mask > 0)
+    # Statistics are accumulated over the masked voxels only (a few thousand), never the full volume
+    voxels = np.flatnonzero(labeled_mask)
+    labels = labeled_mask.ravel()[voxels]
+    hu = np.asarray(input_vol_hu).ravel()[voxels].astype(float)
+    row, col, z = np.unravel_index(voxels, labeled_mask.shape)
+
+    counts = np.bincount(labels, minlength=num_labels + 1)
+    keep = np.flatnonzero(counts > min_calc_object_pixels)  # Remove small calcified objects
+    keep = keep[keep > 0]
+    if len(keep) == 0:
+        return {name: np.array([]) for name in LESION_COLUMNS}
+
+    peak = np.full(num_labels + 1, -np.inf)
+    np.maximum.at(peak, labels, hu)
+    slice_first = np.full(num_labels + 1, labeled_mask.shape[2])
+    np.minimum.at(slice_first, labels, z)
+    slice_last = np.full(num_labels + 1, -1)
+    np.maximum.at(slice_last, labels, z)
+    n = counts[keep].astype(float)
+    mean = np.bincount(labels, weights=hu, minlength=num_labels + 1)[keep] / n
+    centroid = np.stack([np.bincount(labels, weights=axis, minlength=num_labels + 1)[keep] / n
+                         for axis in (row, col, z)], axis=1)
+    counts, peak = counts[keep], peak[keep]
+    slice_first, slice_last = slice_first[keep], slice_last[keep]
+
+    # Divide Voxel_vol by 3 to normalize to standard CAC 3mm slice thickness (see compute_agatston_for_vol)
+    voxel_vol = voxel_dims[0] * voxel_dims[1] * voxel_dims[2] / 3
+    # The object max of input_vol_hu * label includes the zeros outside the object
+    weight = np.searchsorted(AGATSTON_HU_THRESHOLDS, np.maximum(peak, 0), side='right')
+    agatston = np.round(counts.astype(float) * voxel_vol * weight)
+
+    return {
+        'lesion_id': np.arange(1, len(keep) + 1),
+        'voxel_count': counts,
+        'volume_mm3': counts * float(voxel_dims[0] * voxel_dims[1] * voxel_dims[2]),
+        'peak_hu': peak,
+        'mean_hu': mean,
+        'agatston': agatston,
+        'centroid_row': centroid[:, 0],
+        'centroid_col': centroid[:, 1],
+        'centroid_slice': centroid[:, 2],
+        'slice_first': slice_first,
+        'slice_last': slice_last,
+    }
+
 #input volume already must be in Hounsfeild Units -- #for_slice
-def compute_agatston_for_vol(input_vol_hu, mask, voxel_dims, min_calc_object_pixels=3):
+def compute_agatston_for_vol(input_vol_hu, mask, voxel_dims, min_calc_object_pixels=3, return_lesion_count=False,
+                             return_lesion_table=False):
     if np.sum(mask) == 0:
-        return 0
-    # Divide Voxel_vol by 3 to normalize to standard CAC 3mm slice thickness - inputs may have variable slice thickness. Agatston formula is based on area with 3mm slices.
-    voxel_vol = voxel_dims[0] * voxel_dims[1] * voxel_dims[2] / 3 
-    agatston_score = 0
-    labeled_mask, num_labels = ndimage.label(mask>0) 
-    for calc_idx in range(1, num_labels + 1):
-        label = np.zeros(mask.shape)
-        label[labeled_mask == calc_idx] = 1
-        calc_object = input_vol_hu * label
-        calc_voxel_count = np.sum(label)
-        # Remove small calcified objects.
-        if calc_voxel_count <= min_calc_object_pixels:
-            continue
-        calc_volume = calc_voxel_count * voxel_vol
-        object_agatston = round(get_object_agatston(calc_object, calc_volume))
-        agatston_score += object_agatston
+        empty = {name: np.array([]) for name in LESION_COLUMNS}
+        if return_lesion_table:
+            return 0, 0, empty
+        return (0, 0) if return_lesion_count else 0
+    # One labeling pass; per-object statistics are vectorized (see lesion_table_for_vol)
+    lesions = lesion_table_for_vol(input_vol_hu, mask, voxel_dims, min_calc_object_pixels)
+    agatston_score = int(lesions['agatston'].sum())
+    lesion_count = int((lesions['agatston'] > 0).sum())
+    if return_lesion_table:
+        return agatston_score, lesion_count, lesions
+    if return_lesion_count:
+        return int(agatston_score), lesion_count
     return int(agatston_score)
 
-def compute_agatston_for_batch(batch_vol_hu, batch_mask_vol, batch_voxel_dims):
+def compute_agatston_for_batch(batch_vol_hu, batch_mask_vol, batch_voxel_dims, tracer=NULL_TRACER, return_lesion_counts=False,
+                               return_lesion_tables=False):
     scores = []
-    for i in range(0,batch_vol_hu.shape[0]):
-        vol_hu = batch_vol_hu[i].squeeze().detach().numpy()
-        mask_vol = batch_mask_vol[i].squeeze().detach().numpy()
-        voxel_dims = batch_voxel_dims[i].numpy()
-        score = compute_agatston_for_vol(vol_hu, mask_vol, voxel_dims, 1)
-        scores.append(score)
+    lesion_counts = []
+    lesion_tables = []
+    with tracer.span('scoring'):
+        for i in range(0,batch_vol_hu.shape[0]):
+            vol_hu = batch_vol_hu[i].squeeze().detach().numpy()
+            mask_vol = batch_mask_vol[i].squeeze().detach().numpy()
+            voxel_dims = batch_voxel_dims[i].numpy()
+            score, lesions, table = compute_agatston_for_vol(vol_hu, mask_vol, voxel_dims, 1, return_lesion_table=True)
+            scores.append(score)
+            lesion_counts.append(lesions)
+            lesion_tables.append(table)
+    if return_lesion_tables:
+        return scores, lesion_counts, lesion_tables
+    if return_lesion_counts:
+        return scores, lesion_counts
     return scores
 
@@ -0,0 +1,227 @@
+"""
+逐患者性能剖析模块
+Per-patient Profiler Hooks
+
+站点反馈"运行很慢"时，无需复现其环境即可定位原因。对选定的患者
+（每N例一次，或指定患者ID）包裹一种或多种剖析器:
+
+- cpu:    cProfile（Python函数级，输出 .prof 可用 snakeviz 查看，以及文本统计）
+- torch:  torch.profiler 算子统计表（CPU/CUDA耗时、显存）和Chrome trace
+- memory: tracemalloc 峰值分配快照（numpy等Python堆分配；不含CUDA显存）
+
+输出写入日志目录下的 profiles/<运行名>/，每种剖析器的前几个热点
+同时写入运行日志。
+
+说明: cProfile只记录启用它的线程，因此被剖析的患者不走后台预取，
+而是在主线程中完整加载+推理，保证剖析结果覆盖整个患者流程。
+"""
+
+import io
+import time
+import pstats
+import cProfile
+import logging
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('cpu', 'torch', 'memory')
+
+
+@dataclass
+class ProfileReport:
+    """单个患者的剖析结果"""
+    patient_id: str
+    files: List[Path] = field(default_factory=list)
+    summary: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+def _is_internal_frame(filename: str) -> bool:
+    return filename == tracemalloc.__file__ or filename.startswith('<frozen importlib')
+
+
+def _safe_name(patient_id: str) -> str:
+    return "".join(c if c.isalnum() or c in '-_.' else '_' for c in patient_id)
+
+
+class PatientProfiler:
+    """
+    按患者选择性地启用剖析器
+
+    用法:
+        profiler = PatientProfiler(['cpu', 'memory'], Path('logs/profiles/run1'), every=10)
+        if profiler.should_profile(index, patient_id):
+            with profiler.profile(patient_id) as report:
+                ...
+            for line in report.summary:
+                logger.info(line)
+    """
+
+    def __init__(self, modes: Iterable[str], output_dir: Path, every: int = 10,
+                 patient_ids: Optional[Iterable[str]] = None, top_n: int = 5,
+                 use_cuda: bool = False):
+        """
+        Args:
+            modes: 剖析器列表（cpu / torch / memory）
+            output_dir: 输出目录
+            every: 每N个患者剖析一次（第1、N+1、2N+1...例）；指定patient_ids时忽略
+            patient_ids: 只剖析这些患者ID
+            top_n: 写入运行日志的热点条数
+            use_cuda: torch剖析器是否记录CUDA活动
+        """
+        self.modes = list(dict.fromkeys(modes))
+        unknown = set(self.modes) - set(PROFILE_MODES)
+        if unknown:
+            raise ValueError(f"Unknown profile mode(s): {', '.join(sorted(unknown))}")
+        self.output_dir = Path(output_dir)
+        self.every = max(1, every)
+        self.patient_ids = set(patient_ids) if patient_ids else None
+        self.top_n = top_n
+        self.use_cuda = use_cuda
+        self.reports: List[ProfileReport] = []
+
+    def should_profile(self, index: int, patient_id: str) -> bool:
+        """index 从1开始"""
+        if self.patient_ids is not None:
+            return patient_id in self.patient_ids
+        return (index - 1) % self.every == 0
+
+    @contextmanager
+    def profile(self, patient_id: str):
+        """剖析一个患者；即使处理失败也会写出剖析结果"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        report = ProfileReport(patient_id=patient_id)
+        prefix = self.output_dir / _safe_name(patient_id)
+
+        if 'torch' in self.modes:
+            # 在tracemalloc启动前导入，避免把torch.profiler的导入计入内存剖析（导入在追踪下很慢）
+            import torch.profiler  # noqa: F401
+
+        finishers = []
+        start = time.perf_counter()
+        try:
+            # cProfile最后启动、最先停止，避免记录其他剖析器的开销
+            starters = (('memory', self._start_memory), ('torch', self._start_torch), ('cpu', self._start_cpu))
+            for mode, start_profiler in starters:
+                if mode in self.modes:
+                    finishers.append(start_profiler())
+            yield report
+        finally:
+            report.seconds = time.perf_counter() - start
+            for finish in reversed(finishers):
+                try:
+                    finish(prefix, report)
+                except Exception as e:
+                    logger.warning(f"Profiler output failed for {patient_id}: {e}")
+            self.reports.append(report)
+
+    # ------------------------------------------------------------------
+    # cProfile
+    # ------------------------------------------------------------------
+
+    def _start_cpu(self):
+        prof = cProfile.Profile()
+        prof.enable()
+
+        def finish(prefix: Path, report: ProfileReport):
+            prof.disable()
+            prof_file = prefix.with_name(prefix.name + '_cpu.prof')
+            prof.dump_stats(str(prof_file))
+
+            buf = io.StringIO()
+            stats = pstats.Stats(prof, stream=buf)
+            stats.sort_stats('cumulative').print_stats(40)
+            stats.sort_stats('tottime').print_stats(40)
+            txt_file = prefix.with_name(prefix.name + '_cpu.txt')
+            txt_file.write_text(buf.getvalue(), encoding='utf-8')
+            report.files += [prof_file, txt_file]
+
+            entries = sorted(stats.stats.items(), key=lambda kv: -kv[1][2])[:self.top_n]
+            hotspots = [f"{func} ({Path(filename).name}:{line}) {tt:.2f}s"
+                        for (filename, line, func), (_, _, tt, _, _) in entries]
+            report.summary.append(f"cpu top self-time: {'; '.join(hotspots)}")
+
+        return finish
+
+    # ------------------------------------------------------------------
+    # torch.profiler
+    # ------------------------------------------------------------------
+
+    def _start_torch(self):
+        import torch
+        from torch.profiler import profile, ProfilerActivity
+
+        activities = [ProfilerActivity.CPU]
+        if self.use_cuda and torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        prof = profile(activities=activities, record_shapes=True, profile_memory=True)
+        prof.start()
+
+        def finish(prefix: Path, report: ProfileReport):
+            prof.stop()
+            averages = prof.key_averages()
+            on_cuda = ProfilerActivity.CUDA in activities
+            # torch 2.4+ 将 cuda_time 重命名为 device_time
+            sort_key = 'self_cpu_time_total'
+            if on_cuda:
+                sample = averages[0] if len(averages) else None
+                sort_key = ('self_device_time_total' if hasattr(sample, 'self_device_time_total')
+                            else 'self_cuda_time_total')
+
+            txt_file = prefix.with_name(prefix.name + '_torch.txt')
+            txt_file.write_text(averages.table(sort_by=sort_key, row_limit=30), encoding='utf-8')
+            trace_file = prefix.with_name(prefix.name + '_torch_trace.json')
+            prof.export_chrome_trace(str(trace_file))
+            report.files += [txt_file, trace_file]
+
+            top = sorted(averages, key=lambda e: -getattr(e, sort_key, 0))[:self.top_n]
+            hotspots = [f"{e.key} {getattr(e, sort_key, 0) / 1e6:.2f}s x{e.count}" for e in top]
+            device = 'cuda' if on_cuda else 'cpu'
+            report.summary.append(f"torch top {device} ops: {'; '.join(hotspots)}")
+
+        return finish
+
+    # ------------------------------------------------------------------
+    # tracemalloc
+    # ------------------------------------------------------------------
+
+    def _start_memory(self):
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(10)
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        start_snapshot = tracemalloc.take_snapshot()
+
+        def finish(prefix: Path, report: ProfileReport):
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if started_here:
+                tracemalloc.stop()
+
+            # 患者处理结束后仍未释放的增长（缓存、泄漏）
+            # 按行聚合后再过滤（Snapshot.filter_traces 对每条trace做fnmatch，数十万条时很慢）
+            growth = [d for d in snapshot.compare_to(start_snapshot, 'lineno')
+                      if d.size_diff > 0 and not _is_internal_frame(d.traceback[0].filename)]
+            net = sum(d.size_diff for d in growth)
+            peak_mb = (peak - baseline) / 1024 ** 2
+
+            lines = [f"Peak traced memory: {peak_mb:.1f} MB above baseline ({peak / 1024 ** 2:.1f} MB total)",
+                     f"Net growth after patient: {net / 1024 ** 2:.2f} MB", "",
+                     "Top growth (by line):"]
+            lines += [str(d) for d in growth[:40]]
+            txt_file = prefix.with_name(prefix.name + '_memory.txt')
+            txt_file.write_text("\n".join(lines) + "\n", encoding='utf-8')
+            report.files.append(txt_file)
+
+            hotspots = [f"{Path(d.traceback[0].filename).name}:{d.traceback[0].lineno} "
+                        f"+{d.size_diff / 1024:.0f}KB" for d in growth[:self.top_n]]
+            report.summary.append(f"memory peak +{peak_mb:.1f} MB, net growth {net / 1024 ** 2:+.2f} MB"
+                                  + (f"; top growth: {'; '.join(hotspots)}" if hotspots else ""))
+
+        return finish
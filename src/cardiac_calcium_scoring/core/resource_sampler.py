@@ -0,0 +1,234 @@
+"""
+后台资源采样模块
+Background Resource Sampler
+
+在后台线程中按固定频率采集RAM、VRAM、CPU利用率和本进程RSS，
+写入固定大小的环形缓冲区。推理循环只读取最新快照（一次属性访问），
+不再在热路径中调用psutil和CUDA内存查询。
+
+缓冲区可在每次运行结束时导出为CSV/JSON，用于事后把变慢的时间段
+与内存压力对应起来。
+"""
+
+import csv
+import json
+import time
+import threading
+import logging
+from collections import deque
+from dataclasses import dataclass, asdict, fields
+from pathlib import Path
+from typing import List, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ResourceSample:
+    """单次资源采样"""
+    timestamp: float
+
+    # RAM
+    ram_total_gb: float
+    ram_available_gb: float
+    ram_percent_used: float     # 已用RAM百分比（0-100，= 100 - 可用百分比）
+
+    # GPU VRAM（无CUDA时为0）
+    vram_total_gb: float
+    vram_allocated_gb: float
+    vram_reserved_gb: float
+    vram_free_gb: float
+    vram_percent_used: float
+
+    # CPU利用率（全系统，百分比）
+    cpu_percent: float
+
+    # 本进程及子进程（DataLoader worker等）RSS
+    process_rss_gb: float
+    children_rss_gb: float
+
+
+class ResourceSampler:
+    """
+    后台资源采样器
+
+    用法:
+        sampler = ResourceSampler(interval_sec=1.0, buffer_size=3600)
+        sampler.start()
+        ...
+        sample = sampler.latest()   # 热路径中只读取最新快照
+        ...
+        sampler.stop()
+        sampler.export_csv(Path('logs/resources.csv'))
+    """
+
+    def __init__(self, interval_sec: float = 1.0, buffer_size: int = 3600,
+                 cuda_available: Optional[bool] = None):
+        """
+        Args:
+            interval_sec: 采样间隔（秒）
+            buffer_size: 环形缓冲区容量（样本数），满后丢弃最旧样本
+            cuda_available: 是否采集VRAM（默认自动检测）
+        """
+        self.interval_sec = max(0.05, float(interval_sec))
+        self.buffer_size = max(1, int(buffer_size))
+        self._buffer = deque(maxlen=self.buffer_size)
+        self._latest: Optional[ResourceSample] = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._process = psutil.Process()
+
+        if cuda_available is None:
+            try:
+                import torch
+                cuda_available = torch.cuda.is_available()
+            except ImportError:
+                cuda_available = False
+        self.cuda_available = cuda_available
+        self._vram_total_bytes = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> 'ResourceSampler':
+        """启动后台采样线程（先同步采样一次，保证latest()立即可用）"""
+        if self.is_running:
+            return self
+
+        if self.cuda_available:
+            import torch
+            self._vram_total_bytes = torch.cuda.get_device_properties(0).total_memory
+
+        # cpu_percent(interval=None) 第一次调用返回0，先初始化基准
+        psutil.cpu_percent(interval=None)
+        self._record(self.sample_now())
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='ResourceSampler', daemon=True)
+        self._thread.start()
+        logger.info(f"Resource sampler started (interval {self.interval_sec}s, buffer {self.buffer_size})")
+        return self
+
+    def stop(self):
+        """停止后台采样线程"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=self.interval_sec * 2 + 1)
+        self._thread = None
+        logger.info(f"Resource sampler stopped ({len(self._buffer)} samples buffered)")
+
+    def __enter__(self) -> 'ResourceSampler':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval_sec):
+            try:
+                self._record(self.sample_now())
+            except Exception as e:
+                logger.debug(f"Resource sampling failed: {e}")
+
+    def _record(self, sample: ResourceSample):
+        with self._lock:
+            self._buffer.append(sample)
+        self._latest = sample
+
+    def sample_now(self) -> ResourceSample:
+        """立即采样一次（会调用psutil/CUDA查询，不要在热路径中调用）"""
+        mem = psutil.virtual_memory()
+
+        vram_total = vram_alloc = vram_reserved = 0
+        if self.cuda_available:
+            import torch
+            vram_total = self._vram_total_bytes or torch.cuda.get_device_properties(0).total_memory
+            vram_alloc = torch.cuda.memory_allocated(0)
+            vram_reserved = torch.cuda.memory_reserved(0)
+
+        rss = self._process.memory_info().rss
+        children_rss = 0
+        try:
+            for child in self._process.children(recursive=True):
+                try:
+                    children_rss += child.memory_info().rss
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+        except psutil.Error:
+            pass
+
+        gb = 1024 ** 3
+        return ResourceSample(
+            timestamp=time.time(),
+            ram_total_gb=mem.total / gb,
+            ram_available_gb=mem.available / gb,
+            ram_percent_used=100.0 - (mem.available / mem.total) * 100,
+            vram_total_gb=vram_total / gb,
+            vram_allocated_gb=vram_alloc / gb,
+            vram_reserved_gb=vram_reserved / gb,
+            vram_free_gb=(vram_total - vram_reserved) / gb,
+            vram_percent_used=(vram_reserved / vram_total) * 100 if vram_total else 0.0,
+            cpu_percent=psutil.cpu_percent(interval=None),
+            process_rss_gb=rss / gb,
+            children_rss_gb=children_rss / gb,
+        )
+
+    def latest(self) -> Optional[ResourceSample]:
+        """返回最新快照（无锁读取，开销可忽略）"""
+        return self._latest
+
+    def snapshot(self) -> List[ResourceSample]:
+        """返回缓冲区全部样本的副本（按时间顺序）"""
+        with self._lock:
+            return list(self._buffer)
+
+    def peak(self, field_name: str) -> Optional[float]:
+        """返回缓冲区内某字段的最大值（如 'process_rss_gb'）"""
+        samples = self.snapshot()
+        if not samples:
+            return None
+        return max(getattr(s, field_name) for s in samples)
+
+    def export_csv(self, output_path: Path) -> Path:
+        """导出缓冲区为CSV"""
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        columns = [f.name for f in fields(ResourceSample)]
+        with open(output_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            for sample in self.snapshot():
+                writer.writerow(asdict(sample))
+        return output_path
+
+    def export_json(self, output_path: Path) -> Path:
+        """导出缓冲区为JSON"""
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'interval_sec': self.interval_sec,
+                'buffer_size': self.buffer_size,
+                'samples': [asdict(s) for s in self.snapshot()],
+            }, f, indent=2)
+        return output_path
+
+
+if __name__ == "__main__":
+    # 测试代码
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    sampler = ResourceSampler(interval_sec=0.2, buffer_size=10)
+    with sampler:
+        time.sleep(1.5)
+        latest = sampler.latest()
+        print(f"最新样本: RAM {latest.ram_available_gb:.1f}GB 可用, "
+              f"CPU {latest.cpu_percent:.0f}%, RSS {latest.process_rss_gb:.2f}GB")
+
+    print(f"缓冲区样本数: {len(sampler.snapshot())} (容量 {sampler.buffer_size})")
+    print(f"峰值RSS: {sampler.peak('process_rss_gb'):.2f}GB")
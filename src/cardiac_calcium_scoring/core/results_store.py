@@ -0,0 +1,249 @@
+"""
+结果列式存储模块
+Typed Results Store (Parquet, fixed schema + run metadata)
+
+结果CSV（utf-8-sig）每次运行整体写两遍，分析脚本每次读取都要重新做类型推断（可空整数
+变成float、布尔变成object）。本模块把同样的逐患者结果按固定schema写成 Parquet，
+运行信息（工具版本、模型校验和、机器与性能档位）写在文件元数据中:
+
+    <output_dir>/results/run=<run_id>/results.parquet
+
+    read_results('output/results')                # 所有运行，run 列取自分区目录名
+    read_results('output/results', latest=True)   # 每个患者只保留最近一次结果
+    read_run_metadata('output/results/run=20251020_101500')
+
+患者提交时追加到缓冲区，缓冲的行达到 row_group_rows 时写出为一个行组（row group），
+不重写已写出的部分；剩余的行在 close() 时写出。不按时间写出: footer 只在 close() 时写入，
+中途写出的行组在进程异常退出后也无法读取，只会产生大量小行组、拖慢读取。文件在 close()
+时改名为 results.parquet；进程异常退出时本次运行没有 Parquet 结果（留下 .tmp 文件），
+续跑缓存和CSV不受影响。未安装 pyarrow 时不写出（CSV照常）。
+"""
+
+import hashlib
+import json
+import os
+import logging
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = 'results'
+RESULTS_FILE = 'results.parquet'
+SCHEMA_VERSION = 1
+
+# 文件元数据中运行信息的键
+METADATA_KEY = b'nb10.run'
+
+# 固定列及类型（结果中的其他键，如 --trace 的 t_<stage>_sec，不写入）
+RESULT_COLUMNS = [
+    ('patient_id', 'string'),
+    ('status', 'string'),
+    ('error', 'string'),
+    ('agatston_score', 'float64'),
+    ('calcium_volume_mm3', 'float64'),
+    ('calcium_mass_mg', 'float64'),
+    ('num_slices', 'int32'),
+    ('has_calcification', 'bool'),
+    ('lesion_count', 'int32'),
+    ('slices_scored', 'int32'),
+    ('patient_age', 'int16'),
+    ('patient_sex', 'string'),
+    ('is_premature_cad', 'bool'),
+    ('slice_batch_size', 'float32'),
+    ('slice_batch_min', 'int32'),
+    ('oom_retries', 'int32'),
+    ('completed_at', 'timestamp[ms]'),
+]
+
+
+def result_schema(metadata: Optional[Dict] = None) -> 'pa.Schema':
+    """固定的结果schema（metadata 为运行信息，写入 METADATA_KEY）"""
+    types = {
+        'string': pa.string(), 'float64': pa.float64(), 'float32': pa.float32(),
+        'int32': pa.int32(), 'int16': pa.int16(), 'bool': pa.bool_(),
+        'timestamp[ms]': pa.timestamp('ms'),
+    }
+    schema = pa.schema([pa.field(name, types[kind]) for name, kind in RESULT_COLUMNS])
+    if metadata:
+        schema = schema.with_metadata({METADATA_KEY: json.dumps(metadata, default=str).encode('utf-8')})
+    return schema
+
+
+@lru_cache(maxsize=8)
+def _sha256(path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_checksum(path) -> Optional[str]:
+    """文件的SHA-256（同一进程内按大小和修改时间缓存）；文件不存在时为None"""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return _sha256(str(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _cell(value):
+    """结果字典中的值 -> Arrow可接受的Python值（numpy标量、NaN、空字符串）"""
+    if value is None:
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+class ResultsWriter:
+    """
+    逐患者追加结果，按行组写入一个 Parquet 文件
+
+    用法:
+        with ResultsWriter(output_dir / 'results', run_id, metadata) as writer:
+            writer.add(result)
+    """
+
+    def __init__(self, root: Path, run_id: str, metadata: Optional[Dict] = None,
+                 row_group_rows: int = 10_000, compression: str = 'zstd'):
+        """
+        Args:
+            root: 数据集根目录（其下为 run=<run_id> 分区）
+            run_id: 运行标识（分区目录名）
+            metadata: 运行信息（写入文件元数据，见 read_run_metadata）
+            row_group_rows: 每个行组的行数（最后一个行组可能更少）
+            compression: Parquet压缩算法
+        """
+        self.run_dir = Path(root) / f"run={run_id}"
+        self.path = self.run_dir / RESULTS_FILE
+        self.metadata = dict(metadata or {}, run_id=run_id, schema_version=SCHEMA_VERSION)
+        self.row_group_rows = max(1, row_group_rows)
+        self.compression = compression
+        self.rows_written = 0
+        self.row_groups = 0
+        self._schema = result_schema(self.metadata)
+        self._tmp = self.run_dir / f".{RESULTS_FILE}.tmp"
+        self._writer = None
+        self._rows: List[Dict] = []
+
+    def add(self, result: Dict):
+        """
+        追加一个患者的结果（结果字典，缺少的列为空）
+
+        行在加入缓冲区前按 schema 转换一次：不符合 schema 的结果在此处抛出，
+        不会留在缓冲区里让之后每次 flush()/close() 都失败。
+        """
+        row = {name: _cell(result.get(name)) for name, _ in RESULT_COLUMNS}
+        if row['error'] == '':
+            row['error'] = None
+        row['completed_at'] = datetime.now()
+        pa.RecordBatch.from_pylist([row], schema=self._schema)
+        self._rows.append(row)
+        if len(self._rows) >= self.row_group_rows:
+            self.flush()
+
+    def flush(self):
+        """把缓冲的行写出为一个行组"""
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows, schema=self._schema)
+        if self._writer is None:
+            self.run_dir.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(self._tmp, self._schema, compression=self.compression)
+        self._writer.write_table(table, row_group_size=len(self._rows))
+        self.rows_written += len(self._rows)
+        self.row_groups += 1
+        self._rows = []
+
+    def close(self):
+        """写出剩余行并完成文件（无结果时不生成文件）"""
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self._tmp, self.path)
+
+    def __enter__(self) -> 'ResultsWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def describe(self) -> str:
+        return f"{self.rows_written} rows in {self.row_groups} row group(s) -> {self.path}"
+
+
+def read_run_metadata(path: Path) -> Dict:
+    """读取运行信息（results.parquet 或其 run=<run_id> 目录）"""
+    path = Path(path)
+    if path.is_dir():
+        path = path / RESULTS_FILE
+    metadata = pq.read_schema(path).metadata or {}
+    return json.loads(metadata[METADATA_KEY]) if METADATA_KEY in metadata else {}
+
+
+def read_results(root: Path, run_id: Optional[str] = None, latest: bool = False) -> pd.DataFrame:
+    """
+    读取结果数据集（全部运行或单次运行），run 列取自分区目录名
+
+    整数、布尔列读取为pandas可空类型（Int32、boolean），缺失值不会把列变成float/object。
+
+    Args:
+        root: 数据集根目录（output/results）
+        run_id: 只读取该次运行
+        latest: 每个患者只保留最近一次运行的结果（成功结果优先于之后的失败，
+                与续跑时跳过已成功患者一致）
+    """
+    root = Path(root)
+    runs = [root / f"run={run_id}"] if run_id else sorted(root.glob('run=*'))
+    tables = []
+    for run_dir in runs:
+        path = run_dir / RESULTS_FILE
+        if path.exists():
+            table = pq.read_table(path)
+            run = pa.array([run_dir.name.split('=', 1)[1]] * table.num_rows, pa.string())
+            tables.append(table.add_column(0, 'run', run))
+    if not tables:
+        return pd.DataFrame(columns=['run'] + [name for name, _ in RESULT_COLUMNS])
+
+    df = pa.concat_tables(tables, promote_options='default').to_pandas(
+        types_mapper={pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype(),
+                      pa.bool_(): pd.BooleanDtype()}.get)
+    if latest:
+        df['_success'] = df['status'] == 'success'
+        df = (df.sort_values(['_success', 'run', 'completed_at'], kind='stable')
+                .drop_duplicates('patient_id', keep='last')
+                .drop(columns='_success')
+                .sort_values(['run', 'completed_at'], kind='stable')
+                .reset_index(drop=True))
+    return df
+
+
+def load_results_file(path) -> pd.DataFrame:
+    """
+    分析脚本的结果读取入口: 结果CSV，或 Parquet（results.parquet、run=<run_id> 目录、
+    数据集根目录；根目录时每个患者取最近一次结果）
+    """
+    path = Path(path)
+    if path.is_dir():
+        if path.name.startswith('run='):
+            return read_results(path.parent, run_id=path.name.split('=', 1)[1])
+        return read_results(path, latest=True)
+    if path.suffix == '.parquet':
+        return pd.read_parquet(path, dtype_backend='numpy_nullable')
+    return pd.read_csv(path, encoding='utf-8-sig')
@@ -36,7 +36,7 @@ class ResourceStatus:
     # RAM状态
     ram_total_gb: float
     ram_available_gb: float
-    ram_percent_used: float
+    ram_percent_used: float     # 已用RAM百分比（0-100，= 100 - 可用百分比；同步检查和采样器快照一致）
     ram_level: SafetyLevel
 
     # GPU VRAM状态
@@ -44,7 +44,7 @@ class ResourceStatus:
     vram_allocated_gb: float
     vram_reserved_gb: float
     vram_free_gb: float
-    vram_percent_used: float
+    vram_percent_used: float    # 已用（reserved）VRAM百分比（0-100）
     vram_level: SafetyLevel
 
     # 整体安全等级
@@ -102,6 +102,11 @@ class SafetyMonitor:
 
         self.enable_auto_downgrade = enable_auto_downgrade
 
+        # 后台采样器（可选，见 attach_sampler）
+        self._sampler = None
+        self._cached_sample = None
+        self._cached_status: Optional[ResourceStatus] = None
+
         # 检查CUDA可用性
         self.cuda_available = torch.cuda.is_available()
 
@@ -122,17 +127,17 @@ class SafetyMonitor:
         available_gb = mem.available / (1024 ** 3)
         percent_available = (mem.available / mem.total) * 100
 
-        # 判断安全等级
+        return total_gb, available_gb, percent_available, self._classify_ram(percent_available)
+
+    def _classify_ram(self, percent_available: float) -> SafetyLevel:
+        """根据可用RAM百分比判断安全等级"""
         if percent_available < self.ram_emergency:
-            level = SafetyLevel.EMERGENCY
+            return SafetyLevel.EMERGENCY
         elif percent_available < self.ram_critical:
-            level = SafetyLevel.CRITICAL
+            return SafetyLevel.CRITICAL
         elif percent_available < self.ram_warning:
-            level = SafetyLevel.WARNING
-        else:
-            level = SafetyLevel.SAFE
-
-        return total_gb, available_gb, percent_available, level
+            return SafetyLevel.WARNING
+        return SafetyLevel.SAFE
 
     def check_vram_status(self) -> Tuple[float, float, float, float, float, SafetyLevel]:
         """
@@ -155,17 +160,17 @@ class SafetyMonitor:
         free_gb = (total_bytes - reserved_bytes) / (1024 ** 3)
         percent_used = (reserved_bytes / total_bytes) * 100
 
-        # 判断安全等级
+        return total_gb, allocated_gb, reserved_gb, free_gb, percent_used, self._classify_vram(percent_used)
+
+    def _classify_vram(self, percent_used: float) -> SafetyLevel:
+        """根据已用VRAM百分比判断安全等级"""
         if percent_used > self.vram_emergency:
-            level = SafetyLevel.EMERGENCY
+            return SafetyLevel.EMERGENCY
         elif percent_used > self.vram_critical:
-            level = SafetyLevel.CRITICAL
+            return SafetyLevel.CRITICAL
         elif percent_used > self.vram_warning:
-            level = SafetyLevel.WARNING
-        else:
-            level = SafetyLevel.SAFE
-
-        return total_gb, allocated_gb, reserved_gb, free_gb, percent_used, level
+            return SafetyLevel.WARNING
+        return SafetyLevel.SAFE
 
     def check_status(self) -> ResourceStatus:
         """
@@ -175,12 +180,68 @@ class SafetyMonitor:
             ResourceStatus对象
         """
         # 检查RAM
-        ram_total, ram_avail, ram_percent_avail, ram_level = self.check_ram_status()
-        ram_percent_used = 100 - ram_percent_avail
+        ram_total, ram_avail, _, _ = self.check_ram_status()
 
         # 检查VRAM
         vram_total, vram_alloc, vram_reserved, vram_free, vram_percent_used, vram_level = self.check_vram_status()
 
+        return self._build_status(
+            ram_total, ram_avail,
+            vram_total, vram_alloc, vram_reserved, vram_free, vram_percent_used, vram_level,
+        )
+
+    def attach_sampler(self, sampler):
+        """
+        绑定后台资源采样器（ResourceSampler）
+
+        绑定后 latest_status() 直接使用采样器的最新快照，
+        不再在调用线程中查询psutil/CUDA。
+        """
+        self._sampler = sampler
+        self._cached_sample = None
+        self._cached_status = None
+
+    def latest_status(self) -> ResourceStatus:
+        """
+        获取资源状态（热路径使用）
+
+        有运行中的采样器时只读取其最新快照，同一快照的结果会被缓存；
+        否则退回到同步的 check_status()。
+
+        Returns:
+            ResourceStatus对象
+        """
+        sampler = self._sampler
+        sample = sampler.latest() if sampler is not None and sampler.is_running else None
+        if sample is None:
+            return self.check_status()
+
+        if sample is not self._cached_sample:
+            self._cached_status = self._build_status(
+                sample.ram_total_gb, sample.ram_available_gb,
+                sample.vram_total_gb, sample.vram_allocated_gb, sample.vram_reserved_gb,
+                sample.vram_free_gb, sample.vram_percent_used,
+                self._classify_vram(sample.vram_percent_used) if sample.vram_total_gb else SafetyLevel.SAFE,
+            )
+            self._cached_sample = sample
+        return self._cached_status
+
+    def _build_status(
+        self,
+        ram_total: float, ram_avail: float,
+        vram_total: float, vram_alloc: float, vram_reserved: float, vram_free: float,
+        vram_percent_used: float, vram_level: SafetyLevel,
+    ) -> ResourceStatus:
+        """
+        根据RAM/VRAM数值组装ResourceStatus
+
+        RAM的已用百分比和等级只在这里由总量/可用量计算，check_status() 与
+        latest_status()（采样器快照）得到的 ram_percent_used 含义相同。
+        """
+        ram_percent_avail = (ram_avail / ram_total) * 100 if ram_total else 100.0
+        ram_percent_used = 100 - ram_percent_avail
+        ram_level = self._classify_ram(ram_percent_avail)
+
         # 确定整体安全等级（取最危险的）
         levels = [ram_level, vram_level]
         if SafetyLevel.EMERGENCY in levels:
@@ -0,0 +1,69 @@
+"""
+患者调度模块
+Patient Scheduling (LPT)
+
+多个worker并行处理时，按文件夹名顺序（FIFO）容易在最后留下一个超大检查
+（如900层的薄层序列），其他worker空闲等待。使用运行前即可得到的廉价成本估计
+（头信息索引中的切片数 / RunPlanner.estimate()）调整顺序:
+
+- fifo: 保持原顺序
+- lpt:  Longest-Processing-Time-first，按预测耗时从大到小排序；
+        配合共享队列（空闲worker取下一个，即work stealing）时，
+        makespan 不超过最优解的 4/3 - 1/(3m)
+
+另提供 list_schedule() 按给定顺序模拟共享队列的makespan（benchmark schedule 使用）。
+"""
+
+import heapq
+from typing import Callable, List, Sequence, Tuple, TypeVar
+
+T = TypeVar('T')
+
+SCHEDULES = ('fifo', 'lpt')
+
+
+def order_by_cost(items: Sequence[T], cost_fn: Callable[[T], float], strategy: str = 'lpt') -> List[T]:
+    """
+    按调度策略排序
+
+    Args:
+        items: 待处理条目（如患者文件夹）
+        cost_fn: 成本估计函数（秒或切片数，只需可比较）
+        strategy: 'fifo' 或 'lpt'
+
+    Returns:
+        新的列表（lpt为稳定排序，成本相同的条目保持原顺序）
+    """
+    if strategy not in SCHEDULES:
+        raise ValueError(f"Unknown schedule '{strategy}' (choose from: {', '.join(SCHEDULES)})")
+    if strategy == 'fifo':
+        return list(items)
+    return sorted(items, key=lambda item: -cost_fn(item))
+
+
+def list_schedule(costs: Sequence[float], workers: int) -> Tuple[float, List[List[int]]]:
+    """
+    模拟共享队列：按顺序把每个任务交给最早空闲的worker
+
+    Args:
+        costs: 按处理顺序排列的任务成本
+        workers: worker数
+
+    Returns:
+        (makespan, 每个worker处理的任务下标列表)
+    """
+    workers = max(1, workers)
+    heap = [(0.0, w) for w in range(workers)]
+    assignments: List[List[int]] = [[] for _ in range(workers)]
+    for idx, cost in enumerate(costs):
+        free_at, w = heapq.heappop(heap)
+        assignments[w].append(idx)
+        heapq.heappush(heap, (free_at + cost, w))
+    return max(t for t, _ in heap), assignments
+
+
+def makespan_lower_bound(costs: Sequence[float], workers: int) -> float:
+    """max(最大单个任务, 总量/worker数)"""
+    if not costs:
+        return 0.0
+    return max(max(costs), sum(costs) / max(1, workers))
@@ -0,0 +1,167 @@
+"""
+评分/输出阶段模块
+Asynchronous Scoring and Output Stage
+
+模型前向完成后，评分（连通域标记、Agatston）、病灶表写出和结果提交原来都在主线程中
+串行执行，期间GPU空闲。本模块把这些CPU工作放到独立的工作线程中：主线程提交前向结果后
+立即开始下一个患者的前向计算。
+
+- 有界队列：等待评分的患者数超过上限时 submit() 阻塞（背压），内存占用有上界
+- 有序提交：多个评分线程可乱序完成，commit_fn 仍严格按提交顺序、逐个串行调用
+  （重排缓冲区），结果文件与续跑缓存的行序与处理顺序一致
+- 提交前的失败（加载、前向）也通过 submit_error() 进入同一序列，保持顺序
+
+持久性由 commit_fn 负责（如续跑缓存每行写入后 fsync）：进程崩溃时，已提交的患者都在
+磁盘上，尚在队列中的患者未记录，续跑时重新处理。
+
+    stage = ScoringStage(score_fn, commit_fn, workers=1, queue_size=2)
+    for folder in folders:
+        stage.submit(predict(folder), context=folder)   # 队列满时阻塞
+    stage.close()                                       # 等待全部提交完成
+"""
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Item:
+    sequence: int
+    context: Any
+    payload: Any = None
+    result: Any = None
+    error: Optional[BaseException] = None
+    needs_scoring: bool = True
+
+
+class ScoringStage:
+    """
+    评分线程 + 有界队列 + 按序提交
+
+    score_fn(payload) -> result 在评分线程中执行；
+    commit_fn(context, result, error) 按 submit 顺序串行执行（error 非 None 时 result 为 None）。
+    commit_fn 抛出异常后阶段停止提交，之后的 submit()/drain()/close() 重新抛出该异常。
+    """
+
+    def __init__(self, score_fn: Callable[[Any], Any],
+                 commit_fn: Callable[[Any, Any, Optional[BaseException]], None],
+                 workers: int = 1, queue_size: int = 2, name: str = 'scoring'):
+        """
+        Args:
+            score_fn: 评分函数（CPU工作，在评分线程中执行）
+            commit_fn: 提交函数（写结果，按提交顺序串行执行）
+            workers: 评分线程数
+            queue_size: 等待评分的最大条目数（超过时 submit 阻塞）
+            name: 线程名前缀
+        """
+        self.score_fn = score_fn
+        self.commit_fn = commit_fn
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self.submitted = 0
+        self.committed = 0
+        self.blocked_sec = 0.0  # submit() 因队列满而等待的累计时间
+
+        self._queue: 'queue.Queue[Optional[_Item]]' = queue.Queue(maxsize=self.queue_size)
+        self._ready: Dict[int, _Item] = {}
+        self._commit_lock = threading.Lock()
+        self._failure: Optional[BaseException] = None
+        self._closed = False
+        self._threads: List[threading.Thread] = []
+        for k in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{name}-{k}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def pending(self) -> int:
+        """已提交但尚未完成 commit 的条目数"""
+        return self.submitted - self.committed
+
+    def submit(self, payload: Any, context: Any = None):
+        """提交待评分的条目（队列满时阻塞）"""
+        self._put(_Item(self.submitted, context, payload=payload))
+
+    def submit_result(self, result: Any, context: Any = None):
+        """提交已评分的结果（不经过 score_fn，仍按顺序提交）"""
+        self._put(_Item(self.submitted, context, result=result, needs_scoring=False))
+
+    def submit_error(self, error: BaseException, context: Any = None):
+        """提交评分前已失败的条目（按顺序以 error 调用 commit_fn）"""
+        self._put(_Item(self.submitted, context, error=error, needs_scoring=False))
+
+    def _put(self, item: _Item):
+        self._raise_failure()
+        if self._closed:
+            raise RuntimeError("ScoringStage is closed")
+        self.submitted += 1
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            start = time.perf_counter()
+            self._queue.put(item)
+            self.blocked_sec += time.perf_counter() - start
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            if item.needs_scoring and self._failure is None:
+                try:
+                    item.result = self.score_fn(item.payload)
+                except Exception as e:
+                    item.error = e
+            item.payload = None
+            self._complete(item)
+            self._queue.task_done()
+
+    def _complete(self, item: _Item):
+        """放入重排缓冲区，按序号提交所有已就绪的条目"""
+        with self._commit_lock:
+            self._ready[item.sequence] = item
+            while self.committed in self._ready:
+                ready = self._ready.pop(self.committed)
+                if self._failure is None:
+                    try:
+                        self.commit_fn(ready.context, ready.result, ready.error)
+                    except BaseException as e:
+                        logger.error(f"Result commit failed, stopping the scoring stage: {e}")
+                        self._failure = e
+                self.committed += 1
+
+    def _raise_failure(self):
+        if self._failure is not None:
+            raise RuntimeError(f"Scoring stage stopped: {self._failure}") from self._failure
+
+    def drain(self):
+        """等待所有已提交的条目完成 commit"""
+        self._queue.join()
+        self._raise_failure()
+
+    def close(self):
+        """等待全部提交完成并结束评分线程（可重复调用）"""
+        if not self._closed:
+            self._closed = True
+            for _ in self._threads:
+                self._queue.put(None)
+            for thread in self._threads:
+                thread.join()
+        self._raise_failure()
+
+    def __enter__(self) -> 'ScoringStage':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def describe(self) -> str:
+        return (f"{self.committed} committed by {self.workers} worker(s), queue {self.queue_size}, "
+                f"forward pass blocked {self.blocked_sec:.1f}s on a full queue")
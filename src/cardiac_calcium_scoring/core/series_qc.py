@@ -0,0 +1,157 @@
+"""
+序列质控模块
+Pre-inference Series QC
+
+损坏或不可用的检查原来要到 CTChestDataset_nongated.__getitem__ 解码时才暴露：打印错误后
+返回 512x512x64 的全零"corrupt"体数据，照样经过模型推理，结果为0分。本模块在解码任何
+像素之前，用头信息索引已读取的逐切片几何信息（ImagePositionPatient、ImageOrientationPatient、
+PixelSpacing、Rows、Columns）对选中序列做质控，不通过的检查直接记为失败并给出具体原因，
+不占用推理时间。
+
+检查项（逐切片数组上的向量化计算）:
+- 切片数过少（定位像、单层重建）
+- 切片矩阵尺寸（Rows x Columns）不一致
+- 方向不一致、非轴位序列（层面法向与z轴夹角过大）
+- 位置缺失、重复位置（同一位置多个切片）
+- z方向缺层（间距大于中位间距的 gap_factor 倍）、层间距不均匀
+- 像素间距不一致
+
+某项信息在整个序列中都缺失（如DICOMDIR导出未逐个读取文件头）时跳过对应检查，
+只有部分切片缺失才判为失败。
+
+    geometry = np.array([slice_geometry(ds) for ds in headers])
+    reason = check_series(geometry)     # None 表示通过
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# 头信息索引需要额外读取的标签
+GEOMETRY_TAGS = ['ImagePositionPatient', 'ImageOrientationPatient', 'PixelSpacing', 'Rows', 'Columns']
+
+# slice_geometry() 返回值的列
+_POS = slice(0, 3)
+_ORIENT = slice(3, 9)
+_SPACING = slice(9, 11)
+_MATRIX = slice(11, 13)
+GEOMETRY_COLUMNS = 13
+
+
+@dataclass
+class QCThresholds:
+    """质控阈值"""
+    min_slices: int = 20                  # 少于该切片数视为定位像/不完整序列
+    gap_factor: float = 1.5               # 层间距超过中位间距的倍数视为缺层
+    spacing_tolerance: float = 0.1        # 层间距相对变化上限（缺层以外）
+    duplicate_tolerance_mm: float = 0.01  # 小于该距离视为重复位置
+    orientation_tolerance: float = 1e-3   # 方向余弦的最大偏差
+    max_tilt_deg: float = 30.0            # 层面法向与z轴的最大夹角（机架倾斜）
+
+
+def _values(ds, keyword: str, count: int) -> List[float]:
+    value = getattr(ds, keyword, None)
+    try:
+        values = [float(v) for v in (value if count > 1 else [value])]
+    except (TypeError, ValueError):
+        return [np.nan] * count
+    return values if len(values) == count else [np.nan] * count
+
+
+def slice_geometry(ds) -> List[float]:
+    """一个切片的几何信息（13个数，缺失为NaN）: 位置3 + 方向6 + 像素间距2 + 行列2"""
+    return (_values(ds, 'ImagePositionPatient', 3) + _values(ds, 'ImageOrientationPatient', 6)
+            + _values(ds, 'PixelSpacing', 2) + _values(ds, 'Rows', 1) + _values(ds, 'Columns', 1))
+
+
+def _partial(block: np.ndarray) -> int:
+    """部分缺失的切片数（整列缺失时为0，表示该信息未知而非缺失）"""
+    missing = np.isnan(block).any(axis=1)
+    return int(missing.sum()) if not missing.all() else 0
+
+
+def check_series(geometry: Sequence[Sequence[float]],
+                 thresholds: Optional[QCThresholds] = None) -> Optional[str]:
+    """
+    对一个序列做质控
+
+    Args:
+        geometry: 每个切片一行 slice_geometry()，形状 (切片数, 13)；
+                  行数即切片数，几何未知时可全为NaN
+        thresholds: 质控阈值（默认 QCThresholds()）
+
+    Returns:
+        None 表示通过；否则为失败原因（多项以 '; ' 分隔）
+    """
+    t = thresholds or QCThresholds()
+    g = np.asarray(geometry, dtype=float).reshape(-1, GEOMETRY_COLUMNS)
+    n = len(g)
+    reasons: List[str] = []
+
+    if n < t.min_slices:
+        reasons.append(f"too few slices: {n} (minimum {t.min_slices})")
+    if n == 0:
+        return reasons[0]
+
+    # 矩阵尺寸
+    matrix = g[:, _MATRIX]
+    known = matrix[~np.isnan(matrix).any(axis=1)]
+    if len(known):
+        sizes, counts = np.unique(known, axis=0, return_counts=True)
+        if len(sizes) > 1:
+            listed = ", ".join(f"{int(r)}x{int(c)} ({k})" for (r, c), k in zip(sizes, counts))
+            reasons.append(f"mismatched rows/columns: {listed}")
+
+    # 方向: 一致性与轴位
+    orient = g[:, _ORIENT]
+    normal = np.array([0.0, 0.0, 1.0])
+    missing = _partial(orient)
+    if missing:
+        reasons.append(f"ImageOrientationPatient missing on {missing}/{n} slices")
+    elif not np.isnan(orient).all():
+        deviation = np.abs(orient - orient[0]).max()
+        if deviation > t.orientation_tolerance:
+            reasons.append(f"inconsistent orientation across slices (max cosine deviation {deviation:.3f})")
+        cross = np.cross(orient[0, :3], orient[0, 3:])
+        norm = np.linalg.norm(cross)
+        if norm > 0:
+            normal = cross / norm
+            tilt = float(np.degrees(np.arccos(min(1.0, abs(normal[2])))))
+            if tilt > t.max_tilt_deg:
+                reasons.append(f"non-axial series: slice normal {tilt:.0f} deg from z "
+                               f"(maximum {t.max_tilt_deg:.0f})")
+
+    # 像素间距
+    spacing = g[:, _SPACING]
+    known = spacing[~np.isnan(spacing).any(axis=1)]
+    if len(known) and np.abs(known - known[0]).max() > 1e-3 * max(known[0].max(), 1.0):
+        reasons.append(f"inconsistent pixel spacing: {known.min():.3f}-{known.max():.3f} mm")
+
+    # 位置: 沿层面法向投影后排序
+    positions = g[:, _POS]
+    missing = _partial(positions[:, 2:3])
+    if missing:
+        reasons.append(f"ImagePositionPatient missing on {missing}/{n} slices")
+    elif n > 1 and not np.isnan(positions[:, 2]).all():
+        if np.isnan(positions).any():
+            z = np.sort(positions[:, 2])
+        else:
+            z = np.sort(positions @ normal)
+        steps = np.diff(z)
+        duplicate = steps < t.duplicate_tolerance_mm
+        if duplicate.any():
+            reasons.append(f"duplicate slice positions: {int(duplicate.sum())} "
+                           f"(first at {z[1:][duplicate][0]:.1f} mm)")
+        steps = steps[~duplicate]
+        if len(steps):
+            median = float(np.median(steps))
+            gaps = steps > t.gap_factor * median
+            if gaps.any():
+                reasons.append(f"z-gap: {int(gaps.sum())} gap(s), largest {steps.max():.1f} mm "
+                               f"(median spacing {median:.2f} mm)")
+            regular = steps[~gaps]
+            if len(regular) and (regular.max() - regular.min()) > t.spacing_tolerance * median:
+                reasons.append(f"inconsistent slice spacing: {regular.min():.2f}-{regular.max():.2f} mm")
+
+    return "; ".join(reasons) if reasons else None
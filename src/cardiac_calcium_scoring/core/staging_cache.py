@@ -0,0 +1,318 @@
+"""
+本地暂存模块
+Local SSD Staging Cache for Slow Mounts
+
+数据位于 Google Drive（Colab FUSE挂载）或医院SMB共享时，每个患者数百个小DICOM文件的
+逐个读取（每次打开/读取都是一次网络往返）远慢于推理本身。本模块在后台按处理顺序:
+
+1. 对后续 lookahead 个患者做序列选择（只读文件头）
+2. 用 copy_workers 个线程并行把选中序列的文件复制到本地磁盘
+3. 流水线从本地副本解码；解码完成（像素已在内存中）后立即删除副本
+
+暂存总量受 max_bytes 限制：空间不足时按顺序等待前面的患者被释放；
+单个患者超过预算时不暂存，直接从原位置读取。
+
+    staging = StagingCache(stage_dir, max_bytes=20 * 2**30, lookahead=4)
+    staging.schedule(folders, files_fn)
+    local_files = staging.fetch(folder)    # 等待暂存完成；None 表示从原位置读取
+    ...                                    # 读取 local_files
+    staging.release(folder)
+    staging.close()
+"""
+
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+try:
+    from .archive_source import file_size, get_archive, split_archive_path
+    from .dicom_series_selector import prepare_dicom_for_aicac
+except ImportError:
+    from archive_source import file_size, get_archive, split_archive_path
+    from dicom_series_selector import prepare_dicom_for_aicac
+
+try:
+    from shared.environment.runtime_detector import detect_google_drive
+except ImportError:
+    detect_google_drive = None
+
+logger = logging.getLogger(__name__)
+
+# 网络/FUSE文件系统（/proc/mounts 中的 fstype）
+REMOTE_FILESYSTEMS = ('cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'afs', '9p', 'sshfs', 'davfs')
+
+# 超过该时长的残留暂存目录（进程异常退出留下）在启动时清理
+STALE_RUN_SEC = 24 * 3600
+
+
+def _mount_fstype(path: str) -> Optional[str]:
+    """path所在挂载点的文件系统类型（Linux，读取 /proc/mounts）"""
+    try:
+        with open('/proc/mounts', 'r') as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return None
+    best, fstype = '', None
+    for mount_point, kind in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) and len(mount_point) > len(best):
+            best, fstype = mount_point, kind
+    return fstype
+
+
+def is_remote_path(path) -> bool:
+    """
+    路径是否位于网络挂载（SMB/NFS/Google Drive等）
+
+    Windows: UNC路径或网络映射盘；Linux: /proc/mounts 中的网络或FUSE文件系统；
+    另外识别 Colab 的 Google Drive 挂载点。
+    """
+    split = split_archive_path(path)
+    path = os.path.abspath(split[0] if split else str(path))
+
+    if path.startswith(('\\\\', '//')):
+        return True
+    if os.name == 'nt':
+        try:
+            import ctypes
+            drive = os.path.splitdrive(path)[0] + '\\'
+            return ctypes.windll.kernel32.GetDriveTypeW(drive) == 4  # DRIVE_REMOTE
+        except Exception:
+            return False
+
+    if detect_google_drive is not None:
+        try:
+            mounted, mount_path = detect_google_drive()
+            if mounted and mount_path and path.startswith(str(mount_path)):
+                return True
+        except Exception:
+            pass
+
+    fstype = _mount_fstype(path)
+    return bool(fstype) and (fstype.startswith('fuse') or fstype in REMOTE_FILESYSTEMS)
+
+
+def _copy_file(src: str, dst: str) -> int:
+    """复制一个文件（支持压缩包虚拟路径），返回字节数"""
+    split = split_archive_path(src)
+    if split is None:
+        shutil.copyfile(src, dst)
+        return os.path.getsize(dst)
+    archive_path, member = split
+    with get_archive(archive_path).open(member) as fin, open(dst, 'wb') as fout:
+        shutil.copyfileobj(fin, fout, 1024 * 1024)
+        return fout.tell()
+
+
+@dataclass
+class StagingStats:
+    """暂存统计"""
+    staged: int = 0            # 已暂存的患者数
+    skipped: int = 0           # 超预算或失败、从原位置读取的患者数
+    bytes_copied: int = 0
+    copy_seconds: float = 0.0  # 复制（不含序列选择）耗时合计
+    wait_seconds: float = 0.0  # 流水线等待暂存完成的时间合计
+    peak_bytes: int = 0
+
+    def describe(self) -> str:
+        rate = self.bytes_copied / self.copy_seconds / 2**20 if self.copy_seconds else 0.0
+        return (f"{self.staged} staged, {self.skipped} read in place, "
+                f"{self.bytes_copied / 2**20:.0f} MB copied at {rate:.1f} MB/s, "
+                f"peak {self.peak_bytes / 2**20:.0f} MB, pipeline waited {self.wait_seconds:.1f}s")
+
+
+class StagingCache:
+    """
+    按处理顺序把后续患者选中的序列暂存到本地磁盘
+
+    暂存在单个后台线程中按顺序进行（并行度在文件复制层），因此预算等待只依赖
+    排在前面、已经暂存的患者被释放，不会互相等待。
+    """
+
+    def __init__(self, stage_dir: Optional[Path] = None, max_bytes: int = 20 * 2**30,
+                 lookahead: int = 4, copy_workers: int = 8,
+                 select_fn: Optional[Callable[[Path, Optional[List[str]]], Optional[List[str]]]] = None):
+        """
+        Args:
+            stage_dir: 本地暂存目录（默认系统临时目录下的 nb10_staging）
+            max_bytes: 暂存总量上限
+            lookahead: 最多提前暂存的患者数（相对流水线最近取走的患者）
+            copy_workers: 并行复制文件的线程数
+            select_fn: select_fn(folder, files) -> 需要暂存的文件（默认: 选中序列的文件）
+        """
+        base = Path(stage_dir) if stage_dir else Path(tempfile.gettempdir()) / 'nb10_staging'
+        base.mkdir(parents=True, exist_ok=True)
+        self._remove_stale_runs(base)
+        self.run_dir = Path(tempfile.mkdtemp(prefix='run_', dir=str(base)))
+        self.max_bytes = max_bytes
+        self.lookahead = max(1, lookahead)
+        self.select_fn = select_fn or _selected_series_files
+        self.stats = StagingStats()
+
+        self._copy_pool = ThreadPoolExecutor(max_workers=max(1, copy_workers),
+                                             thread_name_prefix='StageCopy')
+        self._cond = threading.Condition()
+        self._order: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._files_fn: Callable[[Path], Optional[List[str]]] = lambda folder: None
+        self._futures: Dict[str, Future] = {}
+        self._staged: Dict[str, int] = {}  # 键 -> 暂存字节数（尚未释放）
+        self._used = 0
+        self._fetched = -1                 # 流水线取走的最大序号
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _remove_stale_runs(base: Path):
+        now = time.time()
+        for entry in base.glob('run_*'):
+            try:
+                if now - entry.stat().st_mtime > STALE_RUN_SEC:
+                    shutil.rmtree(entry, ignore_errors=True)
+            except OSError:
+                pass
+
+    def schedule(self, folders: Sequence[Path],
+                 files_fn: Optional[Callable[[Path], Optional[List[str]]]] = None):
+        """
+        设置处理顺序并启动后台暂存
+
+        Args:
+            folders: 患者目录（按处理顺序）
+            files_fn: files_fn(folder) -> 已知的DICOM文件列表（如头信息索引），None时由选择函数自行列出
+        """
+        with self._cond:
+            self._order = [str(f) for f in folders]
+            self._index = {key: i for i, key in enumerate(self._order)}
+            self._futures = {key: Future() for key in self._order}
+            if files_fn is not None:
+                self._files_fn = files_fn
+        self._thread = threading.Thread(target=self._run, name='StagingCache', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for idx, key in enumerate(self._order):
+            with self._cond:
+                # 只暂存到流水线前方 lookahead 个患者
+                while not self._closed and idx > self._fetched + self.lookahead:
+                    self._cond.wait()
+                if self._closed:
+                    break
+            future = self._futures[key]
+            if future.done():
+                continue
+            try:
+                future.set_result(self._stage(idx, Path(key)))
+            except Exception as e:
+                logger.warning(f"Staging failed for {Path(key).name}, reading in place: {e}")
+                with self._cond:
+                    self.stats.skipped += 1
+                future.set_result(None)
+        # 关闭时未开始的患者从原位置读取
+        for future in self._futures.values():
+            if not future.done():
+                future.set_result(None)
+
+    def _stage(self, idx: int, folder: Path) -> Optional[List[str]]:
+        files = self.select_fn(folder, self._files_fn(folder))
+        if not files:
+            with self._cond:
+                self.stats.skipped += 1
+            return None
+        size = sum(file_size(f) for f in files)
+        if size > self.max_bytes:
+            logger.info(f"{folder.name}: {size / 2**20:.0f} MB exceeds the staging budget, reading in place")
+            with self._cond:
+                self.stats.skipped += 1
+            return None
+
+        key = str(folder)
+        with self._cond:
+            while not self._closed and self._used and self._used + size > self.max_bytes:
+                self._cond.wait()
+            if self._closed:
+                return None
+            self._used += size
+            self._staged[key] = size
+            self.stats.peak_bytes = max(self.stats.peak_bytes, self._used)
+
+        target = self.run_dir / f"{idx:05d}"
+        target.mkdir(exist_ok=True)
+        destinations = [str(target / f"{n:05d}_{os.path.basename(src)}") for n, src in enumerate(files)]
+        start = time.perf_counter()
+        try:
+            copied = sum(self._copy_pool.map(_copy_file, files, destinations))
+        except Exception:
+            self._discard(key, target)
+            raise
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self.stats.staged += 1
+            self.stats.bytes_copied += copied
+            self.stats.copy_seconds += elapsed
+        logger.debug(f"Staged {folder.name}: {len(files)} files, {copied / 2**20:.1f} MB in {elapsed:.2f}s")
+        return destinations
+
+    def fetch(self, folder: Path) -> Optional[List[str]]:
+        """
+        等待folder暂存完成
+
+        Returns:
+            本地文件路径列表；未安排、超预算或暂存失败时返回None（从原位置读取）
+        """
+        key = str(folder)
+        with self._cond:
+            idx = self._index.get(key)
+            if idx is None:
+                return None
+            if idx > self._fetched:
+                self._fetched = idx
+                self._cond.notify_all()
+            future = self._futures[key]
+        start = time.perf_counter()
+        files = future.result()
+        with self._cond:
+            self.stats.wait_seconds += time.perf_counter() - start
+        return files
+
+    def release(self, folder: Path):
+        """删除folder的本地副本，释放预算"""
+        key = str(folder)
+        idx = self._index.get(key)
+        if idx is not None:
+            self._discard(key, self.run_dir / f"{idx:05d}")
+
+    def _discard(self, key: str, target: Path):
+        shutil.rmtree(target, ignore_errors=True)
+        with self._cond:
+            self._used -= self._staged.pop(key, 0)
+            self._cond.notify_all()
+
+    def close(self):
+        """停止暂存并删除所有本地副本"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self._copy_pool.shutdown(wait=True)
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+
+    def __enter__(self) -> 'StagingCache':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _selected_series_files(folder: Path, files: Optional[List[str]]) -> Optional[List[str]]:
+    """默认选择函数：序列选择后选中序列的文件（只读取文件头）"""
+    result = prepare_dicom_for_aicac(folder, files=files)
+    return result['file_paths'] if result else None
@@ -0,0 +1,115 @@
+"""
+检查级元数据模块
+Per-study Metadata (Demographics)
+
+序列识别（identify_dicom_series）逐个读取文件头时，从每个序列的第一个文件取出患者/检查
+信息（PatientAge、PatientSex、PatientBirthDate、StudyDate），有DICOMDIR时直接取自其
+PATIENT/STUDY记录。人口学信息（年龄、性别、早发CAD）因此不需要再遍历目录或读取文件:
+
+    series = prepare_dicom_for_aicac(folder)
+    series['metadata'].demographics()
+    # {'patient_age': 58, 'patient_sex': 'M', 'is_premature_cad': False}
+"""
+
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional
+
+# 早发CAD年龄界限（ACCF/AHA: 男 <55岁，女 <65岁）
+PREMATURE_CAD_AGE = {'M': 55, 'F': 65}
+
+# 字段 -> DICOM关键字
+_KEYWORDS = {
+    'patient_id': 'PatientID',
+    'patient_age_raw': 'PatientAge',
+    'patient_sex_raw': 'PatientSex',
+    'birth_date': 'PatientBirthDate',
+    'study_date': 'StudyDate',
+}
+
+# 只需要元数据时传给 dcmread(specific_tags=...)
+METADATA_TAGS = list(_KEYWORDS.values())
+
+
+@dataclass
+class StudyMetadata:
+    """一个检查的患者/检查信息（DICOM原始字符串，缺失为None）"""
+    patient_id: Optional[str] = None
+    patient_age_raw: Optional[str] = None   # PatientAge，如 '055Y'
+    patient_sex_raw: Optional[str] = None   # PatientSex
+    birth_date: Optional[str] = None        # PatientBirthDate (YYYYMMDD)
+    study_date: Optional[str] = None        # StudyDate (YYYYMMDD)
+
+    @classmethod
+    def from_dataset(cls, ds) -> 'StudyMetadata':
+        """从 pydicom Dataset（或DICOMDIR的 FileInstance）读取"""
+        values = {}
+        for name, keyword in _KEYWORDS.items():
+            value = getattr(ds, keyword, None)
+            values[name] = (str(value).strip() or None) if value is not None else None
+        return cls(**values)
+
+    def merge(self, other: Optional['StudyMetadata']) -> 'StudyMetadata':
+        """用other补全本对象缺失的字段"""
+        if other is None:
+            return self
+        return StudyMetadata(**{f.name: getattr(self, f.name) or getattr(other, f.name)
+                                for f in fields(self)})
+
+    @property
+    def is_empty(self) -> bool:
+        return not any(getattr(self, f.name) for f in fields(self))
+
+    @property
+    def has_demographics(self) -> bool:
+        """年龄和性别均可确定"""
+        return self.patient_age is not None and self.patient_sex is not None
+
+    def _stated_age(self) -> Optional[int]:
+        age = self.patient_age_raw or ''
+        if age.endswith('Y'):
+            try:
+                return int(age[:-1])
+            except ValueError:
+                return None
+        return None
+
+    def _calculated_age(self) -> Optional[int]:
+        if not (self.birth_date and self.study_date):
+            return None
+        try:
+            return int(self.study_date[:4]) - int(self.birth_date[:4])
+        except ValueError:
+            return None
+
+    @property
+    def patient_age(self) -> Optional[int]:
+        """年龄（岁）: PatientAge（'055Y'），否则用检查年份减出生年份"""
+        age = self._stated_age()
+        return age if age is not None else self._calculated_age()
+
+    @property
+    def age_calculated(self) -> bool:
+        """年龄由出生日期和检查日期推算（PatientAge缺失或不是按年记录）"""
+        return self._stated_age() is None and self._calculated_age() is not None
+
+    @property
+    def patient_sex(self) -> Optional[str]:
+        """'M' / 'F'，其他取值（'O'、空）为None"""
+        sex = (self.patient_sex_raw or '').upper()
+        return sex if sex in PREMATURE_CAD_AGE else None
+
+    @property
+    def is_premature_cad(self) -> Optional[bool]:
+        """是否满足早发CAD年龄标准（男 <55，女 <65）；年龄或性别未知时为None"""
+        age, sex = self.patient_age, self.patient_sex
+        if age is None or sex is None:
+            return None
+        return age < PREMATURE_CAD_AGE[sex]
+
+    def demographics(self) -> Dict[str, Any]:
+        """结果CSV中的人口学字段"""
+        return {
+            'patient_age': self.patient_age,
+            'patient_sex': self.patient_sex,
+            'is_premature_cad': self.is_premature_cad,
+        }
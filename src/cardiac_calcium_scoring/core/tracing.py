@@ -0,0 +1,184 @@
+"""
+分阶段计时与Trace导出模块
+Per-stage Timing and Trace Export
+
+轻量级的span计时API，显式地传入各处理阶段（series选择、像素解码、HU转换、
+模型前向、评分、CSV写入等）:
+
+    tracer = Tracer()
+    with tracer.patient('P001'):
+        with tracer.span('pixel_decode'):
+            ...
+    tracer.stage_durations('P001')   # {'t_pixel_decode_sec': 1.23, ...}
+    tracer.export_chrome_trace(Path('logs/trace.json'))
+
+未启用时使用 NULL_TRACER，span() 返回同一个空上下文对象，几乎没有开销。
+导出文件为Chrome Trace Event格式，可直接在 chrome://tracing 或 Perfetto 中打开。
+
+说明: AI-CAC原始代码通过sys.path以裸模块名导入（processing、dataset_generator_inference），
+同一个文件可能被导入为两个模块对象，因此tracer通过参数传递而不是模块级全局变量。
+"""
+
+import os
+import json
+import time
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class _NullSpan:
+    """空上下文（禁用时使用）"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullTracer:
+    """禁用状态的tracer：所有操作均为空操作"""
+    enabled = False
+
+    def span(self, name: str, **args) -> _NullSpan:
+        return _NULL_SPAN
+
+    def patient(self, patient_id: str) -> _NullSpan:
+        return _NULL_SPAN
+
+    def stage_durations(self, patient_id: str) -> Dict[str, float]:
+        return {}
+
+    def export_chrome_trace(self, output_path: Path) -> Optional[Path]:
+        return None
+
+
+NULL_TRACER = NullTracer()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start_ns')
+
+    def __init__(self, tracer: 'Tracer', name: str, args: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._record(self.name, self.start_ns, time.perf_counter_ns(), self.args)
+        return False
+
+
+class _PatientScope:
+    __slots__ = ('local', 'patient_id', 'previous')
+
+    def __init__(self, local, patient_id: str):
+        self.local = local
+        self.patient_id = patient_id
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = getattr(self.local, 'patient', None)
+        self.local.patient = self.patient_id
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.local.patient = self.previous
+        return False
+
+
+class Tracer:
+    """
+    记录span并按患者累计各阶段耗时
+
+    线程安全：预取线程中的加载阶段和主线程中的推理阶段可以同时记录，
+    当前患者通过 patient() 按线程设置。
+    """
+    enabled = True
+
+    def __init__(self, record_events: bool = True):
+        """
+        Args:
+            record_events: 是否保留每个span事件用于导出trace；
+                           只需要分阶段耗时（如指标导出）时设为False，长时间运行内存不增长
+        """
+        self.record_events = record_events
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._events = []
+        self._thread_names: Dict[int, str] = {}
+        self._stage_totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._origin_ns = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    def span(self, name: str, **args) -> _Span:
+        """计时一个阶段（同名阶段在同一患者内累加）"""
+        return _Span(self, name, args)
+
+    def patient(self, patient_id: str) -> _PatientScope:
+        """设置当前线程正在处理的患者"""
+        return _PatientScope(self._local, patient_id)
+
+    def _record(self, name: str, start_ns: int, end_ns: int, args: Dict):
+        patient_id = getattr(self._local, 'patient', None)
+        event = {
+            'name': name,
+            'cat': 'nb10',
+            'ph': 'X',
+            'ts': (start_ns - self._origin_ns) / 1000.0,
+            'dur': (end_ns - start_ns) / 1000.0,
+            'pid': self._pid,
+            'tid': threading.get_ident(),
+        }
+        if patient_id is not None or args:
+            event['args'] = dict(args, patient=patient_id) if patient_id is not None else dict(args)
+
+        with self._lock:
+            if self.record_events:
+                self._events.append(event)
+                if event['tid'] not in self._thread_names:
+                    self._thread_names[event['tid']] = threading.current_thread().name
+            if patient_id is not None:
+                self._stage_totals[patient_id][name] += (end_ns - start_ns) / 1e9
+
+    def stage_durations(self, patient_id: str) -> Dict[str, float]:
+        """
+        取出某患者各阶段累计耗时（取出后清除）
+
+        Returns:
+            {'t_<stage>_sec': seconds, ...}
+        """
+        with self._lock:
+            totals = self._stage_totals.pop(patient_id, {})
+        return {f"t_{name}_sec": round(sec, 4) for name, sec in totals.items()}
+
+    def export_chrome_trace(self, output_path: Path) -> Path:
+        """导出Chrome Trace Event格式JSON（chrome://tracing / Perfetto）"""
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+
+        # 线程名元数据，便于区分主线程和预取线程
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid,
+             'args': {'name': name}}
+            for tid, name in thread_names.items()
+        ]
+
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f)
+        return output_path
@@ -7,6 +7,7 @@ NB10 AI-CAC 冠状动脉钙化评分工具 - 交互式菜单系统
 """
 
 import os
+import re
 import sys
 import platform
 import subprocess
@@ -86,6 +87,7 @@ def main_menu():
         print("  2. 处理CHD组 (完整模式)")
         print("  3. 处理Normal组 (完整模式)")
         print("  4. 自定义数据目录处理")
+        print("  E. 一次处理CHD+Normal组 (单进程，共享模型)")
 
         print_section("统计分析")
         print("  5. CHD vs Normal组对比分析")
@@ -105,7 +107,7 @@ def main_menu():
         print(f"\n  {Colors.RED}0. 退出程序{Colors.ENDC}")
         print(f"\n{Colors.BOLD}{'='*80}{Colors.ENDC}\n")
 
-        choice = input("请选择操作 (0-9/A-D): ").strip().upper()
+        choice = input("请选择操作 (0-9/A-E): ").strip().upper()
 
         if choice == '1':
             pilot_test()
@@ -115,6 +117,8 @@ def main_menu():
             process_normal()
         elif choice == '4':
             custom_dir_process()
+        elif choice == 'E':
+            process_all_cohorts()
         elif choice == '5':
             compare_analysis()
         elif choice == '6':
@@ -218,6 +222,63 @@ def process_normal():
     pause()
 
 
+def has_cohorts_section(config_file):
+    """配置文件中是否定义了非空的顶层 cohorts: 部分（按文本检查，菜单不依赖PyYAML）"""
+    if not os.path.exists(config_file):
+        return False
+    with open(config_file, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    for i, line in enumerate(lines):
+        if re.match(r'^cohorts:\s*(#.*)?$', line):
+            # 下一个非空、非注释行需缩进（队列条目）
+            for following in lines[i + 1:]:
+                if following.strip() and not following.lstrip().startswith('#'):
+                    return following[0] in ' \t'
+    return False
+
+
+def process_all_cohorts():
+    """在一个进程中依次处理config.yaml中cohorts:定义的全部队列"""
+    clear_screen()
+    print_header("一次处理CHD+Normal组")
+
+    if not has_cohorts_section('config/config.yaml'):
+        print_error("config/config.yaml 中没有 cohorts: 部分，无法一次处理多个队列。")
+        print("\n请在 config/config.yaml 中添加（参考 config/config.yaml.template）:\n")
+        print("cohorts:")
+        print("  chd:")
+        print('    data_dir: "D:/cardiac_data/dicom_original/chd"')
+        print('    output_dir: "output/chd"')
+        print("  normal:")
+        print('    data_dir: "D:/cardiac_data/dicom_original/normal"')
+        print('    output_dir: "output/normal"')
+        print("\n或使用选项2/3分别处理CHD组和Normal组。")
+        pause()
+        return
+
+    print("队列定义: config.yaml 中的 cohorts: 部分 (各自的data_dir/output_dir)")
+    print("处理模式: 完整模式 (Full)")
+    print("模型、硬件检测只加载/运行一次，各队列结果分别保存到各自的output_dir")
+    print("预计耗时: 约60-120分钟 (取决于数据量和硬件)\n")
+    print_warning("处理过程中请勿关闭窗口！")
+
+    pause("按Enter键开始处理...")
+
+    print("\n正在处理全部队列...\n")
+    success = run_command('echo "" | ../../venv/bin/python cli/run_calcium_scoring.py --config config/config.yaml --mode full --cohort all')
+
+    print("\n" + "="*80)
+    if success:
+        print_success("全部队列处理完成！")
+    else:
+        print_error("队列处理失败！请查看错误信息。")
+    print("="*80)
+
+    print("\n结果文件: output/chd/, output/normal/ (或cohorts:中设置的output_dir)")
+    print("日志文件: logs/nb10_*.log")
+    pause()
+
+
 def custom_dir_process():
     """自定义数据目录处理"""
     clear_screen()
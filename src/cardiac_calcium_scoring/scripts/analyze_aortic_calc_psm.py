@@ -20,6 +20,10 @@ warnings.filterwarnings('ignore')
 
 # File paths (absolute paths from project root)
 import os
+import sys
+# src/ on the path for the shared matching/balance module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared.analysis.matching import standardized_mean_differences
 # Script is in tools/nb10_windows/scripts/, so go up 3 levels to project root
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR)))
@@ -110,6 +114,15 @@ def analyze_psm_matched(merged):
     print(f"  CHD: {len(chd)}")
     print(f"  Normal: {len(normal)}")
 
+    # Covariate balance of the analysed subset (cases without aortic data are dropped after matching)
+    sex_code = merged_valid['Sex'].map({'M': 1, 'Male': 1, 'male': 1, 'F': 0, 'Female': 0, 'female': 0})
+    covariates = pd.DataFrame({'Sex': sex_code, 'Age': pd.to_numeric(merged_valid['Age'], errors='coerce')})
+    smd = standardized_mean_differences(covariates.values, (merged_valid['Group'] == 'CHD').values)
+    print(f"\nCovariate balance (SMD):")
+    for cov, value in zip(covariates.columns, smd):
+        status = "balanced" if abs(value) < 0.1 else "acceptable" if abs(value) < 0.2 else "IMBALANCED"
+        print(f"  {cov}: {value:.3f} ({status})")
+
     results = {}
 
     # Analyze total aortic calcification
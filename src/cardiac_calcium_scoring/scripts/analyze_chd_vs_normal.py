@@ -10,19 +10,23 @@ Version: 1.1.0
 Date: 2025-10-15
 """
 
-import pandas as pd
 import numpy as np
 from scipy import stats
 from pathlib import Path
 import sys
 
+# core/ directly on the path: importing the core package would load torch/MONAI
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'core'))
+
+from results_store import load_results_file
+
 
 def load_results(chd_csv, normal_csv):
-    """Load CHD and Normal group results"""
-    chd_df = pd.read_csv(chd_csv)
+    """Load CHD and Normal group results (results CSV, or Parquet results file/directory)"""
+    chd_df = load_results_file(chd_csv)
     chd_df['group'] = 'CHD'
 
-    normal_df = pd.read_csv(normal_csv)
+    normal_df = load_results_file(normal_csv)
     normal_df['group'] = 'Normal'
 
     # Filter successful cases only
@@ -307,6 +311,7 @@ def main():
         print()
         print("Example:")
         print("  python analyze_chd_vs_normal.py output/chd_results.csv output/normal_results.csv")
+        print("  python analyze_chd_vs_normal.py output/chd/results output/normal/results")
         sys.exit(1)
 
     chd_csv = sys.argv[1]
@@ -9,99 +9,52 @@ Premature CAD criteria:
 - Male: < 55 years old
 - Female: < 65 years old
 
+Patient folders are found with the tool's DICOM scanner, and demographics are
+parsed by the same StudyMetadata used for the results CSV (one header per patient).
+
 Author: NB10 Windows Tool
-Version: 1.0.0
+Version: 1.1.0
 Date: 2025-10-15
 """
 
-import pydicom
 import sys
 from pathlib import Path
-from collections import defaultdict
-
-
-def extract_patient_info(dcm_file):
-    """Extract patient demographic information from DICOM file"""
-    try:
-        dcm = pydicom.dcmread(dcm_file, stop_before_pixels=True)
-
-        info = {
-            'patient_id': None,
-            'patient_age': None,
-            'patient_sex': None,
-            'patient_birth_date': None,
-            'study_date': None,
-        }
-
-        # Patient ID
-        if hasattr(dcm, 'PatientID'):
-            info['patient_id'] = str(dcm.PatientID)
-
-        # Patient Age (formatted as "055Y" or similar)
-        if hasattr(dcm, 'PatientAge'):
-            age_str = str(dcm.PatientAge)
-            # Parse age string (e.g., "055Y" -> 55)
-            if age_str.endswith('Y'):
-                try:
-                    info['patient_age'] = int(age_str[:-1])
-                except:
-                    pass
-            info['patient_age_raw'] = age_str
-
-        # Patient Sex (M/F)
-        if hasattr(dcm, 'PatientSex'):
-            info['patient_sex'] = str(dcm.PatientSex).upper()
-
-        # Patient Birth Date (YYYYMMDD)
-        if hasattr(dcm, 'PatientBirthDate'):
-            info['patient_birth_date'] = str(dcm.PatientBirthDate)
-
-        # Study Date (YYYYMMDD) - can calculate age from birth date
-        if hasattr(dcm, 'StudyDate'):
-            info['study_date'] = str(dcm.StudyDate)
-
-        # Calculate age from birth date and study date if age not directly available
-        if info['patient_age'] is None and info['patient_birth_date'] and info['study_date']:
-            try:
-                birth_year = int(info['patient_birth_date'][:4])
-                study_year = int(info['study_date'][:4])
-                info['patient_age'] = study_year - birth_year
-                info['patient_age_calculated'] = True
-            except:
-                pass
-
-        return info
-
-    except Exception as e:
-        return {'error': str(e)}
 
+# Tool root (for core.*)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-def check_premature_cad_criteria(age, sex):
-    """Check if patient meets premature CAD age criteria"""
-    if age is None or sex is None:
-        return None
+from core.dicom_scanner import DicomScanner
+from core.dicom_series_selector import read_study_metadata
 
-    if sex == 'M' and age < 55:
-        return True
-    elif sex == 'F' and age < 65:
-        return True
-    else:
-        return False
 
+def metadata_to_info(metadata):
+    """Flatten a StudyMetadata into the report's per-patient fields"""
+    info = {
+        'patient_id': metadata.patient_id,
+        'patient_age': metadata.patient_age,
+        'patient_sex': metadata.patient_sex,
+        'patient_birth_date': metadata.birth_date,
+        'study_date': metadata.study_date,
+        'is_premature_cad': metadata.is_premature_cad,
+    }
+    if metadata.patient_age_raw is not None:
+        info['patient_age_raw'] = metadata.patient_age_raw
+    if metadata.age_calculated:
+        info['patient_age_calculated'] = True
+    return info
 
-def scan_patient_directory(patient_dir):
-    """Scan a patient directory and extract info from first DICOM file"""
-    patient_dir = Path(patient_dir)
 
-    # Find first DICOM file
-    dcm_files = list(patient_dir.rglob("*.dcm"))
-    if not dcm_files:
+def scan_patient_directory(patient_folder):
+    """Read demographics for one scanned patient folder (DicomFolder with files)"""
+    if not patient_folder.files:
         return None
 
-    # Extract info from first file (all files should have same patient info)
-    info = extract_patient_info(dcm_files[0])
-    info['patient_folder'] = patient_dir.name
-    info['num_dcm_files'] = len(dcm_files)
+    try:
+        info = metadata_to_info(read_study_metadata(patient_folder.path, files=patient_folder.files))
+    except Exception as e:
+        info = {'error': str(e)}
+    info['patient_folder'] = patient_folder.path.name
+    info['num_dcm_files'] = len(patient_folder.files)
 
     return info
 
@@ -128,8 +81,8 @@ def main():
         print(f"Error: Directory not found: {data_dir}")
         sys.exit(1)
 
-    # Find all patient directories
-    patient_dirs = sorted([d for d in data_dir.iterdir() if d.is_dir()])
+    # Find all patient directories (same discovery as the scoring tool)
+    patient_dirs = DicomScanner(collect_files=True).scan(data_dir)
 
     if not patient_dirs:
         print(f"Error: No patient directories found in {data_dir}")
@@ -168,7 +121,7 @@ def main():
 
         info = scan_patient_directory(patient_dir)
         if info is None:
-            print(f"  Warning: No DICOM files in {patient_dir.name}")
+            print(f"  Warning: No DICOM files in {patient_dir.path.name}")
             continue
 
         if 'error' in info:
@@ -190,7 +143,7 @@ def main():
         if info.get('patient_age') is not None and info.get('patient_sex') is not None:
             stats['has_both'] += 1
 
-            is_premature = check_premature_cad_criteria(info['patient_age'], info['patient_sex'])
+            is_premature = info['is_premature_cad']
             if is_premature:
                 stats['premature_cad'] += 1
             elif is_premature is False:
@@ -237,13 +190,13 @@ def main():
     print("-" * 80)
 
     for info in results[:10]:
-        age = info.get('patient_age', 'N/A')
-        sex = info.get('patient_sex', 'N/A')
-        age_str = str(age) if age != 'N/A' else 'N/A'
+        age = info.get('patient_age')
+        sex = info.get('patient_sex') or 'N/A'
+        age_str = str(age) if age is not None else 'N/A'
         if info.get('patient_age_calculated'):
             age_str += '*'
 
-        premature = check_premature_cad_criteria(info.get('patient_age'), info.get('patient_sex'))
+        premature = info.get('is_premature_cad')
         premature_str = 'Yes' if premature else ('No' if premature is False else 'Unknown')
 
         print(f"{info['patient_folder']:<30} {age_str:<8} {sex:<6} {premature_str:<15}")
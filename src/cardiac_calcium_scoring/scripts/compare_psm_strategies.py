@@ -11,12 +11,15 @@ Date: 2025-10-15
 import pandas as pd
 import numpy as np
 from scipy import stats
-from sklearn.linear_model import LogisticRegression
-from sklearn.neighbors import NearestNeighbors
 import os
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+# src/ 目录（共享匹配模块 shared.analysis.matching）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared.analysis.matching import estimate_propensity, match_propensity, balance_table
+
 # File paths
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR)))
@@ -76,32 +79,21 @@ def psm_matching(data, covariates, strategy_name, caliper=0.2):
     X = df[covariates_encoded].values
     y = df['treatment'].values
 
-    lr = LogisticRegression(random_state=42, max_iter=1000)
-    lr.fit(X, y)
-    df['propensity_score'] = lr.predict_proba(X)[:, 1]
-
-    # 1:1最近邻匹配
-    treated = df[df['treatment'] == 1].copy()
-    control = df[df['treatment'] == 0].copy()
-
-    nn = NearestNeighbors(n_neighbors=1, metric='euclidean')
-    nn.fit(control[['propensity_score']].values)
-    distances, indices = nn.kneighbors(treated[['propensity_score']].values)
+    df['propensity_score'] = estimate_propensity(X, y)
 
-    # 应用caliper
+    # 1:1贪婪最近邻匹配（不放回，匹配时即应用caliper；含性别时按性别精确匹配）
     caliper_value = caliper * df['propensity_score'].std()
-    valid_matches = distances.flatten() <= caliper_value
+    match = match_propensity(
+        df['propensity_score'].values, y, caliper=caliper_value, replace=False,
+        strata=df['Sex_code'].values if 'Sex_code' in covariates_encoded else None
+    )
 
     print(f"\n匹配结果:")
-    print(f"  有效匹配: {valid_matches.sum()} 对")
-    print(f"  超出caliper: {(~valid_matches).sum()} 对")
-
-    # 构建匹配后数据
-    treated_matched = treated[valid_matches].copy()
-    control_indices = indices[valid_matches].flatten()
-    control_matched = control.iloc[control_indices].copy()
+    print(f"  有效匹配: {match.n_pairs} 对")
+    print(f"  未匹配(caliper内无可用对照): {len(match.unmatched)} 例")
 
-    matched_data = pd.concat([treated_matched, control_matched], ignore_index=True)
+    # 构建匹配后数据（CHD在前，对照在后；match_id 为配对编号）
+    matched_data = match.matched_frame(df)
 
     print(f"\n匹配后人数:")
     print(f"  总计: {len(matched_data)} 例")
@@ -118,25 +110,9 @@ def assess_matching_quality(before, after, covariates):
     print(f"\n匹配质量评估 (标准化均数差 SMD):")
     print("-" * 60)
 
-    for cov in covariates:
-        # 匹配前
-        chd_before = before[before['Group']=='CHD'][cov].mean()
-        normal_before = before[before['Group']=='Normal'][cov].mean()
-        pooled_std_before = np.sqrt(
-            (before[before['Group']=='CHD'][cov].var() +
-             before[before['Group']=='Normal'][cov].var()) / 2
-        )
-        smd_before = (chd_before - normal_before) / pooled_std_before if pooled_std_before > 0 else 0
-
-        # 匹配后
-        chd_after = after[after['Group']=='CHD'][cov].mean()
-        normal_after = after[after['Group']=='Normal'][cov].mean()
-        pooled_std_after = np.sqrt(
-            (after[after['Group']=='CHD'][cov].var() +
-             after[after['Group']=='Normal'][cov].var()) / 2
-        )
-        smd_after = (chd_after - normal_after) / pooled_std_after if pooled_std_after > 0 else 0
-
+    balance = balance_table(before, after, covariates)
+    for cov, row in balance.iterrows():
+        smd_before, smd_after = row['smd_before'], row['smd_after']
         print(f"{cov:15s} SMD: {smd_before:7.3f} → {smd_after:7.3f}  ", end='')
         if abs(smd_after) < 0.1:
             print("✓ 优秀")
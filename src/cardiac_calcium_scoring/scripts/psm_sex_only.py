@@ -11,12 +11,15 @@ Date: 2025-10-15
 import pandas as pd
 import numpy as np
 from scipy import stats
-from sklearn.linear_model import LogisticRegression
-from sklearn.neighbors import NearestNeighbors
 import os
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+# src/ 目录（共享匹配模块 shared.analysis.matching）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared.analysis.matching import estimate_propensity, match_propensity, balance_table
+
 # File paths
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR)))
@@ -94,6 +97,11 @@ def psm_sex_only(data, caliper=0.2):
 
     # 编码性别
     df['Sex_code'] = df['Sex'].map({'M': 1, 'F': 0})
+    unknown_sex = df['Sex_code'].isna().sum()
+    if unknown_sex:
+        print(f"⚠️  排除 {unknown_sex} 例性别非 M/F 的患者")
+        df = df.dropna(subset=['Sex_code']).copy()
+        df['Sex_code'] = df['Sex_code'].astype(int)
 
     # 创建treatment变量
     df['treatment'] = (df['Group'] == 'CHD').astype(int)
@@ -119,37 +127,23 @@ def psm_sex_only(data, caliper=0.2):
     X = df[['Sex_code']].values
     y = df['treatment'].values
 
-    lr = LogisticRegression(random_state=42, max_iter=1000)
-    lr.fit(X, y)
-    df['propensity_score'] = lr.predict_proba(X)[:, 1]
+    df['propensity_score'] = estimate_propensity(X, y)
 
     print(f"  CHD组PS范围: [{df[df['treatment']==1]['propensity_score'].min():.3f}, {df[df['treatment']==1]['propensity_score'].max():.3f}]")
     print(f"  Normal组PS范围: [{df[df['treatment']==0]['propensity_score'].min():.3f}, {df[df['treatment']==0]['propensity_score'].max():.3f}]")
 
-    # 1:1最近邻匹配
+    # 1:1贪婪最近邻匹配（不放回，按性别精确匹配，匹配时即应用caliper）
     print(f"\n执行1:1最近邻匹配...")
-    treated = df[df['treatment'] == 1].copy()
-    control = df[df['treatment'] == 0].copy()
-
-    nn = NearestNeighbors(n_neighbors=1, metric='euclidean')
-    nn.fit(control[['propensity_score']].values)
-
-    distances, indices = nn.kneighbors(treated[['propensity_score']].values)
-
-    # 应用caliper
     caliper_value = caliper * df['propensity_score'].std()
-    valid_matches = distances.flatten() <= caliper_value
+    match = match_propensity(df['propensity_score'].values, y, caliper=caliper_value,
+                             replace=False, strata=df['Sex_code'].values)
 
-    print(f"  有效匹配: {valid_matches.sum()} 对")
-    print(f"  超出caliper: {(~valid_matches).sum()} 对")
+    print(f"  有效匹配: {match.n_pairs} 对")
+    print(f"  未匹配(caliper内无可用对照): {len(match.unmatched)} 例")
     print(f"  Caliper值: {caliper_value:.4f}")
 
-    # 构建匹配后数据集
-    treated_matched = treated[valid_matches].copy()
-    control_indices = indices[valid_matches].flatten()
-    control_matched = control.iloc[control_indices].copy()
-
-    matched_data = pd.concat([treated_matched, control_matched], ignore_index=True)
+    # 构建匹配后数据集（CHD在前，对照在后；match_id 为配对编号）
+    matched_data = match.matched_frame(df)
 
     print(f"\n匹配后样本:")
     print(f"  总计: {len(matched_data)} 例")
@@ -167,20 +161,15 @@ def assess_balance(before, after):
     print("匹配质量评估 (标准化均数差 SMD)")
     print(f"{'='*60}")
 
-    # 性别
-    print(f"\n性别:")
-    before_chd_male = (before[before['Group']=='CHD']['Sex'] == 'M').mean()
-    before_normal_male = (before[before['Group']=='Normal']['Sex'] == 'M').mean()
-
-    after_chd_male = (after[after['Group']=='CHD']['Sex'] == 'M').mean()
-    after_normal_male = (after[after['Group']=='Normal']['Sex'] == 'M').mean()
+    balance = balance_table(before, after, ['Sex_code', 'Age'])
 
-    # 计算SMD (对于二分类变量)
-    smd_before = (before_chd_male - before_normal_male) / np.sqrt((before_chd_male*(1-before_chd_male) + before_normal_male*(1-before_normal_male))/2)
-    smd_after = (after_chd_male - after_normal_male) / np.sqrt((after_chd_male*(1-after_chd_male) + after_normal_male*(1-after_normal_male))/2) if (after_chd_male*(1-after_chd_male) + after_normal_male*(1-after_normal_male)) > 0 else 0
+    # 性别（Sex_code: 男性=1，均值即男性比例）
+    print(f"\n性别:")
+    sex = balance.loc['Sex_code']
+    smd_before, smd_after = sex['smd_before'], sex['smd_after']
 
-    print(f"  匹配前: CHD {100*before_chd_male:.1f}% 男性 vs Normal {100*before_normal_male:.1f}% 男性 (SMD={smd_before:.3f})")
-    print(f"  匹配后: CHD {100*after_chd_male:.1f}% 男性 vs Normal {100*after_normal_male:.1f}% 男性 (SMD={smd_after:.3f})")
+    print(f"  匹配前: CHD {100*sex['mean_treated_before']:.1f}% 男性 vs Normal {100*sex['mean_control_before']:.1f}% 男性 (SMD={smd_before:.3f})")
+    print(f"  匹配后: CHD {100*sex['mean_treated_after']:.1f}% 男性 vs Normal {100*sex['mean_control_after']:.1f}% 男性 (SMD={smd_after:.3f})")
 
     if abs(smd_after) < 0.1:
         print(f"  ✓ 优秀匹配 (SMD < 0.1)")
@@ -191,18 +180,11 @@ def assess_balance(before, after):
 
     # 年龄
     print(f"\n年龄:")
-    before_chd_age = before[before['Group']=='CHD']['Age'].mean()
-    before_normal_age = before[before['Group']=='Normal']['Age'].mean()
-    before_pooled_std = np.sqrt((before[before['Group']=='CHD']['Age'].var() + before[before['Group']=='Normal']['Age'].var())/2)
-    smd_age_before = (before_chd_age - before_normal_age) / before_pooled_std
-
-    after_chd_age = after[after['Group']=='CHD']['Age'].mean()
-    after_normal_age = after[after['Group']=='Normal']['Age'].mean()
-    after_pooled_std = np.sqrt((after[after['Group']=='CHD']['Age'].var() + after[after['Group']=='Normal']['Age'].var())/2)
-    smd_age_after = (after_chd_age - after_normal_age) / after_pooled_std if after_pooled_std > 0 else 0
+    age = balance.loc['Age']
+    smd_age_before, smd_age_after = age['smd_before'], age['smd_after']
 
-    print(f"  匹配前: CHD {before_chd_age:.1f}岁 vs Normal {before_normal_age:.1f}岁 (SMD={smd_age_before:.3f})")
-    print(f"  匹配后: CHD {after_chd_age:.1f}岁 vs Normal {after_normal_age:.1f}岁 (SMD={smd_age_after:.3f})")
+    print(f"  匹配前: CHD {age['mean_treated_before']:.1f}岁 vs Normal {age['mean_control_before']:.1f}岁 (SMD={smd_age_before:.3f})")
+    print(f"  匹配后: CHD {age['mean_treated_after']:.1f}岁 vs Normal {age['mean_control_after']:.1f}岁 (SMD={smd_age_after:.3f})")
 
     if abs(smd_age_after) < 0.1:
         print(f"  ✓ 优秀匹配 (SMD < 0.1)")
@@ -362,7 +344,7 @@ def generate_report(sex_only_results, sex_age_results, matched_data):
     with open(report_file, 'w', encoding='utf-8') as f:
         f.write("# 仅性别PSM匹配 - 主动脉钙化分析报告\n\n")
         f.write("**分析日期**: 2025-10-15\n")
-        f.write("**PSM策略**: 仅性别协变量（1:1最近邻匹配）\n")
+        f.write("**PSM策略**: 仅性别协变量（1:1贪婪最近邻匹配，不放回，性别精确匹配）\n")
         f.write("**Caliper**: 0.2个标准差\n\n")
         f.write("---\n\n")
 
@@ -0,0 +1,20 @@
+"""
+Shared Analysis Module
+Statistical helpers for cohort analyses (propensity score matching, covariate balance)
+"""
+
+from .matching import (
+    MatchResult,
+    estimate_propensity,
+    match_propensity,
+    standardized_mean_differences,
+    balance_table,
+)
+
+__all__ = [
+    'MatchResult',
+    'estimate_propensity',
+    'match_propensity',
+    'standardized_mean_differences',
+    'balance_table',
+]
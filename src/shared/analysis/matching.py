@@ -0,0 +1,306 @@
+"""
+Propensity Score Matching - Shared Version
+Greedy nearest-neighbour matching on sorted propensity scores
+
+Replaces the per-script logistic regression + NearestNeighbors(n_neighbors=1) matching,
+which matched with replacement and applied the caliper only afterwards.
+
+- Propensity: L2-penalised logistic regression (same objective as sklearn's default
+  LogisticRegression, C=1.0) fitted with Newton steps in NumPy
+- Matching: controls are sorted once per exact-match stratum; each treated unit's
+  position is found by binary search (np.searchsorted)
+  - with replacement: the k nearest controls come from a 2k window around that
+    position, vectorised over all treated units
+  - without replacement: greedy 1:k in k passes; used controls are skipped with
+    union-find "next available" links, so each lookup is near O(1)
+  - the caliper is enforced during matching: a treated unit whose nearest available
+    control is outside the caliper stays unmatched instead of taking a distant control
+- Balance: standardized mean differences for all covariates at once
+
+Usage:
+    score = estimate_propensity(df[['Sex_code', 'Age']].values, df['treatment'].values)
+    match = match_propensity(score, df['treatment'].values, caliper=0.2 * score.std(ddof=1),
+                             strata=df['Sex_code'].values)
+    matched = match.matched_frame(df)
+    print(balance_table(df, matched, ['Sex_code', 'Age']))
+"""
+
+__version__ = "1.0.0"
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+MATCH_ORDERS = ('largest', 'smallest', 'random', 'data')
+
+
+def estimate_propensity(X, treatment, C: float = 1.0, max_iter: int = 100,
+                        tol: float = 1e-10) -> np.ndarray:
+    """
+    Propensity scores P(treatment | X) from an L2-penalised logistic regression
+
+    Minimises C * sum(log-loss) + 0.5 * ||w||^2 (intercept not penalised), the objective
+    of sklearn's LogisticRegression(C=C), so scores agree with the previous scripts.
+    The model is fitted on complete rows only; rows with a missing (non-finite) covariate
+    get a NaN score, which match_propensity() leaves unmatched.
+
+    Args:
+        X: Covariates, shape (n,) or (n, p)
+        treatment: 1/True for treated units
+        C: Inverse regularisation strength
+        max_iter: Maximum Newton iterations
+        tol: Convergence tolerance on the largest coefficient step
+
+    Returns:
+        Array of shape (n,) with propensity scores (NaN for incomplete rows)
+    """
+    X = np.asarray(X, dtype=float)
+    if X.ndim == 1:
+        X = X[:, None]
+    y = np.asarray(treatment, dtype=float)
+    complete = np.isfinite(X).all(axis=1)
+    if not complete.any():
+        raise ValueError("No rows with complete covariates to fit the propensity model")
+    design_all = np.hstack([np.ones((len(X), 1)), X])
+    design = design_all[complete]
+    y = y[complete]
+    penalty = np.full(design.shape[1], 1.0 / C)
+    penalty[0] = 0.0
+
+    beta = np.zeros(design.shape[1])
+    for _ in range(max_iter):
+        p = 1.0 / (1.0 + np.exp(-design @ beta))
+        gradient = design.T @ (p - y) + penalty * beta
+        hessian = (design * (p * (1.0 - p))[:, None]).T @ design + np.diag(penalty)
+        step = np.linalg.solve(hessian + 1e-12 * np.eye(len(beta)), gradient)
+        beta -= step
+        if np.abs(step).max() < tol:
+            break
+    score = np.full(len(X), np.nan)
+    score[complete] = 1.0 / (1.0 + np.exp(-design @ beta))
+    return score
+
+
+@dataclass
+class MatchResult:
+    """Matched pairs as positional indices into the arrays passed to match_propensity()"""
+    treated: np.ndarray     # Treated unit of each pair (repeated for 1:k)
+    control: np.ndarray     # Matched control of each pair
+    distance: np.ndarray    # |score difference| of each pair
+    unmatched: np.ndarray   # Treated units without any match (caliper, stratum or missing score)
+    k: int
+    replace: bool
+    caliper: Optional[float]
+
+    @property
+    def n_pairs(self) -> int:
+        return len(self.treated)
+
+    @property
+    def matched_treated(self) -> np.ndarray:
+        """Treated units with at least one match (in matching order)"""
+        return pd.unique(self.treated)
+
+    @property
+    def n_controls_reused(self) -> int:
+        """Pairs whose control was already used by another pair (only with replacement)"""
+        return self.n_pairs - len(np.unique(self.control))
+
+    def matched_frame(self, df: pd.DataFrame, id_column: str = 'match_id') -> pd.DataFrame:
+        """
+        Matched sample: matched treated rows followed by their control rows
+
+        Rows are taken by position (df.iloc). id_column holds the treated unit's position,
+        shared by the treated row and its controls. Controls matched more than once
+        (with replacement) appear once per pair.
+        """
+        treated = self.matched_treated
+        rows = df.iloc[np.concatenate([treated, self.control])].copy()
+        rows[id_column] = np.concatenate([treated, self.treated])
+        return rows.reset_index(drop=True)
+
+    def describe(self) -> str:
+        kind = 'with' if self.replace else 'without'
+        caliper = f"caliper {self.caliper:.4f}" if self.caliper is not None else "no caliper"
+        return (f"{len(self.matched_treated)} treated matched 1:{self.k} {kind} replacement "
+                f"({self.n_pairs} pairs, {len(self.unmatched)} unmatched, {caliper})")
+
+
+def _find(parent: List[int], i: int) -> int:
+    """Union-find root with path halving"""
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _match_with_replacement(cs, pos, lo, hi, ts, k):
+    """k nearest controls for each treated unit: candidates are the k positions on either side"""
+    offsets = np.arange(-k, k)
+    candidates = pos[:, None] + offsets[None, :]
+    valid = (candidates >= lo[:, None]) & (candidates < hi[:, None])
+    clipped = np.clip(candidates, 0, max(len(cs) - 1, 0))
+    if not len(cs):
+        return clipped[:, :k], np.full((len(ts), k), np.inf)
+    distance = np.where(valid, np.abs(cs[clipped] - ts[:, None]), np.inf)
+    order = np.argsort(distance, axis=1, kind='stable')[:, :k]
+    return (np.take_along_axis(clipped, order, axis=1),
+            np.take_along_axis(distance, order, axis=1))
+
+
+def match_propensity(score, treatment, k: int = 1, caliper: Optional[float] = None,
+                     replace: bool = False, strata=None, order: str = 'largest',
+                     random_state: Optional[int] = None) -> MatchResult:
+    """
+    Greedy nearest-neighbour matching of treated to control units on a 1-D score
+
+    Args:
+        score: Propensity score (or its logit) per unit
+        treatment: 1/True for treated units
+        k: Controls per treated unit (1:k matching)
+        caliper: Maximum |score difference| of a pair, enforced during matching
+        replace: Allow a control to be matched to several treated units
+        strata: Optional exact-match key per unit (e.g. sex); pairs never cross strata
+        order: Order in which treated units pick controls without replacement:
+            'largest' / 'smallest' score first, 'random' or 'data' (input order)
+        random_state: Seed for order='random'
+
+    Returns:
+        MatchResult with positional indices
+    """
+    if order not in MATCH_ORDERS:
+        raise ValueError(f"Invalid order: {order} (must be one of {', '.join(MATCH_ORDERS)})")
+    if k < 1:
+        raise ValueError(f"k must be at least 1, got {k}")
+    score = np.asarray(score, dtype=float)
+    treated_mask = np.asarray(treatment).astype(bool)
+    keys = np.zeros(len(score), dtype=np.int64) if strata is None else pd.factorize(
+        np.asarray(strata), use_na_sentinel=True)[0]
+    usable = ~np.isnan(score) & (keys >= 0)
+    limit = np.inf if caliper is None else float(caliper)
+
+    # Controls sorted by (stratum, score, position); treated in matching order
+    control_idx = np.flatnonzero(~treated_mask & usable)
+    control_idx = control_idx[np.lexsort((control_idx, score[control_idx], keys[control_idx]))]
+    cs, ck = score[control_idx], keys[control_idx]
+    treated_idx = np.flatnonzero(treated_mask & usable)
+    if order == 'largest':
+        treated_idx = treated_idx[np.argsort(-score[treated_idx], kind='stable')]
+    elif order == 'smallest':
+        treated_idx = treated_idx[np.argsort(score[treated_idx], kind='stable')]
+    elif order == 'random':
+        treated_idx = np.random.default_rng(random_state).permutation(treated_idx)
+    ts, tk = score[treated_idx], keys[treated_idx]
+
+    # Binary search within each treated unit's stratum
+    lo = np.searchsorted(ck, tk, side='left')
+    hi = np.searchsorted(ck, tk, side='right')
+    pos = np.empty(len(treated_idx), dtype=np.int64)
+    for key in np.unique(tk):
+        members = tk == key
+        start, stop = lo[members][0], hi[members][0]
+        pos[members] = start + np.searchsorted(cs[start:stop], ts[members], side='left')
+
+    if replace:
+        chosen, distance = _match_with_replacement(cs, pos, lo, hi, ts, k)
+        ok = np.isfinite(distance) & (distance <= limit)
+        rows = np.repeat(np.arange(len(treated_idx)), k).reshape(-1, k)
+        pair_t, pair_c, pair_d = rows[ok], chosen[ok], distance[ok]
+    else:
+        n = len(cs)
+        right = list(range(n + 1))      # right[i]: next available control >= i (n: none)
+        left = list(range(n + 1))       # left[i + 1]: previous available control <= i (0: none)
+        csl, posl, lol, hil, tsl = cs.tolist(), pos.tolist(), lo.tolist(), hi.tolist(), ts.tolist()
+        pair_t, pair_c, pair_d = [], [], []
+        for _ in range(k):
+            for t in range(len(tsl)):
+                p, s = posl[t], tsl[t]
+                r = _find(right, p)
+                l = _find(left, p) - 1
+                dr = abs(csl[r] - s) if r < hil[t] else np.inf
+                dl = abs(csl[l] - s) if l >= lol[t] else np.inf
+                c, d = (l, dl) if dl <= dr else (r, dr)
+                if d == np.inf or d > limit:
+                    continue
+                pair_t.append(t)
+                pair_c.append(c)
+                pair_d.append(d)
+                right[c] = c + 1
+                left[c + 1] = c
+        pair_t, pair_c, pair_d = (np.asarray(pair_t, dtype=np.int64), np.asarray(pair_c, dtype=np.int64),
+                                  np.asarray(pair_d, dtype=float))
+        # Group the k controls of each treated unit together (stable within passes)
+        grouped = np.argsort(pair_t, kind='stable')
+        pair_t, pair_c, pair_d = pair_t[grouped], pair_c[grouped], pair_d[grouped]
+
+    return MatchResult(
+        treated=treated_idx[pair_t],
+        control=control_idx[pair_c],
+        distance=np.asarray(pair_d, dtype=float),
+        unmatched=np.setdiff1d(np.flatnonzero(treated_mask), treated_idx[pair_t]),
+        k=k,
+        replace=replace,
+        caliper=caliper,
+    )
+
+
+def standardized_mean_differences(X, treatment, binary=None) -> np.ndarray:
+    """
+    Standardized mean difference (treated - control) of every covariate column
+
+    Continuous columns use the pooled SD sqrt((var_t + var_c) / 2) with ddof=1; binary
+    (0/1) columns use sqrt((p_t(1-p_t) + p_c(1-p_c)) / 2). Missing values are ignored;
+    a zero pooled SD gives 0.
+
+    Args:
+        X: Covariates, shape (n,) or (n, p)
+        treatment: 1/True for treated units
+        binary: Optional boolean per column (default: columns containing only 0/1)
+
+    Returns:
+        Array of shape (p,)
+    """
+    X = np.asarray(X, dtype=float)
+    if X.ndim == 1:
+        X = X[:, None]
+    t = np.asarray(treatment).astype(bool)
+    Xt, Xc = X[t], X[~t]
+    if binary is None:
+        binary = np.all(np.isnan(X) | (X == 0) | (X == 1), axis=0)
+    binary = np.asarray(binary, dtype=bool)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_t, mean_c = np.nanmean(Xt, axis=0), np.nanmean(Xc, axis=0)
+        var_cont = (np.nanvar(Xt, axis=0, ddof=1) + np.nanvar(Xc, axis=0, ddof=1)) / 2
+        var_bin = (mean_t * (1 - mean_t) + mean_c * (1 - mean_c)) / 2
+        sd = np.sqrt(np.where(binary, var_bin, var_cont))
+        smd = np.divide(mean_t - mean_c, sd, out=np.zeros_like(sd), where=sd > 0)
+    return np.nan_to_num(smd)
+
+
+def balance_table(before: pd.DataFrame, after: pd.DataFrame, covariates: Sequence[str],
+                  treatment: str = 'treatment') -> pd.DataFrame:
+    """
+    Covariate balance before and after matching
+
+    Args:
+        before: Full sample
+        after: Matched sample (e.g. MatchResult.matched_frame())
+        covariates: Numeric covariate columns
+        treatment: Column with 1/True for treated units
+
+    Returns:
+        DataFrame indexed by covariate: mean_treated/mean_control/smd for before and after
+    """
+    columns = list(covariates)
+    table = {}
+    for label, frame in (('before', before), ('after', after)):
+        X = frame[columns].to_numpy(dtype=float)
+        t = frame[treatment].to_numpy().astype(bool)
+        with np.errstate(invalid='ignore'):
+            table[f'mean_treated_{label}'] = np.nanmean(X[t], axis=0) if t.any() else np.nan
+            table[f'mean_control_{label}'] = np.nanmean(X[~t], axis=0) if (~t).any() else np.nan
+        table[f'smd_{label}'] = standardized_mean_differences(X, t)
+    return pd.DataFrame(table, index=pd.Index(columns, name='covariate'))
@@ -13,6 +13,8 @@ from .ai_cac import (
     # Configuration
     ModelConfig,
     InferenceResult,
+    InferencePipeline,
+    default_pipeline,
 
     # Factory function
     create_ai_cac_model,
@@ -25,6 +27,8 @@ __all__ = [
     # Configuration
     'ModelConfig',
     'InferenceResult',
+    'InferencePipeline',
+    'default_pipeline',
 
     # Factory function
     'create_ai_cac_model',
@@ -8,25 +8,38 @@ Enhancements:
 - CPU optimization for hospital deployments
 - Integrated with shared hardware detection
 - Modular design for easy testing
+- Streaming inference: iter_infer() yields each patient's result as soon as it is
+  scored, with DICOM loading prefetched in worker threads and cancellation support
 
 Original: https://github.com/Raffi-Hagopian/AI-CAC
 License: MIT
 """
 
-__version__ = "2.2.0"
+__version__ = "2.3.0"
 
 import os
 import sys
+import time
 import torch
 import logging
+import threading
 from pathlib import Path
-from typing import Dict, Any, Optional, List, Tuple, Callable
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterable, Iterator
 from dataclasses import dataclass
 
 import pandas as pd
 from torch.utils.data import DataLoader
 from monai.networks.nets import SwinUNETR
 
+# Import with fallback for different import contexts
+try:
+    from ..processing.batch_processor import BatchProcessor, ProcessingConfig
+except ImportError:
+    try:
+        from processing.batch_processor import BatchProcessor, ProcessingConfig
+    except ImportError:
+        from shared.processing.batch_processor import BatchProcessor, ProcessingConfig
+
 logger = logging.getLogger(__name__)
 
 
@@ -67,6 +80,54 @@ class InferenceResult:
     processing_time_seconds: Optional[float] = None
     status: str = 'success'
     error: Optional[str] = None
+    lesion_count: Optional[int] = None
+    dicom_folder: Optional[str] = None
+
+
+@dataclass
+class InferencePipeline:
+    """
+    DICOM loading and scoring functions used by AICAModel
+
+    load_study(folder) decodes one patient on the CPU and may run in worker threads;
+    score_study(loaded, network, config) runs the model in the caller's thread and returns
+    a dict with agatston_score, calcium_volume_mm3, calcium_mass_mg, num_slices,
+    has_calcification and optionally lesion_count / demographics.
+    """
+    load_study: Callable[[Path], Any]
+    score_study: Callable[[Any, torch.nn.Module, 'ModelConfig'], Dict[str, Any]]
+
+
+def default_pipeline() -> InferencePipeline:
+    """
+    AI-CAC pipeline of the calcium scoring tool (series selection, HU conversion,
+    resampling, slice-batched SwinUNETR and Agatston scoring)
+
+    Raises:
+        ImportError: The tool's core modules are not importable
+    """
+    try:
+        from core.ai_cac_inference_lib import load_dicom_study, run_inference_on_loaded_study
+        from core.adaptive_batching import AdaptiveSliceBatcher
+    except ImportError:
+        try:
+            from ai_cac_inference_lib import load_dicom_study, run_inference_on_loaded_study
+            from adaptive_batching import AdaptiveSliceBatcher
+        except ImportError as e:
+            raise ImportError(
+                "AI-CAC DICOM pipeline not found: add the cardiac_calcium_scoring tool directory "
+                "to sys.path, or pass pipeline=InferencePipeline(...) to AICAModel") from e
+
+    batcher = None  # Shared across patients so OOM back-offs carry over
+
+    def score_study(loaded, network, config):
+        nonlocal batcher
+        if batcher is None:
+            batcher = AdaptiveSliceBatcher(config.slice_batch_size)
+        return run_inference_on_loaded_study(loaded, network, config.device, slice_batcher=batcher)
+
+    return InferencePipeline(load_study=lambda folder: load_dicom_study(str(folder)),
+                             score_study=score_study)
 
 
 class AICAModel:
@@ -84,7 +145,8 @@ class AICAModel:
         self,
         config: Optional[ModelConfig] = None,
         hardware_info: Optional[Any] = None,
-        auto_optimize: bool = True
+        auto_optimize: bool = True,
+        pipeline: Optional[InferencePipeline] = None
     ):
         """
         Initialize AI-CAC model
@@ -93,11 +155,13 @@ class AICAModel:
             config: Model configuration (default: auto-detect from hardware)
             hardware_info: HardwareInfo from shared.hardware (for auto-optimization)
             auto_optimize: Enable automatic hardware-based optimization
+            pipeline: DICOM loading/scoring functions (default: default_pipeline(), resolved on first use)
         """
         self.config = config or ModelConfig()
         self.hardware_info = hardware_info
         self.model = None
         self.is_loaded = False
+        self._pipeline = pipeline
 
         # Auto-optimize based on hardware
         if auto_optimize and hardware_info:
@@ -194,14 +258,16 @@ class AICAModel:
         """
         Extract patient demographics from DICOM metadata
 
+        Results from iter_infer()/infer_batch() already carry demographics taken from the
+        headers read during series selection; this reads them for a folder on its own
+        (DICOMDIR records or one file header, via the tool's read_study_metadata).
+
         Args:
             dicom_folder: Path to folder containing DICOM files
 
         Returns:
-            dict with patient_age, patient_sex, is_premature_cad
+            dict with patient_age, patient_sex, is_premature_cad (None when unavailable)
         """
-        import pydicom
-
         result = {
             'patient_age': None,
             'patient_sex': None,
@@ -209,53 +275,71 @@ class AICAModel:
         }
 
         try:
-            # Find first DICOM file
-            dcm_files = list(Path(dicom_folder).rglob("*.dcm"))
-            if not dcm_files:
-                return result
-
-            # Read metadata only (fast)
-            dcm = pydicom.dcmread(dcm_files[0], stop_before_pixels=True)
-
-            # Extract age
-            if hasattr(dcm, 'PatientAge'):
-                age_str = str(dcm.PatientAge)
-                if age_str.endswith('Y'):
-                    try:
-                        result['patient_age'] = int(age_str[:-1])
-                    except ValueError:
-                        pass
-
-            # Fallback: calculate from birth date
-            if result['patient_age'] is None:
-                if hasattr(dcm, 'PatientBirthDate') and hasattr(dcm, 'StudyDate'):
-                    try:
-                        birth_year = int(str(dcm.PatientBirthDate)[:4])
-                        study_year = int(str(dcm.StudyDate)[:4])
-                        result['patient_age'] = study_year - birth_year
-                    except (ValueError, TypeError):
-                        pass
-
-            # Extract sex
-            if hasattr(dcm, 'PatientSex'):
-                sex = str(dcm.PatientSex).upper()
-                if sex in ['M', 'F']:
-                    result['patient_sex'] = sex
-
-            # Check premature CAD criteria (ACCF/AHA guidelines)
-            if result['patient_age'] and result['patient_sex']:
-                if result['patient_sex'] == 'M' and result['patient_age'] < 55:
-                    result['is_premature_cad'] = True
-                elif result['patient_sex'] == 'F' and result['patient_age'] < 65:
-                    result['is_premature_cad'] = True
-                else:
-                    result['is_premature_cad'] = False
-
+            try:
+                from core.dicom_series_selector import read_study_metadata
+            except ImportError:
+                from dicom_series_selector import read_study_metadata
+            return read_study_metadata(Path(dicom_folder)).demographics()
         except Exception as e:
             logger.debug(f"Failed to extract demographics: {e}")
 
         return result
 
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        """Forward pass, so an AICAModel can stand in for the bare network"""
+        return self.model(batch)
+
+    @property
+    def pipeline(self) -> InferencePipeline:
+        if self._pipeline is None:
+            self._pipeline = default_pipeline()
+        return self._pipeline
+
+    def _to_result(self, dicom_folder: Path, scores: Dict[str, Any], seconds: float) -> InferenceResult:
+        return InferenceResult(
+            patient_id=Path(dicom_folder).name,
+            agatston_score=float(scores.get('agatston_score', 0.0)),
+            calcium_volume_mm3=float(scores.get('calcium_volume_mm3', 0.0)),
+            calcium_mass_mg=float(scores.get('calcium_mass_mg', 0.0)),
+            num_slices=int(scores.get('num_slices', 0)),
+            has_calcification=bool(scores.get('has_calcification', False)),
+            patient_age=scores.get('patient_age'),
+            patient_sex=scores.get('patient_sex'),
+            is_premature_cad=scores.get('is_premature_cad'),
+            processing_time_seconds=seconds,
+            status='success',
+            lesion_count=scores.get('lesion_count'),
+            dicom_folder=str(dicom_folder),
+        )
+
+    @staticmethod
+    def _failed(dicom_folder: Path, error: str, seconds: Optional[float] = None) -> InferenceResult:
+        return InferenceResult(
+            patient_id=Path(dicom_folder).name,
+            agatston_score=0.0,
+            calcium_volume_mm3=0.0,
+            calcium_mass_mg=0.0,
+            num_slices=0,
+            has_calcification=False,
+            processing_time_seconds=seconds,
+            status='failed',
+            error=error,
+            dicom_folder=str(dicom_folder),
+        )
+
+    def _score(self, dicom_folder: Path, loaded: Any, load_seconds: float,
+               extract_demographics: bool) -> InferenceResult:
+        start_time = time.time()
+        try:
+            scores = self.pipeline.score_study(loaded, self.model, self.config)
+        except Exception as e:
+            logger.error(f"Inference failed for {Path(dicom_folder).name}: {e}")
+            return self._failed(dicom_folder, str(e), load_seconds + time.time() - start_time)
+        if not extract_demographics:
+            scores = {k: v for k, v in scores.items()
+                      if k not in ('patient_age', 'patient_sex', 'is_premature_cad')}
+        return self._to_result(dicom_folder, scores, load_seconds + time.time() - start_time)
+
     def infer_single_patient(
         self,
         dicom_folder: Path,
@@ -268,65 +352,98 @@ class AICAModel:
         Args:
             dicom_folder: Path to patient's DICOM folder
             extract_demographics: Extract age/sex from DICOM metadata
-            progress_callback: Optional callback(slice_idx, total_slices)
+            progress_callback: Optional callback(done, total) called once the patient is scored
 
         Returns:
-            InferenceResult object
+            InferenceResult object (status 'failed' with the error message on failure)
         """
         if not self.is_loaded:
             raise RuntimeError("Model not loaded. Call load_model() first.")
 
-        import time
         start_time = time.time()
+        try:
+            loaded = self.pipeline.load_study(Path(dicom_folder))
+        except Exception as e:
+            logger.error(f"Inference failed for {Path(dicom_folder).name}: {e}")
+            return self._failed(dicom_folder, str(e), time.time() - start_time)
 
-        patient_id = Path(dicom_folder).name
+        result = self._score(dicom_folder, loaded, time.time() - start_time, extract_demographics)
+        if progress_callback:
+            progress_callback(1, 1)
+        return result
 
-        try:
-            # Extract demographics
-            demographics = {}
-            if extract_demographics:
-                demographics = self.extract_demographics(dicom_folder)
-
-            # Prepare DICOM data
-            # Note: This requires nb10's DICOM processing utilities
-            # For Week 2, we'll create placeholders; full integration in Week 3
-
-            # TODO: Integrate with shared/data/dicom_io.py (Week 2)
-            # For now, return a placeholder result for testing
-
-            processing_time = time.time() - start_time
-
-            return InferenceResult(
-                patient_id=patient_id,
-                agatston_score=0.0,  # Placeholder
-                calcium_volume_mm3=0.0,
-                calcium_mass_mg=0.0,
-                num_slices=0,
-                has_calcification=False,
-                **demographics,
-                processing_time_seconds=processing_time,
-                status='success'
-            )
+    def iter_infer(
+        self,
+        dicom_folders: Iterable[Path],
+        extract_demographics: bool = True,
+        prefetch: int = 2,
+        load_workers: int = 2,
+        cancel: Optional[threading.Event] = None
+    ) -> Iterator[InferenceResult]:
+        """
+        Stream results: yield each patient's InferenceResult as soon as it is scored
 
-        except Exception as e:
-            logger.error(f"Inference failed for {patient_id}: {e}")
-
-            return InferenceResult(
-                patient_id=patient_id,
-                agatston_score=0.0,
-                calcium_volume_mm3=0.0,
-                calcium_mass_mg=0.0,
-                num_slices=0,
-                has_calcification=False,
-                status='failed',
-                error=str(e)
-            )
+        DICOM loading runs ahead in load_workers threads; at most `prefetch` loaded patients
+        wait for the model, so memory stays bounded however many folders are passed (the
+        folder iterable is consumed lazily). Patients are scored in the order their loading
+        finishes, so one slow study does not hold back the others.
+
+        Cancellation: set `cancel` (checked before each patient is scored) or close the
+        generator (e.g. break out of the loop). Loads that have not started are dropped and
+        running ones are awaited.
+
+        Args:
+            dicom_folders: Patient DICOM folders
+            extract_demographics: Include age/sex from DICOM metadata
+            prefetch: Patients loaded (or loading) ahead of the model
+            load_workers: Threads decoding DICOM in parallel
+            cancel: Optional threading.Event that stops the stream when set
+
+        Yields:
+            InferenceResult (failures are yielded with status 'failed', never raised)
+        """
+        if not self.is_loaded:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+
+        pipeline = self.pipeline
+        loader = BatchProcessor(ProcessingConfig(
+            enable_resume=False,
+            clear_cache_interval=0,
+            executor='thread',
+            max_workers=max(1, load_workers),
+            max_in_flight=max(1, prefetch),
+        ))
+
+        def load(folder):
+            start_time = time.time()
+            return {'loaded': pipeline.load_study(Path(folder)), 'seconds': time.time() - start_time}
+
+        loads = loader.iter_results(dicom_folders, load)
+        try:
+            for r in loads:
+                if cancel is not None and cancel.is_set():
+                    logger.info("Inference stream cancelled")
+                    break
+                if not r.ok:
+                    yield self._failed(r.item, r.error)
+                    continue
+                # Drop the decoded volume as soon as it is scored
+                folder, loaded, seconds = r.item, r.result.pop('loaded'), r.result['seconds']
+                del r
+                result = self._score(folder, loaded, seconds, extract_demographics)
+                del loaded
+                yield result
+        finally:
+            loads.close()
+            loader.close()
 
     def infer_batch(
         self,
         dicom_folders: List[Path],
         extract_demographics: bool = True,
-        progress_callback: Optional[Callable] = None
+        progress_callback: Optional[Callable] = None,
+        prefetch: int = 2,
+        load_workers: int = 2
     ) -> List[InferenceResult]:
         """
         Run inference on multiple patients
@@ -335,22 +452,23 @@ class AICAModel:
             dicom_folders: List of patient DICOM folder paths
             extract_demographics: Extract age/sex from DICOM metadata
             progress_callback: Optional callback(current, total, patient_id, result)
+            prefetch: Patients loaded ahead of the model (see iter_infer)
+            load_workers: Threads decoding DICOM in parallel
 
         Returns:
-            List of InferenceResult objects
+            List of InferenceResult objects (input order)
         """
+        dicom_folders = list(dicom_folders)
+        order = {str(folder): i for i, folder in enumerate(dicom_folders)}
         results = []
 
-        for i, folder in enumerate(dicom_folders):
-            result = self.infer_single_patient(
-                folder,
-                extract_demographics=extract_demographics
-            )
+        for i, result in enumerate(self.iter_infer(dicom_folders, extract_demographics,
+                                                   prefetch=prefetch, load_workers=load_workers), 1):
             results.append(result)
-
             if progress_callback:
-                progress_callback(i + 1, len(dicom_folders), result.patient_id, result)
+                progress_callback(i, len(dicom_folders), result.patient_id, result)
 
+        results.sort(key=lambda r: order.get(r.dicom_folder, len(order)))
         return results
 
     def results_to_dataframe(self, results: List[InferenceResult]) -> pd.DataFrame:
@@ -377,7 +495,9 @@ class AICAModel:
                 'is_premature_cad': r.is_premature_cad,
                 'processing_time_seconds': r.processing_time_seconds,
                 'status': r.status,
-                'error': r.error
+                'error': r.error,
+                'lesion_count': r.lesion_count,
+                'dicom_folder': r.dicom_folder
             })
 
         return pd.DataFrame(data)
@@ -387,7 +507,9 @@ class AICAModel:
 def create_ai_cac_model(
     checkpoint_path: str,
     device: str = 'auto',
-    hardware_info: Optional[Any] = None
+    hardware_info: Optional[Any] = None,
+    torch_threads: Optional[int] = None,
+    interop_threads: Optional[int] = None,
 ) -> AICAModel:
     """
     Factory function to create and load AI-CAC model
@@ -396,6 +518,8 @@ def create_ai_cac_model(
         checkpoint_path: Path to model weights (.pth file)
         device: 'cuda', 'cpu', or 'auto'
         hardware_info: Optional HardwareInfo for auto-optimization
+        torch_threads: CPU intra-op threads (e.g. from an autotuned profile)
+        interop_threads: CPU inter-op threads (e.g. from an autotuned profile)
 
     Returns:
         Loaded AICAModel instance
@@ -411,8 +535,14 @@ def create_ai_cac_model(
         >>>     hardware_info=hw
         >>> )
         >>> result = model.infer_single_patient('data/PATIENT001')
+        >>>
+        >>> # Stream a cohort: each result arrives as soon as that patient is scored
+        >>> for r in model.iter_infer(sorted(Path('data').iterdir()), prefetch=2):
+        >>>     print(r.patient_id, r.agatston_score)
     """
-    config = ModelConfig(device=device, checkpoint_path=checkpoint_path)
+    config = ModelConfig(device=device, checkpoint_path=checkpoint_path, cpu_threads=torch_threads)
+    if interop_threads is not None:
+        config.cpu_interop_threads = interop_threads
     model = AICAModel(config=config, hardware_info=hardware_info)
     model.load_model()
     return model
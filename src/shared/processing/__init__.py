@@ -5,10 +5,22 @@ Batch processing framework for medical imaging workflows
 
 from .batch_processor import (
     BatchProcessor,
+    BatchResult,
     ProcessingConfig,
+    ResultCache,
+    MemoryResultCache,
+    FileResultCache,
+    SQLiteResultCache,
+    create_result_cache,
 )
 
 __all__ = [
     'BatchProcessor',
+    'BatchResult',
     'ProcessingConfig',
+    'ResultCache',
+    'MemoryResultCache',
+    'FileResultCache',
+    'SQLiteResultCache',
+    'create_result_cache',
 ]
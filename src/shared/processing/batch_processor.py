@@ -5,25 +5,43 @@ Generic batch processor with resume capability
 Elevated from: tools/nb10_windows/core/processing.py
 Enhancements:
 - Generic batch processing base class
-- Resume capability with cache management
+- Serial, thread-pool and process-pool executors
+- Bounded in-flight work (back-pressure on the input iterator)
+- Results delivered through an iterator as they complete
+- Resume capability with a persistent result cache (file / SQLite)
 - Progress tracking and callbacks
 - Multi-environment support (Colab/Windows/Linux)
 
-Note: Full implementation in Week 3
-This is a framework version for Week 2 testing
+Usage:
+    processor = BatchProcessor(ProcessingConfig(executor='thread', max_workers=4,
+                                                cache_dir=Path('output/.cache')))
+    with processor:
+        for r in processor.iter_results(folders, process_folder):
+            print(r.item, r.status, r.cached)
 """
 
-__version__ = "2.0.0"
+__version__ = "2.1.0"
 
-import logging
-from pathlib import Path
-from typing import List, Dict, Any, Callable, Optional
-from dataclasses import dataclass
+import gc
+import sys
 import json
 import time
+import sqlite3
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import (FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+EXECUTORS = ('serial', 'thread', 'process')
+CACHE_BACKENDS = ('file', 'sqlite', 'memory')
+
 
 @dataclass
 class ProcessingConfig:
@@ -32,6 +50,208 @@ class ProcessingConfig:
     cache_dir: Optional[Path] = None
     save_intermediate: bool = True
     clear_cache_interval: int = 5
+    executor: str = 'serial'             # 'serial' / 'thread' / 'process'
+    max_workers: int = 1
+    max_in_flight: Optional[int] = None  # Submitted but not yet delivered (default: 2 x max_workers)
+    cache_backend: str = 'file'          # 'file' / 'sqlite'; without cache_dir results are kept in memory
+
+    def __post_init__(self):
+        if self.executor not in EXECUTORS:
+            raise ValueError(f"Invalid executor: {self.executor} (must be one of {', '.join(EXECUTORS)})")
+        if self.cache_backend not in CACHE_BACKENDS:
+            raise ValueError(f"Invalid cache_backend: {self.cache_backend} "
+                             f"(must be one of {', '.join(CACHE_BACKENDS)})")
+        if self.max_workers < 1:
+            raise ValueError(f"Invalid max_workers: {self.max_workers} (must be >= 1)")
+        if self.cache_dir is not None:
+            self.cache_dir = Path(self.cache_dir)
+
+    @property
+    def in_flight_limit(self) -> int:
+        if self.executor == 'serial':
+            return 1
+        return max(1, self.max_in_flight or 2 * self.max_workers)
+
+
+# ========================================
+# Result cache backends
+# ========================================
+
+class ResultCache:
+    """Persistent map from item key to a successful result (JSON-serializable dict)"""
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, key: str, result: Dict[str, Any]):
+        raise NotImplementedError
+
+    def keys(self) -> List[str]:
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def flush(self):
+        """Persist buffered writes (no-op for write-through backends)"""
+
+    def close(self):
+        self.flush()
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+
+class MemoryResultCache(ResultCache):
+    """In-process cache (no persistence)"""
+
+    def __init__(self):
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._results.get(key)
+
+    def put(self, key, result):
+        with self._lock:
+            self._results[key] = result
+
+    def keys(self):
+        with self._lock:
+            return list(self._results)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+class FileResultCache(ResultCache):
+    """
+    One JSON file per item under cache_dir/results/
+
+    Files are written to a temporary name and renamed, so an interrupted run never
+    leaves a truncated entry.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.directory = Path(cache_dir) / 'results'
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry.get('result') if entry.get('key') == key else None
+
+    def put(self, key, result):
+        path = self._path(key)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'result': result, 'saved': time.time()}, f, default=str)
+        os.replace(tmp, path)
+
+    def keys(self):
+        keys = []
+        for path in self.directory.glob('*.json'):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    keys.append(json.load(f)['key'])
+            except (OSError, ValueError, KeyError):
+                continue
+        return keys
+
+    def clear(self):
+        for path in self.directory.glob('*.json'):
+            path.unlink(missing_ok=True)
+
+
+class SQLiteResultCache(ResultCache):
+    """Single SQLite file (WAL journal); one connection shared by all threads under a lock"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS results '
+                           '(key TEXT PRIMARY KEY, result TEXT NOT NULL, saved REAL NOT NULL)')
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT result FROM results WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, result):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO results (key, result, saved) VALUES (?, ?, ?)',
+                               (key, json.dumps(result, default=str), time.time()))
+            self._conn.commit()
+
+    def keys(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute('SELECT key FROM results')]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM results')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_result_cache(config: ProcessingConfig) -> ResultCache:
+    """Cache backend for a ProcessingConfig (memory when no cache_dir is set)"""
+    if config.cache_dir is None or config.cache_backend == 'memory':
+        return MemoryResultCache()
+    if config.cache_backend == 'sqlite':
+        return SQLiteResultCache(config.cache_dir / 'results.sqlite')
+    return FileResultCache(config.cache_dir)
+
+
+# ========================================
+# Batch processor
+# ========================================
+
+@dataclass
+class BatchResult:
+    """Outcome of one item"""
+    index: int                  # Position in the input
+    item: Any
+    key: str
+    result: Dict[str, Any]      # Contains 'status' ('success' / 'failed')
+    status: str
+    error: Optional[str] = None
+    cached: bool = False        # Loaded from the result cache (not processed this run)
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 'success'
+
+
+def _timed_call(process_func: Callable, item: Any) -> Tuple[Any, float]:
+    """Run process_func in a worker (module-level so process pools can pickle it)"""
+    start = time.perf_counter()
+    value = process_func(item)
+    return value, time.perf_counter() - start
+
+
+def _default_key(item: Any) -> str:
+    return str(item)
 
 
 class BatchProcessor:
@@ -39,28 +259,171 @@ class BatchProcessor:
     Generic batch processor with resume capability
 
     Features:
-    - Resume from interruption
-    - Progress tracking
-    - Cache management
-    - Flexible callback system
+    - Serial, thread-pool or process-pool execution
+    - At most `in_flight_limit` items submitted but not yet delivered; the input
+      iterator is only advanced as results are consumed
+    - Results yielded as they complete (or in input order with ordered=True)
+    - Successful results cached by item key and skipped on the next run (enable_resume)
+    - gc / CUDA cache release every clear_cache_interval processed items
     """
 
-    def __init__(self, config: Optional[ProcessingConfig] = None):
+    def __init__(self, config: Optional[ProcessingConfig] = None, cache: Optional[ResultCache] = None):
         """
         Initialize batch processor
 
         Args:
             config: Processing configuration
+            cache: Result cache (default: from config.cache_backend / cache_dir)
         """
         self.config = config or ProcessingConfig()
-        self.cache = {}
-        self.progress = {'current': 0, 'total': 0, 'completed': [], 'failed': []}
+        self.cache = cache if cache is not None else create_result_cache(self.config)
+        self.progress = {'current': 0, 'total': 0, 'completed': [], 'failed': [], 'cached': 0}
+        self._processed = 0
+        self._unsaved: List[Tuple[str, Dict[str, Any]]] = []
+
+    def _make_executor(self) -> Executor:
+        if self.config.executor == 'process':
+            return ProcessPoolExecutor(max_workers=self.config.max_workers)
+        return ThreadPoolExecutor(max_workers=self.config.max_workers, thread_name_prefix='BatchWorker')
+
+    def iter_results(self, items: Iterable[Any], process_func: Callable[[Any], Any],
+                     key_func: Optional[Callable[[Any], str]] = None,
+                     ordered: bool = False) -> Iterator[BatchResult]:
+        """
+        Process items and yield a BatchResult for each one
+
+        Args:
+            items: Items to process (consumed lazily)
+            process_func: process_func(item) -> dict (other values are wrapped as {'value': ...});
+                          must be picklable for the process executor
+            key_func: Cache key of an item (default: str(item))
+            ordered: Yield in input order instead of completion order
+
+        Yields:
+            BatchResult; a failure never stops the batch
+        """
+        key_func = key_func or _default_key
+        self.progress.update(current=0, total=len(items) if hasattr(items, '__len__') else 0,
+                             completed=[], failed=[], cached=0)
+        try:
+            if self.config.executor == 'serial':
+                yield from self._iter_serial(items, process_func, key_func)
+            else:
+                yield from self._iter_pool(items, process_func, key_func, ordered)
+        finally:
+            self._flush_cache()
+
+    def _iter_serial(self, items, process_func, key_func) -> Iterator[BatchResult]:
+        for index, item in enumerate(items):
+            key = key_func(item)
+            hit = self._lookup(key)
+            if hit is not None:
+                yield self._cached_result(index, item, key, hit)
+                continue
+            try:
+                value, seconds = _timed_call(process_func, item)
+                error = None
+            except Exception as e:
+                value, seconds, error = None, 0.0, e
+            yield self._finish(index, item, key, value, seconds, error)
+
+    def _iter_pool(self, items, process_func, key_func, ordered) -> Iterator[BatchResult]:
+        limit = self.config.in_flight_limit
+        source = enumerate(items)
+        exhausted = False
+        pending: Dict[Future, Tuple[int, Any, str]] = {}
+        buffered: Dict[int, BatchResult] = {}  # ordered mode: completed but not yet deliverable
+        next_index = 0
+
+        pool = self._make_executor()
+        try:
+            while True:
+                # Back-pressure: only pull new items while under the in-flight limit
+                ready: List[BatchResult] = []
+                while not exhausted and len(pending) + len(buffered) + len(ready) < limit:
+                    try:
+                        index, item = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    key = key_func(item)
+                    hit = self._lookup(key)
+                    if hit is not None:
+                        ready.append(self._cached_result(index, item, key, hit))
+                    else:
+                        pending[pool.submit(_timed_call, process_func, item)] = (index, item, key)
+
+                if pending and not ready:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index, item, key = pending.pop(future)
+                        try:
+                            value, seconds = future.result()
+                            error = None
+                        except Exception as e:
+                            value, seconds, error = None, 0.0, e
+                        ready.append(self._finish(index, item, key, value, seconds, error))
+
+                if ordered:
+                    for result in ready:
+                        buffered[result.index] = result
+                    while next_index in buffered:
+                        yield buffered.pop(next_index)
+                        next_index += 1
+                else:
+                    yield from ready
+
+                if exhausted and not pending and not buffered:
+                    break
+        finally:
+            # Consumer stopped early (or an error): drop work that has not started
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.config.enable_resume:
+            return None
+        return self._load_from_cache(key)
+
+    def _cached_result(self, index: int, item: Any, key: str, result: Dict[str, Any]) -> BatchResult:
+        logger.info(f"Loaded from cache: {item}")
+        self.progress['cached'] += 1
+        self.progress['current'] += 1
+        return BatchResult(index, item, key, result, result.get('status', 'success'), cached=True)
+
+    def _finish(self, index: int, item: Any, key: str, value: Any, seconds: float,
+                error: Optional[BaseException]) -> BatchResult:
+        self.progress['current'] += 1
+        self._processed += 1
+        self._maybe_release_memory()
+        if error is not None:
+            logger.error(f"Failed to process {item}: {error}")
+            self.progress['failed'].append(item)
+            return BatchResult(index, item, key, {'status': 'failed', 'error': str(error)},
+                               'failed', error=str(error), seconds=seconds)
+
+        result = value if isinstance(value, dict) else {'value': value}
+        result['status'] = 'success'
+        self.progress['completed'].append(item)
+        if self.config.enable_resume:
+            self._save_to_cache(key, result)
+        return BatchResult(index, item, key, result, 'success', seconds=seconds)
+
+    def _maybe_release_memory(self):
+        """Every clear_cache_interval processed items: collect garbage and empty the CUDA cache"""
+        interval = self.config.clear_cache_interval
+        if not interval or self._processed % interval:
+            return
+        gc.collect()
+        torch = sys.modules.get('torch')  # never import torch just for this
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
 
     def process_batch(
         self,
         items: List[Any],
         process_func: Callable,
-        progress_callback: Optional[Callable] = None
+        progress_callback: Optional[Callable] = None,
+        key_func: Optional[Callable[[Any], str]] = None,
     ) -> List[Dict[str, Any]]:
         """
         Process a batch of items with resume capability
@@ -68,60 +431,66 @@ class BatchProcessor:
         Args:
             items: List of items to process
             process_func: Function to process each item
-            progress_callback: Optional progress callback
+            progress_callback: Optional progress callback (done, total, item, result), called in completion order
+            key_func: Cache key of an item (default: str(item))
 
         Returns:
-            List of results
+            List of results in input order
         """
-        results = []
-        self.progress['total'] = len(items)
-
-        for i, item in enumerate(items):
-            # Check cache if resume enabled
-            if self.config.enable_resume and self._is_cached(item):
-                result = self._load_from_cache(item)
-                logger.info(f"Loaded from cache: {item}")
-            else:
-                # Process item
-                try:
-                    result = process_func(item)
-                    result['status'] = 'success'
-                    self.progress['completed'].append(item)
+        items = list(items)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        for done, r in enumerate(self.iter_results(items, process_func, key_func), 1):
+            results[r.index] = r.result
+            if progress_callback:
+                progress_callback(done, len(items), r.item, r.result)
+        return results
 
-                    # Save to cache
-                    if self.config.enable_resume:
-                        self._save_to_cache(item, result)
+    def _is_cached(self, key: str) -> bool:
+        """Check if item is cached"""
+        return key in self.cache
 
-                except Exception as e:
-                    logger.error(f"Failed to process {item}: {e}")
-                    result = {'status': 'failed', 'error': str(e)}
-                    self.progress['failed'].append(item)
+    def _load_from_cache(self, key: str) -> Optional[Dict[str, Any]]:
+        """Load result from cache (None when missing)"""
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"Result cache read failed for {key}: {e}")
+            return None
 
-            results.append(result)
-            self.progress['current'] = i + 1
+    def _save_to_cache(self, key: str, result: Dict[str, Any]):
+        """Save result to cache (immediately, or at the end of the batch without save_intermediate)"""
+        if not self.config.save_intermediate:
+            self._unsaved.append((key, result))
+            return
+        try:
+            self.cache.put(key, result)
+        except Exception as e:
+            logger.warning(f"Result cache write failed for {key}: {e}")
 
-            # Progress callback
-            if progress_callback:
-                progress_callback(i + 1, len(items), item, result)
+    def _flush_cache(self):
+        unsaved, self._unsaved = self._unsaved, []
+        for key, result in unsaved:
+            try:
+                self.cache.put(key, result)
+            except Exception as e:
+                logger.warning(f"Result cache write failed for {key}: {e}")
+        self.cache.flush()
 
-        return results
+    def clear_cache(self):
+        """Forget all cached results (process everything again)"""
+        self.cache.clear()
 
-    def _is_cached(self, item: Any) -> bool:
-        """Check if item is cached"""
-        # Placeholder - implement in Week 3
-        return False
+    def close(self):
+        self._flush_cache()
+        self.cache.close()
 
-    def _load_from_cache(self, item: Any) -> Dict[str, Any]:
-        """Load result from cache"""
-        # Placeholder - implement in Week 3
-        return {}
+    def __enter__(self) -> 'BatchProcessor':
+        return self
 
-    def _save_to_cache(self, item: Any, result: Dict[str, Any]):
-        """Save result to cache"""
-        # Placeholder - implement in Week 3
-        pass
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
 
 if __name__ == "__main__":
-    print("Batch Processor Framework - Week 2")
-    print("Full implementation in Week 3")
+    print(f"Batch Processor Framework v{__version__}")
+    print(f"Executors: {', '.join(EXECUTORS)}; cache backends: {', '.join(CACHE_BACKENDS)}")